@@ -2,13 +2,12 @@
 ユーザー・団体・選手管理画面
 初心者でも使いやすい管理画面を提供
 """
-import csv
-
 from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from django.http import HttpResponse
 from django.utils.html import format_html
 
+from nitsys.csv_export import CHUNK_SIZE, streaming_csv_response
+
 from .models import Athlete, Organization, User
 
 # =============================================================================
@@ -17,32 +16,30 @@ from .models import Athlete, Organization, User
 
 @admin.action(description="選択した選手をCSVでエクスポート")
 def export_athletes_csv(modeladmin, request, queryset):
-    """選手をCSVでエクスポート"""
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-    response['Content-Disposition'] = 'attachment; filename="athletes.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
+    """選手をCSVでエクスポート（ストリーミング）"""
+    header = [
         '氏名', 'フリガナ', '英語名', '性別', '生年月日', 
         '学年', '国籍', '登録陸協', 'JAAF ID', '所属団体', '有効'
-    ])
+    ]
+    athletes = queryset.select_related('organization')
     
-    for athlete in queryset.select_related('organization'):
-        writer.writerow([
-            athlete.full_name,
-            athlete.full_name_kana,
-            athlete.full_name_en,
-            athlete.get_gender_display(),
-            athlete.birth_date,
-            athlete.get_grade_display() if athlete.grade else '',
-            athlete.get_nationality_display() if athlete.nationality else 'JPN',
-            athlete.get_registered_pref_display() if athlete.registered_pref else '',
-            athlete.jaaf_id or '',
-            athlete.organization.name if athlete.organization else '',
-            '有効' if athlete.is_active else '無効',
-        ])
+    def rows():
+        for athlete in athletes.iterator(chunk_size=CHUNK_SIZE):
+            yield [
+                athlete.full_name,
+                athlete.full_name_kana,
+                f'{athlete.last_name_en} {athlete.first_name_en}'.strip(),
+                athlete.get_gender_display(),
+                athlete.birth_date,
+                athlete.get_grade_display() if athlete.grade else '',
+                athlete.get_nationality_display() if athlete.nationality else 'JPN',
+                athlete.get_registered_pref_display() if athlete.registered_pref else '',
+                athlete.jaaf_id or '',
+                athlete.organization.name if athlete.organization else '',
+                '有効' if athlete.is_active else '無効',
+            ]
     
-    return response
+    return streaming_csv_response('athletes.csv', header, rows())
 
 
 @admin.action(description="選択した選手を有効化")
@@ -61,27 +58,24 @@ def deactivate_athletes(modeladmin, request, queryset):
 
 @admin.action(description="選択した団体をCSVでエクスポート")
 def export_organizations_csv(modeladmin, request, queryset):
-    """団体をCSVでエクスポート"""
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-    response['Content-Disposition'] = 'attachment; filename="organizations.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
+    """団体をCSVでエクスポート（ストリーミング）"""
+    header = [
         '団体名', 'フリガナ', '略称', '代表者名', 'メール', '電話番号', '有効'
-    ])
+    ]
     
-    for org in queryset:
-        writer.writerow([
-            org.name,
-            org.name_kana,
-            org.short_name,
-            org.representative_name,
-            org.representative_email,
-            org.representative_phone,
-            '有効' if org.is_active else '無効',
-        ])
+    def rows():
+        for org in queryset.iterator(chunk_size=CHUNK_SIZE):
+            yield [
+                org.name,
+                org.name_kana,
+                org.short_name,
+                org.representative_name,
+                org.representative_email,
+                org.representative_phone,
+                '有効' if org.is_active else '無効',
+            ]
     
-    return response
+    return streaming_csv_response('organizations.csv', header, rows())
 
 
 # =============================================================================
@@ -4,11 +4,14 @@ Excelファイルから選手を一括登録
 """
 import io
 import re
+from collections import defaultdict
 from datetime import date
 
 import pandas as pd
 from django.db import transaction
 
+from nitsys.audit import log_bulk_create
+
 from .models import Athlete, User
 
 
@@ -39,6 +42,9 @@ class AthleteExcelImporter:
     REQUIRED_COLUMNS = ['姓', '名', '姓カナ', '名カナ', '性別', '生年月日', '登録陸協', 'JAAF ID']
     OPTIONAL_COLUMNS = ['学年', '国籍', '姓ローマ字', '名ローマ字']
     
+    # bulk_create の1回あたりの件数
+    BATCH_SIZE = 500
+    
     GENDER_MAP = {
         'M': 'M', '男': 'M', '男子': 'M',
         'F': 'F', '女': 'F', '女子': 'F',
@@ -294,45 +300,77 @@ class AthleteExcelImporter:
         """
         重複チェック
         - JAAF IDの重複（ファイル内、既存DB）
-        - 同姓同名＋生年月日の重複
+        - 同姓同名＋生年月日の重複（ファイル内）
+        
+        ファイル内の重複はキーごとの行番号索引で、既存DBとの重複は
+        jaaf_id__in による1回のクエリで判定する。
         """
-        for athlete in parsed_athletes:
-            if not athlete.get('valid'):
-                continue
-            
-            jaaf_id = athlete.get('jaaf_id')
+        valid_athletes = [a for a in parsed_athletes if a.get('valid')]
+        
+        # キー -> 行番号リスト（ファイル内の出現順）
+        rows_by_jaaf = defaultdict(list)
+        rows_by_profile = defaultdict(list)
+        for athlete in valid_athletes:
+            rows_by_jaaf[athlete['jaaf_id']].append(athlete['row_num'])
+            rows_by_profile[self._profile_key(athlete)].append(athlete['row_num'])
+        
+        existing_by_jaaf = self._existing_by_jaaf(rows_by_jaaf.keys())
+        
+        for athlete in valid_athletes:
+            jaaf_id = athlete['jaaf_id']
+            row_num = athlete['row_num']
             
             # ファイル内でのJAAF ID重複
-            same_jaaf_in_file = [
-                a for a in parsed_athletes 
-                if a.get('jaaf_id') == jaaf_id 
-                and a['row_num'] != athlete['row_num']
-                and a.get('valid')
-            ]
-            if same_jaaf_in_file:
-                if 'warnings' not in athlete:
-                    athlete['warnings'] = []
-                athlete['warnings'].append(f'JAAF ID {jaaf_id} が行{same_jaaf_in_file[0]["row_num"]}と重複しています')
+            other_row = self._other_row(rows_by_jaaf[jaaf_id], row_num)
+            if other_row:
+                athlete.setdefault('warnings', []).append(
+                    f'JAAF ID {jaaf_id} が行{other_row}と重複しています'
+                )
+            
+            # ファイル内での同姓同名＋生年月日の重複
+            other_row = self._other_row(rows_by_profile[self._profile_key(athlete)], row_num)
+            if other_row:
+                athlete.setdefault('warnings', []).append(
+                    f'{athlete["last_name"]} {athlete["first_name"]}（{athlete["birth_date"]:%Y-%m-%d}）'
+                    f'が行{other_row}と重複しています'
+                )
             
             # DB内でのJAAF ID重複
-            existing_by_jaaf = Athlete.objects.filter(jaaf_id=jaaf_id, is_active=True)
-            if self.organization:
-                existing_same_org = existing_by_jaaf.filter(organization=self.organization).first()
-                if existing_same_org:
-                    if 'warnings' not in athlete:
-                        athlete['warnings'] = []
-                    athlete['warnings'].append(f'JAAF ID {jaaf_id} は既に登録済みです（{existing_same_org.full_name}）')
-                    athlete['existing_id'] = existing_same_org.pk
-            else:
-                existing_same_user = existing_by_jaaf.filter(user=self.user).first()
-                if existing_same_user:
-                    if 'warnings' not in athlete:
-                        athlete['warnings'] = []
-                    athlete['warnings'].append(f'JAAF ID {jaaf_id} は既に登録済みです（{existing_same_user.full_name}）')
-                    athlete['existing_id'] = existing_same_user.pk
+            existing = existing_by_jaaf.get(jaaf_id)
+            if existing:
+                athlete.setdefault('warnings', []).append(
+                    f'JAAF ID {jaaf_id} は既に登録済みです（{existing.full_name}）'
+                )
+                athlete['existing_id'] = existing.pk
         
         return parsed_athletes
     
+    @staticmethod
+    def _profile_key(athlete: dict) -> tuple:
+        """同一人物判定用のキー（姓・名・生年月日）"""
+        return (athlete['last_name'], athlete['first_name'], athlete['birth_date'])
+    
+    @staticmethod
+    def _other_row(row_nums: list[int], row_num: int):
+        """同じキーを持つ自分以外の最初の行番号"""
+        for other in row_nums:
+            if other != row_num:
+                return other
+        return None
+    
+    def _existing_by_jaaf(self, jaaf_ids) -> dict:
+        """自団体（個人の場合は自分）の登録済み選手を JAAF ID で索引化"""
+        existing = Athlete.objects.filter(jaaf_id__in=list(jaaf_ids), is_active=True)
+        if self.organization:
+            existing = existing.filter(organization=self.organization)
+        else:
+            existing = existing.filter(user=self.user)
+        
+        index = {}
+        for athlete in existing:
+            index.setdefault(athlete.jaaf_id, athlete)
+        return index
+    
     def parse_excel(self, file_content: bytes) -> tuple[list[dict], list[str]]:
         """
         Excelファイルを解析
@@ -363,9 +401,8 @@ class AthleteExcelImporter:
         
         # 各行を解析
         parsed_athletes = []
-        for idx, row in df.iterrows():
+        for idx, row_data in zip(df.index, df.to_dict('records'), strict=True):
             row_num = idx + 2  # Excelは1始まり、ヘッダーで+1
-            row_data = row.to_dict()
             athlete_data = self.parse_row(row_data, row_num)
             parsed_athletes.append(athlete_data)
         
@@ -387,7 +424,7 @@ class AthleteExcelImporter:
         Returns:
             (登録した選手リスト, スキップした選手リスト)
         """
-        imported = []
+        new_athletes = []
         skipped = []
         
         for athlete_data in parsed_athletes:
@@ -421,8 +458,11 @@ class AthleteExcelImporter:
             else:
                 athlete.user = self.user
             
-            athlete.save()
-            imported.append(athlete)
+            new_athletes.append(athlete)
+        
+        imported = Athlete.objects.bulk_create(new_athletes, batch_size=self.BATCH_SIZE)
+        # bulk_create はシグナルを送らないため、操作履歴の作成ログはまとめて記録する
+        log_bulk_create(imported, actor=self.user, batch_size=self.BATCH_SIZE)
         
         return imported, skipped
 
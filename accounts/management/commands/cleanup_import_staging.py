@@ -0,0 +1,19 @@
+"""
+一括登録プレビューの期限切れデータ削除コマンド
+
+使用方法:
+    python manage.py cleanup_import_staging
+
+cron 等で定期実行する（アップロード時にも期限切れ分は削除される）。
+"""
+from django.core.management.base import BaseCommand
+
+from accounts.models import ImportStaging
+
+
+class Command(BaseCommand):
+    help = '有効期限を過ぎた一括登録プレビュー（ImportStaging）を削除します'
+
+    def handle(self, *args, **options):
+        deleted = ImportStaging.purge_expired()
+        self.stdout.write(f'{deleted}件の期限切れデータを削除しました')
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:21
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_alter_athlete_nationality'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportStaging',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(help_text='例: athletes, entries:12（大会ID）', max_length=50, verbose_name='種別')),
+                ('token', models.CharField(max_length=64, verbose_name='トークン')),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='解析結果')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='有効期限')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_stagings', to=settings.AUTH_USER_MODEL, verbose_name='アップロードユーザー')),
+            ],
+            options={
+                'verbose_name': '一括登録プレビュー',
+                'verbose_name_plural': '一括登録プレビュー',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='importstaging',
+            constraint=models.UniqueConstraint(fields=('user', 'scope', 'token'), name='unique_import_staging_token'),
+        ),
+    ]
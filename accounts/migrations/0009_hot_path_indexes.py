@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_import_staging'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='athlete',
+            index=models.Index(fields=['jaaf_id'], name='athlete_jaaf_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='athlete',
+            index=models.Index(fields=['last_name', 'first_name'], name='athlete_name_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-17 05:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='athlete',
+            name='athlete_jaaf_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='athlete',
+            name='athlete_name_idx',
+        ),
+        migrations.AddIndex(
+            model_name='athlete',
+            index=models.Index(fields=['jaaf_id', 'organization'], name='athlete_jaaf_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='athlete',
+            index=models.Index(fields=['last_name', 'first_name', 'organization'], name='athlete_name_idx'),
+        ),
+    ]
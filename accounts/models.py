@@ -1,10 +1,15 @@
 """
 ユーザー・団体・選手モデル
 """
+import hashlib
+from datetime import timedelta
+
 from auditlog.registry import auditlog
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import RegexValidator
 from django.db import models
+from django.utils import timezone
 
 
 class UserManager(BaseUserManager):
@@ -296,6 +301,13 @@ class Athlete(models.Model):
         verbose_name = '選手'
         verbose_name_plural = '選手'
         ordering = ['last_name_kana', 'first_name_kana']
+        indexes = [
+            # 一括登録での JAAF ID による照合。選手の一括登録（AthleteExcelImporter）は団体で、
+            # エントリーの一括登録（ExcelEntryImporter）は JAAF ID だけで絞り込む
+            models.Index(fields=['jaaf_id', 'organization'], name='athlete_jaaf_id_idx'),
+            # エントリーの一括登録での団体内の氏名による照合（団体の外部キーのインデックスより絞り込める）
+            models.Index(fields=['last_name', 'first_name', 'organization'], name='athlete_name_idx'),
+        ]
     
     def __str__(self):
         org_name = self.organization.short_name if self.organization else "個人"
@@ -318,6 +330,85 @@ class Athlete(models.Model):
         )
 
 
+class ImportStaging(models.Model):
+    """
+    一括登録プレビューの一時保存
+    
+    Excelを解析・検証した結果をアップロードトークン単位で保存する。
+    セッションにはトークンだけを持たせ、確定時にこのテーブルから読み出す。
+    期限切れのデータは purge_expired()（cleanup_import_staging コマンド）で削除する。
+    """
+    DEFAULT_TTL = timedelta(minutes=30)
+    
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='import_stagings',
+        verbose_name='アップロードユーザー'
+    )
+    scope = models.CharField(
+        '種別',
+        max_length=50,
+        help_text='例: athletes, entries:12（大会ID）'
+    )
+    token = models.CharField('トークン', max_length=64)
+    payload = models.JSONField('解析結果', encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField('作成日時', auto_now_add=True)
+    expires_at = models.DateTimeField('有効期限', db_index=True)
+    
+    class Meta:
+        verbose_name = '一括登録プレビュー'
+        verbose_name_plural = '一括登録プレビュー'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'scope', 'token'],
+                name='unique_import_staging_token',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.scope} ({self.user})"
+    
+    @staticmethod
+    def make_token(content):
+        """アップロード内容（バイト列）からトークンを生成（SHA-256）"""
+        return hashlib.sha256(content).hexdigest()
+    
+    @classmethod
+    def stage(cls, user, scope, token, payload, ttl=None):
+        """解析結果を保存（同じトークンなら上書き）し、期限切れデータを削除"""
+        cls.purge_expired()
+        cls.objects.update_or_create(
+            user=user, scope=scope, token=token,
+            defaults={
+                'payload': payload,
+                'expires_at': timezone.now() + (ttl or cls.DEFAULT_TTL),
+            },
+        )
+        return token
+    
+    @classmethod
+    def fetch(cls, user, scope, token):
+        """有効期限内の解析結果（なければ None）"""
+        if not token:
+            return None
+        staging = cls.objects.filter(
+            user=user, scope=scope, token=token, expires_at__gt=timezone.now()
+        ).only('payload').first()
+        return staging.payload if staging else None
+    
+    @classmethod
+    def discard(cls, user, scope, token):
+        """確定・取消後に削除"""
+        cls.objects.filter(user=user, scope=scope, token=token).delete()
+    
+    @classmethod
+    def purge_expired(cls):
+        """期限切れのデータを削除"""
+        deleted, _ = cls.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
 # django-auditlog登録
 auditlog.register(User, exclude_fields=['password', 'last_login'])
 auditlog.register(Organization)
@@ -0,0 +1,185 @@
+"""
+団体名マッチング
+
+CSV等で入力された団体名を Organization に照合する。団体一覧を1回だけ読み込み、
+完全一致・略称・正規化キーの辞書と bigram 索引を構築するため、
+行ごとのクエリや全団体との総当たり比較が発生しない。
+"""
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+from .models import Organization
+
+# ひらがな → カタカナ
+_HIRAGANA_TO_KATAKANA = {code: code + 0x60 for code in range(ord('ぁ'), ord('ゖ') + 1)}
+
+# 照合時に無視する文字（空白・中黒）
+_IGNORED_CHARS = re.compile(r'[\s・]+')
+
+
+def normalize_name(text):
+    """
+    表記ゆれを吸収した照合キー
+
+    全角／半角（NFKC）、ひらがな／カタカナ、大文字／小文字、空白・中黒の違いを無視する。
+    """
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    text = text.translate(_HIRAGANA_TO_KATAKANA)
+    return _IGNORED_CHARS.sub('', text)
+
+
+def bigrams(text):
+    """文字 bigram の集合（1文字の場合はその文字）"""
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class OrganizationMatcher:
+    """
+    団体名マッチャー（インポート1回につき1回構築して使い回す）
+
+    照合順:
+        1. 団体名の完全一致
+        2. 略称の完全一致
+        3. 正規化キー（団体名・略称）の一致
+        4. 団体名の部分一致（1団体に絞れる場合のみ）
+        5. 類似度（bigram 索引で絞った候補だけを SequenceMatcher で採点、有効な団体のみ）
+    """
+
+    # 類似度を計算する候補数の上限
+    MAX_CANDIDATES = 20
+
+    # この割合を超える団体に現れる bigram（「大学」「高校」等）は候補抽出に使わない
+    COMMON_GRAM_RATIO = 0.1
+
+    # 類似度がこの値以上の候補が先頭なら一致とみなす
+    AUTO_MATCH_RATIO = 0.9
+
+    def __init__(self, organizations=None):
+        """
+        Args:
+            organizations: 照合対象の団体（省略時は全団体）
+        """
+        if organizations is None:
+            organizations = Organization.objects.only('pk', 'name', 'name_kana', 'short_name', 'is_active')
+
+        self.by_name = {}
+        self.by_short_name = {}
+        self.by_key = {}
+
+        # 部分一致用: (正規化した団体名, 団体) と bigram 索引
+        self._names = []
+        self._name_grams = defaultdict(set)
+
+        # 類似度用: (正規化した団体名または略称, 団体) と bigram 索引
+        self._keys = []
+        self._key_grams = defaultdict(set)
+
+        for org in organizations:
+            # 既定の並び順で最初の団体を採用（従来の .first() と同じ）
+            self.by_name.setdefault(org.name, org)
+            if org.short_name:
+                self.by_short_name.setdefault(org.short_name, org)
+
+            name_key = normalize_name(org.name)
+            self.by_key.setdefault(name_key, org)
+            self._add(self._names, self._name_grams, name_key, org)
+
+            if org.short_name:
+                short_key = normalize_name(org.short_name)
+                self.by_key.setdefault(short_key, org)
+
+            if org.is_active:
+                self._add(self._keys, self._key_grams, name_key, org)
+                if org.short_name:
+                    self._add(self._keys, self._key_grams, short_key, org)
+
+        self._common_limit = max(1, int(len(self._keys) * self.COMMON_GRAM_RATIO))
+
+    @staticmethod
+    def _add(entries, index, key, org):
+        if not key:
+            return
+        entries.append((key, org))
+        for gram in bigrams(key):
+            index[gram].add(len(entries) - 1)
+
+    def match(self, name, threshold=0.8):
+        """
+        団体名で団体を検索
+
+        Args:
+            name: 検索する団体名
+            threshold: 類似度の閾値 (0.0-1.0)
+
+        Returns:
+            (Organization or None, list of candidates)
+        """
+        org = self.by_name.get(name) or self.by_short_name.get(name)
+        if org:
+            return org, []
+
+        key = normalize_name(name)
+        if not key:
+            return None, []
+
+        org = self.by_key.get(key) or self._partial_match(key)
+        if org:
+            return org, []
+
+        candidates = self._similar(key, threshold)
+        if candidates and candidates[0][1] >= self.AUTO_MATCH_RATIO:
+            return candidates[0][0], []
+
+        return None, [org for org, _ in candidates[:3]]
+
+    def _partial_match(self, key):
+        """キーを含む団体名が1件だけならその団体"""
+        if len(key) < 2:
+            entries = range(len(self._names))
+        else:
+            postings = [self._name_grams.get(gram, ()) for gram in bigrams(key)]
+            # 最も出現の少ない bigram の団体だけを検証すれば十分
+            entries = min(postings, key=len)
+
+        found = None
+        for i in entries:
+            name_key, org = self._names[i]
+            if key in name_key:
+                if found is not None:
+                    return None
+                found = org
+        return found
+
+    def _similar(self, key, threshold):
+        """類似度が閾値以上の団体を類似度の降順で返す"""
+        grams = bigrams(key)
+        shared = Counter()
+        common = []
+        for gram in grams:
+            postings = self._key_grams.get(gram)
+            if not postings:
+                continue
+            if len(postings) > self._common_limit:
+                common.append(postings)
+            else:
+                shared.update(postings)
+        if not shared:
+            # 一般的な bigram しか共有しない場合はそれらで候補を抽出
+            for postings in common:
+                shared.update(postings)
+
+        best = {}
+        for i, _ in shared.most_common(self.MAX_CANDIDATES):
+            text, org = self._keys[i]
+            # 長さの差だけで閾値に届かない候補は採点しない
+            if 2 * min(len(key), len(text)) / (len(key) + len(text)) < threshold:
+                continue
+            ratio = SequenceMatcher(None, key, text).ratio()
+            if ratio >= threshold and ratio > best.get(org.pk, (None, 0))[1]:
+                best[org.pk] = (org, ratio)
+
+        return sorted(best.values(), key=lambda c: c[1], reverse=True)
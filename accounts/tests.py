@@ -1,6 +1,7 @@
 """
 accounts アプリのテスト
 """
+import io
 from datetime import date
 
 import pytest
@@ -207,3 +208,201 @@ class TestAccountViews:
         response = client.get('/accounts/password_reset/')
         assert response.status_code == 200
         assert 'パスワードリセット' in response.content.decode()
+
+
+class TestAthleteExcelImporter:
+    """選手一括登録のテスト"""
+    
+    def _excel(self, rows):
+        """行データからxlsxのバイト列を作成"""
+        import io
+
+        import pandas as pd
+        
+        columns = ['姓', '名', '姓カナ', '名カナ', '性別', '生年月日', '登録陸協', 'JAAF ID']
+        output = io.BytesIO()
+        pd.DataFrame(rows, columns=columns).to_excel(output, index=False, engine='openpyxl')
+        return output.getvalue()
+    
+    def _row(self, i, **overrides):
+        row = {
+            '姓': f'一括{i}', '名': '太郎', '姓カナ': 'イッカツ', '名カナ': 'タロウ',
+            '性別': 'M', '生年月日': '2001-05-01', '登録陸協': '東京', 'JAAF ID': f'B{i:06d}',
+        }
+        row.update(overrides)
+        return row
+    
+    def test_duplicate_warnings(self, normal_user, athlete):
+        """ファイル内・既存DBの重複を警告"""
+        from accounts.athlete_import import AthleteExcelImporter
+        
+        content = self._excel([
+            self._row(1),
+            self._row(2, **{'JAAF ID': 'B000001'}),
+            self._row(3, **{'姓': '一括1'}),
+            self._row(4, **{'JAAF ID': 'T123456'}),
+        ])
+        parsed, global_errors = AthleteExcelImporter(normal_user).parse_excel(content)
+        
+        assert global_errors == []
+        assert [a.get('warnings', []) for a in parsed] == [
+            ['JAAF ID B000001 が行3と重複しています', '一括1 太郎（2001-05-01）が行4と重複しています'],
+            ['JAAF ID B000001 が行2と重複しています'],
+            ['一括1 太郎（2001-05-01）が行2と重複しています'],
+            ['JAAF ID T123456 は既に登録済みです（鈴木 次郎）'],
+        ]
+        assert parsed[3]['existing_id'] == athlete.pk
+    
+    def test_import_is_batched(self, normal_user, organization, django_assert_max_num_queries):
+        """行数に関わらず少ないクエリで解析・登録"""
+        from accounts.athlete_import import AthleteExcelImporter
+        
+        importer = AthleteExcelImporter(normal_user)
+        content = self._excel([self._row(i) for i in range(120)])
+        
+        # SQLiteは1文あたりのパラメータ数制限でINSERTが数回に分かれる
+        with django_assert_max_num_queries(10):
+            parsed, _ = importer.parse_excel(content)
+            imported, skipped = importer.import_athletes(parsed)
+        
+        assert len(imported) == 120
+        assert skipped == []
+        assert Athlete.objects.filter(organization=organization, jaaf_id__startswith='B').count() == 120
+    
+    def test_import_writes_audit_log(self, normal_user, organization):
+        """一括登録した選手にも1件ずつ保存した場合と同じ形式の作成ログが残る"""
+        from auditlog.models import LogEntry
+
+        from accounts.athlete_import import AthleteExcelImporter
+        
+        importer = AthleteExcelImporter(normal_user)
+        parsed, _ = importer.parse_excel(self._excel([self._row(1), self._row(2)]))
+        imported, _ = importer.import_athletes(parsed)
+        manual = Athlete.objects.create(
+            organization=organization, last_name='手動', first_name='太郎', last_name_kana='シュドウ',
+            first_name_kana='タロウ', gender='M', birth_date=date(2001, 5, 1), jaaf_id='M000001',
+        )
+        
+        entries = LogEntry.objects.get_for_objects(Athlete.objects.filter(pk__in=[a.pk for a in imported]))
+        assert entries.count() == 2
+        entry = entries.get(object_id=imported[0].pk)
+        assert entry.action == LogEntry.Action.CREATE
+        assert entry.actor == normal_user
+        assert entry.object_repr == str(imported[0])
+        assert entry.changes['jaaf_id'] == ['None', imported[0].jaaf_id]
+        manual_entry = LogEntry.objects.get_for_object(manual).get()
+        assert set(manual_entry.changes) <= set(entry.changes)
+
+
+class TestImportStaging:
+    """一括登録プレビューの一時保存のテスト"""
+    
+    def test_stage_fetch_and_expiry(self, normal_user, individual_user):
+        """ユーザー・種別ごとに保存し、期限切れは取得・削除される"""
+        from datetime import timedelta
+
+        from django.core.management import call_command
+
+        from accounts.models import ImportStaging
+        
+        token = ImportStaging.make_token(b'content')
+        ImportStaging.stage(normal_user, 'athletes', token, [{'birth_date': date(2001, 5, 1)}])
+        
+        assert ImportStaging.fetch(normal_user, 'athletes', token) == [{'birth_date': '2001-05-01'}]
+        assert ImportStaging.fetch(individual_user, 'athletes', token) is None
+        assert ImportStaging.fetch(normal_user, 'entries:1', token) is None
+        
+        ImportStaging.stage(normal_user, 'old', token, {}, ttl=timedelta(seconds=-1))
+        assert ImportStaging.fetch(normal_user, 'old', token) is None
+        
+        call_command('cleanup_import_staging', stdout=io.StringIO())
+        assert list(ImportStaging.objects.values_list('scope', flat=True)) == ['athletes']
+    
+    def test_bulk_upload_keeps_only_token_in_session(self, client_logged_in, organization):
+        """セッションにはトークンのみを保持し、確定時に一時保存から登録"""
+        from django.urls import reverse
+
+        from accounts.models import ImportStaging
+        
+        content = TestAthleteExcelImporter()._excel([TestAthleteExcelImporter()._row(1)])
+        upload = io.BytesIO(content)
+        upload.name = 'athletes.xlsx'
+        
+        response = client_logged_in.post(reverse('accounts:athlete_bulk_upload'), {'file': upload})
+        assert response.status_code == 200
+        
+        session = client_logged_in.session
+        assert 'bulk_athletes' not in session
+        assert session['bulk_athletes_token'] == ImportStaging.make_token(content)
+        
+        response = client_logged_in.post(reverse('accounts:athlete_bulk_register'))
+        assert response.status_code == 302
+        assert Athlete.objects.filter(organization=organization, jaaf_id='B000001').exists()
+        assert not ImportStaging.objects.exists()
+        assert 'bulk_athletes_token' not in client_logged_in.session
+
+
+class TestOrganizationMatcher:
+    """団体名マッチャーのテスト"""
+    
+    def _matcher(self, names):
+        from accounts.organization_matcher import OrganizationMatcher
+        
+        orgs = [
+            Organization(pk=i + 1, name=name, short_name=short, name_kana='', is_active=active)
+            for i, (name, short, active) in enumerate(names)
+        ]
+        return OrganizationMatcher(orgs), orgs
+    
+    def test_exact_short_and_normalized(self):
+        """完全一致・略称・表記ゆれ（全角半角・ひらがな）の照合"""
+        matcher, orgs = self._matcher([
+            ('日本体育大学', '日体大', True),
+            ('ＮＴＴ東日本', '', True),
+            ('さくらクラブ', '', True),
+        ])
+        
+        assert matcher.match('日本体育大学') == (orgs[0], [])
+        assert matcher.match('日体大') == (orgs[0], [])
+        assert matcher.match('NTT 東日本') == (orgs[1], [])
+        assert matcher.match('サクラクラブ') == (orgs[2], [])
+    
+    def test_partial_and_similar(self):
+        """部分一致（1件のみ）と類似度による候補"""
+        matcher, orgs = self._matcher([
+            ('東洋大学', '', True),
+            ('東洋大学牛久高校', '', True),
+            ('駒澤大学', '駒大', True),
+            ('駒沢大学陸上部OB会', '', False),
+            ('東京農業大学第二高校', '', True),
+        ])
+        
+        # 「牛久」を含むのは1団体だけ
+        assert matcher.match('牛久') == (orgs[1], [])
+        # 「東洋」は2団体に含まれるため部分一致では決めず、類似度でも閾値未満
+        assert matcher.match('東洋') == (None, [])
+        # 無効な団体も部分一致の対象（従来の name__icontains と同じ）
+        assert matcher.match('駒沢大学') == (orgs[3], [])
+        # 類似度が閾値以上・自動一致未満なら候補として返る（無効な団体は候補に含めない）
+        assert matcher.match('駒澤大学院') == (None, [orgs[2]])
+        # 閾値を超える類似度なら一致とみなす
+        assert matcher.match('東京農業大学第2高校') == (orgs[4], [])
+    
+    def test_scores_only_few_candidates(self, monkeypatch):
+        """類似度を計算するのは bigram 索引で絞った候補だけ"""
+        from accounts import organization_matcher
+        
+        names = [(f'テスト第{i}大学', '', True) for i in range(2000)]
+        matcher, orgs = self._matcher(names + [('日本体育大学', '日体大', True)])
+        
+        scored = []
+        original = organization_matcher.SequenceMatcher
+        
+        def counting_matcher(*args, **kwargs):
+            scored.append(args)
+            return original(*args, **kwargs)
+        monkeypatch.setattr(organization_matcher, 'SequenceMatcher', counting_matcher)
+        
+        assert matcher.match('日本体育大') == (orgs[-1], [])
+        assert matcher.match('日本体育大学校')[0] == orgs[-1]
+        assert len(scored) <= matcher.MAX_CANDIDATES
@@ -25,7 +25,7 @@ from .forms import (
     UserProfileForm,
     UserRegistrationForm,
 )
-from .models import Athlete
+from .models import Athlete, ImportStaging
 
 security_logger = logging.getLogger('security')
 
@@ -258,15 +258,16 @@ def athlete_bulk_upload(request):
             return redirect('accounts:athlete_bulk_upload')
         
         # Excelを解析
+        content = file.read()
         importer = AthleteExcelImporter(request.user)
-        parsed_athletes, global_errors = importer.parse_excel(file.read())
+        parsed_athletes, global_errors = importer.parse_excel(content)
         
         if global_errors:
             for error in global_errors:
                 messages.error(request, error)
             return redirect('accounts:athlete_bulk_upload')
         
-        # セッションに解析結果を保存
+        # 解析結果を一時保存し、セッションにはトークンだけを保持
         # birth_dateをシリアライズ可能な形式に変換
         serialized_athletes = []
         for athlete in parsed_athletes:
@@ -275,7 +276,9 @@ def athlete_bulk_upload(request):
                 athlete_copy['birth_date'] = athlete_copy['birth_date'].isoformat()
             serialized_athletes.append(athlete_copy)
         
-        request.session['bulk_athletes'] = serialized_athletes
+        request.session['bulk_athletes_token'] = ImportStaging.stage(
+            request.user, 'athletes', ImportStaging.make_token(content), serialized_athletes
+        )
         
         valid_count = sum(1 for a in parsed_athletes if a.get('valid'))
         error_count = len(parsed_athletes) - valid_count
@@ -302,8 +305,9 @@ def athlete_bulk_register(request):
     if request.method != 'POST':
         return redirect('accounts:athlete_bulk_upload')
     
-    # セッションから解析結果を取得
-    serialized_athletes = request.session.get('bulk_athletes')
+    # セッションのトークンから解析結果を取得
+    token = request.session.get('bulk_athletes_token')
+    serialized_athletes = ImportStaging.fetch(request.user, 'athletes', token)
     if not serialized_athletes:
         messages.error(request, 'アップロードされたデータがありません。再度アップロードしてください。')
         return redirect('accounts:athlete_bulk_upload')
@@ -323,8 +327,9 @@ def athlete_bulk_register(request):
     try:
         imported, skipped = importer.import_athletes(parsed_athletes, skip_existing=skip_existing)
         
-        # セッションをクリア
-        del request.session['bulk_athletes']
+        # 一時保存データとセッションをクリア
+        ImportStaging.discard(request.user, 'athletes', token)
+        del request.session['bulk_athletes_token']
         
         if imported:
             messages.success(request, f'{len(imported)}名の選手を登録しました。')
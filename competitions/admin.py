@@ -5,6 +5,7 @@
 import csv
 
 from django.contrib import admin, messages
+from django.db.models import Sum
 from django.http import HttpResponse
 from django.utils import timezone
 from django.utils.html import format_html
@@ -220,9 +221,9 @@ class CompetitionAdmin(admin.ModelAdmin):
     
     def entry_count(self, obj):
         """エントリー数を表示"""
-        from entries.models import Entry
-        count = Entry.objects.filter(race__competition=obj).exclude(status='cancelled').count()
-        confirmed = Entry.objects.filter(race__competition=obj, status='confirmed').count()
+        totals = obj.races.aggregate(count=Sum('active_count'), confirmed=Sum('confirmed_count'))
+        count = totals['count'] or 0
+        confirmed = totals['confirmed'] or 0
         
         if count > 0:
             return format_html(
@@ -273,8 +274,8 @@ class RaceAdmin(admin.ModelAdmin):
             'description': '種目の基本情報を入力してください。表示順は小さい数字ほど上に表示されます。'
         }),
         ('組編成設定', {
-            'fields': ('heat_capacity', 'max_entries'),
-            'description': '1組あたりの定員、エントリー上限を設定します'
+            'fields': ('heat_capacity', 'max_entries', 'seeding_strategy'),
+            'description': '1組あたりの定員、エントリー上限、自動組分けの方式を設定します'
         }),
         ('NCG設定', {
             'fields': ('is_ncg', 'ncg_capacity', 'standard_time', 'fallback_race', 'scheduled_start_time'),
@@ -313,7 +314,7 @@ class RaceAdmin(admin.ModelAdmin):
     
     def entry_count(self, obj):
         """エントリー数を表示"""
-        count = obj.entries.exclude(status='cancelled').count()
+        count = obj.active_count
         if count > 0:
             return format_html(
                 '<a href="/admin/entries/entry/?race__id__exact={}">{} 名</a>',
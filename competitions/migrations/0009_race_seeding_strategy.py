@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('competitions', '0008_alter_race_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='race',
+            name='seeding_strategy',
+            field=models.CharField(choices=[('time', 'タイム順（1組が最速）'), ('fastest_last', 'タイム順（最終組が最速）'), ('even', 'タイム順・人数均等'), ('serpentine', '蛇行配分（走力均等）'), ('organization', 'タイム順・団体分散')], default='time', help_text='自動組分けで選手を各組に振り分ける方法', max_length=20, verbose_name='組分け方式'),
+        ),
+    ]
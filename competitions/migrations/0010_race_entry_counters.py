@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:23
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_counters(apps, schema_editor):
+    """既存のエントリーから種目ごとの件数を集計"""
+    Entry = apps.get_model('entries', 'Entry')
+    Race = apps.get_model('competitions', 'Race')
+    rows = Entry.objects.values('race_id').annotate(
+        confirmed=Count('pk', filter=Q(status='confirmed')),
+        active=Count('pk', filter=~Q(status='cancelled')),
+    ).order_by()
+    for row in rows:
+        Race.objects.filter(pk=row['race_id']).update(
+            confirmed_count=row['confirmed'], active_count=row['active'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('competitions', '0009_race_seeding_strategy'),
+        ('entries', '0004_add_is_draft_to_entrygroup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='race',
+            name='active_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='キャンセル以外のエントリー数（定員判定に使用）', verbose_name='有効エントリー数'),
+        ),
+        migrations.AddField(
+            model_name='race',
+            name='confirmed_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='確定エントリー数'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
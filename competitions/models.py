@@ -143,6 +143,15 @@ class Race(models.Model):
         ('X', '混合'),
     ]
     
+    # 組分けのシード方式（heats.seeding.STRATEGIES と対応）
+    SEEDING_CHOICES = [
+        ('time', 'タイム順（1組が最速）'),
+        ('fastest_last', 'タイム順（最終組が最速）'),
+        ('even', 'タイム順・人数均等'),
+        ('serpentine', '蛇行配分（走力均等）'),
+        ('organization', 'タイム順・団体分散'),
+    ]
+    
     competition = models.ForeignKey(
         Competition,
         on_delete=models.CASCADE,
@@ -161,6 +170,10 @@ class Race(models.Model):
     # 定員設定
     heat_capacity = models.PositiveIntegerField('1組あたりの定員', default=40)
     max_entries = models.PositiveIntegerField('エントリー上限', default=50, null=True, blank=True)
+    seeding_strategy = models.CharField(
+        '組分け方式', max_length=20, choices=SEEDING_CHOICES, default='time',
+        help_text='自動組分けで選手を各組に振り分ける方法'
+    )
     
     # 表示順
     display_order = models.PositiveIntegerField('表示順', default=0)
@@ -198,11 +211,21 @@ class Race(models.Model):
         help_text='NCG定員超過時に選手を移動する一般種目'
     )
     
+    # エントリー数（entries.counters.EntryCounter がエントリーの変更と同じトランザクションで更新する）
+    confirmed_count = models.PositiveIntegerField('確定エントリー数', default=0, editable=False)
+    active_count = models.PositiveIntegerField(
+        '有効エントリー数', default=0, editable=False,
+        help_text='キャンセル以外のエントリー数（定員判定に使用）'
+    )
+    
     # メタ情報
     created_at = models.DateTimeField('作成日時', auto_now_add=True)
     updated_at = models.DateTimeField('更新日時', auto_now=True)
     is_active = models.BooleanField('有効', default=True)
     
+    # save() で書き込まないフィールド（EntryCounter が UPDATE で増減する）
+    COUNTER_FIELDS = ('confirmed_count', 'active_count')
+    
     class Meta:
         verbose_name = '種目'
         verbose_name_plural = '種目'
@@ -217,18 +240,24 @@ class Race(models.Model):
             gender_name = dict(self.GENDER_CHOICES).get(self.gender, '')
             distance_name = dict(self.DISTANCE_CHOICES).get(self.distance, f'{self.distance}m')
             self.name = f"{gender_name}{distance_name}"
+        if not self._state.adding and not args and kwargs.get('update_fields') is None:
+            # 読み込み後に更新されたエントリー数を古い値で上書きしない
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
         super().save(*args, **kwargs)
     
     @property
     def entry_count(self):
         """確定エントリー数"""
-        return self.entries.filter(status='confirmed').count()
+        return self.confirmed_count
     
     @property
     def is_full(self):
-        """定員に達しているか"""
+        """定員に達しているか（キャンセル以外のエントリー数で判定）"""
         if self.max_entries:
-            return self.entry_count >= self.max_entries
+            return self.active_count >= self.max_entries
         return False
 
 
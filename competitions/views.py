@@ -3,7 +3,6 @@ competitions ビュー
 """
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Q
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 
@@ -102,10 +101,8 @@ def competition_detail(request, pk):
         messages.error(request, 'この大会は公開されていません。')
         return redirect('competitions:list')
     
-    # 種目一覧（エントリー数付き）
-    races = competition.races.filter(is_active=True).annotate(
-        confirmed_count=Count('entries', filter=Q(entries__status='confirmed'))
-    ).order_by('display_order')
+    # 種目一覧（確定エントリー数は Race.confirmed_count に保持）
+    races = competition.races.filter(is_active=True).order_by('display_order')
     
     return render(request, 'competitions/competition_detail.html', {
         'competition': competition,
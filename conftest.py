@@ -21,6 +21,29 @@ def disable_ssl_redirect(settings):
     settings.CSRF_COOKIE_SECURE = False
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """テスト間でキャッシュ（点呼カウンター等）を共有しない"""
+    from django.core.cache import cache
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def report_files(settings, tmp_path):
+    """帳票ファイル（バックグラウンド生成・キャッシュ）の保存先をテストごとに分ける"""
+    settings.REPORT_FILES_ROOT = str(tmp_path / 'report_files')
+    return tmp_path / 'report_files'
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    """アップロードファイル（振込明細の画像など）の保存先をテストごとに分ける"""
+    settings.MEDIA_ROOT = tmp_path / 'media'
+    return tmp_path / 'media'
+
+
 @pytest.fixture
 def organization(db):
     """テスト用団体"""
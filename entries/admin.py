@@ -2,14 +2,15 @@
 エントリー管理画面
 初心者でも使いやすい管理画面を提供
 """
-import csv
 from decimal import Decimal
 
 from django import forms
 from django.contrib import admin, messages
-from django.http import HttpResponse
 from django.utils.html import format_html
 
+from nitsys.csv_export import CHUNK_SIZE, streaming_csv_response
+
+from .counters import EntryCounter, RaceFullError
 from .models import Entry, EntryGroup
 
 # =============================================================================
@@ -61,59 +62,71 @@ class EntryGroupAdminForm(forms.ModelForm):
 
 @admin.action(description="選択したエントリーを確定")
 def confirm_entries(modeladmin, request, queryset):
-    """エントリーを一括確定"""
-    count = queryset.update(status='confirmed')
+    """エントリーを一括確定（キャンセル済みから戻す分は定員の枠を確保）"""
+    try:
+        count = EntryCounter.update(queryset, reserve=True, status='confirmed')
+    except RaceFullError as e:
+        messages.error(request, f'{e.messages[0]}。エントリーは変更していません。')
+        return
     messages.success(request, f'{count}件のエントリーを確定しました。')
 
 
 @admin.action(description="選択したエントリーを入金待ちに戻す")
 def pending_entries(modeladmin, request, queryset):
-    """エントリーを入金待ちに戻す"""
-    count = queryset.update(status='pending')
+    """エントリーを入金待ちに戻す（キャンセル済みから戻す分は定員の枠を確保）"""
+    try:
+        count = EntryCounter.update(queryset, reserve=True, status='pending')
+    except RaceFullError as e:
+        messages.error(request, f'{e.messages[0]}。エントリーは変更していません。')
+        return
     messages.success(request, f'{count}件のエントリーを入金待ちに戻しました。')
 
 
 @admin.action(description="選択したエントリーをキャンセル")
 def cancel_entries(modeladmin, request, queryset):
     """エントリーをキャンセル"""
-    count = queryset.update(status='cancelled')
+    count = EntryCounter.update(queryset, status='cancelled')
     messages.success(request, f'{count}件のエントリーをキャンセルしました。')
 
 
 @admin.action(description="選択したエントリーをCSVでエクスポート")
 def export_entries_csv(modeladmin, request, queryset):
-    """エントリーをCSVでエクスポート"""
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-    response['Content-Disposition'] = 'attachment; filename="entries.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
+    """エントリーをCSVでエクスポート（ストリーミング）"""
+    header = [
         '大会名', '種目名', '選手名', 'フリガナ', '団体名', 
         '申告タイム', 'ステータス', 'NCGスライド', '登録日時'
-    ])
+    ]
+    entries = queryset.select_related('athlete', 'race', 'race__competition', 'athlete__organization')
     
-    for entry in queryset.select_related('athlete', 'race', 'race__competition', 'athlete__organization'):
-        writer.writerow([
-            entry.race.competition.name,
-            entry.race.name,
-            entry.athlete.full_name,
-            entry.athlete.full_name_kana,
-            entry.athlete.organization.name if entry.athlete.organization else '',
-            entry.declared_time_display,
-            entry.get_status_display(),
-            'はい' if entry.moved_from_ncg else 'いいえ',
-            entry.created_at.strftime('%Y-%m-%d %H:%M'),
-        ])
+    def rows():
+        for entry in entries.iterator(chunk_size=CHUNK_SIZE):
+            yield [
+                entry.race.competition.name,
+                entry.race.name,
+                entry.athlete.full_name,
+                entry.athlete.full_name_kana,
+                entry.athlete.organization.name if entry.athlete.organization else '',
+                entry.declared_time_display,
+                entry.get_status_display(),
+                'はい' if entry.moved_from_ncg else 'いいえ',
+                entry.created_at.strftime('%Y-%m-%d %H:%M'),
+            ]
     
-    return response
+    return streaming_csv_response('entries.csv', header, rows())
 
 
 @admin.action(description="選択したグループを確定")
 def confirm_entry_groups(modeladmin, request, queryset):
-    """エントリーグループを一括確定"""
+    """エントリーグループを一括確定（定員に達した種目を含むグループは確定しない）"""
+    count = 0
     for group in queryset:
-        group.confirm_all()
-    messages.success(request, f'{queryset.count()}件のグループを確定しました。')
+        try:
+            group.confirm_all(reserve=True)
+        except RaceFullError as e:
+            messages.error(request, f'{group}: {e.messages[0]}。このグループは確定していません。')
+            continue
+        count += 1
+    messages.success(request, f'{count}件のグループを確定しました。')
 
 
 # =============================================================================
@@ -7,6 +7,7 @@ OpenAPI/Swagger 対応 API ドキュメント
 - GET /api/entries/ - エントリー一覧取得
 - GET /api/assignments/<pk>/ - 選手詳細取得（組編成情報付き）
 """
+from django.db.models import Count, Max
 from django.shortcuts import get_object_or_404
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
@@ -14,10 +15,35 @@ from rest_framework.response import Response
 
 from accounts.models import Athlete
 from heats.models import HeatAssignment
+from nitsys.conditional import make_etag, not_modified, set_validators
 
 from .models import Entry
 
 
+def _queryset_version(request, queryset, *timestamp_fields):
+    """
+    一覧の版（件数＋関連行の最終更新日時）のETagを1回の集計クエリで取得
+
+    件数を含めるため、削除も版の変化として検出できる。最終更新日時は削除や
+    絞り込みから外れた行では進まないため、一覧では Last-Modified を使わない
+    （If-Modified-Since だけのリクエストに古い内容で304を返さない）。
+
+    Returns:
+        str: ETag
+    """
+    aggregates = queryset.aggregate(
+        row_count=Count('pk'),
+        **{f'max_{i}': Max(field) for i, field in enumerate(timestamp_fields)}
+    )
+    return make_etag(
+        request.path,
+        request.GET.urlencode(),
+        request.user.pk,
+        aggregates['row_count'],
+        *(aggregates[f'max_{i}'] for i in range(len(timestamp_fields))),
+    )
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def athlete_list(request):
@@ -40,6 +66,10 @@ def athlete_list(request):
     ]
     ```
     
+    ## 条件付きGET
+    `ETag` を返します。`If-None-Match` が一致する場合は本文なしの 304 を返します
+    （`Last-Modified` は返さず、`If-Modified-Since` は使いません）。
+    
     ## エラーレスポンス
     - 401: 認証が必要です
     """
@@ -61,6 +91,13 @@ def athlete_list(request):
     if gender and gender in ['M', 'F']:
         athletes = athletes.filter(gender=gender)
     
+    etag = _queryset_version(
+        request, athletes, 'updated_at', 'organization__updated_at'
+    )
+    response = not_modified(request, etag=etag)
+    if response is not None:
+        return response
+    
     data = [{
         'id': a.id,
         'full_name': a.full_name,
@@ -69,7 +106,7 @@ def athlete_list(request):
         'organization': a.organization.name if a.organization else None,
     } for a in athletes]
     
-    return Response(data)
+    return set_validators(Response(data), etag=etag)
 
 
 @api_view(['GET'])
@@ -101,6 +138,10 @@ def entry_list(request):
     ]
     ```
     
+    ## 条件付きGET
+    `ETag` を返します。`If-None-Match` が一致する場合は本文なしの 304 を返します
+    （`Last-Modified` は返さず、`If-Modified-Since` は使いません）。
+    
     ## エラーレスポンス
     - 401: 認証が必要です
     """
@@ -123,6 +164,14 @@ def entry_list(request):
     if entry_status:
         entries = entries.filter(status=entry_status)
     
+    etag = _queryset_version(
+        request, entries,
+        'updated_at', 'athlete__updated_at', 'race__updated_at', 'race__competition__updated_at'
+    )
+    response = not_modified(request, etag=etag)
+    if response is not None:
+        return response
+    
     entries = entries.select_related(
         'athlete',
         'athlete__organization',
@@ -144,7 +193,7 @@ def entry_list(request):
         'status_display': e.get_status_display(),
     } for e in entries]
     
-    return Response(data)
+    return set_validators(Response(data), etag=etag)
 
 
 @api_view(['GET'])
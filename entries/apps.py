@@ -0,0 +1,14 @@
+"""
+entries アプリケーション設定
+"""
+from django.apps import AppConfig
+
+
+class EntriesConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'entries'
+    verbose_name = 'エントリー'
+    
+    def ready(self):
+        # シグナルを登録
+        from . import signals  # noqa: F401
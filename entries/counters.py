@@ -0,0 +1,210 @@
+"""
+種目ごとのエントリー数カウンター
+
+Race.confirmed_count（確定）と Race.active_count（キャンセル以外）を、エントリーの
+作成・状態変更・種目移動・削除のたびに同じトランザクション内で差分更新する。
+定員判定（Race.is_full）や一覧の件数表示で COUNT クエリを発行しないため。
+
+・Entry.save() / 削除 ... 自動で更新（Entry.save() とシグナル）
+・queryset.update() ... 代わりに EntryCounter.update(queryset, status=...) を使う
+・bulk_create() ... 作成後に EntryCounter.created(entries) を呼ぶ
+
+カウンターは F() 式の UPDATE で増減するため、同時に更新しても値はずれない。
+定員の確保（reserve）は「件数 + n が上限以下」を条件にした1回の UPDATE で行い、
+行ロックを取ったまま待たせることなく定員超過を防ぐ。
+ずれが疑われる場合は reconcile_entry_counters コマンドで再集計する。
+"""
+import logging
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from competitions.models import Race
+
+logger = logging.getLogger(__name__)
+
+# 定員に数えない状態
+INACTIVE_STATUSES = ('cancelled',)
+
+
+class RaceFullError(ValidationError):
+    """定員に達しているため確保できない"""
+
+    def __init__(self, race=None):
+        name = f'種目「{race.name}」' if race is not None else 'この種目'
+        super().__init__(f'{name}は定員に達しています')
+        self.race = race
+
+
+def is_active(status):
+    """定員に数える状態か"""
+    return status not in INACTIVE_STATUSES
+
+
+class EntryCounter:
+    """Race のエントリー数カウンターの更新・確保・再集計"""
+
+    @staticmethod
+    def _add(deltas, race_id, status, sign):
+        if race_id is None or status is None:
+            return
+        delta = deltas[race_id]
+        if status == 'confirmed':
+            delta[0] += sign
+        if is_active(status):
+            delta[1] += sign
+
+    @staticmethod
+    def has_room(count):
+        """「有効数 + count が上限以下（上限なしを含む）」の条件"""
+        return (
+            Q(max_entries__isnull=True) | Q(max_entries=0)
+            | Q(active_count__lte=F('max_entries') - count)
+        )
+
+    @classmethod
+    def apply(cls, deltas, reserve=False):
+        """
+        種目ごとの増減（{種目ID: [確定数の増減, 有効数の増減]}）を反映
+
+        ロック順を揃えてデッドロックを避けるため種目ID順に更新する。
+
+        Args:
+            reserve: True の場合、有効数を増やす種目は定員の範囲内でのみ更新し、
+                超える場合は RaceFullError（呼び出し側のトランザクションごと取り消すこと）
+        """
+        for race_id in sorted(deltas):
+            confirmed, active = deltas[race_id]
+            if not confirmed and not active:
+                continue
+            races = Race.objects.filter(pk=race_id)
+            if reserve and active > 0:
+                races = races.filter(cls.has_room(active))
+            updated = races.update(
+                confirmed_count=Greatest(F('confirmed_count') + confirmed, Value(0)),
+                active_count=Greatest(F('active_count') + active, Value(0)),
+            )
+            if reserve and active > 0 and not updated:
+                raise RaceFullError(Race.objects.filter(pk=race_id).first())
+
+    @classmethod
+    def changed(cls, before, after, reserve=False):
+        """
+        エントリー1件の変更を反映
+
+        Args:
+            before: 変更前の (種目ID, 状態)。新規作成なら None
+            after: 変更後の (種目ID, 状態)。削除なら None
+            reserve: apply() を参照
+        """
+        if before == after:
+            return
+        deltas = defaultdict(lambda: [0, 0])
+        if before is not None:
+            cls._add(deltas, *before, -1)
+        if after is not None:
+            cls._add(deltas, *after, 1)
+        cls.apply(deltas, reserve)
+
+    @classmethod
+    def created(cls, entries, reserve=False):
+        """bulk_create() で作成したエントリーを反映（reserve は apply() を参照）"""
+        deltas = defaultdict(lambda: [0, 0])
+        for entry in entries:
+            cls._add(deltas, entry.race_id, entry.status, 1)
+        cls.apply(deltas, reserve)
+
+    @classmethod
+    def update(cls, queryset, reserve=False, **fields):
+        """
+        queryset.update(**fields) を実行し、状態（status）・種目（race）の変更を反映
+
+        update() は auto_now を更新しないため updated_at も合わせて更新する
+        （一覧APIの ETag・帳票キャッシュの指紋が変更を検出できるように）。
+
+        対象行をロックして変更前の種目・状態を読み、同じトランザクション内で更新する。
+        reserve は apply() を参照（定員を超える場合は何も更新しない）。
+
+        Returns:
+            int: 更新件数
+        """
+        with transaction.atomic():
+            rows = list(
+                queryset.select_for_update(of=('self',)).values_list('pk', 'race_id', 'status')
+            )
+            if not rows:
+                return 0
+
+            from .models import Entry
+
+            fields.setdefault('updated_at', timezone.now())
+            count = Entry.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(**fields)
+
+            race = fields.get('race', fields.get('race_id'))
+            new_race_id = getattr(race, 'pk', race)
+            new_status = fields.get('status')
+            deltas = defaultdict(lambda: [0, 0])
+            for _, race_id, status in rows:
+                cls._add(deltas, race_id, status, -1)
+                cls._add(deltas, new_race_id or race_id, new_status or status, 1)
+            cls.apply(deltas, reserve)
+        return count
+
+    @classmethod
+    def reserve(cls, race, count=1):
+        """
+        定員の枠を count 件確保（有効数を増やす）。上限に達していれば RaceFullError
+
+        「有効数 + count <= 上限」を条件にした1回の UPDATE のため、同時に申し込まれても
+        上限を超えて確保されることはない。呼び出し側のトランザクションが
+        ロールバックされれば確保も取り消される。
+        """
+        if count > 0:
+            cls.apply({race.pk: [0, count]}, reserve=True)
+
+    @classmethod
+    def counts(cls, races):
+        """
+        エントリーから集計した件数
+
+        Returns:
+            dict: {種目ID: (確定数, 有効数)}
+        """
+        from .models import Entry
+
+        rows = Entry.objects.filter(race__in=races).values('race_id').annotate(
+            confirmed=Count('pk', filter=Q(status='confirmed')),
+            active=Count('pk', filter=~Q(status__in=INACTIVE_STATUSES)),
+        ).order_by()
+        return {row['race_id']: (row['confirmed'], row['active']) for row in rows}
+
+    @classmethod
+    def reconcile(cls, races, repair=False):
+        """
+        カウンターと集計値を比較（repair=True ならずれた種目を集計値で上書き）
+
+        Returns:
+            list: ずれていた種目の [(race, (確定数, 有効数)の保存値, 集計値)]
+        """
+        races = list(races)
+        actual = cls.counts(races)
+        drifted = []
+        for race in races:
+            stored = (race.confirmed_count, race.active_count)
+            expected = actual.get(race.pk, (0, 0))
+            if stored != expected:
+                drifted.append((race, stored, expected))
+
+        if repair and drifted:
+            with transaction.atomic():
+                for race, _, _ in drifted:
+                    # 集計中に変わった可能性があるため、行をロックしてから数え直す
+                    list(Race.objects.select_for_update().filter(pk=race.pk).values_list('pk', flat=True))
+                    confirmed, active = cls.counts([race]).get(race.pk, (0, 0))
+                    Race.objects.filter(pk=race.pk).update(confirmed_count=confirmed, active_count=active)
+            logger.warning('エントリー数カウンターを%d種目で修復しました', len(drifted))
+        return drifted
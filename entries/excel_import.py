@@ -9,9 +9,11 @@ import pandas as pd
 from django.core.exceptions import ValidationError
 from django.db import transaction
 
-from accounts.models import Athlete
+from accounts.models import Athlete, ImportStaging
 from competitions.models import Race
+from entries.counters import EntryCounter, RaceFullError
 from entries.models import Entry
+from nitsys.audit import log_bulk_create
 
 
 class ExcelImportError(Exception):
@@ -23,6 +25,40 @@ class ExcelImportError(Exception):
         super().__init__(self.message)
 
 
+def content_hash(file_obj):
+    """アップロードファイルの内容ハッシュ（SHA-256）"""
+    file_obj.seek(0)
+    digest = ImportStaging.make_token(file_obj.read())
+    file_obj.seek(0)
+    return digest
+
+
+class ExcelPreviewStore:
+    """
+    プレビュー結果の一時保存（ImportStaging）
+    
+    プレビュー時に検証済みの行を、大会・ユーザー・ファイル内容のハッシュを
+    キーに保存する。確定時はExcelを読み直さず、この内容から登録する。
+    """
+    
+    @staticmethod
+    def scope(competition):
+        return f'entries:{competition.pk}'
+    
+    @classmethod
+    def get(cls, competition, user, token):
+        """保存済みのプレビュー結果（期限切れ・未保存は None）"""
+        return ImportStaging.fetch(user, cls.scope(competition), token)
+    
+    @classmethod
+    def set(cls, competition, user, token, data):
+        ImportStaging.stage(user, cls.scope(competition), token, data)
+    
+    @classmethod
+    def delete(cls, competition, user, token):
+        ImportStaging.discard(user, cls.scope(competition), token)
+
+
 class ExcelEntryImporter:
     """
     Excel一括エントリーインポーター
@@ -32,11 +68,20 @@ class ExcelEntryImporter:
     
     種目コード例: M5000（男子5000m）, F3000（女子3000m）
     申告タイム形式: MM:SS.ss (例: 14:30.00)
+    
+    種目・選手・既存エントリー・確定数は prepare() で全行分をまとめて取得し、
+    辞書に索引化してから各行を検証する。行数に関わらずクエリ数は一定。
+    
+    プレビューで検証した結果は ExcelPreviewStore に保存され、確定時は
+    import_from_preview() が重複・定員だけを再確認して登録する。
     """
     
     REQUIRED_COLUMNS = ['選手ID', '姓', '名', '種目コード', '申告タイム']
     OPTIONAL_COLUMNS = ['備考']
     
+    # bulk_create の1回あたりの件数
+    BATCH_SIZE = 500
+    
     def __init__(self, competition, user):
         """
         Args:
@@ -49,6 +94,71 @@ class ExcelEntryImporter:
         self.errors = []
         self.warnings = []
         self.imported_entries = []
+        
+        # prepare() で構築する索引
+        self._races = None
+        self._athletes_by_jaaf = {}
+        self._athletes_by_name = {}
+        self._entry_status = {}
+        self._active_counts = {}
+    
+    @staticmethod
+    def _cell_str(value):
+        """セル値を照合用の文字列に変換（従来の行単位処理と同じ変換）"""
+        return str(value).strip()
+    
+    def _load_races(self):
+        """大会の有効な種目を (性別, 距離, NCG) をキーに索引化"""
+        races = {}
+        for race in Race.objects.filter(competition=self.competition, is_active=True):
+            # 既定の並び順で最初の種目を採用（従来の .first() と同じ）
+            races.setdefault((race.gender, race.distance, race.is_ncg), race)
+        return races
+    
+    def prepare(self, df):
+        """
+        全行で参照するデータを一括取得して索引化
+        
+        種目（エントリー数カウンターを含む）・選手（JAAF ID／氏名）・既存エントリーを
+        それぞれ1回の IN クエリで取得する。
+        
+        Args:
+            df: 読み込み済みのDataFrame
+        """
+        self._races = self._load_races()
+        
+        jaaf_ids = set(df['選手ID'].map(self._cell_str)) - {''}
+        last_names = set(df['姓'].map(self._cell_str))
+        first_names = set(df['名'].map(self._cell_str))
+        
+        self._athletes_by_jaaf = {}
+        if jaaf_ids:
+            for athlete in Athlete.objects.filter(jaaf_id__in=jaaf_ids):
+                self._athletes_by_jaaf.setdefault(athlete.jaaf_id, athlete)
+        
+        athletes = Athlete.objects.filter(last_name__in=last_names, first_name__in=first_names)
+        if self.organization:
+            athletes = athletes.filter(organization=self.organization)
+        self._athletes_by_name = {}
+        for athlete in athletes:
+            self._athletes_by_name.setdefault((athlete.last_name, athlete.first_name), athlete)
+        
+        athlete_ids = {a.pk for a in self._athletes_by_jaaf.values()}
+        athlete_ids.update(a.pk for a in self._athletes_by_name.values())
+        self._load_conflicts(athlete_ids, list(self._races.values()))
+    
+    def _load_conflicts(self, athlete_ids, races):
+        """重複・定員の判定に使う既存エントリーと有効エントリー数を取得"""
+        # (選手ID, 種目ID) -> ステータス。ユニーク制約のためキャンセル済みも保持する
+        self._entry_status = {
+            (athlete_id, race_id): status
+            for athlete_id, race_id, status in Entry.objects.filter(
+                athlete_id__in=athlete_ids, race_id__in=[race.pk for race in races]
+            ).values_list('athlete_id', 'race_id', 'status')
+        }
+        
+        # 定員に数えるエントリー数（キャンセル以外）。受け付けた行の分を加算していく
+        self._active_counts = {race.pk: race.active_count for race in races}
     
     def parse_time(self, time_str):
         """
@@ -109,23 +219,19 @@ class ExcelEntryImporter:
             raise ValueError(f'距離が不正です: {race_code[1:]}') from e
         
         # 種目を検索
-        races = Race.objects.filter(
-            competition=self.competition,
-            gender=gender,
-            distance=distance,
-            is_ncg=is_ncg,
-            is_active=True
-        )
+        if self._races is None:
+            self._races = self._load_races()
         
-        if not races.exists():
+        race = self._races.get((gender, distance, is_ncg))
+        if race is None:
             ncg_label = 'NCG ' if is_ncg else ''
             raise ValueError(f'{ncg_label}{gender}{distance}の種目が見つかりません')
         
-        return races.first()
+        return race
     
     def find_or_create_athlete(self, row_data, row_num):
         """
-        選手を検索または作成
+        選手を検索または作成（prepare() で構築した索引を参照）
         
         Args:
             row_data: 行データ（辞書）
@@ -134,35 +240,28 @@ class ExcelEntryImporter:
         Returns:
             Athlete: 選手オブジェクト
         """
-        jaaf_id = str(row_data.get('選手ID', '')).strip()
-        last_name = str(row_data.get('姓', '')).strip()
-        first_name = str(row_data.get('名', '')).strip()
+        jaaf_id = self._cell_str(row_data.get('選手ID', ''))
+        last_name = self._cell_str(row_data.get('姓', ''))
+        first_name = self._cell_str(row_data.get('名', ''))
         
         if not last_name or not first_name:
             raise ValidationError(f'行{row_num}: 姓または名が空です')
         
         # JAAF IDで検索
         if jaaf_id:
-            athlete = Athlete.objects.filter(jaaf_id=jaaf_id).first()
+            athlete = self._athletes_by_jaaf.get(jaaf_id)
             if athlete:
                 # 所属確認
-                if self.organization and athlete.organization != self.organization:
+                if self.organization and athlete.organization_id != self.organization.pk:
                     self.warnings.append(
                         f'行{row_num}: 選手「{athlete.full_name}」は別団体所属です'
                     )
                 return athlete
         
         # 名前と所属で検索
-        athletes = Athlete.objects.filter(
-            last_name=last_name,
-            first_name=first_name
-        )
-        
-        if self.organization:
-            athletes = athletes.filter(organization=self.organization)
-        
-        if athletes.exists():
-            return athletes.first()
+        athlete = self._athletes_by_name.get((last_name, first_name))
+        if athlete:
+            return athlete
         
         # 見つからない場合はエラー（選手マスタに事前登録が必要）
         raise ValidationError(
@@ -199,23 +298,54 @@ class ExcelEntryImporter:
                     f'申告タイム({declared_formatted})が参加標準記録({standard_formatted})を超えています'
                 )
         
-        # 重複エントリーチェック
-        existing = Entry.objects.filter(
-            athlete=athlete,
-            race=race
-        ).exclude(status='cancelled')
+        # 重複・定員チェック
+        errors.extend(self._conflict_errors(athlete.pk, race))
+        
+        if errors:
+            raise ValidationError(f'行{row_num}: ' + '、'.join(errors))
         
-        if existing.exists():
+        return True
+    
+    def _conflict_errors(self, athlete_id, race):
+        """重複エントリー・定員のエラー（同じファイル内で先に登録した行も含む）"""
+        errors = []
+        
+        status = self._entry_status.get((athlete_id, race.pk))
+        if status == 'cancelled':
+            errors.append('キャンセル済みのエントリーがあるため再登録できません')
+        elif status is not None:
             errors.append('既にこの種目にエントリー済みです')
         
-        # 定員チェック
-        if race.is_full:
+        if race.max_entries and self._active_counts.get(race.pk, 0) >= race.max_entries:
             errors.append(f'種目「{race.name}」は定員に達しています')
         
-        if errors:
-            raise ValidationError(f'行{row_num}: ' + '、'.join(errors))
+        return errors
+    
+    @staticmethod
+    def _note(row):
+        """備考欄の値"""
+        return str(row.get('備考', '')) if not pd.isna(row.get('備考')) else ''
+    
+    def _read_dataframe(self, file_obj):
+        """Excelファイルを読み込み、必須カラムを確認して空行を除去"""
+        try:
+            df = pd.read_excel(file_obj, engine='openpyxl')
+        except Exception as e:
+            raise ExcelImportError(f'Excelファイルの読み込みに失敗しました: {e!s}') from e
         
-        return True
+        missing_columns = [col for col in self.REQUIRED_COLUMNS if col not in df.columns]
+        if missing_columns:
+            raise ExcelImportError(
+                f'必須カラムが見つかりません: {", ".join(missing_columns)}'
+            )
+        
+        return df.dropna(how='all')
+    
+    @staticmethod
+    def _iter_rows(df):
+        """(Excel行番号, 行データ辞書) を順に返す"""
+        for idx, row in zip(df.index, df.to_dict('records'), strict=True):
+            yield idx + 2, row  # Excelの行番号（ヘッダー行を考慮）
     
     def import_from_file(self, file_obj):
         """
@@ -231,77 +361,171 @@ class ExcelEntryImporter:
         self.warnings = []
         self.imported_entries = []
         
-        try:
-            # Excelファイルを読み込み
-            df = pd.read_excel(file_obj, engine='openpyxl')
-        except Exception as e:
-            raise ExcelImportError(f'Excelファイルの読み込みに失敗しました: {e!s}') from e
-        
-        # 必須カラムチェック
-        missing_columns = [col for col in self.REQUIRED_COLUMNS if col not in df.columns]
-        if missing_columns:
-            raise ExcelImportError(
-                f'必須カラムが見つかりません: {", ".join(missing_columns)}'
-            )
+        # 同じ内容のファイルをプレビュー済みなら、その結果から登録する
+        token = content_hash(file_obj)
+        if ExcelPreviewStore.get(self.competition, self.user, token) is not None:
+            return self.import_from_preview(token)
         
-        # 空行を除去
-        df = df.dropna(how='all')
+        df = self._read_dataframe(file_obj)
         
         if df.empty:
             raise ExcelImportError('インポートするデータがありません')
         
-        # 各行を処理
-        success_count = 0
+        self.prepare(df)
         
-        with transaction.atomic():
-            for idx, row in df.iterrows():
-                row_num = idx + 2  # Excelの行番号（ヘッダー行を考慮）
+        # 各行を検証し、作成するエントリーを溜める
+        new_entries = []
+        
+        for row_num, row in self._iter_rows(df):
+            try:
+                # 種目を取得
+                race = self.parse_race_code(row.get('種目コード'))
                 
-                try:
-                    # 種目を取得
-                    race = self.parse_race_code(row.get('種目コード'))
-                    
-                    # タイムを変換
-                    declared_time = self.parse_time(row.get('申告タイム'))
-                    
-                    # 選手を取得
-                    athlete = self.find_or_create_athlete(row.to_dict(), row_num)
-                    
-                    # バリデーション
-                    self.validate_entry(athlete, race, declared_time, row_num)
-                    
-                    # エントリー作成
-                    entry = Entry.objects.create(
-                        athlete=athlete,
-                        race=race,
-                        registered_by=self.user,
-                        declared_time=declared_time,
-                        note=str(row.get('備考', '')) if not pd.isna(row.get('備考')) else '',
-                        status='pending'
-                    )
-                    
-                    self.imported_entries.append(entry)
-                    success_count += 1
-                    
-                except ValidationError as e:
-                    self.errors.append(str(e))
-                except ValueError as e:
-                    self.errors.append(f'行{row_num}: {str(e)}')
-                except Exception as e:
-                    self.errors.append(f'行{row_num}: 予期しないエラー - {str(e)}')
+                # タイムを変換
+                declared_time = self.parse_time(row.get('申告タイム'))
+                
+                # 選手を取得
+                athlete = self.find_or_create_athlete(row, row_num)
+                
+                # バリデーション
+                self.validate_entry(athlete, race, declared_time, row_num)
+                
+                new_entries.append(Entry(
+                    athlete=athlete,
+                    race=race,
+                    registered_by=self.user,
+                    declared_time=declared_time,
+                    note=self._note(row),
+                    status='pending'
+                ))
+                self._accept(athlete.pk, race)
+                
+            except ValidationError as e:
+                self.errors.append(str(e))
+            except ValueError as e:
+                self.errors.append(f'行{row_num}: {str(e)}')
+            except Exception as e:
+                self.errors.append(f'行{row_num}: 予期しないエラー - {str(e)}')
+        
+        return self._create_entries(new_entries, len(df))
+    
+    def _accept(self, athlete_id, race):
+        """行を受け付けた分を重複・定員の判定に反映"""
+        self._entry_status[(athlete_id, race.pk)] = 'pending'
+        self._active_counts[race.pk] = self._active_counts.get(race.pk, 0) + 1
+    
+    def _reserve(self, new_entries):
+        """
+        種目ごとに定員の枠をまとめて確保し、確保できたエントリーを返す
+        
+        読み込み後に他の申込で満員になった種目の行は登録せずエラーにする。
+        """
+        by_race = {}
+        for entry in new_entries:
+            by_race.setdefault(entry.race_id, []).append(entry)
+        
+        full = set()
+        for race_id in sorted(by_race):
+            entries = by_race[race_id]
+            try:
+                EntryCounter.reserve(entries[0].race, len(entries))
+            except RaceFullError as e:
+                full.add(race_id)
+                self.errors.append(f'{e.messages[0]}（{len(entries)}件を登録できませんでした）')
+        return [entry for entry in new_entries if entry.race_id not in full]
+    
+    def _create_entries(self, new_entries, total_count):
+        """定員の枠を確保してエントリーを一括作成し、インポート結果を返す"""
+        with transaction.atomic():
+            # 申込中（pending）のエントリーのため、確保した有効数のほかにカウンターの変化はない
+            self.imported_entries = Entry.objects.bulk_create(
+                self._reserve(new_entries), batch_size=self.BATCH_SIZE
+            )
+            log_bulk_create(self.imported_entries, actor=self.user, batch_size=self.BATCH_SIZE)
+        
+        success_count = len(self.imported_entries)
         
         return {
             'success': success_count > 0,
             'success_count': success_count,
-            'total_count': len(df),
+            'total_count': total_count,
             'errors': self.errors,
             'warnings': self.warnings,
             'entries': self.imported_entries,
         }
     
+    def import_from_preview(self, token):
+        """
+        プレビュー済みの内容からエントリーを登録
+        
+        Excelは読み直さず、保存済みの検証結果に対して重複エントリーと
+        定員だけを再確認する（プレビュー後に他の申込が入った場合に備える）。
+        
+        Args:
+            token: preview_from_file() が返したトークン
+        
+        Returns:
+            dict: インポート結果（import_from_file() と同じ形式）
+        """
+        stored = ExcelPreviewStore.get(self.competition, self.user, token)
+        if stored is None:
+            raise ExcelImportError(
+                'プレビューの有効期限が切れました。もう一度ファイルをアップロードしてください。'
+            )
+        
+        self.errors = list(stored['errors'])
+        self.warnings = list(stored['warnings'])
+        self.imported_entries = []
+        
+        rows = stored['rows']
+        athlete_ids = {row['athlete_id'] for row in rows}
+        races = Race.objects.filter(
+            competition=self.competition, is_active=True,
+            pk__in={row['race_id'] for row in rows}
+        ).in_bulk()
+        existing_athletes = set(
+            Athlete.objects.filter(pk__in=athlete_ids).values_list('pk', flat=True)
+        )
+        self._load_conflicts(athlete_ids, list(races.values()))
+        
+        new_entries = []
+        for row in rows:
+            race = races.get(row['race_id'])
+            if race is None:
+                self.errors.append(f'行{row["row_num"]}: {row["race_code"]}の種目が見つかりません')
+                continue
+            if row['athlete_id'] not in existing_athletes:
+                self.errors.append(str(ValidationError(
+                    f'行{row["row_num"]}: 選手「{row["athlete_name"]}」が見つかりません。'
+                    f'先に選手マスタに登録してください。'
+                )))
+                continue
+            
+            errors = self._conflict_errors(row['athlete_id'], race)
+            if errors:
+                self.errors.append(str(ValidationError(f'行{row["row_num"]}: ' + '、'.join(errors))))
+                continue
+            
+            new_entries.append(Entry(
+                athlete_id=row['athlete_id'],
+                race=race,
+                registered_by=self.user,
+                declared_time=Decimal(row['declared_time']),
+                note=row['note'],
+                status='pending'
+            ))
+            self._accept(row['athlete_id'], race)
+        
+        result = self._create_entries(new_entries, stored['total_count'])
+        ExcelPreviewStore.delete(self.competition, self.user, token)
+        return result
+    
     def preview_from_file(self, file_obj):
         """
-        Excelファイルの内容をプレビュー（実際には保存しない）
+        Excelファイルの内容をプレビュー（エントリーは作成しない）
+        
+        検証済みの行は ExcelPreviewStore に保存し、結果の token で
+        import_from_preview() から登録できる。
         
         Args:
             file_obj: アップロードされたファイルオブジェクト
@@ -312,22 +536,13 @@ class ExcelEntryImporter:
         self.errors = []
         self.warnings = []
         preview_data = []
+        valid_rows = []
         
-        try:
-            df = pd.read_excel(file_obj, engine='openpyxl')
-        except Exception as e:
-            raise ExcelImportError(f'Excelファイルの読み込みに失敗しました: {e!s}') from e
-        
-        missing_columns = [col for col in self.REQUIRED_COLUMNS if col not in df.columns]
-        if missing_columns:
-            raise ExcelImportError(
-                f'必須カラムが見つかりません: {", ".join(missing_columns)}'
-            )
+        token = content_hash(file_obj)
+        df = self._read_dataframe(file_obj)
+        self.prepare(df)
         
-        df = df.dropna(how='all')
-        
-        for idx, row in df.iterrows():
-            row_num = idx + 2
+        for row_num, row in self._iter_rows(df):
             preview_row = {
                 'row_num': row_num,
                 'jaaf_id': row.get('選手ID', ''),
@@ -347,10 +562,22 @@ class ExcelEntryImporter:
                 declared_time = self.parse_time(row.get('申告タイム'))
                 preview_row['declared_time_seconds'] = float(declared_time)
                 
-                athlete = self.find_or_create_athlete(row.to_dict(), row_num)
+                athlete = self.find_or_create_athlete(row, row_num)
                 preview_row['athlete_name'] = athlete.full_name
                 
                 self.validate_entry(athlete, race, declared_time, row_num)
+                # 同じファイル内の重複・定員も取り込み時と同様に検出する
+                self._accept(athlete.pk, race)
+                
+                valid_rows.append({
+                    'row_num': row_num,
+                    'athlete_id': athlete.pk,
+                    'athlete_name': athlete.full_name,
+                    'race_id': race.pk,
+                    'race_code': self._cell_str(row.get('種目コード')).upper(),
+                    'declared_time': str(declared_time),
+                    'note': self._note(row),
+                })
                 
             except (ValidationError, ValueError) as e:
                 preview_row['valid'] = False
@@ -365,7 +592,15 @@ class ExcelEntryImporter:
         
         valid_count = sum(1 for row in preview_data if row['valid'])
         
+        ExcelPreviewStore.set(self.competition, self.user, token, {
+            'total_count': len(preview_data),
+            'rows': valid_rows,
+            'errors': self.errors,
+            'warnings': self.warnings,
+        })
+        
         return {
+            'token': token,
             'total_count': len(preview_data),
             'valid_count': valid_count,
             'invalid_count': len(preview_data) - valid_count,
@@ -109,6 +109,12 @@ class EntryForm(forms.ModelForm):
         return cleaned_data
     
     def save(self, commit=True):
+        """
+        エントリーを保存
+        
+        commit=True の場合は Entry.save() が定員の枠を確保する。同時の申込で満員に
+        なっていれば RaceFullError（ValidationError）を送出する。
+        """
         instance = super().save(commit=False)
         instance.declared_time = self.cleaned_data['declared_time_str']
         if self.cleaned_data.get('personal_best_str'):
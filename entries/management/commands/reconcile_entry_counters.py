@@ -0,0 +1,47 @@
+"""
+種目のエントリー数カウンター整合性チェックコマンド
+
+使用方法:
+    python manage.py reconcile_entry_counters              # ずれの検出のみ
+    python manage.py reconcile_entry_counters --repair     # ずれがあれば再集計
+    python manage.py reconcile_entry_counters --competition 3
+"""
+from django.core.management.base import BaseCommand
+
+from competitions.models import Competition, Race
+from entries.counters import EntryCounter
+
+
+class Command(BaseCommand):
+    help = '種目のエントリー数カウンターとEntryの集計値を比較し、ずれを修復します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--competition', type=int, help='対象の大会ID（省略時は公開中の全大会）')
+        parser.add_argument('--repair', action='store_true', help='ずれがあればカウンターを再集計する')
+
+    def handle(self, *args, **options):
+        competitions = Competition.objects.all()
+        if options['competition']:
+            competitions = competitions.filter(pk=options['competition'])
+        else:
+            competitions = competitions.filter(is_published=True)
+
+        for competition in competitions:
+            drifted = EntryCounter.reconcile(
+                Race.objects.filter(competition=competition), repair=options['repair']
+            )
+            if not drifted:
+                self.stdout.write(f'{competition.name}: OK')
+                continue
+            for race, stored, expected in drifted:
+                self.stdout.write(
+                    f'  {race.name}: 確定 {stored[0]} → {expected[0]}、有効 {stored[1]} → {expected[1]}'
+                )
+            if options['repair']:
+                self.stdout.write(self.style.WARNING(
+                    f'{competition.name}: {len(drifted)}種目のずれを修復しました'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f'{competition.name}: {len(drifted)}種目でずれを検出しました (--repair で修復)'
+                ))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entries', '0004_add_is_draft_to_entrygroup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['race', 'status'], name='entry_race_status_idx'),
+        ),
+    ]
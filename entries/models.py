@@ -8,6 +8,8 @@ from django.db import models, transaction
 from accounts.models import Athlete, Organization, User
 from competitions.models import Competition, Race
 
+from .counters import EntryCounter, is_active
+
 
 class Entry(models.Model):
     """
@@ -105,10 +107,54 @@ class Entry(models.Model):
         verbose_name_plural = 'エントリー'
         ordering = ['race', 'declared_time']
         unique_together = ['athlete', 'race']
+        indexes = [
+            # 種目ごとの状態別の一覧・集計（スタートリスト・組編成・カウンターの再集計）
+            models.Index(fields=['race', 'status'], name='entry_race_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.athlete.full_name} - {self.race.name}"
     
+    def save(self, *args, **kwargs):
+        """
+        保存と同じトランザクションで種目のエントリー数を更新
+        
+        定員の枠を新たに使う場合（新規作成・キャンセルからの復帰・種目の変更）は枠を確保し、
+        定員に達していれば保存せずに RaceFullError を送出する。
+        """
+        with transaction.atomic():
+            before = None if self._state.adding else self.counted_state()
+            EntryCounter.changed(before, (self.race_id, self.status), reserve=True)
+            super().save(*args, **kwargs)
+        self._remember_counted()
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_counted()
+        return instance
+    
+    def _remember_counted(self):
+        """カウンターに反映済みの (種目ID, 状態) を記録（遅延読み込みの場合は記録しない）"""
+        if 'race_id' in self.__dict__ and 'status' in self.__dict__:
+            self._counted = (self.race_id, self.status)
+        else:
+            self._counted = None
+    
+    def counted_state(self):
+        """カウンターに反映済みの (種目ID, 状態)"""
+        counted = getattr(self, '_counted', None)
+        if counted is None and self.pk:
+            counted = Entry.objects.filter(pk=self.pk).values_list('race_id', 'status').first()
+        return counted
+    
+    def takes_new_place(self):
+        """保存すると定員の枠を新たに使うか（新規作成・キャンセルからの復帰・種目の変更）"""
+        if not is_active(self.status):
+            return False
+        before = None if self._state.adding else self.counted_state()
+        return before is None or before[0] != self.race_id or not is_active(before[1])
+    
     def clean(self):
         """バリデーション"""
         # raceとathleteが設定されているかチェック
@@ -121,8 +167,8 @@ class Entry(models.Model):
         if self.race.gender != 'X' and self.athlete.gender != self.race.gender:
             raise ValidationError('選手の性別と種目の性別区分が一致しません')
         
-        # 定員チェック
-        if self.race.is_full and self.status == 'pending':
+        # 定員チェック（同時に申し込まれた場合は保存時の枠の確保で超過を防ぐ）
+        if self.takes_new_place() and self.race.is_full:
             raise ValidationError('この種目は定員に達しています')
         
         # 参加標準記録チェック
@@ -249,9 +295,15 @@ class EntryGroup(models.Model):
         return self.total_amount
     
     @transaction.atomic
-    def confirm_all(self):
-        """全エントリーを確定"""
-        self.entries.update(status='confirmed')
+    def confirm_all(self, reserve=False):
+        """
+        全エントリーを確定
+        
+        Args:
+            reserve: True の場合、キャンセル済みから戻るエントリーの定員の枠を確保する
+                （満員なら何も変更せずに RaceFullError）
+        """
+        EntryCounter.update(self.entries.all(), reserve=reserve, status='confirmed')
         self.status = 'confirmed'
         self.save()
 
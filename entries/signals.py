@@ -0,0 +1,15 @@
+"""
+エントリーシグナル - 削除時に種目のエントリー数を減らす
+"""
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .counters import EntryCounter
+from .models import Entry
+
+
+@receiver(post_delete, sender=Entry)
+def decrement_counters_on_entry_delete(sender, instance, **kwargs):
+    """エントリーの削除（選手・種目の削除に伴う一括削除を含む）"""
+    counted = getattr(instance, '_counted', None) or (instance.race_id, instance.status)
+    EntryCounter.changed(counted, None)
@@ -128,6 +128,162 @@ class TestEntryGroupModel:
         assert group.total_amount == 5000
 
 
+class TestEntryCounters:
+    """種目のエントリー数カウンターのテスト"""
+    
+    def _counts(self, race):
+        race.refresh_from_db()
+        return race.confirmed_count, race.active_count
+    
+    def test_counters_follow_status_changes(self, db, athlete, race, normal_user):
+        """保存・一括更新・種目移動・削除でカウンターが追従する"""
+        from competitions.models import Race
+        from entries.counters import EntryCounter
+        
+        other = Race.objects.create(competition=race.competition, distance=10000, gender='M',
+                                    name='男子10000m', display_order=2)
+        entry = Entry.objects.create(athlete=athlete, race=race, registered_by=normal_user,
+                                     declared_time=Decimal('900.00'))
+        assert self._counts(race) == (0, 1)
+        
+        entry.status = 'confirmed'
+        entry.save()
+        assert self._counts(race) == (1, 1)
+        
+        # 古い値を持つ Race を保存してもカウンターは上書きされない
+        stale = Race.objects.get(pk=race.pk)
+        Race.objects.filter(pk=race.pk).update(max_entries=300)
+        race.save()
+        assert self._counts(race) == (1, 1)
+        stale.save()
+        assert self._counts(race) == (1, 1)
+        
+        assert EntryCounter.update(Entry.objects.filter(pk=entry.pk), status='cancelled') == 1
+        assert self._counts(race) == (0, 0)
+        
+        EntryCounter.update(Entry.objects.filter(pk=entry.pk), status='confirmed', race=other)
+        assert self._counts(race) == (0, 0)
+        assert self._counts(other) == (1, 1)
+        
+        Entry.objects.get(pk=entry.pk).delete()
+        assert self._counts(other) == (0, 0)
+    
+    def test_reserve_rejects_over_capacity(self, db, organization, race, normal_user):
+        """定員を超える作成・確保は RaceFullError になり、件数は変わらない"""
+        from entries.counters import EntryCounter, RaceFullError
+        
+        athletes = TestExcelEntryImporter()._create_athletes(organization, 3)
+        race.max_entries = 2
+        race.save()
+        Entry.objects.create(athlete=athletes[0], race=race, registered_by=normal_user,
+                             declared_time=Decimal('900.00'))
+        
+        with pytest.raises(RaceFullError):
+            EntryCounter.reserve(race, count=2)
+        assert self._counts(race) == (0, 1)
+        
+        Entry.objects.create(athlete=athletes[1], race=race, registered_by=normal_user,
+                             declared_time=Decimal('900.00'))
+        with pytest.raises(RaceFullError, match='定員に達しています'):
+            Entry.objects.create(athlete=athletes[2], race=race, registered_by=normal_user,
+                                 declared_time=Decimal('900.00'))
+        assert self._counts(race) == (0, 2)
+        assert Entry.objects.filter(race=race).count() == 2
+        
+        # キャンセル済みは定員に数えない
+        Entry.objects.create(athlete=athletes[2], race=race, registered_by=normal_user,
+                             declared_time=Decimal('900.00'), status='cancelled')
+        assert self._counts(race) == (0, 2)
+    
+    def test_entry_create_reports_race_filled_meanwhile(self, client_logged_in, competition, race,
+                                                        athlete, monkeypatch):
+        """定員チェックの後に満員になった場合は500ではなくフォームのエラーにする"""
+        from django.urls import reverse
+
+        from competitions.models import Race
+        
+        competition.is_published = True
+        competition.is_entry_open = True
+        competition.save()
+        Race.objects.filter(pk=race.pk).update(max_entries=1, active_count=1)
+        # 読み込み時点ではまだ空きがあった状態を再現する
+        monkeypatch.setattr(Race, 'is_full', property(lambda self: False))
+        
+        response = client_logged_in.post(
+            reverse('entries:create', args=[competition.pk, race.pk]),
+            {'athlete': athlete.pk, 'declared_time_str': '14:30.00', 'personal_best_str': '14:20.00'},
+        )
+        
+        assert response.status_code == 200
+        assert '定員に達しています' in response.context['form'].non_field_errors()[0]
+        assert not Entry.objects.filter(race=race).exists()
+    
+    @pytest.mark.django_db(transaction=True)
+    def test_concurrent_entries_do_not_overbook(self, organization, race, normal_user):
+        """複数スレッドから同時に申し込んでも定員を超えない"""
+        import threading
+
+        from django.db import connection
+
+        from entries.counters import RaceFullError
+        
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            pytest.skip('スレッド間で共有できるデータベース（PostgreSQL／ファイルのSQLite）が必要')
+        
+        athletes = TestExcelEntryImporter()._create_athletes(organization, 24)
+        race.max_entries = 5
+        race.save()
+        barrier = threading.Barrier(8)
+        accepted = []
+        
+        def submit(chunk):
+            try:
+                barrier.wait()
+                for athlete in chunk:
+                    try:
+                        Entry.objects.create(athlete=athlete, race=race, registered_by=normal_user,
+                                             declared_time=Decimal('900.00'))
+                    except RaceFullError:
+                        continue
+                    accepted.append(athlete.pk)
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=submit, args=(athletes[i::8],)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert len(accepted) == 5
+        assert Entry.objects.filter(race=race).count() == 5
+        assert self._counts(race) == (0, 5)
+    
+    def test_reconcile_repairs_drift(self, db, athlete, race, normal_user):
+        """reconcile_entry_counters コマンドでずれを検出・修復する"""
+        import io
+
+        from django.core.management import call_command
+
+        from competitions.models import Race
+        
+        Entry.objects.create(athlete=athlete, race=race, registered_by=normal_user,
+                             declared_time=Decimal('900.00'), status='confirmed')
+        Race.objects.filter(pk=race.pk).update(confirmed_count=5, active_count=0)
+        
+        out = io.StringIO()
+        call_command('reconcile_entry_counters', competition=race.competition_id, stdout=out)
+        assert '1種目でずれを検出しました' in out.getvalue()
+        assert self._counts(race) == (5, 0)
+        
+        call_command('reconcile_entry_counters', competition=race.competition_id, repair=True, stdout=out)
+        assert self._counts(race) == (1, 1)
+        
+        out = io.StringIO()
+        call_command('reconcile_entry_counters', competition=race.competition_id, stdout=out)
+        assert out.getvalue().endswith('OK\n')
+
+
 class TestEntryViews:
     """エントリー関連ビューのテスト"""
     
@@ -145,3 +301,282 @@ class TestEntryViews:
         """エントリー作成はログイン必須"""
         response = client.get(f'/entries/competition/{competition.pk}/race/{race.pk}/create/')
         assert response.status_code == 302
+
+
+class TestConditionalApi:
+    """一覧APIの条件付きGETのテスト"""
+    
+    def test_entry_list_not_modified(self, client_logged_in, athlete, race, normal_user):
+        """変更がなければ304、変更があれば200"""
+        entry = Entry.objects.create(
+            athlete=athlete,
+            race=race,
+            registered_by=normal_user,
+            declared_time=Decimal('870.00'),
+        )
+        
+        response = client_logged_in.get('/api/entries/')
+        assert response.status_code == 200
+        etag = response['ETag']
+        assert not response.has_header('Last-Modified')
+        
+        response = client_logged_in.get('/api/entries/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        assert response.content == b''
+        
+        entry.delete()
+        response = client_logged_in.get('/api/entries/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response.json() == []
+    
+    def test_entry_list_ignores_if_modified_since(self, client_logged_in, athlete, race, normal_user):
+        """削除では最終更新日時が進まないため、If-Modified-Since だけでは304を返さない"""
+        from django.utils.http import http_date
+        
+        from accounts.models import Athlete
+        
+        other = Athlete.objects.create(
+            organization=athlete.organization, last_name='佐藤', first_name='花子', last_name_kana='サトウ',
+            first_name_kana='ハナコ', gender='M', birth_date=athlete.birth_date,
+        )
+        entries = [
+            Entry.objects.create(athlete=a, race=race, registered_by=normal_user, declared_time=Decimal('870.00'))
+            for a in (athlete, other)
+        ]
+        assert len(client_logged_in.get('/api/entries/').json()) == 2
+        since = http_date(max(e.updated_at for e in entries).timestamp() + 60)
+        
+        entries[0].delete()
+        response = client_logged_in.get('/api/entries/', HTTP_IF_MODIFIED_SINCE=since)
+        assert response.status_code == 200
+        assert [e['id'] for e in response.json()] == [entries[1].pk]
+    
+    def test_entry_list_modified_after_bulk_confirm(self, client_logged_in, athlete, race, normal_user):
+        """一括確定（queryset.update 経由）の後は古い ETag で304にならない"""
+        from entries.counters import EntryCounter
+        
+        entry = Entry.objects.create(athlete=athlete, race=race, registered_by=normal_user,
+                                     declared_time=Decimal('870.00'))
+        etag = client_logged_in.get('/api/entries/')['ETag']
+        
+        EntryCounter.update(Entry.objects.filter(pk=entry.pk), status='confirmed')
+        
+        response = client_logged_in.get('/api/entries/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response.json()[0]['status'] == 'confirmed'
+    
+    def test_athlete_list_not_modified(self, client_logged_in, athlete):
+        """選手一覧の条件付きGET"""
+        response = client_logged_in.get('/api/athletes/')
+        etag = response['ETag']
+        
+        response = client_logged_in.get('/api/athletes/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        
+        response = client_logged_in.get('/api/athletes/?gender=F', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+
+
+class TestExcelEntryImporter:
+    """Excel一括エントリーのテスト"""
+    
+    def _excel(self, rows):
+        """行データからxlsxファイルを作成"""
+        import io
+
+        import pandas as pd
+        
+        output = io.BytesIO()
+        pd.DataFrame(rows, columns=['選手ID', '姓', '名', '種目コード', '申告タイム', '備考']).to_excel(
+            output, index=False, engine='openpyxl'
+        )
+        output.seek(0)
+        return output
+    
+    def _create_athletes(self, organization, count):
+        """照合用の選手を作成"""
+        return [
+            Athlete.objects.create(
+                organization=organization,
+                last_name=f'取込{i}',
+                first_name='太郎',
+                last_name_kana='トリコミ',
+                first_name_kana='タロウ',
+                gender='M',
+                birth_date=date(2000, 1, 1),
+                jaaf_id=f'J{i:05d}',
+            )
+            for i in range(count)
+        ]
+    
+    def test_import_errors_and_in_file_duplicates(self, db, competition, race, athlete, normal_user):
+        """行ごとのエラーメッセージとファイル内重複の検出"""
+        from entries.excel_import import ExcelEntryImporter
+        
+        file_obj = self._excel([
+            ['T123456', '鈴木', '次郎', 'M5000', '14:30.00', '自己ベスト'],
+            ['', '鈴木', '次郎', 'M5000', '14:40.00', ''],
+            ['', '鈴木', '次郎', 'F3000', '9:40.00', ''],
+            ['', '鈴木', '次郎', 'M5000', '1430', ''],
+            ['', '未登録', '選手', 'M5000', '14:30.00', ''],
+        ])
+        
+        result = ExcelEntryImporter(competition, normal_user).import_from_file(file_obj)
+        
+        assert result['success_count'] == 1
+        assert result['errors'] == [
+            "['行3: 既にこの種目にエントリー済みです']",
+            '行4: F3000の種目が見つかりません',
+            '行5: タイム形式が正しくありません: 1430（例: 14:30.00）',
+            "['行6: 選手「未登録 選手」が見つかりません。先に選手マスタに登録してください。']",
+        ]
+        entry = Entry.objects.get(athlete=athlete, race=race)
+        assert entry.status == 'pending'
+        assert entry.note == '自己ベスト'
+        assert result['entries'] == [entry]
+    
+    def test_import_capacity_and_cancelled(self, db, competition, race, organization, normal_user):
+        """定員到達とキャンセル済みエントリーの扱い"""
+        from entries.excel_import import ExcelEntryImporter
+        
+        athletes = self._create_athletes(organization, 3)
+        Entry.objects.create(athlete=athletes[0], race=race, registered_by=normal_user,
+                             declared_time=Decimal('900.00'), status='cancelled')
+        Entry.objects.create(athlete=athletes[1], race=race, registered_by=normal_user,
+                             declared_time=Decimal('900.00'), status='confirmed')
+        race.max_entries = 1
+        race.save()
+        
+        file_obj = self._excel([
+            [a.jaaf_id, a.last_name, a.first_name, 'M5000', '15:00.00', ''] for a in athletes
+        ])
+        result = ExcelEntryImporter(competition, normal_user).import_from_file(file_obj)
+        
+        assert result['success_count'] == 0
+        assert result['errors'] == [
+            "['行2: キャンセル済みのエントリーがあるため再登録できません、種目「男子5000m」は定員に達しています']",
+            "['行3: 既にこの種目にエントリー済みです、種目「男子5000m」は定員に達しています']",
+            "['行4: 種目「男子5000m」は定員に達しています']",
+        ]
+    
+    def test_import_reserves_capacity(self, db, competition, race, organization, normal_user, monkeypatch):
+        """読み込み後に満員になった種目の行は登録しない"""
+        from competitions.models import Race
+        from entries.excel_import import ExcelEntryImporter
+        
+        athletes = self._create_athletes(organization, 2)
+        race.max_entries = 2
+        race.save()
+        file_obj = self._excel([
+            [a.jaaf_id, a.last_name, a.first_name, 'M5000', '15:00.00', ''] for a in athletes
+        ])
+        importer = ExcelEntryImporter(competition, normal_user)
+        prepare = importer.prepare
+        
+        def prepare_then_fill(df):
+            prepare(df)
+            # 検証の後、登録までの間に他の申込で1件埋まる
+            Race.objects.filter(pk=race.pk).update(active_count=1)
+        
+        monkeypatch.setattr(importer, 'prepare', prepare_then_fill)
+        result = importer.import_from_file(file_obj)
+        
+        assert result['success_count'] == 0
+        assert result['errors'] == ['種目「男子5000m」は定員に達しています（2件を登録できませんでした）']
+        assert not Entry.objects.filter(race=race).exists()
+    
+    def test_import_query_count_is_bounded(self, db, competition, race, organization, normal_user,
+                                           django_assert_max_num_queries):
+        """行数に関わらずクエリ数が一定"""
+        from entries.excel_import import ExcelEntryImporter
+        
+        athletes = self._create_athletes(organization, 60)
+        file_obj = self._excel([
+            [a.jaaf_id, a.last_name, a.first_name, 'M5000', '15:00.00', ''] for a in athletes
+        ])
+        
+        with django_assert_max_num_queries(10):
+            result = ExcelEntryImporter(competition, normal_user).import_from_file(file_obj)
+        
+        assert result['success_count'] == 60
+        assert Entry.objects.filter(race=race, status='pending').count() == 60
+    
+    def test_import_writes_audit_log(self, db, competition, race, organization, athlete, normal_user):
+        """一括登録したエントリーにも作成ログが残る"""
+        from auditlog.models import LogEntry
+
+        from entries.excel_import import ExcelEntryImporter
+        
+        athletes = self._create_athletes(organization, 2)
+        file_obj = self._excel([
+            [a.jaaf_id, a.last_name, a.first_name, 'M5000', '15:00.00', ''] for a in athletes
+        ])
+        result = ExcelEntryImporter(competition, normal_user).import_from_file(file_obj)
+        
+        logs = LogEntry.objects.get_for_objects(Entry.objects.filter(race=race))
+        assert logs.count() == result['success_count'] == 2
+        assert set(logs.values_list('action', flat=True)) == {LogEntry.Action.CREATE}
+        assert set(logs.values_list('actor', flat=True)) == {normal_user.pk}
+        manual = Entry.objects.create(athlete=athlete, race=race, registered_by=normal_user,
+                                      declared_time=Decimal('900.00'))
+        assert set(LogEntry.objects.get_for_object(manual).get().changes) == set(logs.first().changes)
+    
+    def test_preview_then_import_without_reparsing(self, db, competition, race, organization,
+                                                    normal_user, monkeypatch):
+        """プレビュー結果から登録し、Excelは読み直さない"""
+        from entries import excel_import
+        from entries.excel_import import ExcelEntryImporter, ExcelImportError
+        
+        athletes = self._create_athletes(organization, 3)
+        file_obj = self._excel([
+            [a.jaaf_id, a.last_name, a.first_name, 'M5000', '15:00.00', ''] for a in athletes
+        ] + [['', '未登録', '選手', 'M5000', '14:30.00', '']])
+        
+        preview = ExcelEntryImporter(competition, normal_user).preview_from_file(file_obj)
+        assert preview['valid_count'] == 3
+        assert not Entry.objects.exists()
+        
+        # プレビュー後に他経路で申込された選手は重複として除外される
+        Entry.objects.create(athlete=athletes[0], race=race, registered_by=normal_user,
+                             declared_time=Decimal('900.00'))
+        
+        def fail_read_excel(*args, **kwargs):
+            raise AssertionError('Excelを再度読み込んでいます')
+        monkeypatch.setattr(excel_import.pd, 'read_excel', fail_read_excel)
+        
+        importer = ExcelEntryImporter(competition, normal_user)
+        result = importer.import_from_file(file_obj)
+        
+        assert result['success_count'] == 2
+        assert result['total_count'] == 4
+        assert result['errors'] == [
+            "['行5: 選手「未登録 選手」が見つかりません。先に選手マスタに登録してください。']",
+            "['行2: 既にこの種目にエントリー済みです']",
+        ]
+        assert Entry.objects.filter(race=race).count() == 3
+        
+        # 確定後はトークンを再利用できない
+        with pytest.raises(ExcelImportError):
+            importer.import_from_preview(preview['token'])
+    
+    def test_excel_upload_confirm_with_token(self, client_logged_in, competition, race, athlete):
+        """プレビュー画面のトークンで確定できる"""
+        from django.urls import reverse
+        
+        url = reverse('entries:excel_upload', args=[competition.pk])
+        file_obj = self._excel([['T123456', '鈴木', '次郎', 'M5000', '14:30.00', '']])
+        file_obj.name = 'entries.xlsx'
+        
+        response = client_logged_in.post(url, {'excel_file': file_obj, 'preview': '1'})
+        assert response.status_code == 200
+        token = response.context['preview']['token']
+        assert f'value="{token}"'.encode() in response.content
+        
+        response = client_logged_in.post(url, {'preview_token': token, 'import': '1'})
+        assert response.status_code == 302
+        assert Entry.objects.filter(athlete=athlete, race=race, status='pending').count() == 1
+        
+        # 期限切れ・使用済みトークン
+        response = client_logged_in.post(url, {'preview_token': token, 'import': '1'})
+        assert response.status_code == 302
+        assert response.url == url
@@ -12,6 +12,7 @@ from django.shortcuts import get_object_or_404, redirect, render
 from accounts.utils import log_permission_denied
 from competitions.models import Competition, Race
 
+from .counters import EntryCounter, RaceFullError
 from .excel_import import ExcelEntryImporter, ExcelImportError, generate_entry_template
 from .forms import EntryForm, ExcelUploadForm
 from .models import Entry, EntryGroup
@@ -38,8 +39,13 @@ def entry_create(request, competition_pk, race_pk):
     if request.method == 'POST':
         form = EntryForm(request.POST, race=race, user=request.user)
         if form.is_valid():
-            with transaction.atomic():
-                entry = form.save()
+            try:
+                with transaction.atomic():
+                    entry = form.save()
+            except RaceFullError as e:
+                # 定員チェックの後、保存までの間に他の申込で満員になった
+                form.add_error(None, e)
+            else:
                 messages.success(request, f'{entry.athlete.full_name}のエントリーを受け付けました。')
                 
                 # 続けてエントリーするか確認
@@ -251,7 +257,7 @@ def entry_confirm(request, competition_pk):
         entry_group.entries.set(entries)
         
         # エントリーのステータスを更新
-        entries.update(status='pending')
+        EntryCounter.update(entries, status='pending')
         
         messages.success(request, 'エントリー内容を確認しました。振込明細をアップロードしてください。')
         return redirect('payments:upload', entry_group_pk=entry_group.pk)
@@ -315,47 +321,54 @@ def excel_upload(request, competition_pk):
         return redirect('competitions:detail', pk=competition_pk)
     
     if request.method == 'POST':
-        form = ExcelUploadForm(request.POST, request.FILES)
-        if form.is_valid():
-            excel_file = request.FILES['excel_file']
-            importer = ExcelEntryImporter(competition, request.user)
-            
-            # プレビューモードか確定モードか
-            if 'preview' in request.POST:
+        importer = ExcelEntryImporter(competition, request.user)
+        preview_token = request.POST.get('preview_token')
+        result = None
+        
+        if preview_token:
+            # プレビュー済みの内容を確定（Excelは読み直さない）
+            form = ExcelUploadForm()
+            try:
+                result = importer.import_from_preview(preview_token)
+            except ExcelImportError as e:
+                messages.error(request, str(e))
+                return redirect('entries:excel_upload', competition_pk=competition_pk)
+        else:
+            form = ExcelUploadForm(request.POST, request.FILES)
+            if form.is_valid():
+                excel_file = request.FILES['excel_file']
+                
+                # プレビューモードか確定モードか
                 try:
-                    preview_result = importer.preview_from_file(excel_file)
-                    return render(request, 'entries/excel_preview.html', {
-                        'competition': competition,
-                        'preview': preview_result,
-                        'form': form,
-                    })
+                    if 'preview' in request.POST:
+                        preview_result = importer.preview_from_file(excel_file)
+                        return render(request, 'entries/excel_preview.html', {
+                            'competition': competition,
+                            'preview': preview_result,
+                        })
+                    result = importer.import_from_file(excel_file)
                 except ExcelImportError as e:
                     messages.error(request, str(e))
-            else:
-                # 確定モード
-                try:
-                    result = importer.import_from_file(excel_file)
-                    
-                    if result['success']:
-                        messages.success(
+        
+        if result is not None:
+            if result['success']:
+                messages.success(
+                    request,
+                    f'{result["success_count"]}件のエントリーを登録しました。'
+                )
+                if result['errors']:
+                    for error in result['errors'][:5]:
+                        messages.warning(request, error)
+                    if len(result['errors']) > 5:
+                        messages.warning(
                             request,
-                            f'{result["success_count"]}件のエントリーを登録しました。'
+                            f'他に{len(result["errors"]) - 5}件のエラーがあります。'
                         )
-                        if result['errors']:
-                            for error in result['errors'][:5]:
-                                messages.warning(request, error)
-                            if len(result['errors']) > 5:
-                                messages.warning(
-                                    request,
-                                    f'他に{len(result["errors"]) - 5}件のエラーがあります。'
-                                )
-                        return redirect('entries:cart', competition_pk=competition_pk)
-                    else:
-                        messages.error(request, 'エントリーに失敗しました。')
-                        for error in result['errors'][:10]:
-                            messages.error(request, error)
-                except ExcelImportError as e:
-                    messages.error(request, str(e))
+                return redirect('entries:cart', competition_pk=competition_pk)
+            else:
+                messages.error(request, 'エントリーに失敗しました。')
+                for error in result['errors'][:10]:
+                    messages.error(request, error)
     else:
         form = ExcelUploadForm()
     
@@ -0,0 +1,11 @@
+"""
+gunicorn の設定
+
+gunicorn は起動ディレクトリの gunicorn.conf.py を自動で読み込む（Procfile・render.yaml の web）。
+"""
+
+
+def post_worker_init(worker):
+    """ワーカーがアプリケーションを読み込んだ後、リクエストを受ける前に帳票のフォントを準備"""
+    from reports.rendering import RenderingContext
+    RenderingContext.preload()
@@ -2,13 +2,13 @@
 番組編成管理画面
 初心者でも使いやすい管理画面を提供
 """
-import csv
-
 from django.contrib import admin, messages
-from django.http import HttpResponse
 from django.utils import timezone
 from django.utils.html import format_html
 
+from nitsys.csv_export import CHUNK_SIZE, streaming_csv_response
+
+from .checkin import CheckinAggregator, CheckinCounterStore
 from .models import Heat, HeatAssignment
 
 # =============================================================================
@@ -18,6 +18,7 @@ from .models import Heat, HeatAssignment
 @admin.action(description="選択した組を確定")
 def finalize_heats(modeladmin, request, queryset):
     """組を一括確定"""
+    CheckinCounterStore.invalidate_heats(queryset)
     count = queryset.update(is_finalized=True)
     messages.success(request, f'{count}件の組を確定しました。')
 
@@ -25,6 +26,7 @@ def finalize_heats(modeladmin, request, queryset):
 @admin.action(description="選択した組の確定を解除")
 def unfinalize_heats(modeladmin, request, queryset):
     """組の確定を解除"""
+    CheckinCounterStore.invalidate_heats(queryset)
     count = queryset.update(is_finalized=False)
     messages.success(request, f'{count}件の組の確定を解除しました。')
 
@@ -33,35 +35,41 @@ def unfinalize_heats(modeladmin, request, queryset):
 def check_in_assignments(modeladmin, request, queryset):
     """選手を一括点呼済み"""
     now = timezone.now()
-    count = queryset.filter(checked_in=False).update(checked_in=True, checked_in_at=now)
+    CheckinCounterStore.invalidate_heats(Heat.objects.filter(assignments__in=queryset))
+    count = queryset.filter(checked_in=False).update(checked_in=True, checked_in_at=now, updated_at=now)
     messages.success(request, f'{count}名を点呼済みにしました。')
 
 
 @admin.action(description="選択した選手を欠場（DNS）に変更")
 def mark_dns(modeladmin, request, queryset):
     """選手を一括DNS"""
-    count = queryset.update(status='dns')
+    CheckinCounterStore.invalidate_heats(Heat.objects.filter(assignments__in=queryset))
+    count = queryset.update(status='dns', updated_at=timezone.now())
     messages.warning(request, f'{count}名を欠場（DNS）にしました。')
 
 
 @admin.action(description="選択した組をCSVでエクスポート（スタートリスト）")
 def export_heat_csv(modeladmin, request, queryset):
-    """組をCSVでエクスポート"""
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-    response['Content-Disposition'] = 'attachment; filename="heats.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
+    """組をCSVでエクスポート（ストリーミング、選択した全組の割り当てを1クエリで取得）"""
+    header = [
         '種目名', '組番号', '腰番号', 'ゼッケン', '選手名', 'フリガナ',
         '団体名', '申告タイム', 'ステータス', '点呼'
-    ])
+    ]
+    assignments = HeatAssignment.objects.filter(
+        heat__in=queryset.values('pk')
+    ).select_related(
+        'heat__race', 'entry__athlete__organization'
+    ).order_by(
+        'heat__race__competition', 'heat__race__display_order', 'heat__race_id',
+        'heat__heat_number', 'heat_id', 'bib_number', 'pk'
+    )
     
-    for heat in queryset.prefetch_related('assignments__entry__athlete', 'assignments__entry__athlete__organization'):
-        for assignment in heat.assignments.all().order_by('bib_number'):
+    def rows():
+        for assignment in assignments.iterator(chunk_size=CHUNK_SIZE):
             athlete = assignment.entry.athlete
-            writer.writerow([
-                heat.race.name,
-                heat.heat_number,
+            yield [
+                assignment.heat.race.name,
+                assignment.heat.heat_number,
                 assignment.bib_number,
                 assignment.race_bib_number or '',
                 athlete.full_name,
@@ -70,9 +78,9 @@ def export_heat_csv(modeladmin, request, queryset):
                 assignment.entry.declared_time_display,
                 assignment.get_status_display(),
                 '済' if assignment.checked_in else '未',
-            ])
+            ]
     
-    return response
+    return streaming_csv_response('heats.csv', header, rows())
 
 
 # =============================================================================
@@ -146,7 +154,7 @@ class HeatAdmin(admin.ModelAdmin):
     
     def entry_count_display(self, obj):
         """エントリー数を表示"""
-        count = obj.assignments.count()
+        count = obj.checkin_total
         if count > 0:
             return format_html('<strong>{}</strong> 名', count)
         return '0 名'
@@ -154,11 +162,11 @@ class HeatAdmin(admin.ModelAdmin):
     
     def check_in_status(self, obj):
         """点呼状況を表示"""
-        total = obj.assignments.count()
+        total = obj.checkin_total
         if total == 0:
             return '-'
-        checked = obj.assignments.filter(checked_in=True).count()
-        dns = obj.assignments.filter(status='dns').count()
+        checked = obj.checkin_checked_in
+        dns = obj.checkin_dns
         
         if checked == total:
             return format_html('<span style="color: #28a745;">✓ 全員点呼済</span>')
@@ -179,10 +187,10 @@ class HeatAdmin(admin.ModelAdmin):
     is_finalized_badge.admin_order_field = 'is_finalized'
     
     def get_queryset(self, request):
-        """クエリ最適化"""
-        return super().get_queryset(request).select_related(
-            'race', 'race__competition'
-        ).prefetch_related('assignments')
+        """クエリ最適化（点呼集計は一覧全体で1クエリ）"""
+        return CheckinAggregator.annotate_heats(
+            super().get_queryset(request).select_related('race', 'race__competition')
+        )
 
 
 # =============================================================================
@@ -295,3 +303,18 @@ class HeatAssignmentAdmin(admin.ModelAdmin):
             'heat', 'heat__race', 'heat__race__competition',
             'entry', 'entry__athlete', 'entry__athlete__organization'
         )
+    
+    def save_model(self, request, obj, form, change):
+        """保存時に点呼カウンターを再構築させる"""
+        super().save_model(request, obj, form, change)
+        CheckinCounterStore.invalidate_heats(Heat.objects.filter(pk=obj.heat_id))
+    
+    def delete_model(self, request, obj):
+        """削除時に点呼カウンターを再構築させる"""
+        CheckinCounterStore.invalidate_heats(Heat.objects.filter(pk=obj.heat_id))
+        super().delete_model(request, obj)
+    
+    def delete_queryset(self, request, queryset):
+        """一括削除時に点呼カウンターを再構築させる"""
+        CheckinCounterStore.invalidate_heats(Heat.objects.filter(assignments__in=queryset))
+        super().delete_queryset(request, queryset)
@@ -0,0 +1,14 @@
+"""
+heats アプリケーション設定
+"""
+from django.apps import AppConfig
+
+
+class HeatsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'heats'
+    verbose_name = '番組編成'
+    
+    def ready(self):
+        # シグナルを登録
+        from . import signals  # noqa: F401
@@ -0,0 +1,404 @@
+"""
+点呼状況集計
+大会全体の組・種目ごとの点呼数を集計クエリ1回で算出する
+
+CheckinCounterStore は集計結果を版番号ごとにキャッシュに保持する。版番号はDBに置き、
+点呼操作と同じトランザクションで進めるため、キャッシュのバックエンドがアトミックな
+操作を持たなくても（FileBasedCache など）集計がずれない。
+"""
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import CheckinVersion, Heat, HeatAssignment
+
+logger = logging.getLogger(__name__)
+
+
+def calc_progress(checked_in, total):
+    """点呼進捗率（%）"""
+    return round(checked_in / total * 100) if total > 0 else 0
+
+
+class CheckinAggregator:
+    """
+    点呼状況集計サービス
+
+    組ごとの total / checked_in / dns / pending を GROUP BY で一括集計し、
+    種目・大会全体の合計を Python 側で積み上げる。
+    組数が増えてもクエリ数は一定。
+    """
+
+    # 未点呼選手リストの1組あたりの表示上限
+    UNCHECKED_LIMIT = 10
+
+    # 未点呼選手リストの1行の項目
+    UNCHECKED_FIELDS = (
+        'pk',
+        'bib_number',
+        'entry__athlete__last_name',
+        'entry__athlete__first_name',
+        'entry__athlete__organization__short_name',
+    )
+
+    @classmethod
+    def annotate_heats(cls, queryset):
+        """
+        組クエリセットに点呼集計を付与
+
+        付与される属性: checkin_total, checkin_checked_in, checkin_dns
+        """
+        return queryset.annotate(
+            checkin_total=Count('assignments'),
+            checkin_checked_in=Count('assignments', filter=Q(assignments__checked_in=True)),
+            checkin_dns=Count('assignments', filter=Q(assignments__status='dns')),
+        )
+
+    @classmethod
+    def heat_stats(cls, total, checked_in, dns):
+        """組1つ分の集計値を辞書化"""
+        return {
+            'total': total,
+            'checked_in': checked_in,
+            'dns': dns,
+            'pending': total - checked_in - dns,
+            'progress': calc_progress(checked_in, total),
+        }
+
+    @classmethod
+    def competition_summary(cls, competition):
+        """
+        大会全体の点呼状況を集計
+
+        対象は有効な種目の確定済み組のみ。
+
+        Returns:
+            dict: {
+                'races': [{'race', 'heats': [{'heat', 'total', ...}], 'total', ...}],
+                'totals': {'total', 'checked_in', 'dns', 'pending', 'progress'},
+            }
+        """
+        races = list(competition.races.filter(is_active=True).order_by('display_order'))
+
+        heats = cls.annotate_heats(
+            Heat.objects.filter(race__in=races, is_finalized=True)
+        ).order_by('heat_number')
+
+        heats_by_race = {race.pk: [] for race in races}
+        for heat in heats:
+            heat_data = cls.heat_stats(heat.checkin_total, heat.checkin_checked_in, heat.checkin_dns)
+            heat_data['heat'] = heat
+            heats_by_race[heat.race_id].append(heat_data)
+
+        race_rows = []
+        for race in races:
+            heats_data = heats_by_race[race.pk]
+            row = cls.heat_stats(
+                sum(h['total'] for h in heats_data),
+                sum(h['checked_in'] for h in heats_data),
+                sum(h['dns'] for h in heats_data),
+            )
+            row['race'] = race
+            row['heats'] = heats_data
+            race_rows.append(row)
+
+        totals = cls.heat_stats(
+            sum(r['total'] for r in race_rows),
+            sum(r['checked_in'] for r in race_rows),
+            sum(r['dns'] for r in race_rows),
+        )
+
+        return {'races': race_rows, 'totals': totals}
+
+    @classmethod
+    def unchecked_by_heat(cls, heat_ids, limit=None):
+        """
+        組ごとの未点呼選手リスト（DNSを除く、腰ナンバー順）
+
+        組ごとに個別クエリを発行せず、対象組の未点呼者を1クエリで取得して振り分ける。
+        limit=None の場合は全件を返す。
+        """
+        result = {heat_id: [] for heat_id in heat_ids}
+        if not heat_ids:
+            return result
+
+        rows = HeatAssignment.objects.filter(
+            heat_id__in=heat_ids,
+            checked_in=False,
+        ).exclude(status='dns').order_by('heat_id', 'bib_number').values('heat_id', *cls.UNCHECKED_FIELDS)
+
+        for row in rows:
+            bucket = result[row.pop('heat_id')]
+            if limit is None or len(bucket) < limit:
+                bucket.append(row)
+        return result
+
+
+class CheckinCounterStore:
+    """
+    大会単位の点呼カウンターストア
+
+    - 版番号: CheckinVersion（DB）。点呼・DNS・組構成の変更と同じトランザクションで進める
+    - 集計:   キャッシュの checkin:<大会ID>:v<版番号> に組ごとの total/checked_in/dns と未点呼リスト
+
+    各キーにはその版の状態と一致する集計だけを置く。
+    - 点呼・DNS（save()）: 版番号の行をロックして v → v+1 に進め、コミット後に v の集計へ
+      その1件の差分を当てて v+1 のキーに置く（集計し直さない。O(1)）
+    - 組構成の変更など（invalidate()）: 版番号だけ進め、次回参照時に集計し直す
+    - 集計し直し（rebuild()）: 集計の前後で版番号を読み、変わっていなければその版のキーに置く
+      （集計中に他の変更がコミットされた場合は、どの版の状態か決まらないためキャッシュしない）
+    参照時のDBアクセスは版番号の読み取り1回だけで、組編成テーブルには触れない。
+    """
+
+    TIMEOUT = 60 * 60  # 1時間（参照されなくなった版は期限切れで消える）
+
+    @staticmethod
+    def _counters_key(competition_id, version):
+        return f'checkin:{competition_id}:v{version}'
+
+    @classmethod
+    def get_version(cls, competition_id):
+        """現在の版番号（未設定なら0）"""
+        version = CheckinVersion.objects.filter(competition_id=competition_id).values_list(
+            'version', flat=True
+        ).first()
+        return version or 0
+
+    @classmethod
+    def bump_version(cls, competition_id):
+        """
+        版番号を進める（行は大会の作成時に heats.signals が作る）
+
+        呼び出し元のトランザクション内で実行すれば、変更と同時にコミットされる。
+        """
+        CheckinVersion.objects.filter(competition_id=competition_id).update(version=F('version') + 1)
+
+    # ------------------------------------------------------------------
+    # 読み取り
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def get_counters(cls, competition, version=None):
+        """
+        組ごとのカウンターを取得（キャッシュミス時は集計し直す）
+
+        Returns:
+            tuple: (layout, {組ID: カウンター辞書})
+        """
+        if version is None:
+            version = cls.get_version(competition.pk)
+        cached = cache.get(cls._counters_key(competition.pk, version))
+        if cached is not None:
+            return cached
+        return cls.rebuild(competition, version)
+
+    @classmethod
+    def status_payload(cls, competition, version=None):
+        """点呼状況API用のレスポンスデータ"""
+        layout, counters = cls.get_counters(competition, version)
+
+        data = []
+        for race in layout['races']:
+            heats = []
+            for heat in race['heats']:
+                counter = counters[heat['id']]
+                stats = CheckinAggregator.heat_stats(
+                    counter['total'], counter['checked_in'], counter['dns']
+                )
+                heats.append({
+                    'id': heat['id'],
+                    'number': heat['number'],
+                    **stats,
+                    'unchecked': counter['unchecked'][:CheckinAggregator.UNCHECKED_LIMIT],
+                })
+
+            race_stats = CheckinAggregator.heat_stats(
+                sum(h['total'] for h in heats),
+                sum(h['checked_in'] for h in heats),
+                sum(h['dns'] for h in heats),
+            )
+            data.append({
+                'race_id': race['race_id'],
+                'race_name': race['race_name'],
+                'total': race_stats['total'],
+                'checked_in': race_stats['checked_in'],
+                'progress': race_stats['progress'],
+                'heats': heats,
+            })
+
+        return {'races': data}
+
+    # ------------------------------------------------------------------
+    # 再構築・整合性チェック
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def _load_from_db(cls, competition):
+        """HeatAssignment から構成とカウンターを集計"""
+        summary = CheckinAggregator.competition_summary(competition)
+        heat_ids = [h['heat'].pk for r in summary['races'] for h in r['heats']]
+        unchecked = CheckinAggregator.unchecked_by_heat(heat_ids)
+
+        layout = {
+            'races': [{
+                'race_id': r['race'].pk,
+                'race_name': r['race'].name,
+                'heats': [
+                    {'id': h['heat'].pk, 'number': h['heat'].heat_number}
+                    for h in r['heats']
+                ],
+            } for r in summary['races']],
+        }
+        counters = {
+            h['heat'].pk: {
+                'total': h['total'],
+                'checked_in': h['checked_in'],
+                'dns': h['dns'],
+                'unchecked': unchecked[h['heat'].pk],
+            }
+            for r in summary['races'] for h in r['heats']
+        }
+        return layout, counters
+
+    @classmethod
+    def rebuild(cls, competition, version=None):
+        """DBから集計し直し、集計中に版番号が変わらなければ版番号のキーに格納"""
+        if version is None:
+            version = cls.get_version(competition.pk)
+        layout, counters = cls._load_from_db(competition)
+        if cls.get_version(competition.pk) == version:
+            cache.set(cls._counters_key(competition.pk, version), (layout, counters), cls.TIMEOUT)
+        return layout, counters
+
+    @classmethod
+    def invalidate(cls, competition_id):
+        """
+        大会のカウンターを破棄（版番号を進め、次回参照時に集計し直す）
+
+        古い版のキーは参照されずに期限切れで消える。
+        """
+        if competition_id is not None:
+            cls.bump_version(competition_id)
+
+    @classmethod
+    def invalidate_heats(cls, heats):
+        """組クエリセットに含まれる大会のカウンターを破棄"""
+        competition_ids = set(heats.values_list('race__competition_id', flat=True))
+        for competition_id in competition_ids:
+            cls.invalidate(competition_id)
+
+    @classmethod
+    def verify(cls, competition, repair=False):
+        """
+        キャッシュ上のカウンターとDBの集計値を比較
+
+        版番号を進めずにDBを更新した経路（queryset.update() など）の検出に使う。
+
+        Args:
+            competition: 大会オブジェクト
+            repair: ずれがあれば版番号を進めて集計し直すか
+
+        現在の版のキャッシュは、点呼ごとに前の版から差分で引き継がれるため、版番号を進めない
+        更新によるずれも引き継ぐ。現在の版のキャッシュがなければ、次回参照時にDBから集計するため
+        ずれはない（ここで集計し、以降の差分更新の起点にする）。
+
+        Returns:
+            list: ずれのあった組IDのリスト
+        """
+        version = cls.get_version(competition.pk)
+        cached = cache.get(cls._counters_key(competition.pk, version))
+        if cached is None:
+            cls.rebuild(competition, version)
+            return []
+        layout, counters = cached
+        db_layout, db_counters = cls._load_from_db(competition)
+
+        if layout != db_layout:
+            drifted = sorted(set(counters) | set(db_counters))
+        else:
+            drifted = [heat_id for heat_id, counter in counters.items() if counter != db_counters[heat_id]]
+
+        if drifted:
+            logger.warning(
+                f"Checkin counter drift: competition={competition.pk}, heats={drifted}"
+            )
+            if repair:
+                cls.bump_version(competition.pk)
+                cls.rebuild(competition)
+        return drifted
+
+    # ------------------------------------------------------------------
+    # 書き込み（点呼・DNS）
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def save(cls, assignment, was_checked_in, old_status, update_fields=None):
+        """
+        点呼状態を保存し、集計が変わる場合は同じトランザクションで版番号を進める
+
+        コミット後に前の版の集計へこの1件の差分を当て、新しい版のキーに置く。
+
+        Args:
+            assignment: 変更後の HeatAssignment（heat__race を select_related 済みであること）
+            was_checked_in: 変更前の checked_in
+            old_status: 変更前の status
+        """
+        competition_id = assignment.heat.race.competition_id
+        was_dns = old_status == 'dns'
+        is_dns = assignment.status == 'dns'
+        with transaction.atomic():
+            # 未点呼リストの対象（未点呼かつDNS以外）もこの2つで決まる
+            if assignment.checked_in == was_checked_in and is_dns == was_dns:
+                assignment.save(update_fields=update_fields)
+                return
+            # 版番号の行をロックし、同じ大会の点呼を1件ずつ版番号に対応させる
+            version = CheckinVersion.objects.select_for_update().filter(
+                competition_id=competition_id
+            ).values_list('version', flat=True).first()
+            assignment.save(update_fields=update_fields)
+            cls.bump_version(competition_id)
+            if version is None:
+                return
+            delta = {
+                'checked_in': int(assignment.checked_in) - int(was_checked_in),
+                'dns': int(is_dns) - int(was_dns),
+                'unchecked': (not assignment.checked_in and not is_dns) - (not was_checked_in and not was_dns),
+            }
+            transaction.on_commit(
+                lambda: cls._apply_delta(competition_id, version, assignment.heat_id, assignment.pk, delta)
+            )
+
+    @classmethod
+    def _apply_delta(cls, competition_id, version, heat_id, assignment_pk, delta):
+        """
+        版 version の集計に1件の差分を当てて version+1 のキーに置く（コミット後に呼ぶ）
+
+        version の集計がキャッシュになければ何もしない（次回参照時に集計し直す）。
+        """
+        cached = cache.get(cls._counters_key(competition_id, version))
+        if cached is None:
+            return
+        layout, counters = cached
+        counter = counters.get(heat_id)
+        # 集計対象外の組（未確定など）の変更は集計に影響しない
+        if counter is not None:
+            counter['checked_in'] += delta['checked_in']
+            counter['dns'] += delta['dns']
+            unchecked = counter['unchecked']
+            if delta['unchecked'] < 0:
+                counter['unchecked'] = [row for row in unchecked if row['pk'] != assignment_pk]
+            elif delta['unchecked'] > 0:
+                row = HeatAssignment.objects.filter(pk=assignment_pk).values(
+                    *CheckinAggregator.UNCHECKED_FIELDS
+                ).first()
+                if row is None:
+                    return
+                # 腰ナンバー順の位置に入れる
+                position = next(
+                    (i for i, other in enumerate(unchecked) if other['bib_number'] > row['bib_number']),
+                    len(unchecked),
+                )
+                unchecked.insert(position, row)
+        cache.set(cls._counters_key(competition_id, version + 1), (layout, counters), cls.TIMEOUT)
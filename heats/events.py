@@ -0,0 +1,210 @@
+"""
+点呼状況のプッシュ配信（Server-Sent Events）
+
+ASGI（nitsys/asgi.py）で配信する場合は接続を保持し、CheckinCounterStore の
+版番号が進んだときだけ変化した組の差分を送る。閲覧者側のポーリングは発生せず、
+送信量は点呼操作の件数に比例する。
+
+版番号の確認は VersionBroadcaster が大会ごとに1プロセス1つのタスクで行い、
+接続中のストリームへ asyncio.Event で知らせる（接続数が増えても確認の回数は増えない）。
+クライアントが切断したら（nitsys.streaming.DisconnectMiddleware が知らせる）すぐに終了する。
+
+WSGI で動作している場合は接続を保持せず、版番号が変わっていればスナップショットを
+1回返して閉じる（EventSource が retry 間隔で再接続するため、変化がなければ本文は空）。
+"""
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .checkin import CheckinCounterStore
+
+# 版番号の確認間隔（秒）。大会ごとに1プロセス1回、版番号の読み取り1回で組編成テーブルには触れない
+POLL_INTERVAL = 1.0
+
+# 変化がないときのコメント送信間隔（秒）。プロキシによる切断を防ぐ
+HEARTBEAT_INTERVAL = 15.0
+
+# 1接続あたりの最大保持時間（秒）。超過後はクライアントが自動再接続する
+# （切断を検知できない経路でも、保持し続けるのはこの時間まで）
+STREAM_LIFETIME = 120.0
+
+# クライアントの再接続待ち時間（ミリ秒）
+RETRY_MS = 5000
+
+
+def format_event(event, data, event_id=None):
+    """SSEのイベント1件を整形"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def index_heats(payload):
+    """status_payload を {組ID: 組データ（race_id付き）} に展開"""
+    heats = {}
+    for race in payload['races']:
+        for heat in race['heats']:
+            heats[heat['id']] = {**heat, 'race_id': race['race_id']}
+    return heats
+
+
+def diff_heats(previous, current):
+    """
+    前回送信分との差分
+
+    Returns:
+        list | None: 変化した組データのリスト。組構成自体が変わった場合は None
+    """
+    if previous.keys() != current.keys():
+        return None
+    return [heat for heat_id, heat in current.items() if previous[heat_id] != heat]
+
+
+def snapshot_event(payload, version):
+    """初回・構成変更時の全体スナップショット"""
+    return f'retry: {RETRY_MS}\n' + format_event('snapshot', payload, version)
+
+
+def _read_version(competition_id):
+    """版番号を読む（リクエスト外のスレッドで実行するため接続の寿命も確認する）"""
+    close_old_connections()
+    return CheckinCounterStore.get_version(competition_id)
+
+
+class VersionBroadcaster:
+    """
+    大会1つ分の版番号を確認し、変化を購読中のストリームへ知らせる
+
+    購読者がいる間だけ確認タスクを動かし、最後の購読者が抜けたら止める。
+    イベントループ（プロセス）ごとに大会1つにつき1インスタンス。
+    """
+
+    _instances = {}
+
+    def __init__(self, competition_id):
+        self.competition_id = competition_id
+        self.loop = asyncio.get_running_loop()
+        self.version = None
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.task = None
+
+    @classmethod
+    def subscribe(cls, competition_id):
+        """購読を開始（確認タスクがなければ起動）"""
+        broadcaster = cls._instances.get(competition_id)
+        if broadcaster is None or broadcaster.loop is not asyncio.get_running_loop():
+            broadcaster = cls._instances[competition_id] = cls(competition_id)
+        broadcaster.subscribers += 1
+        if broadcaster.task is None or broadcaster.task.done():
+            broadcaster.task = asyncio.create_task(broadcaster._poll())
+        return broadcaster
+
+    def unsubscribe(self):
+        """購読を終了（購読者がいなくなれば確認タスクを止める）"""
+        self.subscribers -= 1
+        if self.subscribers <= 0:
+            if self.task is not None:
+                self.task.cancel()
+            if self._instances.get(self.competition_id) is self:
+                del self._instances[self.competition_id]
+
+    async def _poll(self):
+        # リクエストのスレッドを占有しないよう、スレッドを限定せずに読む
+        read_version = sync_to_async(_read_version, thread_sensitive=False)
+        while True:
+            version = await read_version(self.competition_id)
+            if version != self.version:
+                self.version = version
+                self.changed.set()
+                self.changed = asyncio.Event()
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def wait(self, version, timeout, disconnected=None):
+        """
+        版番号が version から変わるか、timeout 秒経つか、切断されるまで待つ
+
+        Returns:
+            int | None: 確認済みの最新の版番号（まだ確認していなければ None）
+        """
+        if self.version is not None and self.version != version:
+            return self.version
+        waiters = [asyncio.ensure_future(self.changed.wait())]
+        if disconnected is not None:
+            waiters.append(asyncio.ensure_future(disconnected.wait()))
+        try:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        return self.version
+
+
+async def stream_checkin_events(competition, version, payload,
+                                lifetime=STREAM_LIFETIME, disconnected=None):
+    """
+    点呼状況のイベントストリーム（ASGI用の非同期ジェネレーター）
+
+    Args:
+        competition: 大会オブジェクト
+        version: payload 取得時点の版番号
+        payload: CheckinCounterStore.status_payload() の結果
+        disconnected: クライアントの切断でセットされる asyncio.Event（なければ保持時間まで送る）
+    """
+    yield snapshot_event(payload, version)
+
+    last_heats = index_heats(payload)
+    broadcaster = VersionBroadcaster.subscribe(competition.pk)
+    started = last_sent = time.monotonic()
+    try:
+        while True:
+            now = time.monotonic()
+            remaining = lifetime - (now - started)
+            if remaining <= 0 or (disconnected is not None and disconnected.is_set()):
+                break
+
+            current = await broadcaster.wait(
+                version, min(remaining, HEARTBEAT_INTERVAL - (now - last_sent)), disconnected
+            )
+            if disconnected is not None and disconnected.is_set():
+                break
+            if current is None or current == version:
+                if time.monotonic() - last_sent >= HEARTBEAT_INTERVAL:
+                    last_sent = time.monotonic()
+                    yield ': heartbeat\n\n'
+                continue
+
+            version = current
+            payload = await sync_to_async(CheckinCounterStore.status_payload)(competition, version)
+            heats = index_heats(payload)
+            changed = diff_heats(last_heats, heats)
+            last_heats = heats
+
+            if changed is None:
+                yield snapshot_event(payload, version)
+            elif changed:
+                yield format_event('heats', {'heats': changed}, version)
+            else:
+                continue
+            last_sent = time.monotonic()
+    finally:
+        broadcaster.unsubscribe()
+
+
+def single_shot_events(competition, last_event_id):
+    """
+    WSGI用：接続を保持せずに返す本文
+
+    Last-Event-ID が現在の版番号と一致すれば再接続間隔だけを返す。
+    """
+    version = CheckinCounterStore.get_version(competition.pk)
+    if last_event_id == str(version):
+        return f'retry: {RETRY_MS}\n\n'
+    payload = CheckinCounterStore.status_payload(competition, version)
+    return snapshot_event(payload, version)
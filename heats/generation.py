@@ -0,0 +1,424 @@
+"""
+大会全体の組編成エンジン
+
+種目ごとに HeatGenerator.generate_heats() を呼ぶと種目数に比例してクエリが増えるため、
+大会の対象エントリーを1回で読み込み、NCG定員超過の移動と組分けをメモリ上で行い、
+Heat / HeatAssignment をまとめて書き込む。
+
+フェーズ:
+    load  : 種目・既存の組・対象エントリーの読み込み
+    ncg   : NCG定員超過分の一般種目への移動
+    plan  : 種目ごとの組分け（メモリ上）
+    write : 既存の未確定組の削除と一括作成
+
+HeatPlanner は種目単位で目標の組編成と現在の組編成の差分を計算し、
+必要な作成・更新・削除だけを適用する（プレビュー用に差分だけを返すこともできる）。
+"""
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import F
+
+from competitions.models import Race
+from entries.counters import EntryCounter
+from entries.models import Entry
+
+from .checkin import CheckinCounterStore
+from .models import Heat, HeatAssignment, HeatGenerator
+
+
+class CompetitionHeatGenerator:
+    """大会単位の組編成（1トランザクション・一括書き込み）"""
+
+    # bulk_create の1回あたりの件数
+    BATCH_SIZE = 1000
+
+    def __init__(self, competition, force_regenerate=False):
+        """
+        Args:
+            competition: 大会オブジェクト
+            force_regenerate: 既存の未確定組を削除して再生成するか
+        """
+        self.competition = competition
+        self.force_regenerate = force_regenerate
+        self.timings = {}
+        self.results = {
+            'ncg_processed': [],
+            'heats_generated': [],
+            'errors': [],
+            'timings': self.timings,
+        }
+
+    @contextmanager
+    def phase(self, name):
+        """フェーズの所要時間（秒）を記録"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(time.perf_counter() - started, 4)
+
+    @classmethod
+    def run(cls, competition, force_regenerate=False):
+        """
+        大会全体の組分けを生成（NCG処理を含む）
+
+        Returns:
+            dict: generate_heats_with_ncg() と同じ形式の結果に 'timings'（フェーズ別秒数）を追加
+        """
+        return cls(competition, force_regenerate).generate()
+
+    @transaction.atomic
+    def generate(self):
+        started = time.perf_counter()
+
+        with self.phase('load'):
+            races = list(Race.objects.filter(
+                competition=self.competition, is_active=True
+            ).select_related('fallback_race'))
+            heat_state = self._load_heat_state(races)
+            entries_by_race = self._load_entries(races)
+
+        with self.phase('ncg'):
+            self._process_ncg(races, entries_by_race)
+
+        with self.phase('plan'):
+            planned = self._plan(races, heat_state, entries_by_race)
+
+        with self.phase('write'):
+            self._write(planned)
+
+        self.timings['total'] = round(time.perf_counter() - started, 4)
+        return self.results
+
+    def _load_heat_state(self, races):
+        """種目ID -> {'finalized': bool, 'existing': bool}"""
+        state = defaultdict(lambda: {'finalized': False, 'existing': False})
+        for race_id, is_finalized in Heat.objects.filter(
+            race__in=races
+        ).values_list('race_id', 'is_finalized'):
+            state[race_id]['existing'] = True
+            state[race_id]['finalized'] |= is_finalized
+        return state
+
+    def _load_entries(self, races):
+        """種目ID -> 申告タイム順の確定エントリー（1クエリ）"""
+        entries_by_race = defaultdict(list)
+        entries = Entry.objects.filter(
+            race__in=races, status='confirmed'
+        ).only('pk', 'race_id', 'athlete_id', 'declared_time').annotate(
+            organization_id=F('athlete__organization_id')
+        ).order_by('declared_time', 'pk')
+        for entry in entries:
+            entries_by_race[entry.race_id].append(entry)
+        return entries_by_race
+
+    def _process_ncg(self, races, entries_by_race):
+        """
+        NCG種目の定員超過分を一般種目へ移動（HeatGenerator.process_ncg_entries と同じ規則）
+
+        メモリ上の種目別リストも移動後の状態に更新する。
+        """
+        for ncg_race in races:
+            if not ncg_race.is_ncg:
+                continue
+
+            if not ncg_race.fallback_race:
+                self.results['errors'].append({
+                    'race': ncg_race.name,
+                    'error': f'{ncg_race.name}の移動先一般種目が設定されていません',
+                })
+                continue
+
+            entries = entries_by_race[ncg_race.pk]
+            overflow = entries[ncg_race.ncg_capacity:]
+            if overflow:
+                fallback = ncg_race.fallback_race
+                EntryCounter.update(
+                    Entry.objects.filter(pk__in=[e.pk for e in overflow]),
+                    original_ncg_race=ncg_race,
+                    moved_from_ncg=True,
+                    race=fallback
+                )
+                entries_by_race[ncg_race.pk] = entries[:ncg_race.ncg_capacity]
+                for entry in overflow:
+                    entry.race_id = fallback.pk
+                moved = entries_by_race[fallback.pk] + overflow
+                moved.sort(key=lambda e: (e.declared_time, e.pk))
+                entries_by_race[fallback.pk] = moved
+
+            self.results['ncg_processed'].append({
+                'race': ncg_race.name,
+                'ncg_count': len(entries_by_race[ncg_race.pk]),
+                'moved_count': len(overflow),
+            })
+
+    def _plan(self, races, heat_state, entries_by_race):
+        """
+        種目ごとの組分け
+
+        Returns:
+            list[tuple]: (種目, 組ごとのエントリーのリスト)。一般種目 → NCG種目の順
+        """
+        planned = []
+        for race in sorted(races, key=lambda r: r.is_ncg):
+            state = heat_state[race.pk]
+            if state['finalized']:
+                self.results['errors'].append({
+                    'race': race.name,
+                    'error': '確定済みの組があるため再生成できません',
+                })
+                continue
+            if state['existing'] and not self.force_regenerate:
+                self.results['errors'].append({
+                    'race': race.name,
+                    'error': '既に組が作成されています（再生成する場合は強制再生成を指定してください）',
+                })
+                continue
+
+            groups = HeatGenerator.split_entries(
+                entries_by_race[race.pk], race.heat_capacity, strategy=race.seeding_strategy
+            )
+            planned.append((race, groups))
+            self.results['heats_generated'].append({
+                'race': race.name,
+                'heat_count': len(groups),
+            })
+        return planned
+
+    def _write(self, planned):
+        """未確定組の削除と組・組編成の一括作成"""
+        race_ids = [race.pk for race, _ in planned]
+        if self.force_regenerate and race_ids:
+            Heat.objects.filter(race_id__in=race_ids, is_finalized=False).delete()
+
+        heats = Heat.objects.bulk_create([
+            Heat(race=race, heat_number=number)
+            for race, groups in planned
+            for number in range(1, len(groups) + 1)
+        ], batch_size=self.BATCH_SIZE)
+
+        heat_iter = iter(heats)
+        assignments = []
+        for _, groups in planned:
+            for group in groups:
+                heat = next(heat_iter)
+                assignments.extend(
+                    HeatAssignment(heat=heat, entry=entry, bib_number=bib_number)
+                    for bib_number, entry in enumerate(group, start=1)
+                )
+        HeatAssignment.objects.bulk_create(assignments, batch_size=self.BATCH_SIZE)
+
+
+class HeatPlanner:
+    """
+    種目単位の組編成の差分計画
+
+    目標の組編成をメモリ上で計算し、現在の Heat / HeatAssignment との差分
+    （作成・更新・削除）だけを適用する。組やエントリーのIDは可能な限り維持される。
+
+    keep_existing=True の場合は既存の配置（move_entry による手動調整を含む）をそのまま残し、
+    新しく対象になったエントリーの追加と対象外になったエントリーの削除だけを行う。
+    """
+
+    @classmethod
+    def plan(cls, race, include_pending=False, num_heats=None, keep_existing=False, strategy=None,
+             force=False):
+        """
+        差分を計算（データベースは変更しない）
+
+        確定済みの組がある種目は計画できない（ValueError）。force=True の場合は確定済みの組と
+        その組の選手をそのまま残し、残りの選手だけで未確定の組を編成し直す。新しい組には
+        確定済みの組が使っていない組番号を小さい順に割り当てる。
+
+        Args:
+            race: 対象種目
+            include_pending: 入金待ちのエントリーも含めるか
+            num_heats: 組数を指定（None の場合は定員から自動計算。force の場合は未確定の組数）
+            keep_existing: 既存の配置を維持して追加・削除のみ行うか
+            strategy: シード方式（None の場合は種目の設定）
+            force: 確定済みの組を残して未確定の組だけを再生成するか
+
+        Returns:
+            dict: {
+                'race': 種目,
+                'heats_to_create': [組番号, ...],
+                'heats_to_delete': [Heat, ...],
+                'create': [(Entry, 組番号, 腰ナンバー), ...],
+                'update': [(HeatAssignment, 組番号, 腰ナンバー), ...],
+                'delete': [HeatAssignment, ...],
+                'unchanged': 変更のない組編成の件数,
+            }
+        """
+        heats = list(Heat.objects.filter(race=race).order_by('heat_number'))
+        finalized = [heat for heat in heats if heat.is_finalized]
+        if finalized and not force:
+            raise ValueError('確定済みの組があるため再生成できません')
+        heats = [heat for heat in heats if not heat.is_finalized]
+
+        heat_numbers = {heat.pk: heat.heat_number for heat in heats}
+        assignments = list(HeatAssignment.objects.filter(
+            heat__race=race, heat__is_finalized=False
+        ).select_related('entry').order_by('heat__heat_number', 'bib_number'))
+        current = {a.entry_id: a for a in assignments}
+
+        entries = HeatGenerator.target_entries(race, include_pending)
+        if finalized:
+            # 確定済みの組の選手は動かさない
+            kept = set(HeatAssignment.objects.filter(
+                heat__in=finalized
+            ).values_list('entry_id', flat=True))
+            entries = [entry for entry in entries if entry.pk not in kept]
+        groups = HeatGenerator.split_entries(
+            entries, race.heat_capacity, num_heats, strategy or race.seeding_strategy
+        )
+        if keep_existing:
+            groups = cls._merge_into_existing(groups, assignments, heat_numbers, entries, race.heat_capacity)
+
+        # 確定済みの組の番号を飛ばして 1 から割り当てる（確定済みの組がなければ 1..N）
+        finalized_numbers = {heat.heat_number for heat in finalized}
+        numbers = []
+        number = 0
+        while len(numbers) < len(groups):
+            number += 1
+            if number not in finalized_numbers:
+                numbers.append(number)
+
+        target = {
+            entry.pk: (heat_number, bib_number)
+            for heat_number, group in zip(numbers, groups, strict=True)
+            for bib_number, entry in enumerate(group, start=1)
+        }
+        entries_by_pk = {entry.pk: entry for entry in entries}
+
+        # 組を削除した後などで既存の組番号は 1..N の連番とは限らない
+        existing_numbers = set(heat_numbers.values())
+        used_numbers = set(numbers)
+        diff = {
+            'race': race,
+            'heats_to_create': [n for n in numbers if n not in existing_numbers],
+            'heats_to_delete': [heat for heat in heats if heat.heat_number not in used_numbers],
+            'create': [],
+            'update': [],
+            'delete': [],
+            'unchanged': 0,
+        }
+        for entry_id, assignment in current.items():
+            position = target.get(entry_id)
+            if position is None:
+                diff['delete'].append(assignment)
+            elif position != (heat_numbers[assignment.heat_id], assignment.bib_number):
+                diff['update'].append((assignment, *position))
+            else:
+                diff['unchanged'] += 1
+        for entry_id, position in target.items():
+            if entry_id not in current:
+                diff['create'].append((entries_by_pk[entry_id], *position))
+        return diff
+
+    @classmethod
+    def _merge_into_existing(cls, groups, assignments, heat_numbers, entries, capacity=None):
+        """
+        既存の配置を維持したまま対象エントリーの増減を反映した組編成
+
+        新しいエントリーは目標の組編成で入るはずの組に、申告タイム順の位置で挿入する。
+        その組が定員（capacity）に達していれば次の組へ、最後の組も満員なら新しい組に入れる。
+        既存の配置は動かさない（手動調整で定員を超えている組もそのまま）。空になった組は詰める。
+        """
+        eligible = {entry.pk for entry in entries}
+        target_heat = {
+            entry.pk: heat_number
+            for heat_number, group in enumerate(groups, start=1)
+            for entry in group
+        }
+
+        layout = defaultdict(list)
+        placed = set()
+        for assignment in assignments:
+            if assignment.entry_id in eligible:
+                layout[heat_numbers[assignment.heat_id]].append(assignment.entry)
+                placed.add(assignment.entry_id)
+
+        for entry in entries:
+            if entry.pk in placed:
+                continue
+            number = target_heat[entry.pk]
+            while capacity and len(layout[number]) >= capacity:
+                number += 1
+            members = layout[number]
+            index = next(
+                (i for i, member in enumerate(members) if member.declared_time > entry.declared_time),
+                len(members)
+            )
+            members.insert(index, entry)
+
+        return [layout[number] for number in sorted(layout) if layout[number]]
+
+    @classmethod
+    def summarize(cls, diff):
+        """差分の件数（プレビュー表示用）"""
+        return {
+            'heats_created': len(diff['heats_to_create']),
+            'heats_deleted': len(diff['heats_to_delete']),
+            'created': len(diff['create']),
+            'updated': len(diff['update']),
+            'deleted': len(diff['delete']),
+            'unchanged': diff['unchanged'],
+        }
+
+    @classmethod
+    @transaction.atomic
+    def apply(cls, diff):
+        """
+        差分を適用
+
+        Returns:
+            dict: summarize() と同じ形式の件数
+        """
+        race = diff['race']
+
+        if diff['delete']:
+            HeatAssignment.objects.filter(pk__in=[a.pk for a in diff['delete']]).delete()
+
+        heats_by_number = {heat.heat_number: heat for heat in Heat.objects.filter(race=race)}
+        if diff['heats_to_create']:
+            for heat in Heat.objects.bulk_create([
+                Heat(race=race, heat_number=number) for number in diff['heats_to_create']
+            ]):
+                heats_by_number[heat.heat_number] = heat
+
+        moves = []
+        for assignment, heat_number, bib_number in diff['update']:
+            assignment.heat = heats_by_number[heat_number]
+            assignment.bib_number = bib_number
+            moves.append(assignment)
+        HeatGenerator.save_positions(moves)
+
+        if diff['create']:
+            HeatAssignment.objects.bulk_create([
+                HeatAssignment(heat=heats_by_number[heat_number], entry=entry, bib_number=bib_number)
+                for entry, heat_number, bib_number in diff['create']
+            ])
+
+        if diff['heats_to_delete']:
+            Heat.objects.filter(pk__in=[heat.pk for heat in diff['heats_to_delete']]).delete()
+
+        # 組構成の変更と同じトランザクションで点呼カウンターの版番号を進める
+        CheckinCounterStore.invalidate(race.competition_id)
+
+        return cls.summarize(diff)
+
+    @classmethod
+    def regenerate(cls, race, dry_run=False, **options):
+        """
+        差分計画を作成し、dry_run でなければ適用
+
+        Returns:
+            (dict, dict): (差分, 件数)
+        """
+        diff = cls.plan(race, **options)
+        if dry_run:
+            return diff, cls.summarize(diff)
+        return diff, cls.apply(diff)
@@ -0,0 +1,40 @@
+"""
+点呼カウンター整合性チェックコマンド
+
+使用方法:
+    python manage.py check_checkin_counters              # ずれの検出のみ
+    python manage.py check_checkin_counters --repair     # ずれがあれば再構築
+    python manage.py check_checkin_counters --competition 3
+"""
+from django.core.management.base import BaseCommand
+
+from competitions.models import Competition
+from heats.checkin import CheckinCounterStore
+
+
+class Command(BaseCommand):
+    help = 'キャッシュ上の点呼カウンターとHeatAssignmentの集計値を比較し、ずれを修復します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--competition', type=int, help='対象の大会ID（省略時は公開中の全大会）')
+        parser.add_argument('--repair', action='store_true', help='ずれがあればカウンターを再構築する')
+
+    def handle(self, *args, **options):
+        competitions = Competition.objects.all()
+        if options['competition']:
+            competitions = competitions.filter(pk=options['competition'])
+        else:
+            competitions = competitions.filter(is_published=True)
+
+        for competition in competitions:
+            drifted = CheckinCounterStore.verify(competition, repair=options['repair'])
+            if not drifted:
+                self.stdout.write(f'{competition.name}: OK')
+            elif options['repair']:
+                self.stdout.write(self.style.WARNING(
+                    f'{competition.name}: {len(drifted)}組のずれを修復しました'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f'{competition.name}: {len(drifted)}組でずれを検出しました (--repair で修復)'
+                ))
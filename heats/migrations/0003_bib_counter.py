@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('competitions', '0009_race_seeding_strategy'),
+        ('heats', '0002_heatassignment_race_bib_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BibCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gender', models.CharField(choices=[('M', '男子'), ('F', '女子'), ('X', '混合')], max_length=1, verbose_name='性別区分')),
+                ('is_ncg', models.BooleanField(default=False, verbose_name='NCG')),
+                ('last_number', models.PositiveIntegerField(default=0, verbose_name='払い出し済みの最大番号')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('competition', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bib_counters', to='competitions.competition', verbose_name='大会')),
+            ],
+            options={
+                'verbose_name': 'ゼッケン採番状況',
+                'verbose_name_plural': 'ゼッケン採番状況',
+                'unique_together': {('competition', 'gender', 'is_ncg')},
+            },
+        ),
+    ]
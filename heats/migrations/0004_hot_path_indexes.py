@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('heats', '0003_bib_counter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='heatassignment',
+            index=models.Index(fields=['heat', 'checked_in', 'status'], name='assignment_checkin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='heatassignment',
+            index=models.Index(condition=models.Q(('checked_in', False), models.Q(('status', 'dns'), _negated=True)), fields=['heat', 'bib_number'], name='assignment_unchecked_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_versions(apps, schema_editor):
+    """既存の大会の版番号を作成"""
+    Competition = apps.get_model('competitions', 'Competition')
+    CheckinVersion = apps.get_model('heats', 'CheckinVersion')
+    CheckinVersion.objects.bulk_create([
+        CheckinVersion(competition_id=pk) for pk in Competition.objects.values_list('pk', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('competitions', '0010_race_entry_counters'),
+        ('heats', '0004_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckinVersion',
+            fields=[
+                ('competition', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='checkin_version', serialize=False, to='competitions.competition', verbose_name='大会')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='版番号')),
+            ],
+            options={
+                'verbose_name': '点呼状況の版番号',
+                'verbose_name_plural': '点呼状況の版番号',
+            },
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
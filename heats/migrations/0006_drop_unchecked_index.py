@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 05:37
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('heats', '0005_checkin_version'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='heatassignment',
+            name='assignment_unchecked_idx',
+        ),
+    ]
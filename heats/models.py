@@ -1,10 +1,15 @@
 """
 番組編成モデル
 """
+from collections import defaultdict
+
 from auditlog.registry import auditlog
-from django.db import models, transaction
+from django.db import connection, models, transaction
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 
-from competitions.models import Race
+from competitions.models import Competition, Race
+from entries.counters import EntryCounter
 from entries.models import Entry
 
 
@@ -102,24 +107,81 @@ class HeatAssignment(models.Model):
             ['heat', 'bib_number'],
             ['heat', 'entry'],
         ]
+        indexes = [
+            # 組ごとの点呼集計（CheckinAggregator.annotate_heats）を表を読まずに行う
+            # （未点呼選手リストは unique_together の (heat, bib_number) のインデックスを使う）
+            models.Index(fields=['heat', 'checked_in', 'status'], name='assignment_checkin_idx'),
+        ]
     
     def __str__(self):
         return f"{self.heat} - {self.bib_number}番 {self.entry.athlete.full_name}"
 
 
+class BibCounter(models.Model):
+    """
+    ゼッケン番号の採番状況
+    大会・区分（性別・NCG）ごとに払い出し済みの最大番号を保持する
+    """
+    competition = models.ForeignKey(
+        Competition,
+        on_delete=models.CASCADE,
+        related_name='bib_counters',
+        verbose_name='大会'
+    )
+    gender = models.CharField('性別区分', max_length=1, choices=Race.GENDER_CHOICES)
+    is_ncg = models.BooleanField('NCG', default=False)
+    last_number = models.PositiveIntegerField('払い出し済みの最大番号', default=0)
+    
+    updated_at = models.DateTimeField('更新日時', auto_now=True)
+    
+    class Meta:
+        verbose_name = 'ゼッケン採番状況'
+        verbose_name_plural = 'ゼッケン採番状況'
+        unique_together = ['competition', 'gender', 'is_ncg']
+    
+    def __str__(self):
+        return f"{self.competition.name} {BibNumberGenerator.category_label(self.gender, self.is_ncg)}: {self.last_number}"
+
+
+class CheckinVersion(models.Model):
+    """
+    点呼状況の版番号
+    大会ごとに点呼・DNS・組構成の変更と同じトランザクションで進める（CheckinCounterStore が使用）
+    """
+    competition = models.OneToOneField(
+        Competition,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='checkin_version',
+        verbose_name='大会'
+    )
+    version = models.PositiveBigIntegerField('版番号', default=0)
+    
+    class Meta:
+        verbose_name = '点呼状況の版番号'
+        verbose_name_plural = '点呼状況の版番号'
+    
+    def __str__(self):
+        return f"{self.competition.name}: v{self.version}"
+
+
 class HeatGenerator:
     """
     自動番組編成ロジック
     """
     
+    # 腰ナンバーの入れ替え時に一時的に退避させるオフセット（unique_together の衝突回避）
+    TEMP_BIB_OFFSET = 100000
+    
     @classmethod
     @transaction.atomic
-    def generate_heats(cls, race, force_regenerate=False, include_pending=False, num_heats=None):
+    def generate_heats(cls, race, force_regenerate=False, include_pending=False, num_heats=None, strategy=None):
         """
         種目の組分けを自動生成
         
         1. 種目ごとにエントリーを「申告タイム順」にソート
         2. 設定された「1組あたりの最大人数」または指定された組数で自動分割
+           （分け方は種目の組分け方式 Race.seeding_strategy に従う）
         3. 組番号・腰ナンバー（レーン番号）を自動付与
         
         Args:
@@ -127,6 +189,7 @@ class HeatGenerator:
             force_regenerate: 既存の未確定組を削除して再生成するか
             include_pending: 入金待ちのエントリーも含めるか（締切後の組編成用）
             num_heats: 組数を指定（None の場合は定員から自動計算）
+            strategy: シード方式（None の場合は種目の設定）
         
         Returns:
             list: 生成した Heat オブジェクトのリスト
@@ -136,56 +199,72 @@ class HeatGenerator:
             # 既存のHeatAssignmentも削除される（CASCADE）
             Heat.objects.filter(race=race, is_finalized=False).delete()
         
-        # エントリーを取得（ステータスでフィルタ）
-        if include_pending:
-            # 入金待ち・確定の両方を含める
-            statuses = ['pending', 'payment_uploaded', 'confirmed']
-        else:
-            # 確定済みのみ
-            statuses = ['confirmed']
-        
-        entries = list(Entry.objects.filter(
-            race=race,
-            status__in=statuses
-        ).order_by('declared_time'))  # タイム順（速い順）
+        entries = cls.target_entries(race, include_pending)
         
         if not entries:
             return []
         
-        # 組数と1組あたりの人数を計算
-        total_entries = len(entries)
-        
-        if num_heats:
-            # 組数が指定されている場合
-            capacity = (total_entries + num_heats - 1) // num_heats  # 切り上げ
-        else:
-            # 組定員から自動計算
-            capacity = race.heat_capacity
-            num_heats = (total_entries + capacity - 1) // capacity  # 切り上げ
+        groups = cls.split_entries(entries, race.heat_capacity, num_heats, strategy or race.seeding_strategy)
         
         # 組を一括作成（bulk_create最適化）
         heats_to_create = [
             Heat(race=race, heat_number=i + 1)
-            for i in range(num_heats)
+            for i in range(len(groups))
         ]
         heats = Heat.objects.bulk_create(heats_to_create)
         
         # 組編成を一括作成（bulk_create最適化）
-        assignments_to_create = []
-        for i, entry in enumerate(entries):
-            heat_index = i // capacity
-            bib_number = (i % capacity) + 1
-            assignments_to_create.append(
-                HeatAssignment(
-                    heat=heats[heat_index],
-                    entry=entry,
-                    bib_number=bib_number
-                )
-            )
+        assignments_to_create = [
+            HeatAssignment(heat=heat, entry=entry, bib_number=bib_number)
+            for heat, group in zip(heats, groups, strict=True)
+            for bib_number, entry in enumerate(group, start=1)
+        ]
         HeatAssignment.objects.bulk_create(assignments_to_create)
         
         return heats
     
+    @classmethod
+    def target_entries(cls, race, include_pending=False):
+        """
+        組編成の対象エントリーを申告タイム順（速い順）に取得
+        
+        Args:
+            race: 対象種目
+            include_pending: 入金待ちのエントリーも含めるか
+        """
+        if include_pending:
+            # 入金待ち・確定の両方を含める
+            statuses = ['pending', 'payment_uploaded', 'confirmed']
+        else:
+            # 確定済みのみ
+            statuses = ['confirmed']
+        
+        # organization_id は団体分散のシード方式で使用
+        return list(Entry.objects.filter(
+            race=race,
+            status__in=statuses
+        ).annotate(
+            organization_id=models.F('athlete__organization_id')
+        ).order_by('declared_time', 'pk'))
+    
+    @classmethod
+    def split_entries(cls, entries, heat_capacity, num_heats=None, strategy=None):
+        """
+        タイム順のエントリーを組ごとに分割
+        
+        Args:
+            entries: 申告タイム順（速い順）のエントリー
+            heat_capacity: 1組あたりの定員
+            num_heats: 組数を指定（None の場合は定員から自動計算）
+            strategy: シード方式（heats.seeding.STRATEGIES、None の場合はタイム順）
+        
+        Returns:
+            list[list]: 組ごとのエントリー（リスト内の順が腰ナンバー順）
+        """
+        from . import seeding
+        
+        return seeding.split(entries, heat_capacity, num_heats, strategy)
+    
     @classmethod
     @transaction.atomic
     def move_entry(cls, assignment, target_heat, new_bib_number=None):
@@ -193,24 +272,20 @@ class HeatGenerator:
         選手を別の組に移動
         
         手動調整用（PM配置や大学ごとのバラつき調整）
+        new_bib_number を指定した場合はその位置に挿入し、以降の選手を1つずつ後ろにずらす。
         """
-        old_heat = assignment.heat
+        members = list(HeatAssignment.objects.filter(
+            heat=target_heat
+        ).exclude(pk=assignment.pk).order_by('bib_number').values_list('pk', flat=True))
         
-        # 新しい腰ナンバーを計算
         if new_bib_number is None:
-            max_bib = HeatAssignment.objects.filter(heat=target_heat).aggregate(
-                models.Max('bib_number')
-            )['bib_number__max'] or 0
-            new_bib_number = max_bib + 1
-        
-        # 移動
-        assignment.heat = target_heat
-        assignment.bib_number = new_bib_number
-        assignment.save()
-        
-        # 元の組の腰ナンバーを詰める
-        cls.reorder_bib_numbers(old_heat)
+            position = len(members)
+        else:
+            position = min(max(new_bib_number - 1, 0), len(members))
+        members.insert(position, assignment.pk)
         
+        cls.apply_ordering({target_heat.pk: members})
+        assignment.refresh_from_db()
         return assignment
     
     @classmethod
@@ -222,8 +297,94 @@ class HeatGenerator:
             if assignment.bib_number != i:
                 assignment.bib_number = i
                 updates.append(assignment)
-        if updates:
-            HeatAssignment.objects.bulk_update(updates, ['bib_number'])
+        cls.save_positions(updates)
+    
+    @classmethod
+    @transaction.atomic
+    def apply_ordering(cls, orderings):
+        """
+        組ごとの並び順を一括反映（ドラッグ&ドロップでの並べ替え・組移動用）
+        
+        指定した組の選手全員の並び順を受け取り、腰ナンバーを1からの連番にする。
+        他の組から移ってきた選手の元の組は腰ナンバーを詰める。
+        
+        Args:
+            orderings: {組ID: [組編成ID, ...]}（リストの順が腰ナンバー順）
+        
+        Returns:
+            int: 組・腰ナンバーを変更した組編成の件数
+        
+        Raises:
+            ValueError: 組・組編成が存在しない、確定済み、別種目、指定漏れ・重複がある場合
+        """
+        orderings = {int(heat_id): [int(pk) for pk in pks] for heat_id, pks in orderings.items()}
+        assignment_ids = [pk for pks in orderings.values() for pk in pks]
+        if len(assignment_ids) != len(set(assignment_ids)):
+            raise ValueError('同じ選手が複数回指定されています')
+        
+        heats = {heat.pk: heat for heat in Heat.objects.select_for_update().filter(pk__in=list(orderings))}
+        if len(heats) != len(orderings):
+            raise ValueError('組が見つかりません')
+        
+        assignments = {
+            a.pk: a for a in HeatAssignment.objects.select_for_update().filter(
+                models.Q(pk__in=assignment_ids) | models.Q(heat_id__in=list(heats))
+            ).select_related('heat').order_by('bib_number')
+        }
+        missing = set(assignment_ids) - set(assignments)
+        if missing:
+            raise ValueError('組編成が見つかりません')
+        
+        source_heats = {a.heat_id: a.heat for a in assignments.values()}
+        involved = {**source_heats, **heats}
+        if any(heat.is_finalized for heat in involved.values()):
+            raise ValueError('確定済みの組は変更できません')
+        if len({heat.race_id for heat in involved.values()}) > 1:
+            raise ValueError('異なる種目の組は同時に変更できません')
+        
+        listed = set(assignment_ids)
+        if any(a.heat_id in heats and a.pk not in listed for a in assignments.values()):
+            raise ValueError('組の選手がすべて指定されていません')
+        
+        # 元の組（指定外）の残りの選手は腰ナンバーを詰める
+        remaining = defaultdict(list)
+        for assignment in HeatAssignment.objects.filter(
+            heat_id__in=set(source_heats) - set(heats)
+        ).exclude(pk__in=listed).order_by('bib_number'):
+            remaining[assignment.heat_id].append(assignment)
+        
+        updates = []
+        for heat_id, members in [
+            *((heat_id, [assignments[pk] for pk in pks]) for heat_id, pks in orderings.items()),
+            *remaining.items(),
+        ]:
+            for bib_number, assignment in enumerate(members, start=1):
+                if assignment.heat_id != heat_id or assignment.bib_number != bib_number:
+                    assignment.heat_id = heat_id
+                    assignment.bib_number = bib_number
+                    updates.append(assignment)
+        
+        cls.save_positions(updates)
+        return len(updates)
+    
+    @classmethod
+    def save_positions(cls, assignments):
+        """
+        組・腰ナンバーを変更した組編成を一括保存
+        
+        (組, 腰ナンバー) の一意制約は行ごとに検査されるため、入れ替えの途中で重複しないよう
+        対象の腰ナンバーを一度オフセット分ずらしてから最終値を書き込む（2クエリ）。
+        """
+        if not assignments:
+            return
+        # update() / bulk_update() は auto_now を更新しないため明示する（帳票キャッシュの指紋に使用）
+        now = timezone.now()
+        HeatAssignment.objects.filter(pk__in=[a.pk for a in assignments]).update(
+            bib_number=models.F('bib_number') + cls.TEMP_BIB_OFFSET
+        )
+        for assignment in assignments:
+            assignment.updated_at = now
+        HeatAssignment.objects.bulk_update(assignments, ['heat', 'bib_number', 'updated_at'])
     
     @classmethod
     @transaction.atomic
@@ -266,7 +427,8 @@ class HeatGenerator:
         # 一括更新で最適化（ループ内save()を排除）
         if overflow_entries:
             overflow_pks = [e.pk for e in overflow_entries]
-            Entry.objects.filter(pk__in=overflow_pks).update(
+            EntryCounter.update(
+                Entry.objects.filter(pk__in=overflow_pks),
                 original_ncg_race=ncg_race,
                 moved_from_ncg=True,
                 race=fallback_race
@@ -291,77 +453,19 @@ class HeatGenerator:
         2. 一般種目の組分けを生成
         3. NCG種目の組分けを生成
         
+        対象エントリーの読み込み・組分け・書き込みは大会単位でまとめて行う
+        （heats.generation.CompetitionHeatGenerator）。
+        
         Args:
             competition: 大会オブジェクト
             force_regenerate: 既存の組を削除して再生成するか
         
         Returns:
-            dict: 処理結果
+            dict: 処理結果（'timings' にフェーズ別の所要秒数）
         """
-        from competitions.models import Race
-        
-        results = {
-            'ncg_processed': [],
-            'heats_generated': [],
-            'errors': [],
-        }
-        
-        # 1. NCG種目を先に処理
-        ncg_races = Race.objects.filter(
-            competition=competition,
-            is_ncg=True,
-            is_active=True
-        )
+        from .generation import CompetitionHeatGenerator
         
-        for ncg_race in ncg_races:
-            try:
-                ncg_result = cls.process_ncg_entries(ncg_race)
-                results['ncg_processed'].append({
-                    'race': ncg_race.name,
-                    'ncg_count': ncg_result['ncg_count'],
-                    'moved_count': ncg_result['moved_count'],
-                })
-            except Exception as e:
-                results['errors'].append({
-                    'race': ncg_race.name,
-                    'error': str(e),
-                })
-        
-        # 2. 一般種目の組分けを生成
-        general_races = Race.objects.filter(
-            competition=competition,
-            is_ncg=False,
-            is_active=True
-        )
-        
-        for race in general_races:
-            try:
-                heats = cls.generate_heats(race, force_regenerate=force_regenerate)
-                results['heats_generated'].append({
-                    'race': race.name,
-                    'heat_count': len(heats),
-                })
-            except Exception as e:
-                results['errors'].append({
-                    'race': race.name,
-                    'error': str(e),
-                })
-        
-        # 3. NCG種目の組分けを生成
-        for ncg_race in ncg_races:
-            try:
-                heats = cls.generate_heats(ncg_race, force_regenerate=force_regenerate)
-                results['heats_generated'].append({
-                    'race': ncg_race.name,
-                    'heat_count': len(heats),
-                })
-            except Exception as e:
-                results['errors'].append({
-                    'race': ncg_race.name,
-                    'error': str(e),
-                })
-        
-        return results
+        return CompetitionHeatGenerator.run(competition, force_regenerate=force_regenerate)
 
 
 class BibNumberGenerator:
@@ -374,6 +478,9 @@ class BibNumberGenerator:
     - 一般男子: 1000〜1999
     - 一般女子: 2000〜2999
     - 腰ナンバー: 各組で1から連番
+    
+    assign_bib_numbers() は全員を振り直し、assign_new_bib_numbers() は未採番の組編成だけに
+    BibCounter の続きから番号を払い出す（印刷済みのゼッケンは変わらない）。
     """
     
     # ゼッケン番号の開始番号
@@ -386,11 +493,21 @@ class BibNumberGenerator:
         ('X', False): 3500,  # 一般混合
     }
     
+    # BIB_RANGES にない区分の開始番号
+    DEFAULT_BIB_START = 4000
+    
+    # PostgreSQL 以外で1回の executemany に含める件数
+    UPDATE_CHUNK_SIZE = 1000
+    
     @classmethod
     @transaction.atomic
     def assign_bib_numbers(cls, competition):
         """
-        大会全体のゼッケン番号を採番（bulk_update最適化）
+        大会全体のゼッケン番号を採番
+        
+        区分（性別・NCG）ごとに 種目の表示順 → 組番号 → 腰ナンバー の順で連番を振る。
+        PostgreSQL では ROW_NUMBER() による1回の UPDATE、それ以外のデータベースでは
+        ウィンドウ関数で番号を計算して件数ごとに更新する。
         
         Args:
             competition: 大会オブジェクト
@@ -398,62 +515,267 @@ class BibNumberGenerator:
         Returns:
             dict: 採番結果
         """
-        from competitions.models import Race
+        # 追加分の採番（assign_new_bib_numbers）と同時に走らないようカウンターをロック
+        counters = cls._lock_counters(competition)
         
-        results = {
-            'assigned': [],
-            'errors': [],
+        if connection.vendor == 'postgresql':
+            cls._assign_with_update(competition)
+        else:
+            cls._assign_chunked(competition)
+        
+        return {
+            'assigned': cls.assigned_ranges(competition),
+            'errors': cls._reset_counters(competition, counters),
         }
+    
+    @classmethod
+    def _numbering_filter(cls, competition):
+        return models.Q(heat__race__competition=competition, heat__race__is_active=True)
+    
+    @classmethod
+    def _assign_with_update(cls, competition):
+        """ROW_NUMBER() で番号を計算し、変更のある行だけを1文で更新（PostgreSQL）"""
+        qn = connection.ops.quote_name
+        cases = ' '.join('WHEN r.gender = %s AND r.is_ncg = %s THEN %s' for _ in cls.BIB_RANGES)
+        params = [
+            value
+            for (gender, is_ncg), start in cls.BIB_RANGES.items()
+            for value in (gender, is_ncg, start)
+        ]
+        sql = f"""
+            UPDATE {qn(HeatAssignment._meta.db_table)} AS target
+            SET race_bib_number = numbered.bib, updated_at = %s
+            FROM (
+                SELECT a.id,
+                       (CASE {cases} ELSE %s END) - 1 + ROW_NUMBER() OVER (
+                           PARTITION BY r.gender, r.is_ncg
+                           ORDER BY r.display_order, r.id, h.heat_number, a.bib_number
+                       ) AS bib
+                FROM {qn(HeatAssignment._meta.db_table)} AS a
+                JOIN {qn(Heat._meta.db_table)} AS h ON h.id = a.heat_id
+                JOIN {qn(Race._meta.db_table)} AS r ON r.id = h.race_id
+                WHERE r.competition_id = %s AND r.is_active
+            ) AS numbered
+            WHERE target.id = numbered.id
+              AND target.race_bib_number IS DISTINCT FROM numbered.bib
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [timezone.now(), *params, cls.DEFAULT_BIB_START, competition.pk])
+            return cursor.rowcount
+    
+    @classmethod
+    def _assign_chunked(cls, competition):
+        """ウィンドウ関数で番号を計算し、変更のある行だけを件数ごとに更新"""
+        rows = HeatAssignment.objects.filter(cls._numbering_filter(competition)).annotate(
+            position=models.Window(
+                RowNumber(),
+                partition_by=[models.F('heat__race__gender'), models.F('heat__race__is_ncg')],
+                order_by=[
+                    models.F('heat__race__display_order').asc(),
+                    models.F('heat__race_id').asc(),
+                    models.F('heat__heat_number').asc(),
+                    models.F('bib_number').asc(),
+                ],
+            )
+        ).values_list('pk', 'heat__race__gender', 'heat__race__is_ncg', 'position', 'race_bib_number')
         
-        # カウンター初期化
-        counters = dict(cls.BIB_RANGES)
+        updates = []
+        for pk, gender, is_ncg, position, current in rows:
+            bib = cls.BIB_RANGES.get((gender, is_ncg), cls.DEFAULT_BIB_START) + position - 1
+            if bib != current:
+                updates.append((bib, pk))
         
-        # 種目を取得（NCG → 一般の順、タイム順）
-        races = Race.objects.filter(
-            competition=competition,
-            is_active=True
-        ).order_by('-is_ncg', 'display_order')
+        cls._write_numbers(updates)
+        return len(updates)
+    
+    @classmethod
+    def _write_numbers(cls, updates):
+        """
+        (ゼッケン番号, 組編成ID) のリストを件数ごとに書き込む
         
-        # 全ての更新を収集
-        all_updates = []
+        bulk_update は行ごとに CASE 式を組み立てるため、単純な UPDATE を executemany で流す。
+        帳票キャッシュの指紋が変わるよう updated_at も更新する。
+        """
+        qn = connection.ops.quote_name
+        sql = f'UPDATE {qn(HeatAssignment._meta.db_table)} SET race_bib_number = %s, updated_at = %s WHERE id = %s'
+        now = timezone.now()
+        rows = [(bib, now, pk) for bib, pk in updates]
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), cls.UPDATE_CHUNK_SIZE):
+                cursor.executemany(sql, rows[start:start + cls.UPDATE_CHUNK_SIZE])
+    
+    @classmethod
+    def assigned_ranges(cls, competition):
+        """種目ごとの採番済みゼッケン番号の範囲（NCG → 一般、表示順）"""
+        ranges = HeatAssignment.objects.filter(
+            cls._numbering_filter(competition), race_bib_number__isnull=False
+        ).values('heat__race_id', 'heat__race__name').annotate(
+            start_bib=models.Min('race_bib_number'),
+            end_bib=models.Max('race_bib_number'),
+        ).order_by('-heat__race__is_ncg', 'heat__race__display_order', 'heat__race_id')
+        
+        return [
+            {'race': row['heat__race__name'], 'start_bib': row['start_bib'], 'end_bib': row['end_bib']}
+            for row in ranges
+        ]
+    
+    @classmethod
+    def bib_range(cls, gender, is_ncg):
+        """
+        区分のゼッケン番号の範囲
         
-        for race in races:
-            key = (race.gender, race.is_ncg)
-            current_bib = counters.get(key, 4000)
-            start_bib = current_bib
-            
-            # 組ごとに処理
-            heats = race.heats.order_by('heat_number').prefetch_related('assignments')
-            
-            for heat in heats:
-                assignments = list(heat.assignments.order_by('bib_number'))
-                
-                for assignment in assignments:
-                    # ゼッケン番号を更新
-                    assignment.race_bib_number = current_bib
-                    all_updates.append(assignment)
-                    current_bib += 1
+        Returns:
+            (int, int or None): (開始番号, 終了番号)。終了は次の区分の開始番号の1つ前（上限なしは None）
+        """
+        start = cls.BIB_RANGES.get((gender, is_ncg), cls.DEFAULT_BIB_START)
+        later = [n for n in (*cls.BIB_RANGES.values(), cls.DEFAULT_BIB_START) if n > start]
+        return start, (min(later) - 1 if later else None)
+    
+    @classmethod
+    def category_label(cls, gender, is_ncg):
+        """区分の表示名（例: NCG男子、一般女子）"""
+        return f"{'NCG' if is_ncg else '一般'}{dict(Race.GENDER_CHOICES).get(gender, gender)}"
+    
+    @classmethod
+    def _category_max(cls, competition, active_only=False):
+        """区分ごとの使用済み最大番号 {(性別, NCG): 番号}"""
+        queryset = HeatAssignment.objects.filter(
+            heat__race__competition=competition, race_bib_number__isnull=False
+        )
+        if active_only:
+            queryset = queryset.filter(heat__race__is_active=True)
+        return {
+            (row['heat__race__gender'], row['heat__race__is_ncg']): row['last']
+            for row in queryset.values('heat__race__gender', 'heat__race__is_ncg').annotate(
+                last=models.Max('race_bib_number')
+            ).order_by()
+        }
+    
+    @classmethod
+    def _reset_counters(cls, competition, counters):
+        """
+        全体採番の結果をロック済みのカウンター（_lock_counters() の戻り値）に反映し、
+        範囲を超えた区分をエラーとして返す
+        
+        行を削除して作り直すと、ロック待ちの assign_new_bib_numbers が存在しない行を
+        読むことになるため、既存の行をその場で更新する。
+        """
+        used = cls._category_max(competition, active_only=True)
+        
+        errors = []
+        for (gender, is_ncg), last in used.items():
+            _, end = cls.bib_range(gender, is_ncg)
+            if end is not None and last > end:
+                errors.append(
+                    f'{cls.category_label(gender, is_ncg)}のゼッケン番号が上限（{end}）を超えています'
+                    f'（{last}まで使用）'
+                )
+        
+        # 有効な種目で番号を使っていない区分は、無効な種目を含む最大値（なければ開始番号の1つ前）から
+        fallback = cls._category_max(competition) if set(counters) - set(used) else {}
+        for (gender, is_ncg), counter in counters.items():
+            counter.last_number = used.get(
+                (gender, is_ncg),
+                fallback.get((gender, is_ncg), cls.bib_range(gender, is_ncg)[0] - 1),
+            )
+        BibCounter.objects.bulk_update(counters.values(), ['last_number'])
+        return errors
+    
+    @classmethod
+    def _lock_counters(cls, competition):
+        """
+        有効な種目の全区分のカウンターを用意してロック
+        
+        未作成の区分は既存の番号の最大値（なければ開始番号の1つ前）から始める。
+        
+        Returns:
+            dict: {(性別, NCG): BibCounter}
+        """
+        categories = set(Race.objects.filter(
+            competition=competition, is_active=True
+        ).values_list('gender', 'is_ncg').distinct())
+        existing = set(BibCounter.objects.filter(
+            competition=competition
+        ).values_list('gender', 'is_ncg'))
+        
+        missing = categories - existing
+        if missing:
+            used = cls._category_max(competition)
+            BibCounter.objects.bulk_create([
+                BibCounter(
+                    competition=competition, gender=gender, is_ncg=is_ncg,
+                    last_number=used.get((gender, is_ncg), cls.bib_range(gender, is_ncg)[0] - 1),
+                )
+                for gender, is_ncg in missing
+            ], ignore_conflicts=True)
+        
+        return {
+            (counter.gender, counter.is_ncg): counter
+            for counter in BibCounter.objects.select_for_update().filter(competition=competition)
+        }
+    
+    @classmethod
+    @transaction.atomic
+    def assign_new_bib_numbers(cls, competition):
+        """
+        ゼッケン番号が未採番の組編成だけに番号を払い出す（締切後の追加分など）
+        
+        既存の番号は変更せず、区分ごとのカウンターの続きから 表示順 → 組番号 → 腰ナンバー の順に振る。
+        カウンターを select_for_update でロックしてから未採番の組編成を読むため、
+        同時に実行しても番号は重複しない。範囲を超える区分は採番せずエラーとして返す。
+        
+        Args:
+            competition: 大会オブジェクト
+        
+        Returns:
+            dict: {'assigned': [{'race', 'start_bib', 'end_bib', 'count'}], 'errors': [...]}
+        """
+        counters = cls._lock_counters(competition)
+        
+        pending = HeatAssignment.objects.filter(
+            heat__race__competition=competition,
+            heat__race__is_active=True,
+            race_bib_number__isnull=True,
+        ).order_by(
+            'heat__race__display_order', 'heat__race_id', 'heat__heat_number', 'bib_number'
+        ).values_list('pk', 'heat__race__name', 'heat__race__gender', 'heat__race__is_ncg')
+        
+        by_category = defaultdict(list)
+        for pk, race_name, gender, is_ncg in pending:
+            by_category[gender, is_ncg].append((pk, race_name))
+        
+        results = {'assigned': [], 'errors': []}
+        updates = []
+        for key, rows in by_category.items():
+            counter = counters[key]
+            _, end = cls.bib_range(*key)
+            last = counter.last_number + len(rows)
+            if end is not None and last > end:
+                results['errors'].append(
+                    f'{cls.category_label(*key)}のゼッケン番号が上限（{end}）を超えるため採番できません'
+                    f'（{len(rows)}名中 {last - end}名分不足）'
+                )
+                continue
             
-            # カウンター更新
-            counters[key] = current_bib
+            ranges = {}
+            for number, (pk, race_name) in enumerate(rows, start=counter.last_number + 1):
+                updates.append((number, pk))
+                ranges.setdefault(race_name, [number, number])[1] = number
+            results['assigned'].extend(
+                {'race': race_name, 'start_bib': first, 'end_bib': final, 'count': final - first + 1}
+                for race_name, (first, final) in ranges.items()
+            )
             
-            if current_bib > start_bib:
-                results['assigned'].append({
-                    'race': race.name,
-                    'start_bib': start_bib,
-                    'end_bib': current_bib - 1,
-                })
-        
-        # 一括更新
-        if all_updates:
-            HeatAssignment.objects.bulk_update(all_updates, ['race_bib_number'])
+            counter.last_number = last
+            counter.save(update_fields=['last_number', 'updated_at'])
         
+        cls._write_numbers(updates)
         return results
     
     @classmethod
     def get_next_bib_number(cls, race):
         """
-        次のゼッケン番号を取得
+        次のゼッケン番号を取得（払い出しは行わない）
         
         Args:
             race: 種目オブジェクト
@@ -461,19 +783,18 @@ class BibNumberGenerator:
         Returns:
             int: 次のゼッケン番号
         """
-        key = (race.gender, race.is_ncg)
-        base_number = cls.BIB_RANGES.get(key, 4000)
-        
-        # 既に割り当て済みの最大番号を取得
-        max_bib = HeatAssignment.objects.filter(
-            heat__race=race,
-            race_bib_number__isnull=False
-        ).aggregate(models.Max('race_bib_number'))['race_bib_number__max']
-        
-        if max_bib is None:
-            return base_number
-        
-        return max_bib + 1
+        last_number = BibCounter.objects.filter(
+            competition_id=race.competition_id, gender=race.gender, is_ncg=race.is_ncg
+        ).values_list('last_number', flat=True).first()
+        
+        if last_number is None:
+            # カウンター作成前は既存の番号から求める
+            used = cls._category_max(race.competition).get((race.gender, race.is_ncg))
+            if used is None:
+                return cls.bib_range(race.gender, race.is_ncg)[0]
+            return used + 1
+        
+        return last_number + 1
 
 
 # django-auditlog登録
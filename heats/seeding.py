@@ -0,0 +1,147 @@
+"""
+組分けのシード方式
+
+申告タイム順（速い順）に並んだエントリーを組ごとのリストに分割する。
+どの方式も組内の並び（腰ナンバー順）は申告タイム順で、計算量はエントリー数に比例する
+（団体分散も各選手について近傍の組だけを調べる）。
+
+方式（Race.SEEDING_CHOICES と対応）:
+    time         : タイム順に定員ずつ区切る（1組が最速、端数は最終組）
+    fastest_last : タイム順に区切り、最速の組を最後に走らせる（端数は1組）
+    even         : タイム順のまま各組の人数を均等にする（差は最大1名）
+    serpentine   : 蛇行配分（1→N組、N→1組の順に1名ずつ）で各組の走力をそろえる
+    organization : 人数均等のタイム順を基本に、同じ団体の選手を前後の組へ分散させる
+"""
+from collections import defaultdict
+
+DEFAULT_STRATEGY = 'time'
+
+
+def heat_count(total, heat_capacity, num_heats=None):
+    """組数（指定がなければ定員から切り上げで計算）"""
+    if num_heats:
+        return min(num_heats, total)
+    return (total + heat_capacity - 1) // heat_capacity
+
+
+def even_sizes(total, num_heats):
+    """人数均等の組ごとの人数（多い組が先）"""
+    base, extra = divmod(total, num_heats)
+    return [base + 1] * extra + [base] * (num_heats - extra)
+
+
+def _slice(entries, sizes):
+    groups = []
+    start = 0
+    for size in sizes:
+        groups.append(entries[start:start + size])
+        start += size
+    return groups
+
+
+def seed_time(entries, heat_capacity, num_heats=None):
+    """タイム順に定員ずつ区切る"""
+    if num_heats:
+        # 組数が指定されている場合は1組あたりの人数を切り上げで計算
+        heat_capacity = (len(entries) + num_heats - 1) // num_heats
+    return [entries[i:i + heat_capacity] for i in range(0, len(entries), heat_capacity)]
+
+
+def seed_fastest_last(entries, heat_capacity, num_heats=None):
+    """最速の組を最終組にする"""
+    return seed_time(entries, heat_capacity, num_heats)[::-1]
+
+
+def seed_even(entries, heat_capacity, num_heats=None):
+    """タイム順のまま人数を均等にする"""
+    count = heat_count(len(entries), heat_capacity, num_heats)
+    return _slice(entries, even_sizes(len(entries), count))
+
+
+def seed_serpentine(entries, heat_capacity, num_heats=None):
+    """蛇行配分"""
+    count = heat_count(len(entries), heat_capacity, num_heats)
+    groups = [[] for _ in range(count)]
+    for i, entry in enumerate(entries):
+        lap, position = divmod(i, count)
+        groups[position if lap % 2 == 0 else count - 1 - position].append(entry)
+    return groups
+
+
+def seed_organization(entries, heat_capacity, num_heats=None, organization_of=None):
+    """
+    団体分散
+
+    人数均等のタイム順で入るはずの組（基準組）とその前後の組のうち、空きがあり
+    同じ団体の選手が最も少ない組に入れる（同数なら基準組に近い組）。
+    前後の組が埋まっている場合は空きのある最も近い組に入れる。
+
+    Args:
+        organization_of: エントリーから団体IDを返す関数（None の団体は分散の対象外）
+    """
+    if organization_of is None:
+        organization_of = _organization_id
+
+    total = len(entries)
+    count = heat_count(total, heat_capacity, num_heats)
+    sizes = even_sizes(total, count)
+    home = [number for number, size in enumerate(sizes) for _ in range(size)]
+
+    groups = [[] for _ in range(count)]
+    remaining = list(sizes)
+    same_org = defaultdict(int)  # (組, 団体) -> 人数
+
+    for entry, base in zip(entries, home, strict=True):
+        organization = organization_of(entry)
+        nearby = [h for h in (base, base - 1, base + 1) if 0 <= h < count and remaining[h]]
+        if nearby:
+            if organization is None:
+                heat = nearby[0]
+            else:
+                heat = min(nearby, key=lambda h: (same_org[h, organization], abs(h - base)))
+        else:
+            heat = min((h for h in range(count) if remaining[h]), key=lambda h: abs(h - base))
+
+        groups[heat].append(entry)
+        remaining[heat] -= 1
+        if organization is not None:
+            same_org[heat, organization] += 1
+    return groups
+
+
+def _organization_id(entry):
+    """エントリーの団体ID（組編成用の読み込みで付与した値、なければ選手から取得）"""
+    if hasattr(entry, 'organization_id'):
+        return entry.organization_id
+    return entry.athlete.organization_id
+
+
+STRATEGIES = {
+    'time': seed_time,
+    'fastest_last': seed_fastest_last,
+    'even': seed_even,
+    'serpentine': seed_serpentine,
+    'organization': seed_organization,
+}
+
+
+def split(entries, heat_capacity, num_heats=None, strategy=None):
+    """
+    申告タイム順のエントリーを指定の方式で組に分割
+
+    Args:
+        entries: 申告タイム順（速い順）のエントリー
+        heat_capacity: 1組あたりの定員
+        num_heats: 組数を指定（None の場合は定員から自動計算）
+        strategy: シード方式（None の場合は DEFAULT_STRATEGY）
+
+    Returns:
+        list[list]: 組ごとのエントリー（リスト内の順が腰ナンバー順、空の組は含まない）
+    """
+    if not entries:
+        return []
+    try:
+        seed = STRATEGIES[strategy or DEFAULT_STRATEGY]
+    except KeyError:
+        raise ValueError(f'不明なシード方式です: {strategy}') from None
+    return [group for group in seed(list(entries), heat_capacity, num_heats) if group]
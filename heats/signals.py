@@ -0,0 +1,44 @@
+"""
+番組編成シグナル - 組・種目の構成変更時に点呼カウンターを破棄（変更と同じトランザクションで版番号を進める）
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from competitions.models import Competition, Race
+
+from .checkin import CheckinCounterStore
+from .models import CheckinVersion, Heat
+
+
+@receiver(post_save, sender=Competition)
+def create_checkin_version(sender, instance, created, **kwargs):
+    """大会の作成時に点呼状況の版番号を作成"""
+    if created:
+        CheckinVersion.objects.create(competition=instance)
+
+
+@receiver(post_save, sender=Heat)
+def invalidate_checkin_on_heat_save(sender, instance, **kwargs):
+    """組の保存（確定・確定解除・インライン編集）"""
+    competition_id = Race.objects.filter(pk=instance.race_id).values_list(
+        'competition_id', flat=True
+    ).first()
+    CheckinCounterStore.invalidate(competition_id)
+
+
+@receiver(post_delete, sender=Heat)
+def invalidate_checkin_on_heat_delete(sender, instance, **kwargs):
+    """確定済み組の削除（未確定の組は点呼集計の対象外）"""
+    if not instance.is_finalized:
+        return
+    competition_id = Race.objects.filter(pk=instance.race_id).values_list(
+        'competition_id', flat=True
+    ).first()
+    CheckinCounterStore.invalidate(competition_id)
+
+
+@receiver(post_save, sender=Race)
+@receiver(post_delete, sender=Race)
+def invalidate_checkin_on_race_change(sender, instance, **kwargs):
+    """種目の変更（名称・有効フラグ・表示順）"""
+    CheckinCounterStore.invalidate(instance.competition_id)
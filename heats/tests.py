@@ -1,6 +1,9 @@
 """
 heats アプリのテスト
 """
+import asyncio
+import json
+import sqlite3
 from decimal import Decimal
 
 import pytest
@@ -9,6 +12,33 @@ from entries.models import Entry
 from heats.models import Heat, HeatAssignment, HeatGenerator
 
 
+def create_entries(race, organization, user, count, base_time=850):
+    """申告タイムが10秒刻みの確定エントリーを作成"""
+    from datetime import date
+
+    from accounts.models import Athlete
+
+    entries = []
+    for i in range(count):
+        athlete = Athlete.objects.create(
+            organization=organization,
+            last_name=f'{race.pk}選手{base_time + i}',
+            first_name='太郎',
+            last_name_kana=f'センシュ{i}',
+            first_name_kana='タロウ',
+            gender='M',
+            birth_date=date(2000, 1, 1),
+        )
+        entries.append(Entry.objects.create(
+            athlete=athlete,
+            race=race,
+            registered_by=user,
+            declared_time=Decimal(str(base_time + i * 10)),
+            status='confirmed',
+        ))
+    return entries
+
+
 class TestHeatModel:
     """組モデルのテスト"""
     
@@ -365,6 +395,697 @@ class TestNCGLogic:
         assert '移動先一般種目が設定されていません' in str(excinfo.value)
 
 
+class TestCompetitionHeatGenerator:
+    """大会単位の組編成（一括処理）のテスト"""
+
+    def _ncg_pair(self, competition):
+        from competitions.models import Race
+
+        general_race = Race.objects.create(
+            competition=competition, name='男子10000m', distance=10000, gender='M', heat_capacity=3,
+        )
+        ncg_race = Race.objects.create(
+            competition=competition, name='男子10000m NCG', distance=10000, gender='M',
+            heat_capacity=30, is_ncg=True, ncg_capacity=2, fallback_race=general_race,
+            standard_time=Decimal('1800.00'),
+        )
+        return ncg_race, general_race
+
+    def test_ncg_overflow_and_heats_in_one_pass(self, db, competition, organization, normal_user):
+        """NCG定員超過分を一般種目に移してから組分けする"""
+        ncg_race, general_race = self._ncg_pair(competition)
+        ncg_entries = create_entries(ncg_race, organization, normal_user, 4, base_time=800)
+        general_entries = create_entries(general_race, organization, normal_user, 2, base_time=815)
+
+        result = HeatGenerator.generate_heats_with_ncg(competition)
+
+        assert result['errors'] == []
+        assert result['ncg_processed'] == [{'race': '男子10000m NCG', 'ncg_count': 2, 'moved_count': 2}]
+        assert set(result['timings']) == {'load', 'ncg', 'plan', 'write', 'total'}
+
+        # NCG: 上位2名で1組
+        ncg_heat = Heat.objects.get(race=ncg_race)
+        assert [a.entry_id for a in ncg_heat.assignments.order_by('bib_number')] == [
+            ncg_entries[0].pk, ncg_entries[1].pk,
+        ]
+
+        # 一般: 移動してきた2名を含めてタイム順に3名ずつ
+        # 815, 820(NCG), 825 / 830(NCG)
+        heats = list(Heat.objects.filter(race=general_race).order_by('heat_number'))
+        assert len(heats) == 2
+        assert [a.entry_id for a in heats[0].assignments.order_by('bib_number')] == [
+            general_entries[0].pk, ncg_entries[2].pk, general_entries[1].pk,
+        ]
+        assert [a.entry_id for a in heats[1].assignments.order_by('bib_number')] == [
+            ncg_entries[3].pk,
+        ]
+        assert Entry.objects.filter(race=general_race, moved_from_ncg=True).count() == 2
+
+    def test_existing_heats_require_force(self, db, competition, race, organization, normal_user):
+        """既存の組がある種目は強制再生成を指定した場合のみ作り直す"""
+        create_entries(race, organization, normal_user, 3)
+        HeatGenerator.generate_heats(race)
+
+        result = HeatGenerator.generate_heats_with_ncg(competition)
+        assert [e['race'] for e in result['errors']] == [race.name]
+        assert Heat.objects.filter(race=race).count() == 1
+
+        result = HeatGenerator.generate_heats_with_ncg(competition, force_regenerate=True)
+        assert result['errors'] == []
+        assert HeatAssignment.objects.filter(heat__race=race).count() == 3
+
+    def test_finalized_heats_are_kept(self, db, competition, race, organization, normal_user):
+        """確定済みの組がある種目は再生成しない"""
+        create_entries(race, organization, normal_user, 3)
+        heat = HeatGenerator.generate_heats(race)[0]
+        heat.is_finalized = True
+        heat.save()
+
+        result = HeatGenerator.generate_heats_with_ncg(competition, force_regenerate=True)
+
+        assert '確定済み' in result['errors'][0]['error']
+        assert list(Heat.objects.filter(race=race)) == [heat]
+
+    def test_query_count_independent_of_race_count(self, db, competition, organization, normal_user):
+        """クエリ数は種目数に比例しない"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from competitions.models import Race
+
+        for distance in (1500, 3000, 5000, 10000):
+            race = Race.objects.create(competition=competition, distance=distance, gender='M', heat_capacity=2)
+            create_entries(race, organization, normal_user, 5)
+
+        with CaptureQueriesContext(connection) as queries:
+            result = HeatGenerator.generate_heats_with_ncg(competition, force_regenerate=True)
+
+        assert sum(h['heat_count'] for h in result['heats_generated']) == 12
+        assert HeatAssignment.objects.count() == 20
+        # 種目・既存組・エントリーの読み込み、削除、組と組編成の一括作成（SAVEPOINT等を含む）
+        assert len(queries) <= 12
+
+
+
+class TestHeatPlanner:
+    """組編成の差分計画・適用のテスト"""
+
+    def _layout(self, race):
+        """{エントリーID: (組番号, 腰ナンバー)}"""
+        return {
+            a.entry_id: (a.heat.heat_number, a.bib_number)
+            for a in HeatAssignment.objects.filter(heat__race=race).select_related('heat')
+        }
+
+    def test_initial_plan_matches_generate_heats(self, db, race, organization, normal_user):
+        """組がない状態からの適用は generate_heats と同じ編成になる"""
+        from heats.generation import HeatPlanner
+
+        race.heat_capacity = 2
+        race.save()
+        entries = create_entries(race, organization, normal_user, 5)
+
+        diff, summary = HeatPlanner.regenerate(race)
+
+        assert summary['created'] == 5
+        assert summary['heats_created'] == 3
+        assert self._layout(race) == {
+            entries[0].pk: (1, 1), entries[1].pk: (1, 2),
+            entries[2].pk: (2, 1), entries[3].pk: (2, 2),
+            entries[4].pk: (3, 1),
+        }
+
+    def test_regenerate_without_changes_is_noop(self, db, race, organization, normal_user):
+        """変更がなければ何も書き込まずIDも維持される"""
+        from heats.generation import HeatPlanner
+
+        create_entries(race, organization, normal_user, 3)
+        heats = HeatGenerator.generate_heats(race)
+        assignment_ids = set(HeatAssignment.objects.values_list('pk', flat=True))
+
+        _, summary = HeatPlanner.regenerate(race)
+
+        assert summary == {
+            'heats_created': 0, 'heats_deleted': 0,
+            'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': 3,
+        }
+        assert list(Heat.objects.filter(race=race)) == heats
+        assert set(HeatAssignment.objects.values_list('pk', flat=True)) == assignment_ids
+
+    def test_dry_run_does_not_write(self, db, race, organization, normal_user):
+        """dry_run では差分を返すだけ"""
+        from heats.generation import HeatPlanner
+
+        create_entries(race, organization, normal_user, 3)
+
+        diff, summary = HeatPlanner.regenerate(race, dry_run=True)
+
+        assert summary['created'] == 3
+        assert diff['create'][0][1:] == (1, 1)
+        assert not Heat.objects.filter(race=race).exists()
+
+    def test_rebuild_restores_time_order(self, db, race, organization, normal_user):
+        """再生成は手動の並べ替えをタイム順に戻す（腰ナンバーの入れ替えでも制約違反にならない）"""
+        from heats.generation import HeatPlanner
+
+        race.heat_capacity = 2
+        race.save()
+        entries = create_entries(race, organization, normal_user, 4)
+        HeatGenerator.generate_heats(race)
+        expected = self._layout(race)
+
+        first = HeatAssignment.objects.get(entry=entries[0])
+        HeatGenerator.move_entry(first, Heat.objects.get(race=race, heat_number=2))
+        assert self._layout(race) != expected
+
+        _, summary = HeatPlanner.regenerate(race)
+
+        assert summary['created'] == summary['deleted'] == 0
+        assert self._layout(race) == expected
+
+    def test_late_entry_keeps_manual_adjustments(self, db, race, organization, normal_user):
+        """差分更新では手動調整を残し、締切間際の追加分だけを反映する"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from heats.generation import HeatPlanner
+
+        race.heat_capacity = 3
+        race.save()
+        entries = create_entries(race, organization, normal_user, 6)
+        HeatGenerator.generate_heats(race)
+
+        # 最速の選手を2組（880, 890, 900）の末尾に手動で移動
+        first = HeatAssignment.objects.get(entry=entries[0])
+        HeatGenerator.move_entry(first, Heat.objects.get(race=race, heat_number=2))
+
+        late = create_entries(race, organization, normal_user, 1, base_time=875)[0]
+        with CaptureQueriesContext(connection) as queries:
+            _, summary = HeatPlanner.regenerate(race, keep_existing=True)
+
+        layout = self._layout(race)
+        assert summary['created'] == 1
+        assert summary['deleted'] == 0
+        # 手動で移動した選手は2組のまま（定員を超えていても既存の配置は動かさない）
+        assert layout[entries[0].pk] == (2, 4)
+        # 875秒は目標編成で2組だが、2組は定員（3名）に達しているため新しい3組に入る
+        assert layout[late.pk] == (3, 1)
+        assert summary['heats_created'] == 1
+        # 1組は変更なし
+        assert layout[entries[1].pk] == (1, 1)
+        assert layout[entries[2].pk] == (1, 2)
+        assert len(queries) <= 12
+
+    def test_late_entries_respect_heat_capacity(self, db, race, organization, normal_user):
+        """差分更新で追加した選手が定員を超える場合は次の組・新しい組に入る"""
+        from django.db.models import Count
+
+        from heats.generation import HeatPlanner
+
+        race.heat_capacity = 2
+        race.save()
+        entries = create_entries(race, organization, normal_user, 4)
+        HeatGenerator.generate_heats(race)
+
+        late = create_entries(race, organization, normal_user, 3, base_time=851)
+        _, summary = HeatPlanner.regenerate(race, keep_existing=True)
+
+        layout = self._layout(race)
+        sizes = Heat.objects.filter(race=race).annotate(size=Count('assignments'))
+        assert max(heat.size for heat in sizes) == 2
+        assert summary['created'] == 3
+        # 既存の配置は動かない
+        assert [layout[entry.pk] for entry in entries] == [(1, 1), (1, 2), (2, 1), (2, 2)]
+        assert {layout[entry.pk][0] for entry in late} == {3, 4}
+
+    def test_regenerate_with_gap_in_heat_numbers(self, db, race, organization, normal_user):
+        """組番号に欠番がある（組を削除した）種目も再生成できる"""
+        from heats.generation import HeatPlanner
+
+        race.heat_capacity = 2
+        race.save()
+        entries = create_entries(race, organization, normal_user, 6)
+        HeatGenerator.generate_heats(race)
+        Heat.objects.get(race=race, heat_number=2).delete()
+
+        diff, summary = HeatPlanner.regenerate(race)
+
+        assert diff['heats_to_create'] == [2]
+        assert summary['heats_deleted'] == 0
+        assert list(Heat.objects.filter(race=race).values_list('heat_number', flat=True)) == [1, 2, 3]
+        assert self._layout(race) == {
+            entry.pk: (i // 2 + 1, i % 2 + 1) for i, entry in enumerate(entries)
+        }
+
+    def test_withdrawn_entry_is_removed(self, db, race, organization, normal_user):
+        """対象外になったエントリーは削除され、腰ナンバーが詰められる"""
+        from heats.generation import HeatPlanner
+
+        entries = create_entries(race, organization, normal_user, 3)
+        HeatGenerator.generate_heats(race)
+        entries[0].status = 'cancelled'
+        entries[0].save()
+
+        _, summary = HeatPlanner.regenerate(race, keep_existing=True)
+
+        assert summary['deleted'] == 1
+        assert self._layout(race) == {entries[1].pk: (1, 1), entries[2].pk: (1, 2)}
+
+    def test_finalized_heat_blocks_plan(self, db, race, organization, normal_user):
+        """確定済みの組がある種目は計画できない"""
+        from heats.generation import HeatPlanner
+
+        create_entries(race, organization, normal_user, 1)
+        heat = HeatGenerator.generate_heats(race)[0]
+        heat.is_finalized = True
+        heat.save()
+
+        with pytest.raises(ValueError):
+            HeatPlanner.plan(race)
+
+    def test_force_keeps_finalized_heats(self, db, race, organization, normal_user):
+        """force では確定済みの組と選手を残し、残りの選手で未確定の組を再生成する"""
+        from heats.generation import HeatPlanner
+
+        race.heat_capacity = 2
+        race.save()
+        entries = create_entries(race, organization, normal_user, 6)
+        HeatGenerator.generate_heats(race)
+        finalized = Heat.objects.get(race=race, heat_number=2)
+        finalized.is_finalized = True
+        finalized.save()
+        # 1組の選手を確定済みの2組へ移し、2組の選手を未確定の組に戻す
+        HeatAssignment.objects.filter(entry=entries[0]).update(heat=finalized, bib_number=3)
+        HeatAssignment.objects.filter(entry=entries[2]).delete()
+
+        diff, summary = HeatPlanner.regenerate(race, force=True)
+
+        layout = self._layout(race)
+        assert layout[entries[0].pk] == (2, 3)
+        assert layout[entries[3].pk] == (2, 2)
+        # 残り4名は確定済みの2組を飛ばして1組・3組に入る
+        assert layout[entries[1].pk] == (1, 1)
+        assert layout[entries[2].pk] == (1, 2)
+        assert layout[entries[4].pk] == (3, 1)
+        assert layout[entries[5].pk] == (3, 2)
+        assert summary['heats_created'] == summary['heats_deleted'] == 0
+        assert Heat.objects.get(pk=finalized.pk).is_finalized
+
+    def test_force_renumbers_around_finalized_heat(self, db, race, organization, normal_user):
+        """未確定の組数が変わっても確定済みの組番号とは重ならない"""
+        from heats.generation import HeatPlanner
+
+        race.heat_capacity = 2
+        race.save()
+        entries = create_entries(race, organization, normal_user, 4)
+        HeatGenerator.generate_heats(race)
+        Heat.objects.filter(race=race, heat_number=1).update(is_finalized=True)
+        late = create_entries(race, organization, normal_user, 2, base_time=950)
+
+        diff, summary = HeatPlanner.regenerate(race, force=True)
+
+        assert diff['heats_to_create'] == [3]
+        assert list(Heat.objects.filter(race=race).values_list('heat_number', flat=True)) == [1, 2, 3]
+        layout = self._layout(race)
+        assert [layout[entry.pk] for entry in entries] == [(1, 1), (1, 2), (2, 1), (2, 2)]
+        assert [layout[entry.pk] for entry in late] == [(3, 1), (3, 2)]
+
+    def test_apply_bumps_checkin_version(self, db, race, organization, normal_user):
+        """適用と同じトランザクションで点呼カウンターの版番号を進める"""
+        from heats.checkin import CheckinCounterStore
+        from heats.generation import HeatPlanner
+
+        create_entries(race, organization, normal_user, 2)
+        version = CheckinCounterStore.get_version(race.competition_id)
+
+        HeatPlanner.regenerate(race, dry_run=True)
+        assert CheckinCounterStore.get_version(race.competition_id) == version
+
+        HeatPlanner.regenerate(race)
+        assert CheckinCounterStore.get_version(race.competition_id) > version
+
+    def test_force_view(self, db, race, organization, normal_user, client_admin):
+        """確定済みの組がある種目は force=true でだけ再生成できる"""
+        create_entries(race, organization, normal_user, 2)
+        heat = HeatGenerator.generate_heats(race)[0]
+        heat.is_finalized = True
+        heat.save()
+        create_entries(race, organization, normal_user, 1, base_time=950)
+        url = f'/heats/race/{race.pk}/generate/'
+
+        response = client_admin.post(url, follow=True)
+        assert '確定済みの組があるため再生成できません' in response.content.decode()
+        assert Heat.objects.filter(race=race).count() == 1
+
+        response = client_admin.post(url, {'force': 'true'}, follow=True)
+        assert '追加1名' in response.content.decode()
+        assert list(Heat.objects.filter(race=race).values_list('heat_number', 'is_finalized')) == [
+            (1, True), (2, False),
+        ]
+
+    def test_preview_view(self, db, race, organization, normal_user, client_admin):
+        """プレビューは件数を表示するだけで反映しない"""
+        create_entries(race, organization, normal_user, 2)
+
+        response = client_admin.post(f'/heats/race/{race.pk}/generate/', {'preview': 'true'}, follow=True)
+
+        assert 'プレビュー（未反映）: 追加2名' in response.content.decode()
+        assert not Heat.objects.filter(race=race).exists()
+
+
+class TestSeeding:
+    """組分けのシード方式のテスト"""
+
+    def _entries(self, count, organizations=None):
+        from types import SimpleNamespace
+
+        return [
+            SimpleNamespace(
+                pk=i,
+                declared_time=Decimal(800 + i),
+                organization_id=organizations[i] if organizations else None,
+            )
+            for i in range(count)
+        ]
+
+    def _pks(self, groups):
+        return [[e.pk for e in group] for group in groups]
+
+    def test_time(self):
+        """タイム順に定員ずつ区切る（従来の組分け）"""
+        from heats import seeding
+
+        assert self._pks(seeding.split(self._entries(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+        assert self._pks(seeding.split(self._entries(7), 40, num_heats=2)) == [[0, 1, 2, 3], [4, 5, 6]]
+
+    def test_fastest_last(self):
+        """最速の組が最終組"""
+        from heats import seeding
+
+        groups = seeding.split(self._entries(7), 3, strategy='fastest_last')
+        assert self._pks(groups) == [[6], [3, 4, 5], [0, 1, 2]]
+
+    def test_even(self):
+        """人数の差は最大1名"""
+        from heats import seeding
+
+        groups = seeding.split(self._entries(7), 3, strategy='even')
+        assert self._pks(groups) == [[0, 1, 2], [3, 4], [5, 6]]
+
+    def test_serpentine(self):
+        """1→N、N→1 の順に配分"""
+        from heats import seeding
+
+        groups = seeding.split(self._entries(7), 3, strategy='serpentine')
+        assert self._pks(groups) == [[0, 5, 6], [1, 4], [2, 3]]
+
+    def test_organization_spread(self):
+        """同じ団体の選手が前後の組に分散する"""
+        from heats import seeding
+
+        # 上位6名のうち4名が団体1
+        organizations = [1, 1, 1, 1, 2, 3, 4, 5, 6]
+        groups = seeding.split(self._entries(9, organizations), 3, strategy='organization')
+
+        assert sorted(len(g) for g in groups) == [3, 3, 3]
+        per_heat = [sum(1 for e in group if e.organization_id == 1) for group in groups]
+        assert max(per_heat) == 2
+        # 組内は申告タイム順
+        for group in groups:
+            assert [e.pk for e in group] == sorted(e.pk for e in group)
+
+    def test_organization_spread_is_linear(self):
+        """数千件でも近傍の組だけを調べるため高速"""
+        import time
+
+        from heats import seeding
+
+        entries = self._entries(5000, [i % 37 for i in range(5000)])
+        started = time.perf_counter()
+        groups = seeding.split(entries, 40, strategy='organization')
+        assert time.perf_counter() - started < 1.0
+        assert sum(len(g) for g in groups) == 5000
+        assert max(len(g) for g in groups) <= 40
+
+    def test_unknown_strategy(self):
+        """未定義の方式はエラー"""
+        from heats import seeding
+
+        with pytest.raises(ValueError):
+            seeding.split(self._entries(3), 2, strategy='random')
+
+    def test_race_setting_is_used(self, db, race, organization, normal_user):
+        """種目の組分け方式で generate_heats の振り分けが変わる"""
+        race.heat_capacity = 2
+        race.seeding_strategy = 'serpentine'
+        race.save()
+        entries = create_entries(race, organization, normal_user, 4)
+
+        heats = HeatGenerator.generate_heats(race)
+
+        assert [
+            list(heat.assignments.order_by('bib_number').values_list('entry_id', flat=True))
+            for heat in heats
+        ] == [[entries[0].pk, entries[3].pk], [entries[1].pk, entries[2].pk]]
+
+
+class TestBatchReorder:
+    """組の並び順の一括反映のテスト"""
+
+    def _heats(self, race, organization, user, count=6):
+        race.heat_capacity = 3
+        race.save()
+        create_entries(race, organization, user, count)
+        return HeatGenerator.generate_heats(race)
+
+    def _order(self, heat):
+        return list(heat.assignments.order_by('bib_number').values_list('pk', 'bib_number'))
+
+    def test_reverse_heat_in_one_transaction(self, db, race, organization, normal_user):
+        """組内の並びを逆順にしても一意制約に違反しない"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        heat = self._heats(race, organization, normal_user)[0]
+        pks = [pk for pk, _ in self._order(heat)]
+
+        with CaptureQueriesContext(connection) as queries:
+            updated = HeatGenerator.apply_ordering({heat.pk: pks[::-1]})
+
+        assert updated == 2  # 真ん中の選手は変更なし
+        assert self._order(heat) == [(pk, i) for i, pk in enumerate(pks[::-1], start=1)]
+        assert len(queries) <= 10
+
+    def test_move_between_heats_compacts_source(self, db, race, organization, normal_user):
+        """指定していない元の組は腰ナンバーが詰められる"""
+        first, second = self._heats(race, organization, normal_user)
+        first_pks = [pk for pk, _ in self._order(first)]
+        second_pks = [pk for pk, _ in self._order(second)]
+
+        HeatGenerator.apply_ordering({second.pk: [first_pks[0], *second_pks]})
+
+        assert self._order(second) == [(pk, i) for i, pk in enumerate([first_pks[0], *second_pks], start=1)]
+        assert self._order(first) == [(first_pks[1], 1), (first_pks[2], 2)]
+
+    def test_move_entry_inserts_at_position(self, db, race, organization, normal_user):
+        """腰ナンバーを指定した移動は以降の選手を後ろにずらす"""
+        first, second = self._heats(race, organization, normal_user)
+        first_pks = [pk for pk, _ in self._order(first)]
+        second_pks = [pk for pk, _ in self._order(second)]
+
+        assignment = HeatAssignment.objects.get(pk=first_pks[2])
+        HeatGenerator.move_entry(assignment, second, new_bib_number=1)
+
+        assert assignment.heat == second
+        assert assignment.bib_number == 1
+        assert self._order(second) == [(pk, i) for i, pk in enumerate([first_pks[2], *second_pks], start=1)]
+
+    def test_incomplete_ordering_is_rejected(self, db, race, organization, normal_user):
+        """組の選手が欠けている指定は反映しない"""
+        heat = self._heats(race, organization, normal_user)[0]
+        before = self._order(heat)
+        pks = [pk for pk, _ in before]
+
+        with pytest.raises(ValueError, match='すべて指定されていません'):
+            HeatGenerator.apply_ordering({heat.pk: pks[:2][::-1]})
+        with pytest.raises(ValueError, match='複数回'):
+            HeatGenerator.apply_ordering({heat.pk: [pks[0], *pks]})
+        assert self._order(heat) == before
+
+    def test_finalized_heat_is_rejected(self, db, race, organization, normal_user):
+        """確定済みの組は変更できない"""
+        first, second = self._heats(race, organization, normal_user)
+        first.is_finalized = True
+        first.save()
+        moved = self._order(first)[0][0]
+
+        with pytest.raises(ValueError, match='確定済み'):
+            HeatGenerator.apply_ordering({second.pk: [moved, *[pk for pk, _ in self._order(second)]]})
+
+    def test_reorder_view(self, db, race, organization, normal_user, client_admin):
+        """JSONで複数組の並び順をまとめて反映"""
+        first, second = self._heats(race, organization, normal_user)
+        first_pks = [pk for pk, _ in self._order(first)]
+        second_pks = [pk for pk, _ in self._order(second)]
+
+        response = client_admin.post('/heats/reorder/', data=json.dumps({'heats': [
+            {'heat_id': first.pk, 'assignment_ids': [second_pks[0], *first_pks[1:]]},
+            {'heat_id': second.pk, 'assignment_ids': [first_pks[0], *second_pks[1:]]},
+        ]}), content_type='application/json')
+
+        assert response.json() == {'success': True, 'updated': 2}
+        assert self._order(first)[0] == (second_pks[0], 1)
+        assert self._order(second)[0] == (first_pks[0], 1)
+
+        response = client_admin.post('/heats/reorder/', data='{"heats": 1}', content_type='application/json')
+        assert response.status_code == 400
+
+
+class TestBibNumberGenerator:
+    """ゼッケン番号採番のテスト"""
+
+    def _races(self, competition, organization, user):
+        from competitions.models import Race
+
+        races = {}
+        for order, (gender, is_ncg) in enumerate([('M', False), ('F', True), ('M', True), ('M', False)]):
+            race = Race.objects.create(
+                competition=competition, name=f'種目{order}', distance=5000, gender=gender,
+                is_ncg=is_ncg, display_order=order, heat_capacity=2,
+            )
+            create_entries(race, organization, user, 3, base_time=800 + order * 100)
+            HeatGenerator.generate_heats(race)
+            races[order] = race
+        return races
+
+    def _bibs(self, race):
+        return list(HeatAssignment.objects.filter(heat__race=race).order_by(
+            'heat__heat_number', 'bib_number'
+        ).values_list('race_bib_number', flat=True))
+
+    def test_ranges_per_category(self, db, competition, organization, normal_user):
+        """区分ごとに開始番号から表示順・組・腰ナンバー順で連番"""
+        from heats.models import BibNumberGenerator
+
+        races = self._races(competition, organization, normal_user)
+
+        result = BibNumberGenerator.assign_bib_numbers(competition)
+
+        assert self._bibs(races[0]) == [1000, 1001, 1002]
+        assert self._bibs(races[3]) == [1003, 1004, 1005]  # 一般男子は種目をまたいで連番
+        assert self._bibs(races[1]) == [500, 501, 502]
+        assert self._bibs(races[2]) == [1, 2, 3]
+        assert result['assigned'] == [
+            {'race': '種目1', 'start_bib': 500, 'end_bib': 502},
+            {'race': '種目2', 'start_bib': 1, 'end_bib': 3},
+            {'race': '種目0', 'start_bib': 1000, 'end_bib': 1002},
+            {'race': '種目3', 'start_bib': 1003, 'end_bib': 1005},
+        ]
+
+    def test_rerun_updates_only_changed_rows(self, db, competition, organization, normal_user):
+        """再採番では番号が変わる行だけを更新する"""
+        from heats.models import BibNumberGenerator
+
+        races = self._races(competition, organization, normal_user)
+        BibNumberGenerator.assign_bib_numbers(competition)
+        assert BibNumberGenerator._assign_chunked(competition) == 0
+
+        # 1組の並びを入れ替えると2名だけ変わる
+        heat = races[0].heats.get(heat_number=1)
+        pks = list(heat.assignments.order_by('bib_number').values_list('pk', flat=True))
+        HeatGenerator.apply_ordering({heat.pk: pks[::-1]})
+        assert BibNumberGenerator._assign_chunked(competition) == 2
+
+    @pytest.mark.skipif(
+        sqlite3.sqlite_version_info < (3, 39),
+        reason='UPDATE ... FROM / IS DISTINCT FROM に対応した SQLite が必要'
+    )
+    def test_set_based_update_matches_chunked(self, db, competition, organization, normal_user):
+        """PostgreSQL 用の一括 UPDATE と件数ごとの更新で同じ番号になる"""
+        from heats.models import BibNumberGenerator
+
+        self._races(competition, organization, normal_user)
+        BibNumberGenerator._assign_chunked(competition)
+        expected = dict(HeatAssignment.objects.values_list('pk', 'race_bib_number'))
+
+        HeatAssignment.objects.update(race_bib_number=None)
+        BibNumberGenerator._assign_with_update(competition)
+
+        assert dict(HeatAssignment.objects.values_list('pk', 'race_bib_number')) == expected
+
+    def test_full_assignment_updates_counters_in_place(self, db, competition, organization, normal_user):
+        """全体採番はカウンターの行を作り直さずに更新する（ロック待ちの追加採番が行を見失わない）"""
+        from heats.models import BibCounter, BibNumberGenerator
+
+        races = self._races(competition, organization, normal_user)
+        BibNumberGenerator.assign_bib_numbers(competition)
+        counter_ids = dict(BibCounter.objects.filter(competition=competition).values_list('pk', 'last_number'))
+
+        races[0].is_active = False
+        races[0].save()
+        BibNumberGenerator.assign_bib_numbers(competition)
+
+        counters = {c.pk: c.last_number for c in BibCounter.objects.filter(competition=competition)}
+        assert set(counters) == set(counter_ids)
+        assert counters != counter_ids
+
+    def test_new_bibs_continue_from_counter(self, db, competition, organization, normal_user):
+        """追加分は既存の番号を変えずにカウンターの続きから採番"""
+        from heats.generation import HeatPlanner
+        from heats.models import BibCounter, BibNumberGenerator
+
+        races = self._races(competition, organization, normal_user)
+        BibNumberGenerator.assign_bib_numbers(competition)
+        assert BibCounter.objects.get(competition=competition, gender='M', is_ncg=False).last_number == 1005
+
+        # 一般男子の最初の種目に締切後の追加
+        late = create_entries(races[0], organization, normal_user, 1, base_time=805)[0]
+        HeatPlanner.regenerate(races[0], keep_existing=True)
+        before = dict(HeatAssignment.objects.exclude(entry=late).values_list('pk', 'race_bib_number'))
+
+        result = BibNumberGenerator.assign_new_bib_numbers(competition)
+
+        assert result == {
+            'assigned': [{'race': '種目0', 'start_bib': 1006, 'end_bib': 1006, 'count': 1}],
+            'errors': [],
+        }
+        assert HeatAssignment.objects.get(entry=late).race_bib_number == 1006
+        assert dict(HeatAssignment.objects.exclude(entry=late).values_list('pk', 'race_bib_number')) == before
+        assert BibNumberGenerator.get_next_bib_number(races[3]) == 1007
+        assert BibNumberGenerator.assign_new_bib_numbers(competition)['assigned'] == []
+
+    def test_counter_starts_from_existing_numbers(self, db, competition, organization, normal_user):
+        """カウンターがない大会では既存の番号の最大値から続ける"""
+        from heats.models import BibCounter, BibNumberGenerator
+
+        races = self._races(competition, organization, normal_user)
+        HeatAssignment.objects.filter(heat__race=races[1]).update(race_bib_number=700)
+        assert BibNumberGenerator.get_next_bib_number(races[1]) == 701
+
+        BibNumberGenerator.assign_new_bib_numbers(competition)
+
+        assert self._bibs(races[2]) == [1, 2, 3]
+        assert self._bibs(races[0]) + self._bibs(races[3]) == list(range(1000, 1006))
+        assert BibCounter.objects.get(competition=competition, gender='F', is_ncg=True).last_number == 700
+
+    def test_range_overflow_is_reported(self, db, competition, organization, normal_user, monkeypatch):
+        """区分の範囲を超える場合は採番せずエラー"""
+        from heats.models import BibCounter, BibNumberGenerator
+
+        races = self._races(competition, organization, normal_user)
+        BibCounter.objects.create(competition=competition, gender='M', is_ncg=True, last_number=498)
+
+        result = BibNumberGenerator.assign_new_bib_numbers(competition)
+
+        assert result['errors'] == ['NCG男子のゼッケン番号が上限（499）を超えるため採番できません（3名中 2名分不足）']
+        assert self._bibs(races[2]) == [None, None, None]
+        assert self._bibs(races[1]) == [500, 501, 502]
+
+        # 全体の振り直しでも範囲超過を報告する
+        monkeypatch.setattr(BibNumberGenerator, 'BIB_RANGES', {**BibNumberGenerator.BIB_RANGES, ('F', True): 3})
+        result = BibNumberGenerator.assign_bib_numbers(competition)
+        assert result['errors'] == ['NCG男子のゼッケン番号が上限（2）を超えています（3まで使用）']
+
 class TestHeatViews:
     """番組編成関連ビューのテスト"""
     
@@ -382,3 +1103,358 @@ class TestHeatViews:
         """組一覧は管理者のみ"""
         response = client_logged_in.get(f'/heats/race/{race.pk}/')
         assert response.status_code == 302
+
+
+class TestCheckinAggregator:
+    """点呼状況集計サービスのテスト"""
+    
+    def _create_heats(self, race, organization, normal_user, num_heats, per_heat, offset=0):
+        """確定済みの組と選手を作成"""
+        from datetime import date
+
+        from accounts.models import Athlete
+        
+        heats = []
+        for h in range(num_heats):
+            heat = Heat.objects.create(race=race, heat_number=offset + h + 1, is_finalized=True)
+            for b in range(per_heat):
+                athlete = Athlete.objects.create(
+                    organization=organization,
+                    last_name=f'点呼{offset + h}_{b}',
+                    first_name='太郎',
+                    last_name_kana='テンコ',
+                    first_name_kana='タロウ',
+                    gender='M',
+                    birth_date=date(2000, 1, 1),
+                )
+                entry = Entry.objects.create(
+                    athlete=athlete,
+                    race=race,
+                    registered_by=normal_user,
+                    declared_time=Decimal('900.00'),
+                    status='confirmed',
+                )
+                HeatAssignment.objects.create(heat=heat, entry=entry, bib_number=b + 1)
+            heats.append(heat)
+        return heats
+    
+    def test_competition_summary_counts(self, db, competition, race, organization, normal_user):
+        """組・種目・大会全体の集計値"""
+        from heats.checkin import CheckinAggregator
+        
+        heat = self._create_heats(race, organization, normal_user, 1, 4)[0]
+        assignments = list(heat.assignments.order_by('bib_number'))
+        assignments[0].checked_in = True
+        assignments[0].save()
+        assignments[1].status = 'dns'
+        assignments[1].save()
+        # 未確定の組は集計対象外
+        Heat.objects.create(race=race, heat_number=99)
+        
+        summary = CheckinAggregator.competition_summary(competition)
+        
+        assert len(summary['races']) == 1
+        heat_data = summary['races'][0]['heats'][0]
+        assert heat_data['heat'] == heat
+        assert heat_data['total'] == 4
+        assert heat_data['checked_in'] == 1
+        assert heat_data['dns'] == 1
+        assert heat_data['pending'] == 2
+        assert heat_data['progress'] == 25
+        assert summary['totals']['total'] == 4
+        
+        unchecked = CheckinAggregator.unchecked_by_heat([heat.pk])
+        assert [row['bib_number'] for row in unchecked[heat.pk]] == [3, 4]
+    
+    def test_query_count_flat_as_heats_grow(self, db, competition, race, organization, normal_user):
+        """組数が増えても点呼集計（DBからの再構築）のクエリ数は一定"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from heats.checkin import CheckinCounterStore
+        
+        self._create_heats(race, organization, normal_user, 2, 3)
+        with CaptureQueriesContext(connection) as small:
+            CheckinCounterStore.rebuild(competition)
+        
+        self._create_heats(race, organization, normal_user, 8, 3, offset=2)
+        with CaptureQueriesContext(connection) as large:
+            layout, _ = CheckinCounterStore.rebuild(competition)
+        assert len(layout['races'][0]['heats']) == 10
+        
+        assert len(large.captured_queries) == len(small.captured_queries)
+    
+    def test_checkin_views_render(self, db, competition, race, organization, normal_user, client_admin):
+        """ダッシュボード・統計パーシャルの表示"""
+        self._create_heats(race, organization, normal_user, 2, 2)
+        
+        response = client_admin.get(f'/heats/competition/{competition.pk}/checkin/dashboard/')
+        assert response.status_code == 200
+        
+        response = client_admin.get(f'/heats/competition/{competition.pk}/checkin/stats/')
+        assert response.status_code == 200
+        assert response.context['stats']['total'] == 4
+
+
+class TestCheckinCounterStore:
+    """点呼カウンターストアのテスト"""
+    
+    @pytest.fixture
+    def heat(self, db, race, organization, normal_user):
+        return TestCheckinAggregator()._create_heats(race, organization, normal_user, 1, 3)[0]
+    
+    def test_status_api_served_from_cache(self, competition, heat, client_admin):
+        """2回目以降の点呼APIは組編成テーブルを参照しない"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        url = f'/heats/competition/{competition.pk}/checkin/status/'
+        client_admin.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client_admin.get(url)
+        
+        assert response.json()['races'][0]['heats'][0]['total'] == 3
+        assert not any('heats_heatassignment' in q['sql'] for q in ctx.captured_queries)
+    
+    def test_status_api_not_modified(
+        self, competition, heat, client_admin, django_capture_on_commit_callbacks
+    ):
+        """版番号が変わらなければ304、点呼操作後は200"""
+        url = f'/heats/competition/{competition.pk}/checkin/status/'
+        etag = client_admin.get(url)['ETag']
+        
+        assert client_admin.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            client_admin.post(f'/heats/assignment/{heat.assignments.first().pk}/toggle/')
+        assert client_admin.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+    
+    def test_toggle_updates_counters_incrementally(
+        self, competition, heat, client_admin, django_capture_on_commit_callbacks
+    ):
+        """点呼トグル・DNSでカウンターが差分更新される"""
+        from heats.checkin import CheckinCounterStore
+        
+        CheckinCounterStore.rebuild(competition)
+        first, second = heat.assignments.order_by('bib_number')[:2]
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            client_admin.post(f'/heats/assignment/{first.pk}/toggle/')
+            client_admin.post(f'/heats/assignment/{second.pk}/dns/')
+        
+        _, counters = CheckinCounterStore.get_counters(competition)
+        counter = counters[heat.pk]
+        assert counter['checked_in'] == 1
+        assert counter['dns'] == 1
+        assert [r['bib_number'] for r in counter['unchecked']] == [3]
+        assert CheckinCounterStore.verify(competition) == []
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            client_admin.post(f'/heats/assignment/{first.pk}/toggle/')
+        
+        _, counters = CheckinCounterStore.get_counters(competition)
+        assert [r['bib_number'] for r in counters[heat.pk]['unchecked']] == [1, 3]
+        assert CheckinCounterStore.verify(competition) == []
+    
+    def test_toggle_does_not_recount(self, competition, heat, client_admin, django_capture_on_commit_callbacks):
+        """点呼後の参照は前の版の集計に差分を当てたものを使い、組編成を集計し直さない"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from heats.checkin import CheckinCounterStore
+        
+        CheckinCounterStore.rebuild(competition)
+        assignments = list(heat.assignments.order_by('bib_number'))
+        with django_capture_on_commit_callbacks(execute=True):
+            for assignment in assignments:
+                client_admin.post(f'/heats/assignment/{assignment.pk}/toggle/')
+            client_admin.post(f'/heats/assignment/{assignments[1].pk}/toggle/')
+        
+        with CaptureQueriesContext(connection) as ctx:
+            _, counters = CheckinCounterStore.get_counters(competition)
+        assert len(ctx.captured_queries) == 1  # 版番号の読み取りのみ
+        assert counters[heat.pk]['checked_in'] == 2
+        assert [r['bib_number'] for r in counters[heat.pk]['unchecked']] == [2]
+        assert CheckinCounterStore.verify(competition) == []
+    
+    def test_rebuild_skips_cache_when_version_moves(self, competition, heat, monkeypatch):
+        """集計中に版番号が進んだ場合、どの版の状態か決まらないためキャッシュしない"""
+        from django.core.cache import cache
+
+        from heats.checkin import CheckinCounterStore
+        
+        version = CheckinCounterStore.get_version(competition.pk)
+        load = CheckinCounterStore._load_from_db
+        
+        def load_then_bump(competition):
+            result = load(competition)
+            CheckinCounterStore.bump_version(competition.pk)
+            return result
+        
+        monkeypatch.setattr(CheckinCounterStore, '_load_from_db', load_then_bump)
+        CheckinCounterStore.rebuild(competition, version)
+        
+        assert cache.get(CheckinCounterStore._counters_key(competition.pk, version)) is None
+    
+    def test_verify_finds_drift_carried_over_by_toggle(
+        self, competition, heat, client_admin, django_capture_on_commit_callbacks
+    ):
+        """版番号を進めない更新のずれは点呼の差分で次の版に引き継がれ、その直後でも検出できる"""
+        from heats.checkin import CheckinCounterStore
+        
+        CheckinCounterStore.rebuild(competition)
+        first, second, _ = heat.assignments.order_by('bib_number')
+        heat.assignments.filter(pk=second.pk).update(checked_in=True)
+        with django_capture_on_commit_callbacks(execute=True):
+            client_admin.post(f'/heats/assignment/{first.pk}/toggle/')
+        
+        assert CheckinCounterStore.verify(competition, repair=True) == [heat.pk]
+        _, counters = CheckinCounterStore.get_counters(competition)
+        assert counters[heat.pk]['checked_in'] == 2
+        assert CheckinCounterStore.verify(competition) == []
+    
+    def test_verify_repairs_drift(self, competition, heat):
+        """カウンターのずれを検出・修復"""
+        from heats.checkin import CheckinCounterStore
+        
+        CheckinCounterStore.rebuild(competition)
+        # カウンターを経由しない更新でずれを発生させる
+        heat.assignments.update(checked_in=True)
+        
+        assert CheckinCounterStore.verify(competition) == [heat.pk]
+        CheckinCounterStore.verify(competition, repair=True)
+        assert CheckinCounterStore.verify(competition) == []
+        
+        _, counters = CheckinCounterStore.get_counters(competition)
+        assert counters[heat.pk]['checked_in'] == 3
+    
+    def test_late_rebuild_does_not_hide_change(self, competition, heat):
+        """点呼前の状態で集計した結果が点呼後に書き込まれても、点呼後の版には影響しない"""
+        from django.core.cache import cache
+
+        from heats.checkin import CheckinCounterStore
+        
+        version = CheckinCounterStore.get_version(competition.pk)
+        stale = CheckinCounterStore._load_from_db(competition)
+        assignment = heat.assignments.select_related('heat__race').first()
+        assignment.checked_in = True
+        CheckinCounterStore.save(assignment, False, assignment.status)
+        # 点呼前に読んだ集計が遅れてキャッシュに入る
+        cache.set(CheckinCounterStore._counters_key(competition.pk, version), stale)
+        
+        assert CheckinCounterStore.get_version(competition.pk) == version + 1
+        _, counters = CheckinCounterStore.get_counters(competition)
+        assert counters[heat.pk]['checked_in'] == 1
+        assert CheckinCounterStore.verify(competition) == []
+    
+    def test_version_rolls_back_with_change(self, competition, heat):
+        """ロールバックした点呼では版番号も進まない"""
+        from django.db import transaction
+
+        from heats.checkin import CheckinCounterStore
+        
+        version = CheckinCounterStore.get_version(competition.pk)
+        assignment = heat.assignments.select_related('heat__race').first()
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                assignment.checked_in = True
+                CheckinCounterStore.save(assignment, False, assignment.status)
+                raise RuntimeError
+        
+        assert CheckinCounterStore.get_version(competition.pk) == version
+    
+    def test_finalize_invalidates_counters(self, competition, race, heat, django_capture_on_commit_callbacks):
+        """組の確定でカウンターが再構築される"""
+        from heats.checkin import CheckinCounterStore
+        
+        CheckinCounterStore.rebuild(competition)
+        with django_capture_on_commit_callbacks(execute=True):
+            Heat.objects.create(race=race, heat_number=2, is_finalized=True)
+        
+        layout, _ = CheckinCounterStore.get_counters(competition)
+        assert len(layout['races'][0]['heats']) == 2
+
+
+class TestCheckinEvents:
+    """点呼状況プッシュ配信のテスト"""
+    
+    @pytest.fixture
+    def heat(self, db, race, organization, normal_user):
+        return TestCheckinAggregator()._create_heats(race, organization, normal_user, 2, 2)[0]
+    
+    def test_single_shot_under_wsgi(self, competition, heat, client_admin):
+        """WSGIでは1回分を返し、版番号が同じなら本文を送らない"""
+        url = f'/heats/competition/{competition.pk}/checkin/events/'
+        
+        response = client_admin.get(url)
+        assert response['Content-Type'] == 'text/event-stream'
+        body = response.content.decode()
+        assert 'event: snapshot' in body
+        event_id = body.split('id: ')[1].split('\n')[0]
+        
+        response = client_admin.get(url, HTTP_LAST_EVENT_ID=event_id)
+        assert 'event:' not in response.content.decode()
+    
+    def test_stream_sends_only_changed_heats(self, transactional_db, competition, heat, monkeypatch):
+        """版番号が進んだときに変化した組だけを送る（版番号の確認は接続が複数でも1つのタスク）"""
+        from asgiref.sync import async_to_sync, sync_to_async
+
+        from heats.checkin import CheckinCounterStore
+        from heats.events import VersionBroadcaster, stream_checkin_events
+        
+        version = CheckinCounterStore.get_version(competition.pk)
+        payload = CheckinCounterStore.status_payload(competition)
+        assignment = heat.assignments.first()
+        
+        def check_in():
+            assignment.checked_in = True
+            CheckinCounterStore.save(assignment, False, assignment.status)
+        
+        async def run():
+            streams = [stream_checkin_events(competition, version, payload) for _ in range(2)]
+            first = [await stream.__anext__() for stream in streams]
+            pending = [asyncio.ensure_future(stream.__anext__()) for stream in streams]
+            await asyncio.sleep(0.05)
+            broadcaster = VersionBroadcaster._instances[competition.pk]
+            subscribers = broadcaster.subscribers
+            await sync_to_async(check_in)()
+            events = [await event for event in pending]
+            for stream in streams:
+                await stream.aclose()
+            return first, events, subscribers, broadcaster
+        
+        monkeypatch.setattr('heats.events.POLL_INTERVAL', 0.01)
+        first, events, subscribers, broadcaster = async_to_sync(run)()
+        assert all('event: snapshot' in event for event in first)
+        assert subscribers == 2
+        assert broadcaster.subscribers == 0
+        assert competition.pk not in VersionBroadcaster._instances
+        for event in events:
+            assert 'event: heats' in event
+            data = json.loads(event.split('data: ')[1])
+            assert [h['id'] for h in data['heats']] == [heat.pk]
+            assert data['heats'][0]['checked_in'] == 1
+    
+    def test_stream_stops_on_disconnect(self, competition, heat, monkeypatch):
+        """クライアントが切断したら保持時間を待たずに終了する"""
+        from asgiref.sync import async_to_sync
+
+        from heats.checkin import CheckinCounterStore
+        from heats.events import VersionBroadcaster, stream_checkin_events
+        
+        payload = CheckinCounterStore.status_payload(competition)
+        
+        async def run():
+            disconnected = asyncio.Event()
+            stream = stream_checkin_events(competition, 0, payload, disconnected=disconnected)
+            await stream.__anext__()
+            following = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0.01)
+            disconnected.set()
+            with pytest.raises(StopAsyncIteration):
+                await asyncio.wait_for(following, timeout=1)
+        
+        # 版番号は変わらない（確認タスクは待機するだけ）
+        monkeypatch.setattr(VersionBroadcaster, '_poll', lambda self: asyncio.sleep(3600))
+        async_to_sync(run)()
+        assert competition.pk not in VersionBroadcaster._instances
@@ -14,9 +14,11 @@ urlpatterns = [
     path('<int:pk>/', views.heat_detail, name='detail'),
     path('<int:pk>/finalize/', views.finalize_heat, name='finalize'),
     path('move/', views.move_assignment, name='move'),
+    path('reorder/', views.reorder_assignments, name='reorder'),
     path('competition/<int:competition_pk>/checkin/', views.checkin_search, name='checkin_search'),
     path('competition/<int:competition_pk>/checkin/dashboard/', views.checkin_dashboard, name='checkin_dashboard'),
     path('competition/<int:competition_pk>/checkin/status/', views.checkin_status_api, name='checkin_status_api'),
+    path('competition/<int:competition_pk>/checkin/events/', views.checkin_events, name='checkin_events'),
     path('competition/<int:competition_pk>/checkin/stats/', views.checkin_stats_partial, name='checkin_stats_partial'),
     path('assignment/<int:assignment_pk>/checkin/', views.checkin, name='checkin'),
     path('assignment/<int:assignment_pk>/toggle/', views.toggle_checkin, name='toggle_checkin'),
@@ -1,17 +1,26 @@
 """
 heats ビュー
 """
+import json
+
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
 from django.db import models
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 from django.views.decorators.http import require_POST
 
 from accounts.utils import admin_required
 from competitions.models import Competition, Race
+from nitsys.conditional import make_etag, not_modified, set_validators
+from nitsys.streaming import disconnected_event
 
+from .checkin import CheckinAggregator, CheckinCounterStore
+from .events import single_shot_events, stream_checkin_events
+from .generation import HeatPlanner
 from .models import Heat, HeatAssignment, HeatGenerator
 
 
@@ -53,20 +62,35 @@ def heat_list(request, race_pk):
 @admin_required
 @require_POST
 def generate_heats(request, race_pk):
-    """組分け自動生成"""
+    """
+    組分け自動生成
+    
+    現在の組編成との差分だけを適用する（組・組編成のIDは可能な限り維持）。
+    mode=update の場合は既存の配置（手動調整）を残して追加・削除のみ行い、
+    preview=true の場合は差分の件数を表示するだけで反映しない。
+    確定済みの組がある種目は force=true の場合だけ、確定済みの組とその選手を残して
+    未確定の組を再生成する。
+    """
     race = get_object_or_404(Race, pk=race_pk)
     
+    keep_existing = request.POST.get('mode') == 'update'
+    preview = request.POST.get('preview', 'false') == 'true'
     force = request.POST.get('force', 'false') == 'true'
     
-    # 既存の確定済み組があるかチェック
-    if race.heats.filter(is_finalized=True).exists() and not force:
-        messages.error(request, '確定済みの組が存在します。再生成する場合は強制オプションを使用してください。')
-        return redirect('heats:list', race_pk=race_pk)
-    
     try:
-        heats = HeatGenerator.generate_heats(race, force_regenerate=True)
-        messages.success(request, f'{len(heats)}組を生成しました。')
-    except Exception as e:
+        _, summary = HeatPlanner.regenerate(
+            race, dry_run=preview, keep_existing=keep_existing, force=force
+        )
+        detail = (
+            f'追加{summary["created"]}名・移動{summary["updated"]}名・削除{summary["deleted"]}名'
+            f'（変更なし{summary["unchanged"]}名）、'
+            f'組の追加{summary["heats_created"]}・削除{summary["heats_deleted"]}'
+        )
+        if preview:
+            messages.info(request, f'プレビュー（未反映）: {detail}')
+        else:
+            messages.success(request, f'{race.heats.count()}組に更新しました。{detail}')
+    except (ValueError, ValidationError) as e:
         messages.error(request, f'組分け生成に失敗しました: {str(e)}')
     
     return redirect('heats:list', race_pk=race_pk)
@@ -102,13 +126,54 @@ def move_assignment(request):
         
         new_bib_number = int(new_bib) if new_bib else None
         
+        old_competition_id = assignment.heat.race.competition_id
         HeatGenerator.move_entry(assignment, target_heat, new_bib_number)
         
+        # 組構成が変わるため点呼カウンターを再構築させる
+        CheckinCounterStore.invalidate(old_competition_id)
+        CheckinCounterStore.invalidate(target_heat.race.competition_id)
+        
         return JsonResponse({'success': True})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
 
+@login_required
+@admin_required
+@require_POST
+def reorder_assignments(request):
+    """
+    組の並び順を一括反映（Ajax）
+    
+    ドラッグ&ドロップ後の各組の並び順をまとめて受け取り、1トランザクションで反映する。
+    リクエスト本文（JSON）: {"heats": [{"heat_id": 1, "assignment_ids": [12, 10, 11]}, ...]}
+    """
+    try:
+        payload = json.loads(request.body)
+        orderings = {
+            int(item['heat_id']): [int(pk) for pk in item['assignment_ids']]
+            for item in payload['heats']
+        }
+    except (KeyError, TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': '並び順の指定が正しくありません'}, status=400)
+    
+    if not orderings:
+        return JsonResponse({'success': False, 'error': '並び順の指定が正しくありません'}, status=400)
+    
+    try:
+        updated = HeatGenerator.apply_ordering(orderings)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+    
+    # 組構成が変わるため点呼カウンターを再構築させる
+    competition_id = Heat.objects.filter(pk__in=list(orderings)).values_list(
+        'race__competition_id', flat=True
+    ).first()
+    CheckinCounterStore.invalidate(competition_id)
+    
+    return JsonResponse({'success': True, 'updated': updated})
+
+
 @login_required
 @admin_required
 @require_POST
@@ -158,39 +223,12 @@ def checkin_dashboard(request, competition_pk):
     """リアルタイム点呼状況ダッシュボード"""
     competition = get_object_or_404(Competition, pk=competition_pk)
     
-    # 各種目の点呼状況を取得
-    races = []
-    for race in competition.races.filter(is_active=True).order_by('display_order'):
-        heats_data = []
-        for heat in race.heats.filter(is_finalized=True).order_by('heat_number'):
-            total = heat.assignments.count()
-            checked_in = heat.assignments.filter(checked_in=True).count()
-            dns = heat.assignments.filter(status='dns').count()
-            pending = total - checked_in - dns
-            
-            heats_data.append({
-                'heat': heat,
-                'total': total,
-                'checked_in': checked_in,
-                'dns': dns,
-                'pending': pending,
-                'progress': round(checked_in / total * 100) if total > 0 else 0,
-            })
-        
-        total_race = sum(h['total'] for h in heats_data)
-        checked_in_race = sum(h['checked_in'] for h in heats_data)
-        
-        races.append({
-            'race': race,
-            'heats': heats_data,
-            'total': total_race,
-            'checked_in': checked_in_race,
-            'progress': round(checked_in_race / total_race * 100) if total_race > 0 else 0,
-        })
+    # 各種目の点呼状況を一括集計
+    summary = CheckinAggregator.competition_summary(competition)
     
     return render(request, 'heats/checkin_dashboard.html', {
         'competition': competition,
-        'races': races,
+        'races': summary['races'],
     })
 
 
@@ -200,80 +238,51 @@ def checkin_status_api(request, competition_pk):
     """点呼状況API（リアルタイム更新用）"""
     competition = get_object_or_404(Competition, pk=competition_pk)
     
-    data = []
-    for race in competition.races.filter(is_active=True).order_by('display_order'):
-        heats = []
-        for heat in race.heats.filter(is_finalized=True).order_by('heat_number'):
-            total = heat.assignments.count()
-            checked_in = heat.assignments.filter(checked_in=True).count()
-            dns = heat.assignments.filter(status='dns').count()
-            
-            # 未点呼選手リスト
-            unchecked = heat.assignments.filter(
-                checked_in=False
-            ).exclude(status='dns').select_related(
-                'entry__athlete', 'entry__athlete__organization'
-            ).values(
-                'pk',
-                'bib_number',
-                'entry__athlete__last_name',
-                'entry__athlete__first_name',
-                'entry__athlete__organization__short_name',
-            )[:10]
-            
-            heats.append({
-                'id': heat.pk,
-                'number': heat.heat_number,
-                'total': total,
-                'checked_in': checked_in,
-                'dns': dns,
-                'pending': total - checked_in - dns,
-                'progress': round(checked_in / total * 100) if total > 0 else 0,
-                'unchecked': list(unchecked),
-            })
-        
-        total_race = sum(h['total'] for h in heats)
-        checked_in_race = sum(h['checked_in'] for h in heats)
-        
-        data.append({
-            'race_id': race.pk,
-            'race_name': race.name,
-            'total': total_race,
-            'checked_in': checked_in_race,
-            'progress': round(checked_in_race / total_race * 100) if total_race > 0 else 0,
-            'heats': heats,
-        })
+    # 版番号が変わっていなければ集計・シリアライズせずに304
+    version = CheckinCounterStore.get_version(competition.pk)
+    etag = make_etag('checkin', competition.pk, version)
+    response = not_modified(request, etag=etag)
+    if response is not None:
+        return response
     
-    return JsonResponse({'races': data})
+    # キャッシュヒット時は組編成テーブルに触れない
+    payload = CheckinCounterStore.status_payload(competition, version)
+    return set_validators(JsonResponse(payload), etag=etag)
 
 
 @login_required
 @admin_required
-def checkin_stats_partial(request, competition_pk):
-    """点呼状況統計パーシャル（htmx用）"""
+def checkin_events(request, competition_pk):
+    """点呼状況のプッシュ配信（Server-Sent Events）"""
     competition = get_object_or_404(Competition, pk=competition_pk)
     
-    # 統計を計算
-    total = 0
-    checked_in = 0
-    dns = 0
-    
-    for race in competition.races.filter(is_active=True):
-        for heat in race.heats.filter(is_finalized=True):
-            total += heat.assignments.count()
-            checked_in += heat.assignments.filter(checked_in=True).count()
-            dns += heat.assignments.filter(status='dns').count()
+    if isinstance(request, ASGIRequest):
+        # ASGI: 接続を保持し、変化した組だけを送信
+        version = CheckinCounterStore.get_version(competition.pk)
+        payload = CheckinCounterStore.status_payload(competition, version)
+        response = StreamingHttpResponse(
+            stream_checkin_events(competition, version, payload, disconnected=disconnected_event(request)),
+            content_type='text/event-stream'
+        )
+    else:
+        # WSGI: ワーカーを占有しないよう1回分だけ返して閉じる
+        response = HttpResponse(
+            single_shot_events(competition, request.headers.get('Last-Event-ID')),
+            content_type='text/event-stream'
+        )
     
-    pending = total - checked_in - dns
-    progress = round(checked_in / total * 100) if total > 0 else 0
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+@admin_required
+def checkin_stats_partial(request, competition_pk):
+    """点呼状況統計パーシャル（htmx用）"""
+    competition = get_object_or_404(Competition, pk=competition_pk)
     
-    stats = {
-        'total': total,
-        'checked_in': checked_in,
-        'dns': dns,
-        'pending': pending,
-        'progress': progress,
-    }
+    stats = CheckinAggregator.competition_summary(competition)['totals']
     
     return render(request, 'heats/partials/checkin_stats.html', {
         'stats': stats,
@@ -286,12 +295,16 @@ def checkin_stats_partial(request, competition_pk):
 @require_POST
 def checkin(request, assignment_pk):
     """点呼チェックイン"""
-    assignment = get_object_or_404(HeatAssignment, pk=assignment_pk)
+    assignment = get_object_or_404(
+        HeatAssignment.objects.select_related('heat__race', 'entry__athlete__organization'),
+        pk=assignment_pk
+    )
     
     if not assignment.checked_in:
+        old_status = assignment.status
         assignment.checked_in = True
         assignment.checked_in_at = timezone.now()
-        assignment.save()
+        CheckinCounterStore.save(assignment, False, old_status)
         messages.success(request, f'{assignment.entry.athlete.full_name}の点呼を完了しました。')
     else:
         messages.info(request, f'{assignment.entry.athlete.full_name}は既に点呼済みです。')
@@ -308,9 +321,13 @@ def checkin(request, assignment_pk):
 @require_POST
 def mark_dns(request, assignment_pk):
     """欠場（DNS）マーク"""
-    assignment = get_object_or_404(HeatAssignment, pk=assignment_pk)
+    assignment = get_object_or_404(
+        HeatAssignment.objects.select_related('heat__race', 'entry__athlete__organization'),
+        pk=assignment_pk
+    )
+    old_status = assignment.status
     assignment.status = 'dns'
-    assignment.save()
+    CheckinCounterStore.save(assignment, assignment.checked_in, old_status)
     
     # エントリーのステータスも更新
     assignment.entry.status = 'dns'
@@ -330,18 +347,19 @@ def mark_dns(request, assignment_pk):
 def toggle_checkin(request, assignment_pk):
     """点呼トグル（HTMX部分更新対応）"""
     assignment = get_object_or_404(
-        HeatAssignment.objects.select_related('entry__athlete'),
+        HeatAssignment.objects.select_related('heat__race', 'entry__athlete__organization'),
         pk=assignment_pk
     )
     
     # 状態をトグル
-    if assignment.checked_in:
+    was_checked_in = assignment.checked_in
+    if was_checked_in:
         assignment.checked_in = False
         assignment.checked_in_at = None
     else:
         assignment.checked_in = True
         assignment.checked_in_at = timezone.now()
-    assignment.save()
+    CheckinCounterStore.save(assignment, was_checked_in, assignment.status)
     
     # HTMX用のパーシャルテンプレートを返す
     return render(request, 'heats/partials/checkin_toggle.html', {
@@ -371,7 +389,11 @@ def generate_all_heats(request, competition_pk):
         
         if result['heats_generated']:
             total_heats = sum(h['heat_count'] for h in result['heats_generated'])
-            messages.success(request, f'全{len(result["heats_generated"])}種目、計{total_heats}組を生成しました。')
+            messages.success(
+                request,
+                f'全{len(result["heats_generated"])}種目、計{total_heats}組を生成しました。'
+                f'（{result["timings"]["total"]:.2f}秒）'
+            )
         
         for error in result['errors']:
             messages.error(request, f'{error["race"]}: {error["error"]}')
@@ -386,24 +408,38 @@ def generate_all_heats(request, competition_pk):
 @admin_required
 @require_POST
 def assign_bib_numbers(request, competition_pk):
-    """大会全体のゼッケン番号を採番"""
+    """
+    大会全体のゼッケン番号を採番
+    
+    mode=new の場合は未採番の選手（締切後の追加分など）だけに続きの番号を払い出し、
+    既存のゼッケン番号は変更しない。
+    """
     from .models import BibNumberGenerator
     
     competition = get_object_or_404(Competition, pk=competition_pk)
+    only_new = request.POST.get('mode') == 'new'
     
     try:
-        result = BibNumberGenerator.assign_bib_numbers(competition)
+        if only_new:
+            result = BibNumberGenerator.assign_new_bib_numbers(competition)
+            total = sum(assigned['count'] for assigned in result['assigned'])
+            if total:
+                messages.success(request, f'追加分 {total}名のゼッケン番号を採番しました。')
+            elif not result['errors']:
+                messages.info(request, '未採番の選手はいません。')
+        else:
+            result = BibNumberGenerator.assign_bib_numbers(competition)
+            if result['assigned']:
+                messages.success(
+                    request,
+                    f'{len(result["assigned"])}種目のゼッケン番号を採番しました。'
+                )
         
-        if result['assigned']:
-            messages.success(
+        for assigned in result['assigned']:
+            messages.info(
                 request,
-                f'{len(result["assigned"])}種目のゼッケン番号を採番しました。'
+                f'{assigned["race"]}: {assigned["start_bib"]}〜{assigned["end_bib"]}'
             )
-            for assigned in result['assigned']:
-                messages.info(
-                    request,
-                    f'{assigned["race"]}: {assigned["start_bib"]}〜{assigned["end_bib"]}'
-                )
         
         for error in result.get('errors', []):
             messages.error(request, str(error))
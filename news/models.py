@@ -42,6 +42,15 @@ class News(models.Model):
         ordering = ['-published_at']  # 新しい順に表示
         verbose_name = 'お知らせ'
         verbose_name_plural = 'お知らせ'
+        indexes = [
+            # 公開中のお知らせ（get_active_news）。is_active=True は「WHERE is_active」と
+            # 比較なしの条件になり複合インデックスでは絞り込めないため、部分インデックスにする
+            models.Index(
+                fields=['-published_at'],
+                name='news_active_published_idx',
+                condition=models.Q(is_active=True),
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -1,11 +1,17 @@
 """
 ASGI config for nitsys project.
+
+本番は gunicorn + uvicorn_worker.UvicornWorker でこのアプリケーションを起動する。
+点呼状況のプッシュ配信（heats:checkin_events）は ASGI 上でのみ接続を保持する。
+クライアントの切断は DisconnectMiddleware がビューに知らせる。
 """
 
 import os
 
 from django.core.asgi import get_asgi_application
 
+from nitsys.streaming import DisconnectMiddleware
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nitsys.settings')
 
-application = get_asgi_application()
+application = DisconnectMiddleware(get_asgi_application())
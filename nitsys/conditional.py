@@ -0,0 +1,47 @@
+"""
+条件付きGET（ETag / Last-Modified）ユーティリティ
+
+ポーリングされるJSON APIで、データの版（変更カウンターや最終更新日時）だけを
+安価に求め、クライアントの If-None-Match / If-Modified-Since と一致すれば
+重い集計・シリアライズを行わずに 304 Not Modified を返す。
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """版を構成する値からETag文字列を生成"""
+    raw = ':'.join(str(part) for part in parts)
+    return quote_etag(hashlib.sha256(raw.encode()).hexdigest()[:32])
+
+
+def not_modified(request, etag=None, last_modified=None):
+    """
+    クライアントのキャッシュが有効なら 304 レスポンスを返す
+
+    Args:
+        etag: make_etag() で生成したETag
+        last_modified: 最終更新日時（datetime、不明なら None）。削除で進まない値
+            （一覧の行の最大 updated_at など）は渡さないこと。If-Modified-Since だけの
+            リクエストに古い内容で304を返してしまう
+
+    Returns:
+        HttpResponseNotModified | None
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag=None, last_modified=None):
+    """レスポンスに ETag / Last-Modified と再検証必須のCache-Controlを付与"""
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Cache-Control'] = 'private, no-cache'
+    return response
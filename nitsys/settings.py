@@ -77,9 +77,9 @@ INSTALLED_APPS = [
     # Local apps
     'accounts.apps.AccountsConfig',
     'competitions',
-    'entries',
+    'entries.apps.EntriesConfig',
     'payments',
-    'heats',
+    'heats.apps.HeatsConfig',
     'reports',
     'news',
 ]
@@ -400,6 +400,42 @@ SESSION_COOKIE_AGE = 86400  # 24 hours (絶対タイムアウト)
 SESSION_IDLE_TIMEOUT = 1800  # 30 minutes (アイドルタイムアウト)
 SESSION_SAVE_EVERY_REQUEST = True  # 毎リクエストでセッション更新
 
+# Cache settings（点呼カウンター等）
+# 開発・テストはプロセス内メモリ、本番は複数ワーカーで共有できるファイルキャッシュ
+if DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_DIR', default=str(BASE_DIR / 'cache')),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# バックグラウンド生成した帳票の保存先の Storage クラス（run_report_jobs ワーカーと Web で共有する）
+# 既定はデータベース。FileSystemStorage を指定した場合は REPORT_FILES_ROOT に保存する
+REPORT_STORAGE = config('REPORT_STORAGE', default='reports.storage.DatabaseStorage')
+# 帳票の作業ディレクトリ（生成済み帳票キャッシュ。公開しない）
+REPORT_FILES_ROOT = config('REPORT_FILES_ROOT', default=str(BASE_DIR / 'report_files'))
+# 生成済み帳票キャッシュ（REPORT_FILES_ROOT/cache）の上限サイズ。超えたら参照の古い順に削除
+REPORT_CACHE_MAX_BYTES = config('REPORT_CACHE_MAX_BYTES', default=256 * 1024 * 1024, cast=int)
+# 大会全体の帳票（全データPDF・結果記録用紙一括）を並列描画するプロセス数（0/1 は直列、pypdf が必要）
+REPORT_RENDER_WORKERS = config('REPORT_RENDER_WORKERS', default=0, cast=int)
+
+# PDF帳票の日本語フォント
+# PDF_FONT_PATHS はカンマ区切りで、既定の候補より優先して探す
+# PDF_PRELOAD_FONT が有効なら gunicorn のワーカー（gunicorn.conf.py の post_worker_init）と
+# run_report_jobs の起動時にフォント登録とスタイル構築を済ませる
+PDF_FONT_NAME = config('PDF_FONT_NAME', default='Japanese')
+PDF_FONT_PATHS = config('PDF_FONT_PATHS', default='', cast=Csv())
+PDF_PRELOAD_FONT = config('PDF_PRELOAD_FONT', default=not DEBUG, cast=bool)
+
 # Email settings
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
@@ -0,0 +1,107 @@
+"""
+ASGI でも逐次送信するストリーミングレスポンス
+
+Django 4.2 の StreamingHttpResponse は、同期イテレーターを ASGI で送るときに
+sync_to_async(list) で全体をメモリに読み込んでから送信する（CSV・PDFが丸ごと溜まる）。
+ここのレスポンスは同期イテレーターを BATCH_BYTES 程度ずつ sync_to_async で読み進め、
+読んだ分から送信する。WSGI（開発サーバー・テストクライアント）では通常どおり同期で送る。
+
+DisconnectMiddleware は接続を保持するレスポンスにクライアントの切断を知らせる。
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, StreamingHttpResponse
+
+# ASGI で1回のスレッド切り替えで読み進めるおおよそのバイト数
+BATCH_BYTES = 64 * 1024
+
+
+def _next_batch(iterator, size):
+    """イテレーターから合計 size バイトに達するまで取り出す（尽きたら空リスト）"""
+    batch = []
+    total = 0
+    for part in iterator:
+        batch.append(part)
+        total += len(part)
+        if total >= size:
+            break
+    return batch
+
+
+class AsyncIterationMixin:
+    """同期イテレーターを ASGI で少しずつ読み進める __aiter__"""
+
+    async def __aiter__(self):
+        if self.is_async:
+            async for part in super().__aiter__():
+                yield part
+            return
+
+        iterator = iter(self.streaming_content)
+        # QuerySet.iterator() のカーソルを同じ接続で読み続けるため、リクエストと同じスレッドで実行する
+        next_batch = sync_to_async(_next_batch, thread_sensitive=True)
+        while True:
+            batch = await next_batch(iterator, BATCH_BYTES)
+            if not batch:
+                break
+            for part in batch:
+                yield part
+
+
+class StreamingResponse(AsyncIterationMixin, StreamingHttpResponse):
+    """ASGI でも逐次送信する StreamingHttpResponse"""
+
+
+class StreamingFileResponse(AsyncIterationMixin, FileResponse):
+    """ASGI でも逐次送信する FileResponse"""
+
+
+# 切断を知らせる asyncio.Event を入れる scope のキー
+DISCONNECT_KEY = 'nitsys.disconnected'
+
+
+class DisconnectMiddleware:
+    """
+    クライアントの切断（http.disconnect）を scope[DISCONNECT_KEY] の asyncio.Event で知らせる ASGI ミドルウェア
+
+    Django 4.2 の ASGIHandler はリクエスト本文を読んだ後に receive() を呼ばないため、
+    長時間保持するストリーミング（点呼状況の SSE など）は切断に気づけない。
+    本文を読み終えた後の receive() をここで待ち、切断されたら Event をセットする。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        disconnected = asyncio.Event()
+        watcher = None
+
+        async def watch():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        async def receive_body():
+            nonlocal watcher
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+            elif not message.get('more_body') and watcher is None:
+                watcher = asyncio.create_task(watch())
+            return message
+
+        try:
+            await self.app({**scope, DISCONNECT_KEY: disconnected}, receive_body, send)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+
+def disconnected_event(request):
+    """リクエストの切断を知らせる asyncio.Event（DisconnectMiddleware を通っていなければ None）"""
+    scope = getattr(request, 'scope', None)
+    return scope.get(DISCONNECT_KEY) if scope else None
@@ -3,14 +3,14 @@
 初心者でも使いやすい管理画面を提供
 振込明細画像のサムネイル表示、ワンクリック承認機能付き
 """
-import csv
-
 from django import forms
 from django.contrib import admin, messages
-from django.http import HttpResponse
 from django.utils import timezone
 from django.utils.html import format_html
 
+from entries.counters import EntryCounter
+from nitsys.csv_export import CHUNK_SIZE, streaming_csv_response
+
 from .models import BankAccount, ParkingRequest, Payment
 
 # =============================================================================
@@ -57,36 +57,34 @@ def reject_payments(modeladmin, request, queryset):
 
 @admin.action(description="選択した入金情報をCSVでエクスポート")
 def export_payments_csv(modeladmin, request, queryset):
-    """入金情報をCSVでエクスポート"""
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-    response['Content-Disposition'] = 'attachment; filename="payments.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
+    """入金情報をCSVでエクスポート（ストリーミング）"""
+    header = [
         '団体名', '大会名', '振込金額', '振込名義', '振込日',
         'ステータス', '確認者', '確認日時', 'アップロード日時'
-    ])
+    ]
+    payments = queryset.select_related('entry_group', 'entry_group__organization', 'entry_group__competition', 'reviewed_by')
     
-    for payment in queryset.select_related('entry_group', 'entry_group__organization', 'entry_group__competition', 'reviewed_by'):
-        writer.writerow([
-            payment.entry_group.organization.name if payment.entry_group.organization else '',
-            payment.entry_group.competition.name,
-            payment.payment_amount or '',
-            payment.payer_name,
-            payment.payment_date or '',
-            payment.get_status_display(),
-            payment.reviewed_by.full_name if payment.reviewed_by else '',
-            payment.reviewed_at.strftime('%Y-%m-%d %H:%M') if payment.reviewed_at else '',
-            payment.uploaded_at.strftime('%Y-%m-%d %H:%M'),
-        ])
+    def rows():
+        for payment in payments.iterator(chunk_size=CHUNK_SIZE):
+            yield [
+                payment.entry_group.organization.name if payment.entry_group.organization else '',
+                payment.entry_group.competition.name,
+                payment.payment_amount or '',
+                payment.payer_name,
+                payment.payment_date or '',
+                payment.get_status_display(),
+                payment.reviewed_by.full_name if payment.reviewed_by else '',
+                payment.reviewed_at.strftime('%Y-%m-%d %H:%M') if payment.reviewed_at else '',
+                payment.uploaded_at.strftime('%Y-%m-%d %H:%M'),
+            ]
     
-    return response
+    return streaming_csv_response('payments.csv', header, rows())
 
 
 @admin.action(description="選択した駐車申請を割当済みに変更")
 def assign_parking(modeladmin, request, queryset):
     """駐車申請を一括割当済み"""
-    count = queryset.update(status='assigned')
+    count = queryset.update(status='assigned', updated_at=timezone.now())
     messages.success(request, f'{count}件の駐車申請を割当済みにしました。')
 
 
@@ -248,7 +246,7 @@ class PaymentAdmin(admin.ModelAdmin):
                 obj.reviewed_at = timezone.now()
                 obj.entry_group.status = 'pending'
                 obj.entry_group.save()
-                obj.entry_group.entries.update(status='pending')
+                EntryCounter.update(obj.entry_group.entries.all(), status='pending')
                 messages.warning(request, '入金を却下しました。エントリーは入金待ち状態に戻りました。')
         super().save_model(request, obj, form, change)
 
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_add_parking_and_force_approve'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='parkingrequest',
+            index=models.Index(fields=['competition', 'status'], name='parking_competition_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', '-uploaded_at'], name='payment_status_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'reviewed_at'], name='payment_status_reviewed_idx'),
+        ),
+    ]
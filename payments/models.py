@@ -79,6 +79,12 @@ class Payment(models.Model):
         verbose_name = '入金情報'
         verbose_name_plural = '入金情報'
         ordering = ['-uploaded_at']
+        indexes = [
+            # 入金確認一覧（状態で絞り込み、新しい順）
+            models.Index(fields=['status', '-uploaded_at'], name='payment_status_uploaded_idx'),
+            # 本日の承認件数（状態と確認日時の範囲）
+            models.Index(fields=['status', 'reviewed_at'], name='payment_status_reviewed_idx'),
+        ]
     
     def __str__(self):
         return f"{self.entry_group} - {self.get_status_display()}"
@@ -264,6 +270,10 @@ class ParkingRequest(models.Model):
         verbose_name_plural = '駐車場申請'
         unique_together = ['organization', 'competition']
         ordering = ['-created_at']
+        indexes = [
+            # 大会ごとの駐車場申請一覧・割当済みの駐車許可証
+            models.Index(fields=['competition', 'status'], name='parking_competition_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.organization.name} - {self.competition.name}"
@@ -5,11 +5,10 @@ Excelで作成した配車表をCSVでインポートし、ParkingRequestテー
 import csv
 import io
 from datetime import datetime
-from difflib import SequenceMatcher
 
 from django.db import transaction
 
-from accounts.models import Organization
+from accounts.organization_matcher import OrganizationMatcher
 from payments.models import ParkingRequest
 
 
@@ -47,7 +46,7 @@ class ParkingImportResult:
         })
 
 
-def find_organization_by_name(name, threshold=0.8):
+def find_organization_by_name(name, threshold=0.8, matcher=None):
     """
     組織名で団体を検索
     完全一致しない場合は類似度で候補を探す
@@ -55,49 +54,14 @@ def find_organization_by_name(name, threshold=0.8):
     Args:
         name: 検索する団体名
         threshold: 類似度の閾値 (0.0-1.0)
+        matcher: 構築済みの OrganizationMatcher（複数行を照合する場合は使い回す）
     
     Returns:
         (Organization or None, list of candidates)
     """
-    # 完全一致
-    exact_match = Organization.objects.filter(name=name).first()
-    if exact_match:
-        return exact_match, []
-    
-    # 短縮名で検索
-    short_match = Organization.objects.filter(short_name=name).first()
-    if short_match:
-        return short_match, []
-    
-    # 部分一致
-    partial_matches = Organization.objects.filter(name__icontains=name)
-    if partial_matches.count() == 1:
-        return partial_matches.first(), []
-    
-    # 類似度検索
-    all_orgs = Organization.objects.filter(is_active=True)
-    candidates = []
-    
-    for org in all_orgs:
-        # 団体名との類似度
-        ratio = SequenceMatcher(None, name, org.name).ratio()
-        if ratio >= threshold:
-            candidates.append((org, ratio))
-        
-        # 短縮名との類似度
-        if org.short_name:
-            short_ratio = SequenceMatcher(None, name, org.short_name).ratio()
-            if short_ratio >= threshold:
-                candidates.append((org, short_ratio))
-    
-    # 類似度でソート
-    candidates.sort(key=lambda x: x[1], reverse=True)
-    
-    # 類似度が高い1件だけ一致とみなす場合
-    if candidates and candidates[0][1] >= 0.9:
-        return candidates[0][0], []
-    
-    return None, [c[0] for c in candidates[:3]]
+    if matcher is None:
+        matcher = OrganizationMatcher()
+    return matcher.match(name, threshold)
 
 
 def parse_time(time_str):
@@ -171,6 +135,9 @@ def import_parking_csv(csv_file, competition, created_by_user):
             result.add_error(0, f'必須カラムがありません: {", ".join(missing)}')
             return result
     
+    # 団体一覧は1回だけ読み込んで全行の照合に使う
+    matcher = OrganizationMatcher()
+    
     for row_num, row in enumerate(reader, start=2):  # ヘッダー行を1として、データは2から
         org_name = row.get('団体名', '').strip()
         
@@ -179,7 +146,7 @@ def import_parking_csv(csv_file, competition, created_by_user):
             continue
         
         # 団体の検索
-        organization, candidates = find_organization_by_name(org_name)
+        organization, candidates = find_organization_by_name(org_name, matcher=matcher)
         
         if not organization:
             if candidates:
@@ -10,40 +10,15 @@ from django.conf import settings
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
+from reports.rendering import RenderingContext
 
-# 日本語フォント登録（システムフォントを使用）
+
+# 日本語フォント登録（帳票共通の RenderingContext を使用）
 def register_japanese_font():
-    """日本語フォントを登録"""
-    # macOS のヒラギノ角ゴシック
-    mac_font_paths = [
-        '/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc',
-        '/System/Library/Fonts/Hiragino Sans GB.ttc',
-        '/Library/Fonts/Arial Unicode.ttf',
-    ]
-    
-    # Linux / Windows の代替フォント
-    other_font_paths = [
-        '/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc',
-        '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
-        'C:/Windows/Fonts/msgothic.ttc',
-    ]
-    
-    font_paths = mac_font_paths + other_font_paths
-    
-    for font_path in font_paths:
-        if os.path.exists(font_path):
-            try:
-                pdfmetrics.registerFont(TTFont('JapaneseFont', font_path))
-                return 'JapaneseFont'
-            except Exception:
-                continue
-    
-    # フォールバック: Helveticaを使用（日本語表示に問題あり）
-    return 'Helvetica'
+    """日本語フォントを登録（プロセスごとに1回）し、フォント名を返す"""
+    return RenderingContext.font_name()
 
 
 def generate_receipt_pdf(payment):
@@ -158,6 +158,24 @@ class TestParkingImport:
         assert result.success_count == 0
         assert result.error_count == 1
         assert '団体が見つかりません' in result.errors[0]['message']
+    
+    def test_import_csv_matcher_built_once(self, db, organization, competition, admin_user,
+                                           django_assert_max_num_queries):
+        """団体一覧は1回だけ読み込み、表記ゆれは警告付きで一致"""
+        from payments.parking_import import import_parking_csv
+        
+        rows = '\n'.join(
+            f'{name},A駐車場,7:00,18:00,0,0,1,' for name in ['テスト大', 'テスト 大学', '存在しない大学'] * 5
+        )
+        csv_content = f'団体名,駐車場,入庫時間,出庫時間,大型バス,中型バス,乗用車,備考\n{rows}'
+        
+        # 団体一覧1回 + 一致した行ごとの駐車申請の取得・保存
+        with django_assert_max_num_queries(1 + 10 * 4):
+            result = import_parking_csv(csv_content, competition, admin_user)
+        
+        assert result.success_count == 10
+        assert result.error_count == 5
+        assert result.warnings[0]['message'] == '"テスト 大学" を "テスト大学" にマッチしました'
 
 
 class TestPaymentViews:
@@ -2,6 +2,7 @@
 payments ビュー
 """
 import logging
+from datetime import timedelta
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -11,6 +12,7 @@ from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
 from accounts.utils import admin_required, log_permission_denied
+from entries.counters import EntryCounter
 from entries.models import EntryGroup
 
 from .forms import PaymentReviewForm, PaymentUploadForm
@@ -57,7 +59,7 @@ def payment_upload(request, entry_group_pk):
                 entry_group.save()
                 
                 # 各エントリーのステータスも更新
-                entry_group.entries.update(status='payment_uploaded')
+                EntryCounter.update(entry_group.entries.all(), status='payment_uploaded')
             
             messages.success(request, '振込明細をアップロードしました。確認をお待ちください。')
             return redirect('payments:status', entry_group_pk=entry_group_pk)
@@ -119,11 +121,12 @@ def payment_list(request):
     # 統計情報を計算
     pending_count = Payment.objects.filter(status='pending').count()
     
-    # 本日承認数・金額
-    today = timezone.localdate()
+    # 本日承認数・金額（日時の範囲で絞り込み、(status, reviewed_at) のインデックスを使う）
+    today_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
     today_approved = Payment.objects.filter(
         status='approved',
-        reviewed_at__date=today
+        reviewed_at__gte=today_start,
+        reviewed_at__lt=today_start + timedelta(days=1),
     )
     approved_count = today_approved.count()
     total_amount = sum(p.entry_group.total_amount or 0 for p in today_approved.select_related('entry_group'))
@@ -441,19 +444,14 @@ def parking_csv_template(request):
 
 @admin_required
 def all_permits_download(request, competition_pk):
-    """全駐車許可証一括ダウンロード（管理者用）"""
+    """全駐車許可証一括（管理者用、バックグラウンド生成ジョブを登録して状況ページへ）"""
     from competitions.models import Competition
-    from reports.generators import ParkingPermitPDFGenerator
+    from reports.jobs import ReportJobRunner
     
     competition = get_object_or_404(Competition, pk=competition_pk)
     
-    pdf_buffer = ParkingPermitPDFGenerator.generate_all_permits_pdf(competition)
-    
-    response = HttpResponse(pdf_buffer.read(), content_type='application/pdf')
-    filename = f"all_parking_permits_{competition.pk}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    job = ReportJobRunner.enqueue('pdf_parking_permits', competition, user=request.user)
+    return redirect('reports:job_detail', job_pk=job.pk)
 
 
 @login_required
@@ -5,7 +5,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 
-from .models import ReportLog
+from .models import ReportJob, ReportLog
 
 # =============================================================================
 # 帳票出力履歴管理
@@ -34,6 +34,10 @@ class ReportLogAdmin(admin.ModelAdmin):
             'fields': ('generated_by', 'generated_at'),
             'description': '誰がいつ出力したか'
         }),
+        ('生成ファイル', {
+            'fields': ('file_path',),
+            'description': 'バックグラウンド生成した帳票の保存先'
+        }),
     )
     
     def report_type_badge(self, obj):
@@ -91,3 +95,23 @@ class ReportLogAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related(
             'competition', 'race', 'generated_by'
         )
+
+
+# =============================================================================
+# 帳票生成ジョブ
+# =============================================================================
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    """帳票生成ジョブ管理画面（状況確認用）"""
+    list_display = ('id', 'report_type', 'competition', 'race', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'report_type')
+    search_fields = ('competition__name', 'race__name')
+    raw_id_fields = ('competition', 'race', 'requested_by', 'report_log')
+    readonly_fields = ('attempts', 'error', 'filename', 'created_at', 'started_at', 'finished_at')
+    ordering = ('-created_at',)
+    list_per_page = 30
+    
+    def get_queryset(self, request):
+        """クエリ最適化"""
+        return super().get_queryset(request).select_related('competition', 'race')
@@ -0,0 +1,9 @@
+"""
+reports アプリケーション設定
+"""
+from django.apps import AppConfig
+
+
+class ReportsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'reports'
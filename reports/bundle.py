@@ -0,0 +1,309 @@
+"""
+大会当日のオフライン用データ一式（ZIP）
+
+ネットワーク障害に備え、大会ごとに次のファイルを事前に生成して1つのZIPにまとめる。
+    snapshot.json                     組編成のスナップショット（大会・種目・組・選手）
+    <表示順>_<種目名>/startlist.csv    スタートリストCSV
+    <表示順>_<種目名>/rollcall_<組>.pdf 点呼用PDF（組ごと）
+    <表示順>_<種目名>/result_sheets.pdf 結果記録用紙PDF（全組）
+
+build_offline_bundles コマンド（夜間の定期実行）が build() を呼ぶ。ReportCache.fingerprint() が
+前回と同じ種目は生成し直さない（増分生成）。内容が変わったときだけ版番号を上げて
+ZIP（bundle_v<版>.zip）を作り直し、古い版は削除する。
+
+ZIP・manifest.json（版番号・種目ごとの指紋とファイル）・種目ごとのファイルはすべて
+report_storage()（既定はデータベース）の bundles/<大会ID>/ に置く。種目ごとのファイルは
+races/<種目ID>/v<生成した版>/ に保存し、manifest.json から参照する。Render の cron のように
+毎回空のディスクで動いても、変わった種目だけを生成し直す。
+"""
+import json
+import logging
+import re
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime
+
+from django.core.files.base import ContentFile, File
+from django.db import transaction
+from django.utils import timezone
+
+from heats.models import HeatAssignment
+from nitsys.csv_export import iter_csv_bytes
+
+from .cache import ReportCache
+from .generators import CSVGenerator, PDFGenerator, ResultSheetPDFGenerator
+from .storage import report_storage
+
+logger = logging.getLogger(__name__)
+
+# ZIP内のフォルダ名に使えない文字
+UNSAFE_CHARACTERS = re.compile(r'[\\/:*?"<>|]')
+
+
+class OfflineBundle:
+    """オフライン用データ一式の生成・参照"""
+
+    # ファイルの構成を変えたら上げる（全種目を生成し直す）
+    FORMAT = 1
+    MANIFEST = 'manifest.json'
+
+    @staticmethod
+    def _storage_name(competition, name):
+        """report_storage() 上のファイル名"""
+        return f'bundles/{competition.pk}/{name}'
+
+    @classmethod
+    def _race_file_name(cls, competition, key, entry, name):
+        """種目ごとのファイルの report_storage() 上のファイル名（entry はマニフェストの種目の内容）"""
+        return cls._storage_name(competition, f"races/{key}/v{entry['version']}/{name}")
+
+    @classmethod
+    def manifest(cls, competition):
+        """前回の生成内容（版番号・生成日時・種目ごとの指紋とファイル）。なければ空"""
+        try:
+            with report_storage().open(cls._storage_name(competition, cls.MANIFEST)) as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return {'version': 0, 'races': {}}
+
+    @classmethod
+    def path(cls, competition):
+        """最新のZIPの report_storage() 上のファイル名（まだ生成していなければ None）"""
+        manifest = cls.manifest(competition)
+        if not manifest['version']:
+            return None
+        name = cls._storage_name(competition, cls._zip_name(manifest['version']))
+        return name if report_storage().exists(name) else None
+
+    @classmethod
+    def info(cls, competition):
+        """最新のZIPの版番号と生成日時（まだ生成していなければ None）"""
+        if cls.path(competition) is None:
+            return None
+        manifest = cls.manifest(competition)
+        return {
+            'version': manifest['version'],
+            'generated_at': datetime.fromisoformat(manifest['generated_at']),
+        }
+
+    @classmethod
+    def filename(cls, competition):
+        """ダウンロード時のファイル名"""
+        return f"offline_{competition.event_date}_v{cls.manifest(competition)['version']}.zip"
+
+    @classmethod
+    def build(cls, competition, force=False):
+        """
+        データ一式を生成（前回から変わった種目だけ生成し直す）
+
+        Args:
+            force: True の場合は全種目を生成し直す
+
+        Returns:
+            dict: {'version': 版番号, 'rebuilt': 生成し直した種目数, 'removed': 削除した種目数, 'changed': 版が上がったか}
+        """
+        storage = report_storage()
+        manifest = cls.manifest(competition)
+        previous = manifest['races']
+        races = list(competition.races.filter(is_active=True).order_by('display_order', 'pk'))
+
+        fingerprints = {str(race.pk): f'{cls.FORMAT}|{ReportCache.fingerprint(race)}' for race in races}
+        stale = {
+            key for key, fingerprint in fingerprints.items()
+            if force or previous.get(key, {}).get('fingerprint') != fingerprint
+        }
+        removed_keys = set(previous) - set(fingerprints)
+        changed = bool(stale or removed_keys) or list(previous) != list(fingerprints)
+        version = manifest['version']
+        if not changed and cls.path(competition) is not None:
+            return {'version': version, 'rebuilt': 0, 'removed': 0, 'changed': False}
+
+        # 指紋が同じでも保存済みのファイルが欠けている種目は生成し直す
+        version += 1
+        entries = {}
+        rebuild = []
+        for race in races:
+            key = str(race.pk)
+            entry = previous.get(key)
+            if key not in stale and 'version' in entry and all(
+                storage.exists(cls._race_file_name(competition, key, entry, name)) for name in entry['files']
+            ):
+                entries[key] = entry
+            else:
+                rebuild.append(race)
+        # 結果記録用紙は生成し直す種目分をまとめて描画する（種目単位では並列描画の閾値に届かないため）
+        result_sheets = ResultSheetPDFGenerator.generate_result_sheets_by_race(rebuild)
+        for race in rebuild:
+            key = str(race.pk)
+            entry = {'fingerprint': fingerprints[key], 'version': version}
+            entry['files'] = cls._write_race(competition, race, entry, result_sheets[race.pk])
+            entries[key] = entry
+        # マニフェストの種目は表示順に並べる（前回との比較に順序も使う）
+        entries = {str(race.pk): entries[str(race.pk)] for race in races}
+        rebuilt = len(rebuild)
+        removed = len(removed_keys)
+
+        # 新しい版の公開後に削除する前の版のファイル（生成し直した種目・なくなった種目）
+        obsolete = [
+            cls._race_file_name(competition, key, previous[key], name)
+            for key in [str(race.pk) for race in rebuild if str(race.pk) in previous] + sorted(removed_keys)
+            if 'version' in previous[key]
+            for name in previous[key]['files']
+        ]
+
+        generated_at = timezone.now()
+        with tempfile.TemporaryFile(suffix='.zip') as zip_file:
+            cls._write_zip(competition, races, entries, zip_file, version, generated_at)
+            zip_file.seek(0)
+            cls._publish(competition, zip_file, manifest['version'], {
+                'version': version,
+                'generated_at': generated_at.isoformat(),
+                'races': entries,
+            }, obsolete)
+        logger.info('オフライン用データ一式を生成しました: %s v%d（%d種目）', competition, version, rebuilt)
+
+        return {'version': version, 'rebuilt': rebuilt, 'removed': removed, 'changed': changed}
+
+    @staticmethod
+    def _zip_name(version):
+        return f'bundle_v{version}.zip'
+
+    @classmethod
+    def _write_race(cls, competition, race, entry, result_sheets):
+        """
+        種目のファイルを生成して report_storage() に保存。ファイル名のリストを返す
+
+        Args:
+            entry: マニフェストの種目の内容（保存先の版番号）
+            result_sheets: 結果記録用紙PDFのバイト列（組がなければ空）
+        """
+        storage = report_storage()
+        key = str(race.pk)
+        files = []
+
+        def save(name, content):
+            storage_name = cls._race_file_name(competition, key, entry, name)
+            # 途中で失敗した前回の生成の残り（同じ版）は置き換える
+            storage.delete(storage_name)
+            storage.save(storage_name, content)
+            files.append(name)
+
+        with tempfile.TemporaryFile(suffix='.csv') as f:
+            f.writelines(iter_csv_bytes(CSVGenerator.STARTLIST_HEADER, CSVGenerator.iter_startlist_rows(race)))
+            save('startlist.csv', File(f))
+
+        heats = list(race.heats.select_related('race__competition').order_by('heat_number'))
+        for heat in heats:
+            save(f'rollcall_{heat.heat_number}.pdf', File(PDFGenerator.generate_rollcall_pdf(heat)))
+
+        if result_sheets:
+            save('result_sheets.pdf', ContentFile(result_sheets))
+
+        snapshot = json.dumps(cls._race_snapshot(race, heats), ensure_ascii=False, separators=(',', ':'))
+        save('snapshot.json', ContentFile(snapshot.encode('utf-8')))
+        return files
+
+    @classmethod
+    def _race_snapshot(cls, race, heats):
+        """種目の組編成のスナップショット"""
+        rows = {heat.pk: [] for heat in heats}
+        assignments = HeatAssignment.objects.filter(heat__race=race).select_related(
+            'entry', 'entry__athlete', 'entry__athlete__organization'
+        ).order_by('heat_id', 'bib_number', 'pk')
+        for assignment in assignments:
+            athlete = assignment.entry.athlete
+            org = athlete.organization
+            rows[assignment.heat_id].append({
+                'bib': assignment.bib_number,
+                'race_bib': assignment.race_bib_number,
+                'name': athlete.full_name,
+                'kana': f'{athlete.last_name_kana} {athlete.first_name_kana}',
+                'organization': org.short_name if org else '',
+                'declared_time': assignment.entry.declared_time_display,
+                'jaaf_id': athlete.jaaf_id or '',
+                'status': assignment.status,
+            })
+        return {
+            'id': race.pk,
+            'name': race.name,
+            'distance': race.distance,
+            'gender': race.gender,
+            'heats': [
+                {
+                    'number': heat.heat_number,
+                    'start_time': heat.scheduled_start_time.strftime('%H:%M') if heat.scheduled_start_time else None,
+                    'assignments': rows[heat.pk],
+                }
+                for heat in heats
+            ],
+        }
+
+    @staticmethod
+    def _folder(index, race):
+        """ZIP内の種目フォルダ名（表示順＋種目名。パス区切りなどは置き換える）"""
+        return f"{index:02d}_{UNSAFE_CHARACTERS.sub('_', race.name)}"
+
+    @classmethod
+    def _write_zip(cls, competition, races, entries, output, version, generated_at):
+        """保存済みの種目ごとのファイルから ZIP を output（バイナリのファイルオブジェクト）に書き出す"""
+        storage = report_storage()
+        date_time = timezone.localtime(generated_at).timetuple()[:6]
+        snapshot = {
+            'version': version,
+            'generated_at': generated_at.isoformat(),
+            'competition': {
+                'id': competition.pk,
+                'name': competition.name,
+                'event_date': competition.event_date.isoformat(),
+                'venue': competition.venue,
+            },
+            'races': [],
+        }
+
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for index, race in enumerate(races, start=1):
+                key = str(race.pk)
+                entry = entries[key]
+                folder = cls._folder(index, race)
+                for name in entry['files']:
+                    with storage.open(cls._race_file_name(competition, key, entry, name)) as source:
+                        if name == 'snapshot.json':
+                            snapshot['races'].append(json.loads(source.read()))
+                            continue
+                        info = zipfile.ZipInfo(f'{folder}/{name}', date_time)
+                        # PDFは圧縮済みのためそのまま格納する
+                        info.compress_type = zipfile.ZIP_STORED if name.endswith('.pdf') else zipfile.ZIP_DEFLATED
+                        with archive.open(info, 'w') as target:
+                            shutil.copyfileobj(source, target)
+            archive.writestr(
+                'snapshot.json', json.dumps(snapshot, ensure_ascii=False, separators=(',', ':'))
+            )
+
+    @classmethod
+    def _publish(cls, competition, zip_file, previous_version, manifest, obsolete):
+        """ZIPと manifest を report_storage() に保存し、前の版のZIPと不要になった種目のファイルを削除"""
+        storage = report_storage()
+        zip_name = cls._storage_name(competition, cls._zip_name(manifest['version']))
+        manifest_name = cls._storage_name(competition, cls.MANIFEST)
+        with transaction.atomic():
+            # Storage.save() は同名のファイルがあると別名にするため、先に消しておく
+            for name in (zip_name, manifest_name):
+                storage.delete(name)
+            storage.save(zip_name, File(zip_file))
+            storage.save(manifest_name, ContentFile(json.dumps(manifest, ensure_ascii=False).encode('utf-8')))
+            if previous_version and previous_version != manifest['version']:
+                storage.delete(cls._storage_name(competition, cls._zip_name(previous_version)))
+            for name in obsolete:
+                storage.delete(name)
+
+    @classmethod
+    def open(cls, competition):
+        """最新のZIPを開く（まだ生成していなければ None）"""
+        name = cls.path(competition)
+        if name is None:
+            return None
+        try:
+            return report_storage().open(name)
+        except FileNotFoundError:
+            return None
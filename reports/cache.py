@@ -0,0 +1,184 @@
+"""
+生成済み帳票のキャッシュ（内容アドレス方式）
+
+キーは「帳票種別・対象（組／種目）・データの指紋」のハッシュ。指紋は対象に関わる
+Heat / HeatAssignment / Entry / Athlete（および所属団体・種目・大会）の
+updated_at の最大値と組編成の件数から求めるため、データが変わればキーも変わり、
+古いファイルは参照されなくなる（明示的な無効化は不要）。
+
+ファイルは REPORT_FILES_ROOT/cache に置き、合計サイズが REPORT_CACHE_MAX_BYTES を
+超えたら最終参照日時（mtime、ヒット時に更新）の古い順に削除する（LRU）。
+
+queryset.update() など save() を通らない更新は updated_at が変わらないため、
+帳票に出る項目をそうした経路で変更する場合は updated_at も合わせて更新すること。
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+
+from heats.models import Heat, HeatAssignment
+
+logger = logging.getLogger(__name__)
+
+
+class ReportCache:
+    """帳票ファイルのキャッシュ（キー計算・参照・保存・LRU削除）"""
+
+    SUFFIX = '.pdf'
+
+    @classmethod
+    def directory(cls):
+        """キャッシュの保存先"""
+        return Path(settings.REPORT_FILES_ROOT) / 'cache'
+
+    @classmethod
+    def _scope(cls, target):
+        """対象（組または種目）から (組の絞り込み条件, 種目) を返す"""
+        if isinstance(target, Heat):
+            return {'pk': target.pk}, target.race
+        return {'race': target}, target
+
+    @classmethod
+    def fingerprint(cls, target):
+        """
+        対象のデータの指紋（2クエリ）
+
+        Args:
+            target: Heat または Race
+        """
+        heat_filter, race = cls._scope(target)
+        heats = Heat.objects.filter(**heat_filter).aggregate(
+            count=Count('pk'), updated=Max('updated_at')
+        )
+        assignments = HeatAssignment.objects.filter(
+            **{f'heat__{key}': value for key, value in heat_filter.items()}
+        ).aggregate(
+            count=Count('pk'),
+            updated=Max('updated_at'),
+            entry_updated=Max('entry__updated_at'),
+            athlete_updated=Max('entry__athlete__updated_at'),
+            organization_updated=Max('entry__athlete__organization__updated_at'),
+            # ゼッケン番号の採番は updated_at を更新しない一括 UPDATE で書き込まれるため番号自体も含める
+            race_bibs=Count('race_bib_number'),
+            race_bib_sum=Sum('race_bib_number'),
+            race_bib_max=Max('race_bib_number'),
+        )
+        parts = [
+            heats['count'], heats['updated'],
+            assignments['count'], assignments['updated'], assignments['entry_updated'],
+            assignments['athlete_updated'], assignments['organization_updated'],
+            assignments['race_bibs'], assignments['race_bib_sum'], assignments['race_bib_max'],
+            race.updated_at, race.competition.updated_at,
+        ]
+        return '|'.join('' if part is None else str(part) for part in parts)
+
+    @classmethod
+    def key(cls, report_type, target):
+        """キャッシュキー（帳票種別・対象・指紋の SHA-256）"""
+        source = f'{report_type}:{type(target).__name__}:{target.pk}:{cls.fingerprint(target)}'
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def path(cls, key):
+        return cls.directory() / f'{key}{cls.SUFFIX}'
+
+    @classmethod
+    def get(cls, key):
+        """
+        キャッシュ済みファイルを開く（なければ None）。ヒットしたら最終参照日時を更新
+
+        開いたファイルは削除（LRU）されても読み続けられる。
+        """
+        path = cls.path(key)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return f
+
+    @classmethod
+    def put(cls, key, buffer):
+        """
+        生成した帳票を保存してパスを返す（保存後に上限を超えていれば古いものを削除）
+
+        一時ファイルに書いてから置き換えるため、同時に生成しても壊れたファイルは残らない。
+        """
+        directory = cls.directory()
+        directory.mkdir(parents=True, exist_ok=True)
+        path = cls.path(key)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(buffer.getbuffer())
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        cls.evict()
+        return path
+
+    @classmethod
+    def open(cls, report_type, target, render):
+        """
+        キャッシュがあればそれを、なければ render(target) で生成・保存して開く
+
+        Returns:
+            (file, bool): 開いたファイルとキャッシュヒットかどうか
+        """
+        key = cls.key(report_type, target)
+        cached = cls.get(key)
+        if cached is not None:
+            return cached, True
+        buffer = render(target)
+        cls.put(key, buffer)
+        buffer.seek(0)
+        return buffer, False
+
+    @classmethod
+    def evict(cls, max_bytes=None):
+        """
+        合計サイズが上限を超えていれば最終参照日時の古い順に削除
+
+        Returns:
+            int: 削除したファイル数
+        """
+        if max_bytes is None:
+            max_bytes = settings.REPORT_CACHE_MAX_BYTES
+        files = []
+        total = 0
+        for path in cls.directory().glob(f'*{cls.SUFFIX}'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        removed = 0
+        for _, size, path in sorted(files, key=lambda f: f[0]):
+            if total <= max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        if removed:
+            logger.info('帳票キャッシュを%d件削除しました', removed)
+        return removed
+
+    @classmethod
+    def clear(cls):
+        """キャッシュをすべて削除"""
+        return cls.evict(max_bytes=0)
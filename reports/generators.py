@@ -1,53 +1,62 @@
 """
 帳票生成ユーティリティ
 """
-import csv
 import io
 import random
+import tempfile
 from datetime import datetime
+from itertools import groupby
 
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.lib.units import mm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table
 
-from heats.models import HeatAssignment
+from heats.models import Heat, HeatAssignment
+from nitsys.csv_export import CHUNK_SIZE, iter_csv, streaming_csv_response
+
+from . import parallel
+from .rendering import RenderingContext
 
 
 class CSVGenerator:
-    """CSV出力生成"""
+    """
+    CSV出力生成
+
+    iter_*_rows() は1回の並び順付きクエリを iterator() で少しずつ読み、
+    行を逐次生成する。ダウンロードビューは streaming_csv_response() で
+    そのまま送り出すため、件数に関わらずメモリ使用量は一定になる。
+    """
+    
+    STARTLIST_HEADER = [
+        'Heat', 'Lane', 'Bib', 'LastName', 'FirstName',
+        'Team', 'SeedTime', 'JAAF_ID'
+    ]
+    
+    ALL_DATA_HEADER = [
+        'Race', 'Heat', 'Lane', 'LastName', 'FirstName',
+        'LastNameKana', 'FirstNameKana', 'Gender', 'BirthDate',
+        'Team', 'TeamKana', 'SeedTime', 'JAAF_ID', 'Status'
+    ]
     
     @classmethod
-    def generate_startlist_csv(cls, race):
+    def iter_startlist_rows(cls, race):
         """
-        計測システム連携用スタートリストCSV
+        計測システム連携用スタートリストの行
         FinishLynx/NISHI等に取り込み可能な形式
         """
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # ヘッダー
-        writer.writerow([
-            'Heat', 'Lane', 'Bib', 'LastName', 'FirstName',
-            'Team', 'SeedTime', 'JAAF_ID'
-        ])
-        
-        # データ
         assignments = HeatAssignment.objects.filter(
             heat__race=race,
             status='assigned'
         ).select_related(
             'heat', 'entry', 'entry__athlete', 'entry__athlete__organization'
-        ).order_by('heat__heat_number', 'bib_number')
+        ).order_by('heat__heat_number', 'bib_number', 'pk')
         
-        for assignment in assignments:
+        for assignment in assignments.iterator(chunk_size=CHUNK_SIZE):
             athlete = assignment.entry.athlete
             org_name = athlete.organization.short_name if athlete.organization else ''
             
-            writer.writerow([
+            yield [
                 assignment.heat.heat_number,
                 assignment.bib_number,
                 assignment.bib_number,
@@ -56,104 +65,74 @@ class CSVGenerator:
                 org_name,
                 assignment.entry.declared_time_display,
                 athlete.jaaf_id or ''
-            ])
-        
-        output.seek(0)
-        return output.getvalue()
+            ]
     
     @classmethod
-    def generate_all_data_csv(cls, competition):
-        """大会全データCSV出力"""
-        output = io.StringIO()
-        writer = csv.writer(output)
+    def iter_all_data_rows(cls, competition):
+        """大会全データの行（有効な全種目を1クエリで取得）"""
+        assignments = HeatAssignment.objects.filter(
+            heat__race__competition=competition,
+            heat__race__is_active=True
+        ).select_related(
+            'heat', 'heat__race', 'entry', 'entry__athlete', 'entry__athlete__organization'
+        ).order_by(
+            'heat__race__display_order', 'heat__race_id',
+            'heat__heat_number', 'bib_number', 'pk'
+        )
         
-        # ヘッダー
-        writer.writerow([
-            'Race', 'Heat', 'Lane', 'LastName', 'FirstName',
-            'LastNameKana', 'FirstNameKana', 'Gender', 'BirthDate',
-            'Team', 'TeamKana', 'SeedTime', 'JAAF_ID', 'Status'
-        ])
-        
-        # 全種目のデータ
-        for race in competition.races.filter(is_active=True).order_by('display_order'):
-            assignments = HeatAssignment.objects.filter(
-                heat__race=race
-            ).select_related(
-                'heat', 'entry', 'entry__athlete', 'entry__athlete__organization'
-            ).order_by('heat__heat_number', 'bib_number')
+        for assignment in assignments.iterator(chunk_size=CHUNK_SIZE):
+            athlete = assignment.entry.athlete
+            org = athlete.organization
             
-            for assignment in assignments:
-                athlete = assignment.entry.athlete
-                org = athlete.organization
-                
-                writer.writerow([
-                    race.name,
-                    assignment.heat.heat_number,
-                    assignment.bib_number,
-                    athlete.last_name,
-                    athlete.first_name,
-                    athlete.last_name_kana,
-                    athlete.first_name_kana,
-                    athlete.get_gender_display(),
-                    athlete.birth_date.strftime('%Y-%m-%d'),
-                    org.name if org else '',
-                    org.name_kana if org else '',
-                    assignment.entry.declared_time_display,
-                    athlete.jaaf_id or '',
-                    assignment.get_status_display()
-                ])
-        
-        output.seek(0)
-        return output.getvalue()
+            yield [
+                assignment.heat.race.name,
+                assignment.heat.heat_number,
+                assignment.bib_number,
+                athlete.last_name,
+                athlete.first_name,
+                athlete.last_name_kana,
+                athlete.first_name_kana,
+                athlete.get_gender_display(),
+                athlete.birth_date.strftime('%Y-%m-%d'),
+                org.name if org else '',
+                org.name_kana if org else '',
+                assignment.entry.declared_time_display,
+                athlete.jaaf_id or '',
+                assignment.get_status_display()
+            ]
+    
+    @classmethod
+    def stream_startlist_csv(cls, race, filename):
+        """スタートリストCSVのストリーミングレスポンス"""
+        return streaming_csv_response(
+            filename, cls.STARTLIST_HEADER, cls.iter_startlist_rows(race)
+        )
+    
+    @classmethod
+    def stream_all_data_csv(cls, competition, filename):
+        """大会全データCSVのストリーミングレスポンス"""
+        return streaming_csv_response(
+            filename, cls.ALL_DATA_HEADER, cls.iter_all_data_rows(competition)
+        )
+    
+    @classmethod
+    def generate_startlist_csv(cls, race):
+        """スタートリストCSVを文字列で生成"""
+        return ''.join(iter_csv(cls.STARTLIST_HEADER, cls.iter_startlist_rows(race)))
+    
+    @classmethod
+    def generate_all_data_csv(cls, competition):
+        """大会全データCSVを文字列で生成"""
+        return ''.join(iter_csv(cls.ALL_DATA_HEADER, cls.iter_all_data_rows(competition)))
 
 
 class PDFGenerator:
     """PDF出力生成"""
     
-    _font_registered = False
-    _font_name = 'Helvetica'
-    
     @classmethod
     def _setup_fonts(cls):
-        """日本語フォント設定（システムフォント使用）"""
-        if cls._font_registered:
-            return cls._font_name
-        
-        font_paths = [
-            # macOS
-            '/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc',
-            '/System/Library/Fonts/Hiragino Sans GB.ttc',
-            '/Library/Fonts/Arial Unicode.ttf',
-            # Linux (Ubuntu/Debian) - Noto CJK（apt install fonts-noto-cjkでインストール）
-            '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
-            '/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc',
-            '/usr/share/fonts/noto-cjk/NotoSansCJKjp-Regular.otf',
-            '/usr/share/fonts/opentype/noto/NotoSansCJKjp-Regular.otf',
-            # Render/Heroku Buildpack（Aptfileからインストール）
-            '/app/.fonts/NotoSansCJKjp-Regular.otf',
-            # その他のLinuxフォント
-            '/usr/share/fonts/truetype/fonts-japanese-gothic.ttf',
-            '/usr/share/fonts/truetype/takao-gothic/TakaoPGothic.ttf',
-            '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
-            # IPAフォント（手動インストール時）
-            '/usr/share/fonts/ipa-gothic/ipag.ttf',
-            '/usr/share/fonts/truetype/ipafont/ipag.ttf',
-        ]
-        
-        for font_path in font_paths:
-            try:
-                pdfmetrics.registerFont(TTFont('Japanese', font_path))
-                cls._font_registered = True
-                cls._font_name = 'Japanese'
-                print(f"[PDF] 日本語フォント登録成功: {font_path}")
-                return cls._font_name
-            except Exception:
-                continue
-        
-        # フォールバック（日本語は表示できない可能性あり）
-        print("[PDF] 警告: 日本語フォントが見つかりません。代替フォントを使用します。")
-        cls._font_registered = True
-        return cls._font_name
+        """日本語フォント設定（登録は RenderingContext でプロセスごとに1回）"""
+        return RenderingContext.font_name()
     
     @classmethod
     def generate_rollcall_pdf(cls, heat):
@@ -162,7 +141,6 @@ class PDFGenerator:
         受付で手動チェックするためのリスト
         """
         buffer = io.BytesIO()
-        font_name = cls._setup_fonts()
         
         doc = SimpleDocTemplate(
             buffer,
@@ -174,25 +152,17 @@ class PDFGenerator:
         )
         
         elements = []
-        styles = getSampleStyleSheet()
         
         # タイトル
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontName=font_name,
-            fontSize=16,
-            spaceAfter=10*mm
-        )
         elements.append(Paragraph(
             f"{heat.race.name} {heat.heat_number}組 点呼リスト",
-            title_style
+            RenderingContext.paragraph_style('rollcall_title')
         ))
         
         # 日時
         elements.append(Paragraph(
             f"出力日時: {datetime.now().strftime('%Y年%m月%d日 %H:%M')}",
-            styles['Normal']
+            RenderingContext.base_style('Normal')
         ))
         elements.append(Spacer(1, 5*mm))
         
@@ -218,17 +188,7 @@ class PDFGenerator:
         
         # テーブル作成
         table = Table(data, colWidths=[15*mm, 20*mm, 50*mm, 50*mm, 35*mm, 15*mm])
-        table.setStyle(TableStyle([
-            ('FONT', (0, 0), (-1, -1), font_name, 10),
-            ('FONT', (0, 0), (-1, 0), font_name, 10),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('ALIGN', (2, 1), (3, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ROWHEIGHTS', (0, 0), (-1, -1), 8*mm),
-        ]))
+        table.setStyle(RenderingContext.table_style('rollcall'))
         
         elements.append(table)
         
@@ -243,7 +203,6 @@ class PDFGenerator:
         組ごとの選手一覧
         """
         buffer = io.BytesIO()
-        font_name = cls._setup_fonts()
         
         doc = SimpleDocTemplate(
             buffer,
@@ -255,30 +214,13 @@ class PDFGenerator:
         )
         
         elements = []
-        styles = getSampleStyleSheet()
-        
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontName=font_name,
-            fontSize=18,
-            spaceAfter=5*mm
-        )
-        
-        heat_title_style = ParagraphStyle(
-            'HeatTitle',
-            parent=styles['Heading2'],
-            fontName=font_name,
-            fontSize=14,
-            spaceBefore=10*mm,
-            spaceAfter=5*mm
-        )
+        heat_title_style = RenderingContext.paragraph_style('program_heat')
         
         # タイトル
-        elements.append(Paragraph(f"{race.name} プログラム", title_style))
+        elements.append(Paragraph(f"{race.name} プログラム", RenderingContext.paragraph_style('program_title')))
         elements.append(Paragraph(
             f"{race.competition.name} ({race.competition.event_date.strftime('%Y年%m月%d日')})",
-            styles['Normal']
+            RenderingContext.base_style('Normal')
         ))
         
         # 各組
@@ -301,15 +243,7 @@ class PDFGenerator:
                 ])
             
             table = Table(data, colWidths=[15*mm, 60*mm, 50*mm, 30*mm])
-            table.setStyle(TableStyle([
-                ('FONT', (0, 0), (-1, -1), font_name, 10),
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-                ('ALIGN', (3, 0), (3, -1), 'RIGHT'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('ROWHEIGHTS', (0, 0), (-1, -1), 7*mm),
-            ]))
+            table.setStyle(RenderingContext.table_style('program'))
             
             elements.append(table)
         
@@ -318,103 +252,190 @@ class PDFGenerator:
         return buffer
     
     @classmethod
-    def generate_all_data_pdf(cls, competition):
+    def generate_all_data_pdf(cls, competition, workers=None):
         """
         緊急時対応用：全データPDF
         ネットワーク障害時に備えた全データ出力
+        
+        Args:
+            workers: 並列描画のワーカー数（None の場合は settings.REPORT_RENDER_WORKERS）。
+                2以上かつ pypdf があり選手数が多い場合は、種目をワーカー数のまとまりに分けて
+                別プロセスで描画・連結する（まとまりの境目で改ページする）
         """
         buffer = io.BytesIO()
-        font_name = cls._setup_fonts()
-        
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=A4,
-            rightMargin=10*mm,
-            leftMargin=10*mm,
-            topMargin=15*mm,
-            bottomMargin=15*mm
-        )
+        cls.write_all_data_pdf(competition, buffer, workers)
+        buffer.seek(0)
+        return buffer
+    
+    @classmethod
+    def generate_all_data_pdf_file(cls, competition, workers=None):
+        """
+        全データPDFを一時ファイルに書き出して返す（省メモリ版）
         
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontName=font_name,
-            fontSize=20,
-            spaceAfter=10*mm
-        )
+        出力をメモリに持たないため、大規模な大会でもメモリ使用量が増えない。
+        返すファイルは先頭に戻してあり、閉じると削除される。
+        """
+        f = tempfile.TemporaryFile(suffix='.pdf')
+        try:
+            cls.write_all_data_pdf(competition, f, workers)
+        except BaseException:
+            f.close()
+            raise
+        f.seek(0)
+        return f
+    
+    @classmethod
+    def write_all_data_pdf(cls, competition, output, workers=None):
+        """
+        全データPDFを output（バイナリのファイルオブジェクト）に書き出す
         
-        race_title_style = ParagraphStyle(
-            'RaceTitle',
-            parent=styles['Heading2'],
-            fontName=font_name,
-            fontSize=16,
-            spaceBefore=15*mm,
-            spaceAfter=5*mm
-        )
+        出力はメモリに持たず output に直接書き込む。直列描画では組編成を種目ごとに
+        読み込みながら描画し、描画済みの種目のフローアブルは解放する
+        （大会全体の Table を同時に保持しない）。
+        """
+        header = {
+            'name': competition.name,
+            'event_date': competition.event_date.strftime('%Y年%m月%d日'),
+            'generated_at': datetime.now().strftime('%Y年%m月%d日 %H:%M:%S'),
+        }
+        races = list(competition.races.filter(is_active=True).order_by('display_order', 'pk'))
+        
+        workers = parallel.worker_count(workers)
+        if workers > 1 and parallel.can_parallelize(
+            workers, len(races), cls._all_data_assignments(races).count()
+        ):
+            race_data = list(cls._iter_all_data_races(races))
+            groups = parallel.partition(race_data, workers, weight=cls._race_rows)
+            parts = [(header if i == 0 else None, group) for i, group in enumerate(groups)]
+            parallel.render(render_all_data_part, parts, workers, output=output)
+            return
+        
+        cls._build_all_data(output, header, cls._iter_all_data_races(races))
+    
+    @staticmethod
+    def _all_data_assignments(races):
+        return HeatAssignment.objects.filter(heat__race__in=races)
+    
+    @classmethod
+    def _iter_all_data_races(cls, races):
+        """
+        全データPDFの内容（種目・組・選手）を種目ごとに返す
         
-        # タイトル
-        elements.append(Paragraph(
-            f"{competition.name}",
-            title_style
-        ))
-        elements.append(Paragraph(
-            f"開催日: {competition.event_date.strftime('%Y年%m月%d日')}",
-            styles['Normal']
-        ))
-        elements.append(Paragraph(
-            f"出力日時: {datetime.now().strftime('%Y年%m月%d日 %H:%M:%S')}",
-            styles['Normal']
-        ))
-        elements.append(Paragraph(
-            "※緊急時バックアップ用データ",
-            styles['Normal']
-        ))
+        組編成は大会分を1クエリ（種目の表示順に並べて iterator() で少しずつ）で読み込み、
+        プロセス間で受け渡せる辞書・リストにする。
+        """
+        heats = {}
+        for heat in Heat.objects.filter(race__in=races).order_by('heat_number'):
+            heats.setdefault(heat.race_id, []).append({'number': heat.heat_number, 'rows': []})
         
-        # 各種目
-        for race in competition.races.filter(is_active=True).order_by('display_order'):
-            elements.append(Paragraph(race.name, race_title_style))
-            
-            for heat in race.heats.order_by('heat_number'):
-                elements.append(Paragraph(
-                    f"{heat.heat_number}組",
-                    styles['Heading3']
-                ))
-                
-                data = [['腰', '氏名', '所属', '申告', '状態']]
-                
-                for assignment in heat.assignments.select_related(
-                    'entry', 'entry__athlete', 'entry__athlete__organization'
-                ).order_by('bib_number'):
+        assignments = cls._all_data_assignments(races).select_related(
+            'heat', 'entry', 'entry__athlete', 'entry__athlete__organization'
+        ).order_by(
+            'heat__race__display_order', 'heat__race_id', 'heat__heat_number', 'bib_number'
+        ).iterator(chunk_size=CHUNK_SIZE)
+        groups = groupby(assignments, key=lambda assignment: assignment.heat.race_id)
+        group = next(groups, None)
+        
+        for race in races:
+            race_heats = heats.pop(race.pk, [])
+            if group is not None and group[0] == race.pk:
+                rows = {heat['number']: heat['rows'] for heat in race_heats}
+                for assignment in group[1]:
                     athlete = assignment.entry.athlete
                     org_name = athlete.organization.short_name if athlete.organization else ''
-                    
-                    data.append([
+                    rows[assignment.heat.heat_number].append([
                         str(assignment.bib_number),
                         athlete.full_name,
                         org_name,
                         assignment.entry.declared_time_display,
                         assignment.get_status_display()
                     ])
+                group = next(groups, None)
+            yield {'name': race.name, 'heats': race_heats}
+    
+    @staticmethod
+    def _race_rows(race):
+        """種目の描画量（選手数＋組・種目の見出し）"""
+        return 1 + sum(1 + len(heat['rows']) for heat in race['heats'])
+    
+    @classmethod
+    def _build_all_data(cls, output, header, races):
+        """全データPDFを描画（header が None なら表紙部分なし。races は種目の反復可能オブジェクト）"""
+        doc = _RaceByRaceDocTemplate(
+            output,
+            pagesize=A4,
+            rightMargin=10*mm,
+            leftMargin=10*mm,
+            topMargin=15*mm,
+            bottomMargin=15*mm
+        )
+        doc.build_chunks(cls._all_data_flowables(header, races))
+    
+    @classmethod
+    def _all_data_flowables(cls, header, races):
+        """全データPDFのフローアブルを種目ごとのリストで返す（先頭は表紙部分）"""
+        normal_style = RenderingContext.base_style('Normal')
+        race_title_style = RenderingContext.paragraph_style('all_data_race')
+        heat_title_style = RenderingContext.base_style('Heading3')
+        table_style = RenderingContext.table_style('all_data')
+        
+        # タイトル
+        if header:
+            yield [
+                Paragraph(header['name'], RenderingContext.paragraph_style('all_data_title')),
+                Paragraph(f"開催日: {header['event_date']}", normal_style),
+                Paragraph(f"出力日時: {header['generated_at']}", normal_style),
+                Paragraph("※緊急時バックアップ用データ", normal_style),
+            ]
+        
+        # 各種目
+        for race in races:
+            elements = [Paragraph(race['name'], race_title_style)]
+            
+            for heat in race['heats']:
+                elements.append(Paragraph(f"{heat['number']}組", heat_title_style))
                 
-                if len(data) > 1:
+                if heat['rows']:
+                    data = [['腰', '氏名', '所属', '申告', '状態']] + heat['rows']
                     table = Table(data, colWidths=[12*mm, 55*mm, 45*mm, 25*mm, 25*mm])
-                    table.setStyle(TableStyle([
-                        ('FONT', (0, 0), (-1, -1), font_name, 9),
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                        ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-                        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                        ('ROWHEIGHTS', (0, 0), (-1, -1), 6*mm),
-                    ]))
+                    table.setStyle(table_style)
                     elements.append(table)
                     elements.append(Spacer(1, 3*mm))
-        
-        doc.build(elements)
-        buffer.seek(0)
-        return buffer
+            
+            yield elements
+
+
+class _RaceByRaceDocTemplate(SimpleDocTemplate):
+    """
+    種目ごとのフローアブルを描画しながら順に追加する SimpleDocTemplate
+    
+    build() は渡したリストの先頭から描画済みのフローアブルを取り除いていく。
+    フローアブルを描画するたびに呼ばれる afterFlowable() で、残りが LOOKAHEAD 件以下に
+    なったら次のまとまり（種目）を同じリストに追加する。描画済みの Table は参照が
+    なくなり解放されるため、同時に保持するのは1〜2種目分になる。
+    """
+    
+    LOOKAHEAD = 2
+    
+    def build_chunks(self, chunks):
+        """まとまり（フローアブルのリスト）の反復可能オブジェクトから文書を描画"""
+        self._chunks = iter(chunks)
+        self._flowables = []
+        self._refill()
+        self.build(self._flowables)
+        if next(self._chunks, None) is not None:
+            # 追加が間に合わずに build() が終わった（描画を打ち切った文書は返さない）
+            raise RuntimeError('全データPDFの描画が途中で終了しました')
+    
+    def _refill(self):
+        while len(self._flowables) <= self.LOOKAHEAD:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._flowables.extend(chunk)
+    
+    def afterFlowable(self, flowable):
+        self._refill()
 
 
 class ParkingPermitPDFGenerator:
@@ -427,7 +448,6 @@ class ParkingPermitPDFGenerator:
         ダッシュボードに掲示するための許可証
         """
         buffer = io.BytesIO()
-        font_name = PDFGenerator._setup_fonts()
         
         doc = SimpleDocTemplate(
             buffer,
@@ -439,55 +459,7 @@ class ParkingPermitPDFGenerator:
         )
         
         elements = []
-        styles = getSampleStyleSheet()
-        
-        # カスタムスタイル
-        title_style = ParagraphStyle(
-            'PermitTitle',
-            parent=styles['Heading1'],
-            fontName=font_name,
-            fontSize=28,
-            alignment=1,  # CENTER
-            spaceAfter=15*mm,
-            textColor=colors.darkblue
-        )
-        
-        subtitle_style = ParagraphStyle(
-            'PermitSubtitle',
-            parent=styles['Normal'],
-            fontName=font_name,
-            fontSize=14,
-            alignment=1,
-            spaceAfter=10*mm
-        )
-        
-        org_style = ParagraphStyle(
-            'OrgName',
-            parent=styles['Heading1'],
-            fontName=font_name,
-            fontSize=32,
-            alignment=1,
-            spaceAfter=15*mm,
-            textColor=colors.black
-        )
-        
-        # info_style は現在未使用だが、将来の拡張用に残す
-        _ = ParagraphStyle(
-            'InfoStyle',
-            parent=styles['Normal'],
-            fontName=font_name,
-            fontSize=14,
-            spaceAfter=5*mm
-        )
-        
-        large_info_style = ParagraphStyle(
-            'LargeInfoStyle',
-            parent=styles['Normal'],
-            fontName=font_name,
-            fontSize=20,
-            alignment=1,
-            spaceAfter=10*mm
-        )
+        subtitle_style = RenderingContext.paragraph_style('permit_subtitle')
         
         # ヘッダー枠
         elements.append(Spacer(1, 10*mm))
@@ -498,7 +470,7 @@ class ParkingPermitPDFGenerator:
             f"第{competition.name.split('第')[-1].split('回')[0]}回" if '第' in competition.name else '',
             subtitle_style
         ))
-        elements.append(Paragraph("駐 車 許 可 証", title_style))
+        elements.append(Paragraph("駐 車 許 可 証", RenderingContext.paragraph_style('permit_title')))
         
         # 大会名
         elements.append(Paragraph(competition.name, subtitle_style))
@@ -507,7 +479,7 @@ class ParkingPermitPDFGenerator:
         # 団体名（大きく表示）
         elements.append(Paragraph(
             parking_request.organization.name,
-            org_style
+            RenderingContext.paragraph_style('permit_organization')
         ))
         
         elements.append(Spacer(1, 15*mm))
@@ -518,7 +490,7 @@ class ParkingPermitPDFGenerator:
         # 駐車場名を大きく表示
         elements.append(Paragraph(
             f"駐車場: {permit_info['parking_lot']}",
-            large_info_style
+            RenderingContext.paragraph_style('permit_large_info')
         ))
         
         elements.append(Spacer(1, 10*mm))
@@ -557,27 +529,13 @@ class ParkingPermitPDFGenerator:
         
         if len(table_data) > 1:
             table = Table(table_data, colWidths=[50*mm, 100*mm])
-            table.setStyle(TableStyle([
-                ('FONT', (0, 0), (-1, -1), font_name, 14),
-                ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('ROWHEIGHTS', (0, 0), (-1, -1), 12*mm),
-            ]))
+            table.setStyle(RenderingContext.table_style('permit'))
             elements.append(table)
         
         elements.append(Spacer(1, 20*mm))
         
         # 注意事項
-        note_style = ParagraphStyle(
-            'NoteStyle',
-            parent=styles['Normal'],
-            fontName=font_name,
-            fontSize=10,
-            spaceAfter=3*mm
-        )
-        
+        note_style = RenderingContext.paragraph_style('permit_note')
         elements.append(Paragraph("【注意事項】", note_style))
         notes = [
             "・本許可証はダッシュボードの見える位置に掲示してください。",
@@ -591,13 +549,7 @@ class ParkingPermitPDFGenerator:
         elements.append(Spacer(1, 15*mm))
         
         # 発行情報
-        footer_style = ParagraphStyle(
-            'FooterStyle',
-            parent=styles['Normal'],
-            fontName=font_name,
-            fontSize=9,
-            alignment=2,  # RIGHT
-        )
+        footer_style = RenderingContext.paragraph_style('permit_footer')
         elements.append(Paragraph(
             f"発行日: {datetime.now().strftime('%Y年%m月%d日')}",
             footer_style
@@ -619,7 +571,6 @@ class ParkingPermitPDFGenerator:
         from payments.models import ParkingRequest
         
         buffer = io.BytesIO()
-        font_name = PDFGenerator._setup_fonts()
         
         doc = SimpleDocTemplate(
             buffer,
@@ -631,7 +582,6 @@ class ParkingPermitPDFGenerator:
         )
         
         elements = []
-        styles = getSampleStyleSheet()
         
         parking_requests = ParkingRequest.objects.filter(
             competition=competition,
@@ -640,11 +590,10 @@ class ParkingPermitPDFGenerator:
         
         for i, parking_request in enumerate(parking_requests):
             if i > 0:
-                from reportlab.platypus import PageBreak
                 elements.append(PageBreak())
             
             # 各団体の許可証を追加
-            cls._add_permit_page(elements, parking_request, font_name, styles)
+            cls._add_permit_page(elements, parking_request)
         
         if elements:
             doc.build(elements)
@@ -653,41 +602,18 @@ class ParkingPermitPDFGenerator:
         return buffer
     
     @classmethod
-    def _add_permit_page(cls, elements, parking_request, font_name, styles):
+    def _add_permit_page(cls, elements, parking_request):
         """1団体分の許可証ページを追加"""
-        # スタイル定義
-        title_style = ParagraphStyle(
-            'PermitTitle',
-            parent=styles['Heading1'],
-            fontName=font_name,
-            fontSize=24,
-            alignment=1,
-            spaceAfter=10*mm
-        )
-        
-        org_style = ParagraphStyle(
-            'OrgName',
-            parent=styles['Heading1'],
-            fontName=font_name,
-            fontSize=28,
-            alignment=1,
-            spaceAfter=10*mm
-        )
-        
-        info_style = ParagraphStyle(
-            'InfoStyle',
-            parent=styles['Normal'],
-            fontName=font_name,
-            fontSize=16,
-            alignment=1,
-            spaceAfter=5*mm
-        )
+        info_style = RenderingContext.paragraph_style('permit_page_info')
         
         # コンテンツ
-        elements.append(Paragraph("駐 車 許 可 証", title_style))
+        elements.append(Paragraph("駐 車 許 可 証", RenderingContext.paragraph_style('permit_page_title')))
         elements.append(Paragraph(parking_request.competition.name, info_style))
         elements.append(Spacer(1, 10*mm))
-        elements.append(Paragraph(parking_request.organization.name, org_style))
+        elements.append(Paragraph(
+            parking_request.organization.name,
+            RenderingContext.paragraph_style('permit_page_organization')
+        ))
         elements.append(Spacer(1, 10*mm))
         
         permit_info = parking_request.get_permit_info()
@@ -714,172 +640,70 @@ class ResultSheetPDFGenerator:
         結果記録用紙PDF（1組分）
         陸連公式フォーマット準拠
         """
-        buffer = io.BytesIO()
-        font_name = PDFGenerator._setup_fonts()
-        
-        # 横向きA4
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=landscape(A4),
-            rightMargin=10*mm,
-            leftMargin=10*mm,
-            topMargin=10*mm,
-            bottomMargin=10*mm
-        )
-        
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # タイトルスタイル
-        title_style = ParagraphStyle(
-            'ResultTitle',
-            parent=styles['Heading1'],
-            fontName=font_name,
-            fontSize=14,
-            alignment=1,
-            spaceAfter=5*mm
-        )
-        
-        # ヘッダー情報
-        race = heat.race
-        competition = race.competition
-        
-        elements.append(Paragraph(
-            f"{competition.name}　{race.name}　{heat.heat_number}組",
-            title_style
-        ))
-        
-        # 日付
-        date_style = ParagraphStyle(
-            'DateStyle',
-            parent=styles['Normal'],
-            fontName=font_name,
-            fontSize=10,
-            alignment=2,  # RIGHT
-        )
-        elements.append(Paragraph(
-            f"{competition.event_date.strftime('%Y年%m月%d日')}",
-            date_style
-        ))
-        elements.append(Spacer(1, 3*mm))
-        
-        # ヘッダー行（2行構成）
-        header_row1 = ['ﾚｰﾝ', 'No', '競技者名', '所属', '所属地', '記録', '順位', 'ｺﾒﾝﾄ', '通過', '備考']
-        
-        # データ行
-        assignments = heat.assignments.select_related(
-            'entry', 'entry__athlete', 'entry__athlete__organization'
-        ).order_by('bib_number')
-        
-        data_rows = []
-        
-        for assignment in assignments:
-            athlete = assignment.entry.athlete
-            org = athlete.organization
-            org_name = org.short_name if org else ''
-            
-            # 所属地（都道府県）- organizationのprefectureまたはathleteの情報から取得
-            prefecture = ''
-            if org and hasattr(org, 'prefecture') and org.prefecture:
-                prefecture = org.prefecture
-            elif hasattr(athlete, 'prefecture') and athlete.prefecture:
-                prefecture = athlete.prefecture
-            
-            # カナ名（半角カナ）
-            kana_name = cls._to_half_width_kana(athlete.full_name_kana) if athlete.full_name_kana else ''
-            
-            # 漢字名＋年齢コード
-            birth_year = athlete.birth_date.year if athlete.birth_date else None
-            age_code = ''
-            if birth_year:
-                age_code = f"（{str(birth_year)[2:]}）"
-            kanji_name = f"{athlete.full_name}{age_code}"
-            
-            # ランダム4桁No生成
-            random_no = random.randint(1000, 9999)
-            
-            # 2行を1セルにまとめる形式
-            # 1行目: レーン, No, カナ名, 所属
-            # 2行目: 空, 空, 漢字名, 所属地, 記録, 順位, コメント, 通過, 備考
-            data_rows.append([
-                str(assignment.bib_number or ''),  # レーン（腰番号）
-                str(random_no),  # No（ランダム4桁）
-                kana_name,  # カナ名
-                org_name,  # 所属
-                prefecture,  # 所属地
-                '',  # 記録（空欄）
-                '',  # 順位（空欄）
-                '',  # コメント（空欄）
-                '',  # 通過（空欄）
-                '',  # 備考（空欄）
-            ])
-            data_rows.append([
-                '',  # レーン（空）
-                '',  # No（空）
-                kanji_name,  # 漢字名
-                '',  # 所属（空）
-                '',  # 所属地（空）
-                '',  # 記録（空欄）
-                '',  # 順位（空欄）
-                '',  # コメント（空欄）
-                '',  # 通過（空欄）
-                '',  # 備考（空欄）
-            ])
-        
-        # テーブル全体を構築
-        all_data = [header_row1] + data_rows
-        
-        # 列幅設定
-        col_widths = [15*mm, 15*mm, 55*mm, 45*mm, 25*mm, 30*mm, 15*mm, 25*mm, 25*mm, 25*mm]
+        return cls._build_sheets(cls._sheets([heat]))
+    
+    @classmethod
+    def generate_all_result_sheets_pdf(cls, race, workers=None):
+        """
+        全組の結果記録用紙を一括生成（1PDFに複数ページ）
         
-        table = Table(all_data, colWidths=col_widths)
+        Args:
+            workers: 並列描画のワーカー数（None の場合は settings.REPORT_RENDER_WORKERS）。
+                2以上かつ pypdf があり選手数が多い場合は、組をワーカー数のまとまりに分けて
+                別プロセスで描画・連結する（1組1ページのため直列描画と同じページ構成）
+        """
+        sheets = cls._sheets(race.heats.select_related('race__competition').order_by('heat_number'))
         
-        # スタイル設定
-        style_commands = [
-            ('FONT', (0, 0), (-1, -1), font_name, 9),
-            ('FONT', (0, 0), (-1, 0), font_name, 8),  # ヘッダーは小さめ
-            ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.9, 0.9, 0.9)),  # ヘッダー背景
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('ALIGN', (2, 1), (2, -1), 'LEFT'),  # 競技者名は左寄せ
-            ('ALIGN', (3, 1), (3, -1), 'LEFT'),  # 所属は左寄せ
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('GRID', (0, 0), (-1, 0), 1, colors.black),  # ヘッダー罫線
-            ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black),  # ヘッダー下線
-            ('ROWHEIGHTS', (0, 0), (0, 0), 7*mm),  # ヘッダー行高さ
-        ]
+        workers = parallel.worker_count(workers)
+        if parallel.can_parallelize(workers, len(sheets), sum(len(sheet['rows']) for sheet in sheets)):
+            groups = parallel.partition(sheets, workers, weight=lambda sheet: 1 + len(sheet['rows']))
+            return parallel.render(render_result_sheets, groups, workers)
         
-        # データ行の罫線と行高さ
-        for i in range(1, len(all_data)):
-            style_commands.append(('ROWHEIGHTS', (0, i), (-1, i), 6*mm))
-            # 2行ごとに下線（選手ごとの区切り）
-            if i % 2 == 0:
-                style_commands.append(('LINEBELOW', (0, i), (-1, i), 1, colors.black))
-            else:
-                style_commands.append(('LINEBELOW', (0, i), (-1, i), 0.5, colors.grey))
+        return cls._build_sheets(sheets)
+    
+    @classmethod
+    def generate_result_sheets_by_race(cls, races, workers=None):
+        """
+        複数種目の結果記録用紙PDF（種目ごとに全組）をまとめて生成
         
-        # 縦線
-        style_commands.append(('LINEBEFORE', (0, 0), (0, -1), 1, colors.black))
-        for col in range(1, len(col_widths) + 1):
-            style_commands.append(('LINEBEFORE', (col, 0), (col, -1), 0.5, colors.grey))
-        style_commands.append(('LINEAFTER', (-1, 0), (-1, -1), 1, colors.black))
+        1種目分の行数は並列描画の閾値（parallel.MIN_ROWS）に届かないことが多いため、
+        対象の種目全体の行数で判定し、種目をワーカー数のまとまりに分けて別プロセスで描画する。
+        組編成は対象の種目分をまとめて読み込む。
         
-        table.setStyle(TableStyle(style_commands))
-        elements.append(table)
+        Args:
+            workers: 並列描画のワーカー数（None の場合は settings.REPORT_RENDER_WORKERS）
         
-        doc.build(elements)
-        buffer.seek(0)
-        return buffer
+        Returns:
+            dict: 種目のID -> PDFのバイト列（組がない種目は空）
+        """
+        races = list(races)
+        heats = list(
+            Heat.objects.filter(race__in=races).select_related('race__competition').order_by('heat_number')
+        )
+        sheets_by_race = {race.pk: [] for race in races}
+        for heat, sheet in zip(heats, cls._sheets(heats), strict=True):
+            sheets_by_race[heat.race_id].append(sheet)
+        race_sheets = [(race.pk, sheets_by_race[race.pk]) for race in races if sheets_by_race[race.pk]]
+        
+        documents = {race.pk: b'' for race in races}
+        workers = parallel.worker_count(workers)
+        rows = sum(len(sheet['rows']) for _, sheets in race_sheets for sheet in sheets)
+        if parallel.can_parallelize(workers, len(race_sheets), rows):
+            groups = parallel.partition(
+                race_sheets, workers, weight=lambda item: sum(1 + len(sheet['rows']) for sheet in item[1])
+            )
+            for rendered in parallel.map_parts(render_result_sheets_by_race, groups, workers):
+                documents.update(rendered)
+        else:
+            documents.update(render_result_sheets_by_race(race_sheets))
+        return documents
     
     @classmethod
-    def generate_all_result_sheets_pdf(cls, race):
-        """
-        全組の結果記録用紙を一括生成（1PDFに複数ページ）
-        """
-        from reportlab.platypus import PageBreak
-        
+    def _build_sheets(cls, sheets):
+        """結果記録用紙を描画（1組1ページ、組がなければ空のバッファ）"""
         buffer = io.BytesIO()
-        font_name = PDFGenerator._setup_fonts()
         
+        # 横向きA4
         doc = SimpleDocTemplate(
             buffer,
             pagesize=landscape(A4),
@@ -890,15 +714,11 @@ class ResultSheetPDFGenerator:
         )
         
         elements = []
-        styles = getSampleStyleSheet()
-        
-        heats = race.heats.order_by('heat_number')
-        
-        for i, heat in enumerate(heats):
+        for i, sheet in enumerate(sheets):
             if i > 0:
                 elements.append(PageBreak())
             
-            cls._add_result_sheet_page(elements, heat, font_name, styles)
+            cls._add_result_sheet_page(elements, sheet)
         
         if elements:
             doc.build(elements)
@@ -907,47 +727,18 @@ class ResultSheetPDFGenerator:
         return buffer
     
     @classmethod
-    def _add_result_sheet_page(cls, elements, heat, font_name, styles):
-        """1組分の結果記録用紙ページを追加"""
-        # タイトルスタイル
-        title_style = ParagraphStyle(
-            'ResultTitle',
-            parent=styles['Heading1'],
-            fontName=font_name,
-            fontSize=14,
-            alignment=1,
-            spaceAfter=5*mm
-        )
-        
-        race = heat.race
-        competition = race.competition
-        
-        elements.append(Paragraph(
-            f"{competition.name}　{race.name}　{heat.heat_number}組",
-            title_style
-        ))
-        
-        date_style = ParagraphStyle(
-            'DateStyle',
-            parent=styles['Normal'],
-            fontName=font_name,
-            fontSize=10,
-            alignment=2,
-        )
-        elements.append(Paragraph(
-            f"{competition.event_date.strftime('%Y年%m月%d日')}",
-            date_style
-        ))
-        elements.append(Spacer(1, 3*mm))
+    def _sheets(cls, heats):
+        """
+        結果記録用紙の内容（組ごとの見出しと2行1選手の表データ）を読み込み
         
-        # ヘッダー
-        header_row = ['ﾚｰﾝ', 'No', '競技者名', '所属', '所属地', '記録', '順位', 'ｺﾒﾝﾄ', '通過', '備考']
+        組編成は対象の組分を1クエリで取得し、プロセス間で受け渡せる辞書・リストにする。
+        """
+        heats = list(heats)
+        rows = {heat.pk: [] for heat in heats}
         
-        assignments = heat.assignments.select_related(
+        assignments = HeatAssignment.objects.filter(heat__in=heats).select_related(
             'entry', 'entry__athlete', 'entry__athlete__organization'
-        ).order_by('bib_number')
-        
-        data_rows = []
+        ).order_by('heat_id', 'bib_number')
         
         for assignment in assignments:
             athlete = assignment.entry.athlete
@@ -971,7 +762,7 @@ class ResultSheetPDFGenerator:
             random_no = random.randint(1000, 9999)
             
             # 1行目（カナ名）
-            data_rows.append([
+            rows[assignment.heat_id].append([
                 str(assignment.bib_number or ''),
                 str(random_no),
                 kana_name,
@@ -984,7 +775,7 @@ class ResultSheetPDFGenerator:
                 '',
             ])
             # 2行目（漢字名）
-            data_rows.append([
+            rows[assignment.heat_id].append([
                 '',
                 '',
                 kanji_name,
@@ -997,24 +788,34 @@ class ResultSheetPDFGenerator:
                 '',
             ])
         
-        all_data = [header_row] + data_rows
+        sheets = []
+        for heat in heats:
+            race = heat.race
+            competition = race.competition
+            sheets.append({
+                'title': f"{competition.name}　{race.name}　{heat.heat_number}組",
+                'event_date': competition.event_date.strftime('%Y年%m月%d日'),
+                'rows': rows[heat.pk],
+            })
+        return sheets
+    
+    @classmethod
+    def _add_result_sheet_page(cls, elements, sheet):
+        """1組分の結果記録用紙ページを追加（陸連公式フォーマット準拠）"""
+        elements.append(Paragraph(sheet['title'], RenderingContext.paragraph_style('result_title')))
+        elements.append(Paragraph(sheet['event_date'], RenderingContext.paragraph_style('result_date')))
+        elements.append(Spacer(1, 3*mm))
+        
+        # ヘッダー
+        header_row = ['ﾚｰﾝ', 'No', '競技者名', '所属', '所属地', '記録', '順位', 'ｺﾒﾝﾄ', '通過', '備考']
+        
+        all_data = [header_row] + sheet['rows']
         col_widths = [15*mm, 15*mm, 55*mm, 45*mm, 25*mm, 30*mm, 15*mm, 25*mm, 25*mm, 25*mm]
         
         table = Table(all_data, colWidths=col_widths)
         
-        style_commands = [
-            ('FONT', (0, 0), (-1, -1), font_name, 9),
-            ('FONT', (0, 0), (-1, 0), font_name, 8),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.9, 0.9, 0.9)),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('ALIGN', (2, 1), (2, -1), 'LEFT'),
-            ('ALIGN', (3, 1), (3, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('GRID', (0, 0), (-1, 0), 1, colors.black),
-            ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black),
-            ('ROWHEIGHTS', (0, 0), (0, 0), 7*mm),
-        ]
-        
+        # ヘッダー部分は共有スタイル、行ごとの罫線と行高さをここで追加
+        style_commands = []
         for i in range(1, len(all_data)):
             style_commands.append(('ROWHEIGHTS', (0, i), (-1, i), 6*mm))
             if i % 2 == 0:
@@ -1027,7 +828,7 @@ class ResultSheetPDFGenerator:
             style_commands.append(('LINEBEFORE', (col, 0), (col, -1), 0.5, colors.grey))
         style_commands.append(('LINEAFTER', (-1, 0), (-1, -1), 1, colors.black))
         
-        table.setStyle(TableStyle(style_commands))
+        table.setStyle(RenderingContext.table_style('result_sheet', style_commands))
         elements.append(table)
     
     @staticmethod
@@ -1087,7 +888,6 @@ class EntryConfirmationPDFGenerator:
             BytesIO: PDFファイルのバッファ
         """
         buffer = io.BytesIO()
-        font_name = PDFGenerator._setup_fonts()
         
         doc = SimpleDocTemplate(
             buffer,
@@ -1099,28 +899,10 @@ class EntryConfirmationPDFGenerator:
         )
         
         elements = []
-        styles = getSampleStyleSheet()
-        
-        # スタイル定義
-        title_style = ParagraphStyle(
-            'ConfirmationTitle',
-            parent=styles['Heading1'],
-            fontName=font_name,
-            fontSize=18,
-            alignment=1,  # CENTER
-            spaceAfter=10*mm
-        )
-        
-        header_style = ParagraphStyle(
-            'HeaderStyle',
-            parent=styles['Normal'],
-            fontName=font_name,
-            fontSize=11,
-            spaceAfter=3*mm
-        )
+        header_style = RenderingContext.paragraph_style('confirmation_header')
         
         # タイトル
-        elements.append(Paragraph("エントリー申込確認書", title_style))
+        elements.append(Paragraph("エントリー申込確認書", RenderingContext.paragraph_style('confirmation_title')))
         
         # 大会情報
         elements.append(Paragraph(
@@ -1175,34 +957,13 @@ class EntryConfirmationPDFGenerator:
         col_widths = [12*mm, 40*mm, 45*mm, 45*mm, 25*mm, 25*mm]
         table = Table(table_data, colWidths=col_widths)
         
-        table.setStyle(TableStyle([
-            ('FONT', (0, 0), (-1, -1), font_name, 9),
-            ('FONT', (0, 0), (-1, 0), font_name, 9),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.2, 0.3, 0.5)),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('ALIGN', (0, 1), (0, -1), 'CENTER'),
-            ('ALIGN', (4, 1), (-1, -1), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('GRID', (0, 0), (-1, -2), 0.5, colors.grey),
-            ('LINEABOVE', (0, -1), (-1, -1), 1, colors.black),
-            ('FONT', (0, -1), (-1, -1), font_name, 10),
-            ('FONTNAME', (4, -1), (-1, -1), font_name),
-            ('ROWHEIGHTS', (0, 0), (-1, -1), 7*mm),
-        ]))
+        table.setStyle(RenderingContext.table_style('confirmation'))
         
         elements.append(table)
         elements.append(Spacer(1, 15*mm))
         
         # サマリー
-        summary_style = ParagraphStyle(
-            'SummaryStyle',
-            parent=styles['Normal'],
-            fontName=font_name,
-            fontSize=12,
-            alignment=2,  # RIGHT
-            spaceAfter=5*mm
-        )
+        summary_style = RenderingContext.paragraph_style('confirmation_summary')
         
         elements.append(Paragraph(
             f"<b>エントリー件数:</b> {entries.count()}件",
@@ -1216,13 +977,7 @@ class EntryConfirmationPDFGenerator:
         elements.append(Spacer(1, 20*mm))
         
         # 注意事項
-        note_style = ParagraphStyle(
-            'NoteStyle',
-            parent=styles['Normal'],
-            fontName=font_name,
-            fontSize=9,
-            spaceAfter=2*mm
-        )
+        note_style = RenderingContext.paragraph_style('confirmation_note')
         
         elements.append(Paragraph("【ご注意】", note_style))
         notes = [
@@ -1236,3 +991,26 @@ class EntryConfirmationPDFGenerator:
         doc.build(elements)
         buffer.seek(0)
         return buffer
+
+
+# 並列描画（reports.parallel）の子プロセスで呼ぶ関数（pickle できるようモジュールレベルに置く）
+
+def render_all_data_part(part):
+    """全データPDFの一部（(表紙の内容または None, 種目のリスト)）を描画してバイト列を返す"""
+    header, races = part
+    buffer = io.BytesIO()
+    PDFGenerator._build_all_data(buffer, header, races)
+    return buffer.getvalue()
+
+
+def render_result_sheets(sheets):
+    """結果記録用紙（組のリスト）を描画してバイト列を返す"""
+    return ResultSheetPDFGenerator._build_sheets(sheets).getvalue()
+
+
+def render_result_sheets_by_race(race_sheets):
+    """種目ごとの結果記録用紙（(種目のID, 組のリスト) のリスト）を描画して 種目のID -> バイト列 を返す"""
+    return {
+        race_id: ResultSheetPDFGenerator._build_sheets(sheets).getvalue()
+        for race_id, sheets in race_sheets
+    }
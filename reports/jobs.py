@@ -0,0 +1,220 @@
+"""
+帳票のバックグラウンド生成（データベースをキューとするジョブ実行）
+
+外部のメッセージブローカーは使わず、ReportJob テーブルをキューにする。
+ビューは enqueue() でジョブを登録してすぐに応答し、
+run_report_jobs コマンド（ワーカー）が claim_next() → run() で1件ずつ生成する。
+
+ジョブの取得は PostgreSQL では SELECT ... FOR UPDATE SKIP LOCKED、
+さらに状態の条件付き UPDATE で二重実行を防ぐため、ワーカーを複数起動してもよい。
+生成したファイルは report_storage()（既定はデータベース）に保存し、ReportLog.file_path に記録する。
+完了・失敗から RETENTION を過ぎたジョブは purge_finished() がファイルごと削除する。
+"""
+import logging
+import os
+from datetime import timedelta
+
+from django.core.files.base import File
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ReportJob, ReportLog
+from .storage import report_storage
+
+logger = logging.getLogger(__name__)
+
+
+def _all_data_pdf(job):
+    from .generators import PDFGenerator
+
+    competition = job.competition
+    return (
+        PDFGenerator.generate_all_data_pdf_file(competition),
+        f"emergency_backup_{competition.event_date}.pdf",
+    )
+
+
+def _all_result_sheets_pdf(job):
+    from .generators import ResultSheetPDFGenerator
+
+    race = job.race
+    return (
+        ResultSheetPDFGenerator.generate_all_result_sheets_pdf(race),
+        f"result_sheets_{race.competition.event_date}_{race.name}.pdf",
+    )
+
+
+def _all_permits_pdf(job):
+    from .generators import ParkingPermitPDFGenerator
+
+    competition = job.competition
+    return ParkingPermitPDFGenerator.generate_all_permits_pdf(competition), f"all_parking_permits_{competition.pk}.pdf"
+
+
+# 帳票種別 -> 生成関数（ジョブを受け取り (ファイルオブジェクト, ファイル名) を返す）
+HANDLERS = {
+    'pdf_all': _all_data_pdf,
+    'pdf_result_sheet': _all_result_sheets_pdf,
+    'pdf_parking_permits': _all_permits_pdf,
+}
+
+
+class ReportJobRunner:
+    """帳票生成ジョブの登録・取得・実行"""
+
+    # 生成中のまま放置されたジョブを待機中に戻すまでの時間（ワーカー停止への備え）
+    STALE_AFTER = timedelta(minutes=30)
+    # 実行回数の上限（超えたら失敗にする）
+    MAX_ATTEMPTS = 3
+    # 完了・失敗したジョブと生成ファイルを残す期間
+    RETENTION = timedelta(days=2)
+
+    @classmethod
+    def enqueue(cls, report_type, competition, race=None, user=None):
+        """
+        ジョブを登録（同じ帳票のジョブが待機中・生成中ならそれを返す）
+
+        Returns:
+            ReportJob
+        """
+        if report_type not in HANDLERS:
+            raise ValueError(f'バックグラウンド生成に対応していない帳票です: {report_type}')
+
+        active = ReportJob.objects.filter(
+            report_type=report_type,
+            competition=competition,
+            race=race,
+            status__in=ReportJob.ACTIVE_STATUSES,
+        ).order_by('created_at').first()
+        if active:
+            return active
+
+        return ReportJob.objects.create(
+            report_type=report_type,
+            competition=competition,
+            race=race,
+            requested_by=user,
+        )
+
+    @classmethod
+    def claim_next(cls):
+        """
+        待機中のジョブを1件取得して生成中にする（なければ None）
+
+        他のワーカーがロック中の行は読み飛ばし、状態の条件付き更新で取得を確定する。
+        """
+        while True:
+            with transaction.atomic():
+                job = ReportJob.objects.select_for_update(skip_locked=True).filter(
+                    status=ReportJob.STATUS_PENDING
+                ).order_by('created_at', 'pk').first()
+                if job is None:
+                    return None
+
+                claimed = ReportJob.objects.filter(
+                    pk=job.pk, status=ReportJob.STATUS_PENDING
+                ).update(
+                    status=ReportJob.STATUS_RUNNING,
+                    started_at=timezone.now(),
+                    attempts=F('attempts') + 1,
+                )
+            if claimed:
+                job.refresh_from_db()
+                return job
+
+    @classmethod
+    def run(cls, job):
+        """
+        ジョブを実行して帳票を保存
+
+        成功時は ReportLog（file_path に保存先）を作成して完了に、例外時は失敗にする。
+        """
+        try:
+            output, filename = HANDLERS[job.report_type](job)
+            with output:
+                # 生成物（BytesIO または一時ファイル）を複製せずに少しずつ書き写す
+                path = report_storage().save(
+                    f"jobs/{job.competition_id}/{job.pk}{os.path.splitext(filename)[1]}",
+                    File(output),
+                )
+        except Exception as e:
+            logger.exception('帳票生成ジョブ %s が失敗しました', job.pk)
+            job.status = ReportJob.STATUS_FAILED
+            job.error = str(e)
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'error', 'finished_at'])
+            return job
+
+        with transaction.atomic():
+            job.report_log = ReportLog.objects.create(
+                report_type=job.report_type,
+                competition=job.competition,
+                race=job.race,
+                generated_by=job.requested_by,
+                file_path=path,
+            )
+            job.status = ReportJob.STATUS_DONE
+            job.filename = filename
+            job.error = ''
+            job.finished_at = timezone.now()
+            job.save(update_fields=['report_log', 'status', 'filename', 'error', 'finished_at'])
+        return job
+
+    @classmethod
+    def run_next(cls):
+        """待機中のジョブを1件実行（なければ None）"""
+        job = cls.claim_next()
+        if job is None:
+            return None
+        return cls.run(job)
+
+    @classmethod
+    def requeue_stale(cls):
+        """
+        生成中のまま STALE_AFTER を過ぎたジョブを待機中に戻す（実行回数の上限を超えたものは失敗）
+
+        Returns:
+            int: 待機中に戻した件数
+        """
+        stale = ReportJob.objects.filter(
+            status=ReportJob.STATUS_RUNNING,
+            started_at__lt=timezone.now() - cls.STALE_AFTER,
+        )
+        stale.filter(attempts__gte=cls.MAX_ATTEMPTS).update(
+            status=ReportJob.STATUS_FAILED,
+            error='生成がタイムアウトしました',
+            finished_at=timezone.now(),
+        )
+        return stale.filter(attempts__lt=cls.MAX_ATTEMPTS).update(status=ReportJob.STATUS_PENDING)
+
+    @classmethod
+    def open_artifact(cls, job):
+        """完了したジョブの生成ファイルを開く"""
+        return report_storage().open(job.report_log.file_path, 'rb')
+
+    @classmethod
+    def purge_finished(cls, retention=None):
+        """
+        完了・失敗から retention（既定は RETENTION）を過ぎたジョブを削除し、生成ファイルも消す
+
+        出力ログ（ReportLog）は出力の記録として残し、保存先だけ空にする。
+
+        Returns:
+            int: 削除したジョブ数
+        """
+        finished = ReportJob.objects.filter(
+            status__in=[ReportJob.STATUS_DONE, ReportJob.STATUS_FAILED],
+            finished_at__lt=timezone.now() - (retention or cls.RETENTION),
+        )
+        storage = report_storage()
+        log_ids = []
+        for log_id, path in finished.filter(report_log__isnull=False).values_list(
+            'report_log_id', 'report_log__file_path'
+        ):
+            if path:
+                storage.delete(path)
+            log_ids.append(log_id)
+        ReportLog.objects.filter(pk__in=log_ids).update(file_path='')
+        deleted, _ = finished.delete()
+        return deleted
@@ -0,0 +1,42 @@
+"""
+大会当日のオフライン用データ一式（ZIP）の生成コマンド
+
+使用方法:
+    python manage.py build_offline_bundles                  # 開催前・開催当日の公開中の大会
+    python manage.py build_offline_bundles --competition 3  # 大会を指定
+    python manage.py build_offline_bundles --force          # 全種目を生成し直す
+
+cron 等で毎晩実行する。前回から組編成・選手情報が変わった種目だけを生成し直し、
+変更があった大会はZIPの版番号を上げる。ZIP は REPORT_STORAGE（既定はデータベース）に
+保存するため、Web プロセスとディスクを共有していないサーバー（Render の Cron Job など）で動かしてよい。
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from competitions.models import Competition
+from reports.bundle import OfflineBundle
+
+
+class Command(BaseCommand):
+    help = '大会ごとのオフライン用データ一式（スタートリスト・点呼用PDF・結果記録用紙・組編成JSON）を生成します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--competition', type=int, help='対象の大会ID（省略時は開催前・開催当日の公開中の全大会）')
+        parser.add_argument('--force', action='store_true', help='変更のない種目も生成し直す')
+
+    def handle(self, *args, **options):
+        competitions = Competition.objects.all()
+        if options['competition']:
+            competitions = competitions.filter(pk=options['competition'])
+        else:
+            competitions = competitions.filter(is_published=True, event_date__gte=timezone.localdate())
+
+        for competition in competitions:
+            result = OfflineBundle.build(competition, force=options['force'])
+            if result['changed']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{competition.name}: v{result['version']}を生成しました"
+                    f"（{result['rebuilt']}種目を更新、{result['removed']}種目を削除）"
+                ))
+            else:
+                self.stdout.write(f"{competition.name}: 変更なし（v{result['version']}）")
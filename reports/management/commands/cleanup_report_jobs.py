@@ -0,0 +1,26 @@
+"""
+終了した帳票生成ジョブの削除コマンド
+
+使用方法:
+    python manage.py cleanup_report_jobs             # 完了・失敗から2日を過ぎたジョブ
+    python manage.py cleanup_report_jobs --days 7
+
+cron 等で定期実行する。生成ファイル（jobs/ 以下）も削除し、出力ログは残す。
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from reports.jobs import ReportJobRunner
+
+
+class Command(BaseCommand):
+    help = '終了した帳票生成ジョブ（ReportJob）と生成ファイルを削除します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='完了・失敗から何日経ったジョブを削除するか（既定は2日）')
+
+    def handle(self, *args, **options):
+        retention = timedelta(days=options['days']) if options['days'] else None
+        deleted = ReportJobRunner.purge_finished(retention)
+        self.stdout.write(f'{deleted}件の終了したジョブを削除しました')
@@ -0,0 +1,58 @@
+"""
+帳票生成ジョブのワーカー
+
+使用方法:
+    python manage.py run_report_jobs                 # 待機中のジョブを待ち続けて実行
+    python manage.py run_report_jobs --once          # 待機中のジョブをすべて実行して終了（cron 向け）
+    python manage.py run_report_jobs --interval 5    # ジョブがないときの待機秒数
+
+Web プロセスとは別に常駐させる（複数起動しても同じジョブは1回しか実行されない）。
+生成したファイルは REPORT_STORAGE（既定はデータベース）に保存するため、
+Web プロセスとディスクを共有していないサーバー（Render の Background Worker など）で動かしてよい。
+終了したジョブは cleanup_report_jobs コマンドで削除する。
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from reports.jobs import ReportJobRunner
+from reports.rendering import RenderingContext
+
+
+class Command(BaseCommand):
+    help = '帳票生成ジョブ（ReportJob）を順に実行します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='待機中のジョブがなくなったら終了する')
+        parser.add_argument('--interval', type=float, default=2.0, help='ジョブがないときの待機秒数')
+        parser.add_argument('--max-jobs', type=int, help='指定件数を実行したら終了する')
+
+    def handle(self, *args, **options):
+        # 最初のジョブを待たせないよう、フォント登録とスタイル構築を先に済ませる
+        RenderingContext.preload()
+        processed = 0
+        while True:
+            close_old_connections()
+            requeued = ReportJobRunner.requeue_stale()
+            if requeued:
+                self.stdout.write(self.style.WARNING(f'{requeued}件の停止したジョブを再実行します'))
+
+            job = ReportJobRunner.run_next()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+                continue
+
+            processed += 1
+            if job.status == job.STATUS_DONE:
+                self.stdout.write(f'#{job.pk} {job.get_report_type_display()}: {job.filename}')
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f'#{job.pk} {job.get_report_type_display()}: 失敗 ({job.error})'
+                ))
+            if options['max_jobs'] and processed >= options['max_jobs']:
+                break
+
+        self.stdout.write(f'{processed}件のジョブを実行しました')
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('competitions', '0009_race_seeding_strategy'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reportlog',
+            name='file_path',
+            field=models.CharField(blank=True, help_text='バックグラウンド生成した帳票の保存先（REPORT_FILES_ROOT からの相対パス）', max_length=500, verbose_name='ファイルパス'),
+        ),
+        migrations.AlterField(
+            model_name='reportlog',
+            name='report_type',
+            field=models.CharField(choices=[('csv_startlist', 'スタートリストCSV'), ('pdf_rollcall', '点呼用PDF'), ('pdf_program', 'プログラム原稿PDF'), ('pdf_all', '全データPDF'), ('pdf_result_sheet', '結果記録用紙PDF'), ('pdf_parking_permits', '駐車許可証PDF（一括）')], max_length=20, verbose_name='帳票種別'),
+        ),
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_type', models.CharField(choices=[('csv_startlist', 'スタートリストCSV'), ('pdf_rollcall', '点呼用PDF'), ('pdf_program', 'プログラム原稿PDF'), ('pdf_all', '全データPDF'), ('pdf_result_sheet', '結果記録用紙PDF'), ('pdf_parking_permits', '駐車許可証PDF（一括）')], max_length=20, verbose_name='帳票種別')),
+                ('status', models.CharField(choices=[('pending', '待機中'), ('running', '生成中'), ('done', '完了'), ('failed', '失敗')], default='pending', max_length=10, verbose_name='状態')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='実行回数')),
+                ('error', models.TextField(blank=True, verbose_name='エラー内容')),
+                ('filename', models.CharField(blank=True, max_length=255, verbose_name='ダウンロード時のファイル名')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='登録日時')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='開始日時')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='終了日時')),
+                ('competition', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_jobs', to='competitions.competition', verbose_name='大会')),
+                ('race', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='report_jobs', to='competitions.race', verbose_name='種目')),
+                ('report_log', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='job', to='reports.reportlog', verbose_name='出力ログ')),
+                ('requested_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='report_jobs', to=settings.AUTH_USER_MODEL, verbose_name='依頼者')),
+            ],
+            options={
+                'verbose_name': '帳票生成ジョブ',
+                'verbose_name_plural': '帳票生成ジョブ',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='report_job_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_report_job'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reportjob',
+            name='report_type',
+            field=models.CharField(choices=[('csv_startlist', 'スタートリストCSV'), ('pdf_rollcall', '点呼用PDF'), ('pdf_program', 'プログラム原稿PDF'), ('pdf_all', '全データPDF'), ('pdf_result_sheet', '結果記録用紙PDF'), ('pdf_parking_permits', '駐車許可証PDF（一括）'), ('zip_offline_bundle', 'オフライン用データ一式')], max_length=20, verbose_name='帳票種別'),
+        ),
+        migrations.AlterField(
+            model_name='reportlog',
+            name='report_type',
+            field=models.CharField(choices=[('csv_startlist', 'スタートリストCSV'), ('pdf_rollcall', '点呼用PDF'), ('pdf_program', 'プログラム原稿PDF'), ('pdf_all', '全データPDF'), ('pdf_result_sheet', '結果記録用紙PDF'), ('pdf_parking_permits', '駐車許可証PDF（一括）'), ('zip_offline_bundle', 'オフライン用データ一式')], max_length=20, verbose_name='帳票種別'),
+        ),
+    ]
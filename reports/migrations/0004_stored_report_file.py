@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0003_offline_bundle_report_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredReportFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=500, unique=True, verbose_name='ファイル名')),
+                ('content', models.BinaryField(verbose_name='内容')),
+                ('size', models.PositiveIntegerField(verbose_name='サイズ（バイト）')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='保存日時')),
+            ],
+            options={
+                'verbose_name': '帳票ファイル',
+                'verbose_name_plural': '帳票ファイル',
+            },
+        ),
+        migrations.AlterField(
+            model_name='reportlog',
+            name='file_path',
+            field=models.CharField(blank=True, help_text='バックグラウンド生成した帳票の保存先（REPORT_STORAGE 上のファイル名）', max_length=500, verbose_name='ファイルパス'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-17 05:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def split_contents(apps, schema_editor):
+    """保存済みのファイルの中身をチャンクに分ける"""
+    StoredReportFile = apps.get_model('reports', 'StoredReportFile')
+    StoredReportFileChunk = apps.get_model('reports', 'StoredReportFileChunk')
+    for pk in StoredReportFile.objects.values_list('pk', flat=True):
+        content = bytes(StoredReportFile.objects.filter(pk=pk).values_list('content', flat=True).get())
+        StoredReportFileChunk.objects.bulk_create([
+            StoredReportFileChunk(file_id=pk, index=index, data=content[start:start + CHUNK_SIZE])
+            for index, start in enumerate(range(0, len(content), CHUNK_SIZE))
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0004_stored_report_file'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredReportFileChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField(verbose_name='番号')),
+                ('data', models.BinaryField(verbose_name='内容')),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='reports.storedreportfile', verbose_name='帳票ファイル')),
+            ],
+            options={
+                'verbose_name': '帳票ファイルの内容',
+                'verbose_name_plural': '帳票ファイルの内容',
+                'unique_together': {('file', 'index')},
+            },
+        ),
+        migrations.AlterField(
+            model_name='storedreportfile',
+            name='size',
+            field=models.PositiveBigIntegerField(verbose_name='サイズ（バイト）'),
+        ),
+        migrations.RunPython(split_contents, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='storedreportfile',
+            name='content',
+        ),
+    ]
@@ -1,5 +1,5 @@
 """
-帳票出力用モデル・ユーティリティ（追加テーブルは不要だが、reports.pyに分離）
+帳票出力用モデル（出力ログ・バックグラウンド生成ジョブ・生成ファイル）
 """
 from django.db import models
 
@@ -13,6 +13,9 @@ class ReportLog(models.Model):
         ('pdf_rollcall', '点呼用PDF'),
         ('pdf_program', 'プログラム原稿PDF'),
         ('pdf_all', '全データPDF'),
+        ('pdf_result_sheet', '結果記録用紙PDF'),
+        ('pdf_parking_permits', '駐車許可証PDF（一括）'),
+        ('zip_offline_bundle', 'オフライン用データ一式'),
     ]
     
     report_type = models.CharField('帳票種別', max_length=20, choices=REPORT_TYPES)
@@ -40,7 +43,10 @@ class ReportLog(models.Model):
     )
     generated_at = models.DateTimeField('出力日時', auto_now_add=True)
     
-    file_path = models.CharField('ファイルパス', max_length=500, blank=True)
+    file_path = models.CharField(
+        'ファイルパス', max_length=500, blank=True,
+        help_text='バックグラウンド生成した帳票の保存先（REPORT_STORAGE 上のファイル名）'
+    )
     
     class Meta:
         verbose_name = '帳票出力ログ'
@@ -49,3 +55,120 @@ class ReportLog(models.Model):
     
     def __str__(self):
         return f"{self.get_report_type_display()} - {self.generated_at}"
+
+
+class ReportJob(models.Model):
+    """
+    帳票生成ジョブ（データベースをキューとして使う）
+
+    大きな帳票はリクエスト内で生成せずジョブとして登録し、
+    run_report_jobs コマンド（ワーカー）が順に生成する。
+    生成したファイルは REPORT_STORAGE に保存し、ReportLog.file_path に記録する。
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '待機中'),
+        (STATUS_RUNNING, '生成中'),
+        (STATUS_DONE, '完了'),
+        (STATUS_FAILED, '失敗'),
+    ]
+    ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+    
+    report_type = models.CharField('帳票種別', max_length=20, choices=ReportLog.REPORT_TYPES)
+    competition = models.ForeignKey(
+        'competitions.Competition',
+        on_delete=models.CASCADE,
+        related_name='report_jobs',
+        verbose_name='大会'
+    )
+    race = models.ForeignKey(
+        'competitions.Race',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='report_jobs',
+        verbose_name='種目'
+    )
+    requested_by = models.ForeignKey(
+        'accounts.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='report_jobs',
+        verbose_name='依頼者'
+    )
+    
+    status = models.CharField('状態', max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField('実行回数', default=0)
+    error = models.TextField('エラー内容', blank=True)
+    filename = models.CharField('ダウンロード時のファイル名', max_length=255, blank=True)
+    report_log = models.OneToOneField(
+        ReportLog,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='job',
+        verbose_name='出力ログ'
+    )
+    
+    created_at = models.DateTimeField('登録日時', auto_now_add=True)
+    started_at = models.DateTimeField('開始日時', null=True, blank=True)
+    finished_at = models.DateTimeField('終了日時', null=True, blank=True)
+    
+    class Meta:
+        verbose_name = '帳票生成ジョブ'
+        verbose_name_plural = '帳票生成ジョブ'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='report_job_queue_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_report_type_display()} - {self.get_status_display()}"
+    
+    @property
+    def is_active(self):
+        """待機中または生成中"""
+        return self.status in self.ACTIVE_STATUSES
+
+
+class StoredReportFile(models.Model):
+    """
+    バックグラウンド生成した帳票ファイル（reports.storage.DatabaseStorage の保存先）
+
+    Web プロセスとワーカー（別サーバー）の両方から読めるよう、ファイルの中身をデータベースに置く。
+    中身は StoredReportFileChunk に一定サイズずつ分けて保存し、読み書きとも1チャンクずつ行う。
+    """
+    name = models.CharField('ファイル名', max_length=500, unique=True)
+    size = models.PositiveBigIntegerField('サイズ（バイト）')
+    created_at = models.DateTimeField('保存日時', auto_now_add=True)
+    
+    class Meta:
+        verbose_name = '帳票ファイル'
+        verbose_name_plural = '帳票ファイル'
+    
+    def __str__(self):
+        return self.name
+
+
+class StoredReportFileChunk(models.Model):
+    """帳票ファイルの中身の一部（先頭から index 番目の CHUNK_SIZE バイト）"""
+    
+    # 1チャンクの大きさ（最後のチャンク以外はこのサイズ）
+    CHUNK_SIZE = 1024 * 1024
+    
+    file = models.ForeignKey(
+        StoredReportFile, on_delete=models.CASCADE, related_name='chunks', verbose_name='帳票ファイル'
+    )
+    index = models.PositiveIntegerField('番号')
+    data = models.BinaryField('内容')
+    
+    class Meta:
+        verbose_name = '帳票ファイルの内容'
+        verbose_name_plural = '帳票ファイルの内容'
+        unique_together = ['file', 'index']
+    
+    def __str__(self):
+        return f'{self.file.name} [{self.index}]'
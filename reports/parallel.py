@@ -0,0 +1,147 @@
+"""
+帳票の並列描画（プロセスプール）
+
+大会全体の帳票を種目・組ごとの小さなPDFに分けて複数プロセスで描画し、
+最後にページを連結して1つのPDFにする。ReportLab の描画は CPU 処理のため、
+スレッドではなくプロセスで並列化する。
+
+・ページの連結には pypdf を使う（任意の依存。未インストールなら直列描画）
+・ワーカー数は settings.REPORT_RENDER_WORKERS（0/1 なら直列描画）
+・子プロセスはデータベースに接続しない。描画に必要なデータは親プロセスで
+  読み込み、プロセス間で受け渡せる形（辞書・リスト）で渡す
+・子プロセスは spawn で起動する（fork だと親のDB接続を共有してしまうため）。
+  起動（Django の初期化とフォント登録）に時間がかかるため、プールはプロセス内で使い回す
+・部分の数はワーカー数までにまとめる（部分ごとにフォントが埋め込まれ、連結後のサイズが増えるため）
+"""
+import io
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from django.conf import settings
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # 任意の依存
+    PdfReader = PdfWriter = None
+
+# これより少ない行数の帳票はプロセス間の受け渡しの方が高くつくため直列で描画する
+MIN_ROWS = 500
+
+_lock = threading.Lock()
+_executor = None
+_executor_workers = 0
+
+
+def worker_count(workers=None):
+    """使用するワーカー数（指定がなければ設定値）"""
+    if workers is None:
+        workers = settings.REPORT_RENDER_WORKERS
+    return max(int(workers or 0), 0)
+
+
+def can_parallelize(workers, parts, rows):
+    """並列描画するかどうか（連結ライブラリがあり、ワーカー・分割数が2以上で、行数が MIN_ROWS 以上）"""
+    return PdfWriter is not None and workers > 1 and parts > 1 and rows >= MIN_ROWS
+
+
+def partition(items, count, weight=len):
+    """
+    順序を保ったまま、重みの合計がほぼ均等な count 個以下のグループに分割
+
+    Args:
+        weight: 要素の重み（描画する行数など）を返す関数
+    """
+    weights = [weight(item) for item in items]
+    target = max(sum(weights), 1) / count
+    groups = [[]]
+    total = 0
+    for item, item_weight in zip(items, weights, strict=True):
+        if groups[-1] and total >= target * len(groups) and len(groups) < count:
+            groups.append([])
+        groups[-1].append(item)
+        total += item_weight
+    return groups
+
+
+def _initialize_worker():
+    """子プロセスの初期化（Django設定とフォント登録）"""
+    import django
+    django.setup()
+
+    from .rendering import RenderingContext
+    RenderingContext.warm_up()
+
+
+def render(func, parts, workers, output=None):
+    """
+    部分ごとのPDFをプロセスプールで描画して連結
+
+    Args:
+        func: 部分のデータを受け取りPDFのバイト列を返すモジュールレベルの関数
+        parts: 部分のデータ（順に連結される）
+        workers: ワーカー数
+        output: 連結したPDFの書き出し先（None の場合は BytesIO を作る）
+
+    Returns:
+        連結したPDF（output またはBytesIO）
+    """
+    return merge(map_parts(func, parts, workers), output)
+
+
+def map_parts(func, parts, workers):
+    """
+    部分ごとに func をプロセスプールで呼び、結果を parts の順のリストで返す
+
+    Args:
+        func: 部分のデータを受け取るモジュールレベルの関数（戻り値は pickle できるもの）
+        parts: 部分のデータ
+        workers: ワーカー数
+    """
+    try:
+        return list(_get_executor(workers).map(func, parts))
+    except BrokenProcessPool:
+        # 子プロセスが異常終了したプールは次回作り直す
+        shutdown()
+        raise
+
+
+def _get_executor(workers):
+    """ワーカー数ごとのプロセスプール（プロセス内で使い回す）"""
+    global _executor, _executor_workers
+    with _lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown()
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=get_context('spawn'),
+                initializer=_initialize_worker,
+            )
+            _executor_workers = workers
+        return _executor
+
+
+def shutdown():
+    """プロセスプールを終了"""
+    global _executor, _executor_workers
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _executor_workers = 0
+
+
+def merge(documents, output=None):
+    """PDFのバイト列を順に連結して output（None の場合は BytesIO）に書き出す"""
+    writer = PdfWriter()
+    for document in documents:
+        writer.append(PdfReader(io.BytesIO(document)))
+    if output is None:
+        output = io.BytesIO()
+        writer.write(output)
+        output.seek(0)
+        return output
+    writer.write(output)
+    return output
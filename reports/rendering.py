@@ -0,0 +1,286 @@
+"""
+PDF帳票の描画設定（フォント・スタイルの共有レジストリ）
+
+日本語フォントの検索・登録はプロセスごとに1回だけ行い、帳票で使う
+ParagraphStyle / TableStyle も初回に組み立てて使い回す。
+各帳票（reports.generators, payments.receipt_generator）はここから取得する。
+
+フォントは settings.PDF_FONT_PATHS（優先）→ 既定の候補の順に探し、
+settings.PDF_FONT_NAME の名前で登録する。見つからなければ Helvetica を使う。
+"""
+import logging
+import os
+import threading
+
+from django.conf import settings
+from reportlab.lib import colors
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import TableStyle
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_FONT = 'Helvetica'
+
+DEFAULT_FONT_PATHS = [
+    # macOS
+    '/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc',
+    '/System/Library/Fonts/Hiragino Sans GB.ttc',
+    '/Library/Fonts/Arial Unicode.ttf',
+    # Linux (Ubuntu/Debian) - Noto CJK（apt install fonts-noto-cjkでインストール）
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/noto-cjk/NotoSansCJKjp-Regular.otf',
+    '/usr/share/fonts/opentype/noto/NotoSansCJKjp-Regular.otf',
+    # Render/Heroku Buildpack（Aptfileからインストール）
+    '/app/.fonts/NotoSansCJKjp-Regular.otf',
+    # その他のLinuxフォント
+    '/usr/share/fonts/truetype/fonts-japanese-gothic.ttf',
+    '/usr/share/fonts/truetype/takao-gothic/TakaoPGothic.ttf',
+    # IPAフォント（手動インストール時）
+    '/usr/share/fonts/ipa-gothic/ipag.ttf',
+    '/usr/share/fonts/truetype/ipafont/ipag.ttf',
+    # Windows
+    'C:/Windows/Fonts/msgothic.ttc',
+    # 日本語を含まない最終候補
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+]
+
+# 段落スタイル: 名前 -> (親スタイル, 属性)
+PARAGRAPH_STYLES = {
+    # 点呼リスト
+    'rollcall_title': ('Heading1', {'fontSize': 16, 'spaceAfter': 10*mm}),
+    # プログラム
+    'program_title': ('Heading1', {'fontSize': 18, 'spaceAfter': 5*mm}),
+    'program_heat': ('Heading2', {'fontSize': 14, 'spaceBefore': 10*mm, 'spaceAfter': 5*mm}),
+    # 全データ
+    'all_data_title': ('Heading1', {'fontSize': 20, 'spaceAfter': 10*mm}),
+    'all_data_race': ('Heading2', {'fontSize': 16, 'spaceBefore': 15*mm, 'spaceAfter': 5*mm}),
+    # 駐車許可証（1団体）
+    'permit_title': ('Heading1', {
+        'fontSize': 28, 'alignment': 1, 'spaceAfter': 15*mm, 'textColor': colors.darkblue,
+    }),
+    'permit_subtitle': ('Normal', {'fontSize': 14, 'alignment': 1, 'spaceAfter': 10*mm}),
+    'permit_organization': ('Heading1', {
+        'fontSize': 32, 'alignment': 1, 'spaceAfter': 15*mm, 'textColor': colors.black,
+    }),
+    'permit_large_info': ('Normal', {'fontSize': 20, 'alignment': 1, 'spaceAfter': 10*mm}),
+    'permit_note': ('Normal', {'fontSize': 10, 'spaceAfter': 3*mm}),
+    'permit_footer': ('Normal', {'fontSize': 9, 'alignment': 2}),
+    # 駐車許可証（一括）
+    'permit_page_title': ('Heading1', {'fontSize': 24, 'alignment': 1, 'spaceAfter': 10*mm}),
+    'permit_page_organization': ('Heading1', {'fontSize': 28, 'alignment': 1, 'spaceAfter': 10*mm}),
+    'permit_page_info': ('Normal', {'fontSize': 16, 'alignment': 1, 'spaceAfter': 5*mm}),
+    # 結果記録用紙
+    'result_title': ('Heading1', {'fontSize': 14, 'alignment': 1, 'spaceAfter': 5*mm}),
+    'result_date': ('Normal', {'fontSize': 10, 'alignment': 2}),
+    # 申込確認書
+    'confirmation_title': ('Heading1', {'fontSize': 18, 'alignment': 1, 'spaceAfter': 10*mm}),
+    'confirmation_header': ('Normal', {'fontSize': 11, 'spaceAfter': 3*mm}),
+    'confirmation_summary': ('Normal', {'fontSize': 12, 'alignment': 2, 'spaceAfter': 5*mm}),
+    'confirmation_note': ('Normal', {'fontSize': 9, 'spaceAfter': 2*mm}),
+}
+
+
+def _table_styles(font_name):
+    """表スタイルのコマンド一覧（フォント名を埋め込んで組み立てる）"""
+    return {
+        'rollcall': [
+            ('FONT', (0, 0), (-1, -1), font_name, 10),
+            ('FONT', (0, 0), (-1, 0), font_name, 10),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('ALIGN', (2, 1), (3, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('ROWHEIGHTS', (0, 0), (-1, -1), 8*mm),
+        ],
+        'program': [
+            ('FONT', (0, 0), (-1, -1), font_name, 10),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+            ('ALIGN', (3, 0), (3, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('ROWHEIGHTS', (0, 0), (-1, -1), 7*mm),
+        ],
+        'all_data': [
+            ('FONT', (0, 0), (-1, -1), font_name, 9),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('ROWHEIGHTS', (0, 0), (-1, -1), 6*mm),
+        ],
+        'permit': [
+            ('FONT', (0, 0), (-1, -1), font_name, 14),
+            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('ROWHEIGHTS', (0, 0), (-1, -1), 12*mm),
+        ],
+        # 結果記録用紙はヘッダー部分のみ（行ごとの罫線は行数に応じて追加する）
+        'result_sheet': [
+            ('FONT', (0, 0), (-1, -1), font_name, 9),
+            ('FONT', (0, 0), (-1, 0), font_name, 8),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.9, 0.9, 0.9)),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('ALIGN', (2, 1), (2, -1), 'LEFT'),
+            ('ALIGN', (3, 1), (3, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, 0), 1, colors.black),
+            ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black),
+            ('ROWHEIGHTS', (0, 0), (0, 0), 7*mm),
+        ],
+        'confirmation': [
+            ('FONT', (0, 0), (-1, -1), font_name, 9),
+            ('FONT', (0, 0), (-1, 0), font_name, 9),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.2, 0.3, 0.5)),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('ALIGN', (0, 1), (0, -1), 'CENTER'),
+            ('ALIGN', (4, 1), (-1, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -2), 0.5, colors.grey),
+            ('LINEABOVE', (0, -1), (-1, -1), 1, colors.black),
+            ('FONT', (0, -1), (-1, -1), font_name, 10),
+            ('FONTNAME', (4, -1), (-1, -1), font_name),
+            ('ROWHEIGHTS', (0, 0), (-1, -1), 7*mm),
+        ],
+    }
+
+
+class RenderingContext:
+    """
+    帳票描画の共有コンテキスト
+
+    フォント登録とスタイル構築は初回アクセス時（または起動時の preload）に
+    1回だけ行う。スタイルは読み取り専用として共有するため、呼び出し側で変更しないこと。
+    """
+
+    _lock = threading.Lock()
+    _font_name = None
+    _font_path = None
+    _styles = None
+    _paragraph_styles = None
+    _table_styles = None
+
+    @classmethod
+    def font_candidates(cls):
+        """フォントの候補パス（設定で指定されたものを優先）"""
+        configured = [path for path in getattr(settings, 'PDF_FONT_PATHS', []) if path]
+        return configured + [path for path in DEFAULT_FONT_PATHS if path not in configured]
+
+    @classmethod
+    def _register_font(cls):
+        """候補パスから最初に読み込めたフォントを登録し、フォント名を返す"""
+        name = getattr(settings, 'PDF_FONT_NAME', 'Japanese')
+        for font_path in cls.font_candidates():
+            if not os.path.exists(font_path):
+                continue
+            try:
+                pdfmetrics.registerFont(TTFont(name, font_path))
+            except Exception:
+                continue
+            cls._font_path = font_path
+            logger.info('[PDF] 日本語フォント登録成功: %s', font_path)
+            return name
+
+        # フォールバック（日本語は表示できない可能性あり）
+        cls._font_path = None
+        logger.warning('[PDF] 日本語フォントが見つかりません。代替フォントを使用します。')
+        return FALLBACK_FONT
+
+    @classmethod
+    def warm_up(cls):
+        """フォント登録とスタイル構築（済んでいれば何もしない）。フォント名を返す"""
+        if cls._table_styles is not None:
+            return cls._font_name
+
+        with cls._lock:
+            if cls._table_styles is None:
+                font_name = cls._register_font()
+
+                # 基本スタイル（Normal, Heading1〜3 など）も日本語フォントにそろえる
+                styles = getSampleStyleSheet()
+                for style in styles.byName.values():
+                    if isinstance(style, ParagraphStyle):
+                        style.fontName = font_name
+
+                paragraph_styles = {
+                    name: ParagraphStyle(name, parent=styles[parent], fontName=font_name, **attrs)
+                    for name, (parent, attrs) in PARAGRAPH_STYLES.items()
+                }
+                table_styles = {
+                    name: TableStyle(commands)
+                    for name, commands in _table_styles(font_name).items()
+                }
+
+                cls._font_name = font_name
+                cls._styles = styles
+                cls._paragraph_styles = paragraph_styles
+                cls._table_styles = table_styles
+        return cls._font_name
+
+    @classmethod
+    def preload(cls):
+        """
+        設定 PDF_PRELOAD_FONT が有効なら warm_up を済ませる
+
+        帳票を描画するプロセス（gunicorn のワーカー・run_report_jobs）の起動時にだけ呼ぶ。
+        migrate や cron のコマンドなど帳票を描画しないプロセスではフォントを読み込まない。
+        """
+        if settings.PDF_PRELOAD_FONT:
+            cls.warm_up()
+
+    @classmethod
+    def font_name(cls):
+        """登録済みのフォント名"""
+        return cls.warm_up()
+
+    @classmethod
+    def font_path(cls):
+        """登録したフォントファイル（フォールバック時は None）"""
+        cls.warm_up()
+        return cls._font_path
+
+    @classmethod
+    def base_style(cls, name):
+        """基本スタイル（'Normal', 'Heading3' など）"""
+        cls.warm_up()
+        return cls._styles[name]
+
+    @classmethod
+    def paragraph_style(cls, name):
+        """帳票用の段落スタイル（PARAGRAPH_STYLES のキー）"""
+        cls.warm_up()
+        return cls._paragraph_styles[name]
+
+    @classmethod
+    def table_style(cls, name, extra=None):
+        """
+        帳票用の表スタイル
+
+        Args:
+            name: 表スタイル名
+            extra: 追加のコマンド（行数に応じた罫線など）。指定時は共有スタイルを親にした新しいスタイルを返す
+        """
+        cls.warm_up()
+        style = cls._table_styles[name]
+        if extra:
+            return TableStyle(extra, parent=style)
+        return style
+
+    @classmethod
+    def reset(cls):
+        """キャッシュを破棄（設定を変えた後やテストで使用）"""
+        with cls._lock:
+            cls._font_name = None
+            cls._font_path = None
+            cls._styles = None
+            cls._paragraph_styles = None
+            cls._table_styles = None
@@ -0,0 +1,132 @@
+"""
+バックグラウンド生成した帳票の保存先
+
+ワーカー（run_report_jobs）と Web プロセスは別のサーバーで動くことがあり、
+ローカルディスクは共有できない。そのため既定では生成したファイルをデータベース
+（StoredReportFile）に保存する。設定 REPORT_STORAGE に Storage クラスのパスを指定すれば
+オブジェクトストレージなどに切り替えられる（FileSystemStorage は REPORT_FILES_ROOT に保存）。
+
+DatabaseStorage はファイルを StoredReportFileChunk（1MB）に分けて保存し、読み書きとも
+1チャンクずつ行う。全データPDFやオフライン用ZIPのダウンロード・保存でも、ファイル全体を
+ワーカーのメモリに載せない。
+"""
+import io
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage, Storage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+from django.utils.module_loading import import_string
+
+from .models import StoredReportFile, StoredReportFileChunk
+
+
+class _ChunkReader(io.RawIOBase):
+    """StoredReportFile の中身を必要なチャンクだけ読み込みながら返す読み取り専用のファイル"""
+
+    def __init__(self, file_id, size):
+        super().__init__()
+        self._file_id = file_id
+        self._size = size
+        self._position = 0
+        self._chunk_index = None
+        self._chunk = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise ValueError('negative seek position')
+        self._position = offset
+        return offset
+
+    def readinto(self, buffer):
+        if self._position >= self._size:
+            return 0
+        index, start = divmod(self._position, StoredReportFileChunk.CHUNK_SIZE)
+        if index != self._chunk_index:
+            data = StoredReportFileChunk.objects.filter(
+                file_id=self._file_id, index=index
+            ).values_list('data', flat=True).first()
+            if data is None:
+                # 読み込み中に削除された
+                raise OSError(f'帳票ファイルのチャンクがありません: {self._file_id} [{index}]')
+            self._chunk_index = index
+            self._chunk = memoryview(bytes(data))
+        part = self._chunk[start:start + len(buffer)]
+        buffer[:len(part)] = part
+        self._position += len(part)
+        return len(part)
+
+
+@deconstructible
+class DatabaseStorage(Storage):
+    """StoredReportFile に中身を保存する Storage（URL は持たず、ビューから返す）"""
+
+    def _open(self, name, mode='rb'):
+        row = StoredReportFile.objects.filter(name=name).values_list('pk', 'size').first()
+        if row is None:
+            raise FileNotFoundError(name)
+        file_id, size = row
+        f = File(io.BufferedReader(_ChunkReader(file_id, size)), name=name)
+        f.size = size
+        return f
+
+    def _save(self, name, content):
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        with transaction.atomic():
+            stored = StoredReportFile.objects.create(name=name, size=0)
+            size = 0
+            for index, data in enumerate(_iter_chunks(content)):
+                StoredReportFileChunk.objects.create(file=stored, index=index, data=data)
+                size += len(data)
+            stored.size = size
+            stored.save(update_fields=['size'])
+        return name
+
+    def exists(self, name):
+        return StoredReportFile.objects.filter(name=name).exists()
+
+    def delete(self, name):
+        StoredReportFile.objects.filter(name=name).delete()
+
+    def size(self, name):
+        size = StoredReportFile.objects.filter(name=name).values_list('size', flat=True).first()
+        if size is None:
+            raise FileNotFoundError(name)
+        return size
+
+
+def _iter_chunks(content):
+    """content を CHUNK_SIZE ずつのバイト列で返す（File.chunks() の区切りによらない）"""
+    buffer = b''
+    for part in content.chunks(chunk_size=StoredReportFileChunk.CHUNK_SIZE):
+        if isinstance(part, str):
+            part = part.encode()
+        buffer += part
+        while len(buffer) >= StoredReportFileChunk.CHUNK_SIZE:
+            yield buffer[:StoredReportFileChunk.CHUNK_SIZE]
+            buffer = buffer[StoredReportFileChunk.CHUNK_SIZE:]
+    if buffer:
+        yield buffer
+
+
+def report_storage():
+    """生成した帳票の保存先（公開ディレクトリの MEDIA_ROOT とは分ける）"""
+    storage_class = import_string(settings.REPORT_STORAGE)
+    if issubclass(storage_class, FileSystemStorage):
+        return storage_class(location=settings.REPORT_FILES_ROOT)
+    return storage_class()
@@ -1,8 +1,16 @@
 """
 reports アプリのテスト
 """
-from reports.generators import CSVGenerator, PDFGenerator
-from reports.models import ReportLog
+from unittest.mock import Mock, patch
+
+import pytest
+
+from reports.bundle import OfflineBundle
+from reports.cache import ReportCache
+from reports.generators import CSVGenerator, PDFGenerator, ResultSheetPDFGenerator
+from reports.jobs import ReportJobRunner
+from reports.models import ReportJob, ReportLog
+from reports.rendering import DEFAULT_FONT_PATHS, RenderingContext
 
 
 class TestReportLogModel:
@@ -44,6 +52,99 @@ class TestCSVGenerator:
         assert 'Race,Heat,Lane' in csv_content  # ヘッダーは存在
 
 
+class TestStreamingCSV:
+    """CSVストリーミング出力のテスト"""
+    
+    def _create_assignments(self, race, organization, normal_user, count, heat_number=1):
+        """確定済みエントリーと組割り当てを作成"""
+        from datetime import date
+        from decimal import Decimal
+
+        from accounts.models import Athlete
+        from entries.models import Entry
+        from heats.models import Heat, HeatAssignment
+        
+        heat = Heat.objects.create(race=race, heat_number=heat_number)
+        for i in range(count):
+            athlete = Athlete.objects.create(
+                organization=organization,
+                last_name=f'出力{heat_number}_{i}',
+                first_name='太郎',
+                last_name_kana='シュツリョク',
+                first_name_kana='タロウ',
+                gender='M',
+                birth_date=date(2000, 1, 1),
+            )
+            entry = Entry.objects.create(
+                athlete=athlete,
+                race=race,
+                registered_by=normal_user,
+                declared_time=Decimal('900.00'),
+                status='confirmed',
+            )
+            HeatAssignment.objects.create(heat=heat, entry=entry, bib_number=count - i)
+        return heat
+    
+    def test_iter_csv_bytes_single_bom(self):
+        """BOMは先頭に1回だけ付与される"""
+        from nitsys.csv_export import iter_csv_bytes
+        
+        content = b''.join(iter_csv_bytes(['a', 'b'], [['日本', 1], ['陸上', 2]]))
+        assert content.startswith(b'\xef\xbb\xbf')
+        assert content.count(b'\xef\xbb\xbf') == 1
+        assert content.decode('utf-8-sig') == 'a,b\r\n日本,1\r\n陸上,2\r\n'
+    
+    def test_all_data_rows_single_query(self, db, competition, race, organization,
+                                        normal_user, django_assert_num_queries):
+        """全種目の行を1クエリで並び順どおりに生成"""
+        from competitions.models import Race
+        
+        race2 = Race.objects.create(
+            competition=competition, distance=10000, gender='M',
+            name='男子10000m', display_order=0,
+        )
+        self._create_assignments(race, organization, normal_user, 3)
+        self._create_assignments(race2, organization, normal_user, 2)
+        
+        with django_assert_num_queries(1):
+            rows = list(CSVGenerator.iter_all_data_rows(competition))
+        
+        assert [(row[0], row[2]) for row in rows] == [
+            ('男子10000m', 1), ('男子10000m', 2),
+            ('男子5000m', 1), ('男子5000m', 2), ('男子5000m', 3),
+        ]
+    
+    def test_download_all_data_csv_streams(self, client_admin, competition, race,
+                                           organization, normal_user):
+        """全データCSVダウンロードはストリーミングで返る"""
+        from django.urls import reverse
+        
+        self._create_assignments(race, organization, normal_user, 3)
+        
+        response = client_admin.get(reverse('reports:all_data_csv', args=[competition.pk]))
+        
+        assert response.status_code == 200
+        assert response.streaming
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        lines = content.splitlines()
+        assert lines[0].startswith('Race,Heat,Lane')
+        assert len(lines) == 4
+        assert ReportLog.objects.filter(competition=competition).count() == 1
+    
+    def test_download_startlist_csv_matches_string(self, client_admin, race,
+                                                   organization, normal_user):
+        """スタートリストのストリーミング出力は文字列版と同じ内容"""
+        from django.urls import reverse
+        
+        self._create_assignments(race, organization, normal_user, 2)
+        
+        response = client_admin.get(reverse('reports:startlist_csv', args=[race.pk]))
+        
+        assert response.streaming
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        assert content == CSVGenerator.generate_startlist_csv(race)
+
+
 class TestPDFGenerator:
     """PDF生成のテスト"""
     
@@ -52,3 +153,764 @@ class TestPDFGenerator:
         font_name = PDFGenerator._setup_fonts()
         # フォントが見つかればJapanese、なければHelvetica
         assert font_name in ['Japanese', 'Helvetica']
+    
+    def test_generate_rollcall_pdf(self, db, race, organization, normal_user):
+        """点呼リストPDFを共有スタイルで生成"""
+        heat = TestStreamingCSV()._create_assignments(race, organization, normal_user, 3)
+        
+        buffer = PDFGenerator.generate_rollcall_pdf(heat)
+        
+        assert buffer.getvalue().startswith(b'%PDF')
+    
+    def test_generate_result_sheet_pdf(self, db, race, organization, normal_user):
+        """結果記録用紙（1組・一括）"""
+        heat = TestStreamingCSV()._create_assignments(race, organization, normal_user, 3)
+        
+        assert ResultSheetPDFGenerator.generate_result_sheet_pdf(heat).getvalue().startswith(b'%PDF')
+        assert ResultSheetPDFGenerator.generate_all_result_sheets_pdf(race).getvalue().startswith(b'%PDF')
+    
+    def test_all_data_races_follow_display_order(self, db, competition, race, organization, normal_user):
+        """全データPDFの内容は種目の表示順に、組編成を種目ごとに振り分けて読み込む"""
+        from competitions.models import Race
+        
+        first = Race.objects.create(
+            competition=competition, name='女子3000m', distance=3000, gender='F', display_order=0,
+        )
+        Race.objects.create(competition=competition, name='男子1500m', distance=1500, gender='M', display_order=2)
+        TestStreamingCSV()._create_assignments(race, organization, normal_user, 3, heat_number=1)
+        TestStreamingCSV()._create_assignments(first, organization, normal_user, 2, heat_number=2)
+        races = list(competition.races.filter(is_active=True).order_by('display_order', 'pk'))
+        
+        data = list(PDFGenerator._iter_all_data_races(races))
+        
+        assert [r['name'] for r in data] == ['女子3000m', '男子5000m', '男子1500m']
+        assert [[len(h['rows']) for h in r['heats']] for r in data] == [[2], [3], []]
+        assert [row[0] for row in data[1]['heats'][0]['rows']] == ['1', '2', '3']
+    
+    def test_generate_all_data_pdf_file(self, db, competition, race, organization, normal_user):
+        """全データPDFを一時ファイルに書き出す（省メモリ版）"""
+        TestStreamingCSV()._create_assignments(race, organization, normal_user, 3)
+        
+        with PDFGenerator.generate_all_data_pdf_file(competition) as f:
+            assert f.read(5) == b'%PDF-'
+    
+    def _all_data_races(self, count):
+        """描画用の種目データ（組が複数ページにまたがる程度の行数）"""
+        return [
+            {
+                'name': f'種目{r}',
+                'heats': [
+                    {'number': h, 'rows': [[str(i), f'選手{r}-{h}-{i}', '所属', '15:00.00', '']
+                                           for i in range(1, 31)]}
+                    for h in (1, 2)
+                ] + [{'number': 3, 'rows': []}],
+            }
+            for r in range(count)
+        ]
+    
+    def test_all_data_race_by_race_matches_single_build(self, monkeypatch):
+        """種目ごとに追加しながら描画しても、全フローアブルを一度に渡した場合と同じPDFになる"""
+        import io
+        
+        from reportlab import rl_config
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.units import mm
+        from reportlab.platypus import SimpleDocTemplate
+        
+        monkeypatch.setattr(rl_config, 'invariant', 1)
+        header = {'name': '大会', 'event_date': '2026年10月17日', 'generated_at': '2026年10月17日 09:00:00'}
+        races = self._all_data_races(4)
+        
+        chunked = io.BytesIO()
+        PDFGenerator._build_all_data(chunked, header, races)
+        single = io.BytesIO()
+        SimpleDocTemplate(
+            single, pagesize=A4, rightMargin=10*mm, leftMargin=10*mm, topMargin=15*mm, bottomMargin=15*mm,
+        ).build([f for elements in PDFGenerator._all_data_flowables(header, races) for f in elements])
+        
+        assert chunked.getvalue() == single.getvalue()
+    
+    def test_all_data_loads_races_while_drawing(self, monkeypatch):
+        """次の種目は描画中に読み込む（同時に保持するのは1〜2種目分）"""
+        import io
+        
+        from reports.generators import _RaceByRaceDocTemplate
+        
+        loaded = []
+        pending = []
+        
+        def races():
+            for race in self._all_data_races(5):
+                loaded.append(race['name'])
+                yield race
+        
+        def after_flowable(doc, flowable):
+            pending.append(len(loaded))
+            _refill(doc)
+        
+        _refill = _RaceByRaceDocTemplate._refill
+        monkeypatch.setattr(_RaceByRaceDocTemplate, 'afterFlowable', after_flowable)
+        PDFGenerator._build_all_data(io.BytesIO(), None, races())
+        
+        assert len(loaded) == 5
+        # 最初のフローアブルを描画した時点では先頭の種目しか読み込んでいない
+        assert pending[0] == 1
+
+
+class TestRenderingContext:
+    """帳票描画の共有コンテキストのテスト"""
+    
+    @pytest.fixture(autouse=True)
+    def reset_context(self):
+        RenderingContext.reset()
+        yield
+        RenderingContext.reset()
+    
+    def test_font_registered_once(self):
+        """フォントの検索・登録はプロセスごとに1回"""
+        with patch('reports.rendering.pdfmetrics.registerFont') as register:
+            first = RenderingContext.font_name()
+            second = RenderingContext.font_name()
+            RenderingContext.paragraph_style('rollcall_title')
+        
+        assert first == second
+        assert register.call_count <= 1
+    
+    def test_configured_paths_first(self, settings):
+        """設定したフォントパスを既定の候補より優先"""
+        settings.PDF_FONT_PATHS = ['/opt/fonts/custom.ttf', DEFAULT_FONT_PATHS[0]]
+        
+        candidates = RenderingContext.font_candidates()
+        
+        assert candidates[:2] == ['/opt/fonts/custom.ttf', DEFAULT_FONT_PATHS[0]]
+        assert candidates.count(DEFAULT_FONT_PATHS[0]) == 1
+    
+    def test_fallback_font(self, settings):
+        """フォントが見つからなければ Helvetica"""
+        settings.PDF_FONT_PATHS = ['/nonexistent/font.ttf']
+        
+        with patch('reports.rendering.DEFAULT_FONT_PATHS', []):
+            assert RenderingContext.font_name() == 'Helvetica'
+            assert RenderingContext.font_path() is None
+            assert RenderingContext.base_style('Normal').fontName == 'Helvetica'
+    
+    def test_styles_shared(self):
+        """スタイルは1回だけ構築して使い回す"""
+        font_name = RenderingContext.font_name()
+        
+        title = RenderingContext.paragraph_style('rollcall_title')
+        assert title is RenderingContext.paragraph_style('rollcall_title')
+        assert title.fontName == font_name
+        assert title.fontSize == 16
+        assert RenderingContext.table_style('rollcall') is RenderingContext.table_style('rollcall')
+    
+    def test_table_style_extra(self):
+        """追加コマンド付きの表スタイルは共有スタイルを変更しない"""
+        base = RenderingContext.table_style('result_sheet')
+        count = len(base.getCommands())
+        
+        extended = RenderingContext.table_style('result_sheet', [('LINEBELOW', (0, 1), (-1, 1), 1, 'black')])
+        
+        assert extended is not base
+        assert len(extended.getCommands()) == count + 1
+        assert len(base.getCommands()) == count
+    
+    def test_receipt_uses_shared_font(self):
+        """領収書も同じフォントを使う"""
+        from payments.receipt_generator import register_japanese_font
+        
+        assert register_japanese_font() == RenderingContext.font_name()
+
+    def test_preload_follows_setting(self, settings):
+        """preload は PDF_PRELOAD_FONT が有効なときだけ準備する"""
+        settings.PDF_PRELOAD_FONT = False
+        with patch.object(RenderingContext, 'warm_up') as warm_up:
+            RenderingContext.preload()
+        warm_up.assert_not_called()
+
+        settings.PDF_PRELOAD_FONT = True
+        with patch.object(RenderingContext, 'warm_up') as warm_up:
+            RenderingContext.preload()
+        warm_up.assert_called_once()
+
+    def test_not_loaded_on_app_ready(self, settings):
+        """アプリの初期化（migrate・cron など全コマンド）ではフォントを読み込まない"""
+        from django.apps import apps
+
+        settings.PDF_PRELOAD_FONT = True
+        with patch.object(RenderingContext, 'warm_up') as warm_up:
+            apps.get_app_config('reports').ready()
+        warm_up.assert_not_called()
+
+    def test_gunicorn_worker_hook(self, settings):
+        """gunicorn のワーカー起動時のフックで準備する"""
+        import runpy
+
+        settings.PDF_PRELOAD_FONT = True
+        hooks = runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+        with patch.object(RenderingContext, 'warm_up') as warm_up:
+            hooks['post_worker_init'](Mock())
+        warm_up.assert_called_once()
+
+
+class TestReportJob:
+    """帳票のバックグラウンド生成ジョブのテスト"""
+    
+    def test_enqueue_reuses_active_job(self, db, competition, admin_user):
+        """同じ帳票の待機中ジョブがあれば新しく登録しない"""
+        first = ReportJobRunner.enqueue('pdf_all', competition, user=admin_user)
+        second = ReportJobRunner.enqueue('pdf_all', competition, user=admin_user)
+        
+        assert first.pk == second.pk
+        assert ReportJob.objects.count() == 1
+    
+    def test_enqueue_unsupported_type(self, db, competition):
+        """バックグラウンド生成に対応していない帳票"""
+        with pytest.raises(ValueError):
+            ReportJobRunner.enqueue('csv_startlist', competition)
+    
+    def test_run_next_stores_artifact(self, db, competition, admin_user, report_files):
+        """生成したファイルをデータベースに保存し、ReportLog.file_path に記録（ワーカーとディスクを共有しない）"""
+        from reports.models import StoredReportFile
+        from reports.storage import report_storage
+        
+        job = ReportJobRunner.enqueue('pdf_all', competition, user=admin_user)
+        
+        ReportJobRunner.run_next()
+        
+        job.refresh_from_db()
+        assert job.status == ReportJob.STATUS_DONE
+        assert job.attempts == 1
+        assert job.filename == f"emergency_backup_{competition.event_date}.pdf"
+        log = job.report_log
+        assert log.report_type == 'pdf_all'
+        assert log.generated_by == admin_user
+        with report_storage().open(log.file_path) as artifact:
+            assert artifact.read().startswith(b'%PDF')
+        assert StoredReportFile.objects.get(name=log.file_path).size > 0
+        assert not (report_files / log.file_path).exists()
+        assert ReportJobRunner.run_next() is None
+    
+    def test_run_failure(self, db, competition):
+        """生成中の例外はジョブを失敗にする"""
+        job = ReportJobRunner.enqueue('pdf_all', competition)
+        
+        with patch.dict('reports.jobs.HANDLERS', {'pdf_all': Mock(side_effect=RuntimeError('boom'))}):
+            ReportJobRunner.run_next()
+        
+        job.refresh_from_db()
+        assert job.status == ReportJob.STATUS_FAILED
+        assert job.error == 'boom'
+        assert job.report_log is None
+    
+    def test_claim_next_skips_claimed(self, db, competition, race):
+        """取得済みのジョブは他のワーカーが取得しない"""
+        ReportJobRunner.enqueue('pdf_all', competition)
+        ReportJobRunner.enqueue('pdf_result_sheet', competition, race=race)
+        
+        first = ReportJobRunner.claim_next()
+        second = ReportJobRunner.claim_next()
+        
+        assert first.status == second.status == ReportJob.STATUS_RUNNING
+        assert first.pk != second.pk
+        assert ReportJobRunner.claim_next() is None
+    
+    def test_requeue_stale(self, db, competition):
+        """生成中のまま止まったジョブを待機中に戻す（上限を超えたら失敗）"""
+        from datetime import timedelta
+
+        from django.utils import timezone
+        
+        stale_at = timezone.now() - ReportJobRunner.STALE_AFTER - timedelta(minutes=1)
+        retry = ReportJob.objects.create(
+            report_type='pdf_all', competition=competition,
+            status=ReportJob.STATUS_RUNNING, started_at=stale_at, attempts=1,
+        )
+        give_up = ReportJob.objects.create(
+            report_type='pdf_parking_permits', competition=competition,
+            status=ReportJob.STATUS_RUNNING, started_at=stale_at, attempts=ReportJobRunner.MAX_ATTEMPTS,
+        )
+        
+        assert ReportJobRunner.requeue_stale() == 1
+        
+        retry.refresh_from_db()
+        give_up.refresh_from_db()
+        assert retry.status == ReportJob.STATUS_PENDING
+        assert give_up.status == ReportJob.STATUS_FAILED
+    
+    def test_purge_finished(self, db, competition):
+        """保存期間を過ぎた終了ジョブを生成ファイルごと削除し、出力ログは残す"""
+        from datetime import timedelta
+        from io import StringIO
+
+        from django.core.management import call_command
+        from django.utils import timezone
+
+        from reports.models import StoredReportFile
+        
+        old_job = ReportJobRunner.run(ReportJobRunner.enqueue('pdf_all', competition))
+        recent_job = ReportJobRunner.run(ReportJobRunner.enqueue('pdf_parking_permits', competition))
+        failed = ReportJob.objects.create(report_type='pdf_all', competition=competition, status=ReportJob.STATUS_FAILED)
+        pending = ReportJob.objects.create(report_type='pdf_all', competition=competition)
+        expired_at = timezone.now() - ReportJobRunner.RETENTION - timedelta(hours=1)
+        ReportJob.objects.filter(pk__in=[old_job.pk, failed.pk]).update(finished_at=expired_at)
+        out = StringIO()
+        
+        call_command('cleanup_report_jobs', stdout=out)
+        
+        assert '2件の終了したジョブを削除しました' in out.getvalue()
+        assert set(ReportJob.objects.values_list('pk', flat=True)) == {recent_job.pk, pending.pk}
+        assert list(StoredReportFile.objects.values_list('name', flat=True)) == [recent_job.report_log.file_path]
+        old_log = ReportLog.objects.get(pk=old_job.report_log_id)
+        assert old_log.file_path == ''
+    
+    def test_all_data_pdf_view_enqueues(self, db, client_admin, competition):
+        """全データPDFはジョブを登録して状況ページへ"""
+        from django.urls import reverse
+        
+        response = client_admin.get(reverse('reports:all_data_pdf', args=[competition.pk]))
+        
+        job = ReportJob.objects.get()
+        assert response.status_code == 302
+        assert response.url == reverse('reports:job_detail', args=[job.pk])
+        
+        response = client_admin.get(response.url)
+        assert response.status_code == 200
+        assert '待機中' in response.content.decode()
+    
+    def test_job_status_and_download(self, db, client_admin, race, organization, normal_user):
+        """完了後は状態にダウンロードURLが入り、ファイルを取得できる"""
+        from django.urls import reverse
+        
+        TestStreamingCSV()._create_assignments(race, organization, normal_user, 2)
+        client_admin.get(reverse('reports:all_result_sheets_pdf', args=[race.pk]))
+        job = ReportJob.objects.get()
+        download_url = reverse('reports:job_download', args=[job.pk])
+        
+        assert client_admin.get(download_url).status_code == 404
+        assert client_admin.get(reverse('reports:job_status', args=[job.pk])).json()['download_url'] is None
+        
+        ReportJobRunner.run_next()
+        
+        status = client_admin.get(reverse('reports:job_status', args=[job.pk])).json()
+        assert status['status'] == 'done'
+        assert status['download_url'] == download_url
+        response = client_admin.get(download_url)
+        assert response.status_code == 200
+        assert b''.join(response.streaming_content).startswith(b'%PDF')
+    
+    def test_job_views_require_admin(self, db, client_logged_in, competition):
+        """一般ユーザーはジョブを参照できない"""
+        from django.urls import reverse
+        
+        job = ReportJobRunner.enqueue('pdf_all', competition)
+        
+        response = client_logged_in.get(reverse('reports:job_status', args=[job.pk]))
+        assert response.status_code == 302
+    
+    def test_parking_permits_view_enqueues(self, db, client_admin, competition):
+        """駐車許可証の一括出力もジョブとして登録"""
+        from django.urls import reverse
+        
+        response = client_admin.get(reverse('payments:all_permits_download', args=[competition.pk]))
+        
+        job = ReportJob.objects.get()
+        assert job.report_type == 'pdf_parking_permits'
+        assert response.url == reverse('reports:job_detail', args=[job.pk])
+    
+    def test_worker_command_once(self, db, competition):
+        """ワーカーコマンド（--once）は待機中のジョブをすべて実行して終了"""
+        from io import StringIO
+
+        from django.core.management import call_command
+        
+        ReportJobRunner.enqueue('pdf_all', competition)
+        ReportJobRunner.enqueue('pdf_parking_permits', competition)
+        out = StringIO()
+        
+        call_command('run_report_jobs', '--once', stdout=out)
+        
+        assert '2件のジョブを実行しました' in out.getvalue()
+        assert set(ReportJob.objects.values_list('status', flat=True)) == {ReportJob.STATUS_DONE}
+
+
+class TestDatabaseStorage:
+    """帳票ファイルのデータベース保存（チャンク単位の読み書き）のテスト"""
+    
+    def test_save_and_read_in_chunks(self, db, monkeypatch, django_assert_num_queries):
+        """中身はチャンクに分けて保存し、読み込みは必要なチャンクだけ取得する"""
+        import io
+        
+        from django.core.files.base import ContentFile
+        
+        from reports.models import StoredReportFile, StoredReportFileChunk
+        from reports.storage import DatabaseStorage
+        
+        monkeypatch.setattr(StoredReportFileChunk, 'CHUNK_SIZE', 10)
+        content = bytes(range(95))
+        storage = DatabaseStorage()
+        name = storage.save('jobs/test.bin', ContentFile(content))
+        
+        stored = StoredReportFile.objects.get(name=name)
+        assert stored.size == 95 == storage.size(name)
+        assert [len(c) for c in stored.chunks.order_by('index').values_list('data', flat=True)] == [10] * 9 + [5]
+        
+        with storage.open(name) as f:
+            with django_assert_num_queries(1):
+                assert f.read(4) == content[:4]
+            f.seek(42)
+            with django_assert_num_queries(3):
+                assert f.read(20) == content[42:62]  # 40〜69バイト目の3チャンク
+            f.seek(0, io.SEEK_END)
+            assert f.tell() == 95
+            f.seek(0)
+            assert f.read() == content
+        
+        storage.delete(name)
+        assert not storage.exists(name)
+        assert not StoredReportFileChunk.objects.exists()
+
+
+class TestReportCache:
+    """生成済み帳票キャッシュのテスト"""
+    
+    def test_fingerprint_changes_with_data(self, db, race, organization, normal_user):
+        """選手・組編成の変更や削除で指紋が変わる"""
+        heat = TestStreamingCSV()._create_assignments(race, organization, normal_user, 3)
+        before = ReportCache.fingerprint(heat)
+        assert ReportCache.fingerprint(heat) == before
+        
+        athlete = heat.assignments.first().entry.athlete
+        athlete.last_name = '変更'
+        athlete.save()
+        after_athlete = ReportCache.fingerprint(heat)
+        assert after_athlete != before
+        
+        heat.assignments.last().delete()
+        assert ReportCache.fingerprint(heat) != after_athlete
+    
+    def test_fingerprint_changes_on_reorder(self, db, race, organization, normal_user):
+        """腰ナンバーの一括並べ替え（update 経由）でも指紋が変わる"""
+        from heats.models import HeatGenerator
+        
+        heat = TestStreamingCSV()._create_assignments(race, organization, normal_user, 3)
+        before = ReportCache.fingerprint(race)
+        ids = list(heat.assignments.order_by('-bib_number').values_list('pk', flat=True))
+        
+        HeatGenerator.apply_ordering({heat.pk: ids})
+        
+        assert ReportCache.fingerprint(race) != before
+    
+    def test_open_hit_and_miss(self, db, race, organization, normal_user):
+        """同じデータならキャッシュから返し、変更後は再生成する"""
+        heat = TestStreamingCSV()._create_assignments(race, organization, normal_user, 2)
+        render = Mock(side_effect=PDFGenerator.generate_rollcall_pdf)
+        
+        first, hit = ReportCache.open('pdf_rollcall', heat, render)
+        assert not hit
+        second, hit = ReportCache.open('pdf_rollcall', heat, render)
+        assert hit
+        assert second.read() == first.read()
+        second.close()
+        assert render.call_count == 1
+        
+        heat.save()
+        _, hit = ReportCache.open('pdf_rollcall', heat, render)
+        assert not hit
+        assert render.call_count == 2
+    
+    def test_report_type_in_key(self, db, race, organization, normal_user):
+        """同じ組でも帳票種別が違えば別のキー"""
+        heat = TestStreamingCSV()._create_assignments(race, organization, normal_user, 1)
+        
+        assert ReportCache.key('pdf_rollcall', heat) != ReportCache.key('pdf_result_sheet', heat)
+    
+    def test_evict_least_recently_used(self, db, settings):
+        """上限を超えたら参照の古い順に削除"""
+        import io
+        import os
+        
+        settings.REPORT_CACHE_MAX_BYTES = 10 ** 9
+        for i, key in enumerate(['a', 'b', 'c']):
+            path = ReportCache.put(key, io.BytesIO(b'x' * 100))
+            os.utime(path, (1000 + i, 1000 + i))
+        ReportCache.get('a').close()  # 参照すると最新になる
+        
+        assert ReportCache.evict(max_bytes=250) == 1
+        
+        assert ReportCache.path('a').exists()
+        assert not ReportCache.path('b').exists()
+        assert ReportCache.path('c').exists()
+        assert ReportCache.clear() == 2
+    
+    def test_rollcall_view_served_from_cache(self, db, client_admin, race, organization, normal_user):
+        """点呼リストの2回目以降のダウンロードは再描画しない"""
+        from django.urls import reverse
+        
+        heat = TestStreamingCSV()._create_assignments(race, organization, normal_user, 2)
+        url = reverse('reports:rollcall_pdf', args=[heat.pk])
+        
+        with patch.object(
+            PDFGenerator, 'generate_rollcall_pdf', wraps=PDFGenerator.generate_rollcall_pdf
+        ) as render:
+            first = b''.join(client_admin.get(url).streaming_content)
+            second = b''.join(client_admin.get(url).streaming_content)
+        
+        assert first.startswith(b'%PDF')
+        assert second == first
+        assert render.call_count == 1
+        assert ReportLog.objects.filter(report_type='pdf_rollcall').count() == 2
+
+
+class TestParallelRendering:
+    """大会全体の帳票の並列描画のテスト"""
+    
+    def _create_heats(self, race, organization, normal_user, heats=2, per_heat=2):
+        for number in range(1, heats + 1):
+            TestStreamingCSV()._create_assignments(race, organization, normal_user, per_heat, heat_number=number)
+    
+    def test_serial_without_workers(self, db, competition, race, organization, normal_user, settings):
+        """ワーカー数が0/1なら直列描画（並列描画は使わない）"""
+        settings.REPORT_RENDER_WORKERS = 0
+        self._create_heats(race, organization, normal_user)
+        
+        with patch('reports.parallel.render') as render:
+            pdf = PDFGenerator.generate_all_data_pdf(competition)
+            sheets = ResultSheetPDFGenerator.generate_all_result_sheets_pdf(race, workers=1)
+        
+        render.assert_not_called()
+        assert pdf.getvalue().startswith(b'%PDF')
+        assert sheets.getvalue().startswith(b'%PDF')
+    
+    def test_serial_fallback_without_pypdf(self, db, race, organization, normal_user):
+        """pypdf がなければワーカー数を指定しても直列描画"""
+        self._create_heats(race, organization, normal_user)
+        
+        with patch('reports.parallel.PdfWriter', None), patch('reports.parallel.render') as render:
+            pdf = ResultSheetPDFGenerator.generate_all_result_sheets_pdf(race, workers=4)
+        
+        render.assert_not_called()
+        assert pdf.getvalue().startswith(b'%PDF')
+    
+    def test_parts_split_per_race_and_heat(self, db, competition, race, organization, normal_user):
+        """全データは種目単位（表紙は先頭のみ）、結果記録用紙は組単位でまとめて分割"""
+        from competitions.models import Race
+        
+        self._create_heats(race, organization, normal_user, heats=2, per_heat=3)
+        Race.objects.create(
+            competition=competition, name='女子3000m', distance=3000, gender='F', display_order=2,
+        )
+        
+        with patch('reports.parallel.can_parallelize', return_value=True), \
+                patch('reports.parallel.render') as render:
+            PDFGenerator.generate_all_data_pdf(competition, workers=2)
+            ResultSheetPDFGenerator.generate_all_result_sheets_pdf(race, workers=2)
+        
+        (all_data_func, parts, workers), (sheet_func, sheets, _) = [c.args for c in render.call_args_list]
+        assert workers == 2
+        assert [header is not None for header, _ in parts] == [True, False]
+        assert [[r['name'] for r in races] for _, races in parts] == [[race.name], ['女子3000m']]
+        assert [len(h['rows']) for h in parts[0][1][0]['heats']] == [3, 3]
+        assert parts[1][1][0]['heats'] == []
+        assert [len(group) for group in sheets] == [1, 1]
+        assert len(sheets[0][0]['rows']) == 6  # 1選手2行
+        # 子プロセスで呼ぶ関数は単独でも描画できる
+        assert all_data_func(parts[1]).startswith(b'%PDF')
+        assert sheet_func(sheets[0]).startswith(b'%PDF')
+    
+    def test_result_sheets_by_race_gate_on_total_rows(self, db, competition, race, organization, normal_user,
+                                                      monkeypatch):
+        """複数種目の結果記録用紙は全種目の行数で判定し、種目単位でまとめて並列描画"""
+        from competitions.models import Race
+        from reports import parallel
+        
+        monkeypatch.setattr(parallel, 'PdfWriter', object)
+        monkeypatch.setattr(parallel, 'MIN_ROWS', 10)
+        self._create_heats(race, organization, normal_user, heats=2, per_heat=2)
+        other = Race.objects.create(
+            competition=competition, name='女子3000m', distance=3000, gender='F', display_order=2,
+        )
+        empty = Race.objects.create(
+            competition=competition, name='男子1500m', distance=1500, gender='M', display_order=3,
+        )
+        TestStreamingCSV()._create_assignments(other, organization, normal_user, 1, heat_number=1)
+        
+        # 1種目（8行）では閾値に届かないが、全種目（10行）では並列描画する
+        with patch('reports.parallel.map_parts') as map_parts:
+            ResultSheetPDFGenerator.generate_all_result_sheets_pdf(race, workers=2)
+            map_parts.assert_not_called()
+            map_parts.side_effect = lambda func, parts, workers: [func(part) for part in parts]
+            documents = ResultSheetPDFGenerator.generate_result_sheets_by_race([race, other, empty], workers=2)
+        
+        (func, groups, workers), = [c.args for c in map_parts.call_args_list]
+        assert workers == 2
+        assert [[race_id for race_id, _ in group] for group in groups] == [[race.pk], [other.pk]]
+        assert [len(sheets) for _, sheets in groups[0]] == [2]
+        assert set(documents) == {race.pk, other.pk, empty.pk}
+        assert documents[race.pk].startswith(b'%PDF') and documents[other.pk].startswith(b'%PDF')
+        assert documents[empty.pk] == b''
+    
+    def test_partition_keeps_order(self):
+        """順序を保ったまま重みがほぼ均等なワーカー数以下のまとまりに分ける"""
+        from reports.parallel import partition
+        
+        assert partition([5, 1, 1, 1, 1, 1], 2, weight=lambda n: n) == [[5], [1, 1, 1, 1, 1]]
+        assert partition(list(range(6)), 3, weight=lambda n: 1) == [[0, 1], [2, 3], [4, 5]]
+        assert partition([1], 4, weight=lambda n: 1) == [[1]]
+    
+    def test_parallel_merge(self, db, race, organization, normal_user, monkeypatch):
+        """プロセスプールで描画したページを連結（pypdf がある環境のみ）"""
+        from reports import parallel
+        
+        pypdf = pytest.importorskip('pypdf')
+        monkeypatch.setattr(parallel, 'MIN_ROWS', 0)
+        self._create_heats(race, organization, normal_user, heats=3)
+        
+        try:
+            pdf = ResultSheetPDFGenerator.generate_all_result_sheets_pdf(race, workers=2)
+        finally:
+            parallel.shutdown()
+        
+        assert len(pypdf.PdfReader(pdf).pages) == 3
+
+
+class TestOfflineBundle:
+    """オフライン用データ一式（ZIP）のテスト"""
+    
+    def _create_races(self, competition, race, organization, normal_user):
+        from competitions.models import Race
+        
+        other = Race.objects.create(
+            competition=competition, name='女子3000m/B', distance=3000, gender='F', display_order=2,
+        )
+        TestStreamingCSV()._create_assignments(race, organization, normal_user, 2, heat_number=1)
+        TestStreamingCSV()._create_assignments(race, organization, normal_user, 1, heat_number=2)
+        TestStreamingCSV()._create_assignments(other, organization, normal_user, 2, heat_number=3)
+        return other
+    
+    def test_build_zip_contents(self, db, competition, race, organization, normal_user):
+        """種目ごとのCSV・PDFと組編成JSONをZIPにまとめる"""
+        import json
+        import zipfile
+        
+        self._create_races(competition, race, organization, normal_user)
+        
+        result = OfflineBundle.build(competition)
+        
+        assert result == {'version': 1, 'rebuilt': 2, 'removed': 0, 'changed': True}
+        with zipfile.ZipFile(OfflineBundle.open(competition)) as archive:
+            names = set(archive.namelist())
+            snapshot = json.loads(archive.read('snapshot.json'))
+            startlist = archive.read('01_男子5000m/startlist.csv').decode('utf-8-sig')
+        assert names == {
+            'snapshot.json',
+            '01_男子5000m/startlist.csv', '01_男子5000m/rollcall_1.pdf', '01_男子5000m/rollcall_2.pdf',
+            '01_男子5000m/result_sheets.pdf',
+            '02_女子3000m_B/startlist.csv', '02_女子3000m_B/rollcall_3.pdf', '02_女子3000m_B/result_sheets.pdf',
+        }
+        assert snapshot['version'] == 1
+        assert [r['name'] for r in snapshot['races']] == ['男子5000m', '女子3000m/B']
+        assert [len(h['assignments']) for h in snapshot['races'][0]['heats']] == [2, 1]
+        assert len(startlist.splitlines()) == 4
+        assert OfflineBundle.info(competition)['version'] == 1
+    
+    def test_build_only_changed_races(self, db, competition, race, organization, normal_user):
+        """変更のない種目は生成し直さず、変更があれば版を上げて古いZIPを削除"""
+        from accounts.models import Athlete
+        from reports.storage import report_storage
+        
+        other = self._create_races(competition, race, organization, normal_user)
+        first = OfflineBundle.build(competition)
+        old_path = OfflineBundle.path(competition)
+        
+        with patch.object(OfflineBundle, '_write_race') as write_race:
+            unchanged = OfflineBundle.build(competition)
+        write_race.assert_not_called()
+        assert unchanged == {'version': 1, 'rebuilt': 0, 'removed': 0, 'changed': False}
+        
+        athlete = Athlete.objects.filter(entries__race=other).first()
+        athlete.first_name = '次郎'
+        athlete.save()
+        with patch.object(OfflineBundle, '_write_race', wraps=OfflineBundle._write_race) as write_race:
+            changed = OfflineBundle.build(competition)
+        
+        assert [c.args[1] for c in write_race.call_args_list] == [other]
+        assert changed['version'] == first['version'] + 1
+        assert not report_storage().exists(old_path)
+        assert OfflineBundle.path(competition) == f'bundles/{competition.pk}/bundle_v2.zip'
+        
+        other.is_active = False
+        other.save()
+        assert OfflineBundle.build(competition)['removed'] == 1
+    
+    def test_build_on_another_server(self, db, competition, race, organization, normal_user, settings, tmp_path):
+        """毎回空のディスクで動いても（Render の cron）変わった種目だけ生成し直す"""
+        from reports.models import StoredReportFile
+        
+        other = self._create_races(competition, race, organization, normal_user)
+        OfflineBundle.build(competition)
+        settings.REPORT_FILES_ROOT = str(tmp_path / 'fresh')
+        
+        with patch.object(OfflineBundle, '_write_race') as write_race:
+            unchanged = OfflineBundle.build(competition)
+        write_race.assert_not_called()
+        assert unchanged == {'version': 1, 'rebuilt': 0, 'removed': 0, 'changed': False}
+        
+        other.name = '女子3000m'
+        other.save()
+        settings.REPORT_FILES_ROOT = str(tmp_path / 'fresh2')
+        changed = OfflineBundle.build(competition)
+        
+        assert changed == {'version': 2, 'rebuilt': 1, 'removed': 0, 'changed': True}
+        # 前の版の other のファイルは削除し、変わっていない race は v1 のファイルを使い続ける
+        names = set(StoredReportFile.objects.values_list('name', flat=True))
+        prefix = f'bundles/{competition.pk}/'
+        assert {prefix + 'manifest.json', prefix + 'bundle_v2.zip'} <= names
+        assert {n.rsplit('/', 1)[0] for n in names if '/races/' in n} == {
+            f'{prefix}races/{race.pk}/v1', f'{prefix}races/{other.pk}/v2',
+        }
+        assert not (tmp_path / 'fresh2').exists()
+    
+    def test_rebuild_after_bib_assignment(self, db, competition, race, organization, normal_user):
+        """ゼッケン番号の採番（updated_at を更新しない一括 UPDATE を含む）で種目を生成し直す"""
+        import json
+        import zipfile
+        
+        from heats.models import BibNumberGenerator, HeatAssignment
+        
+        self._create_races(competition, race, organization, normal_user)
+        OfflineBundle.build(competition)
+        
+        BibNumberGenerator.assign_bib_numbers(competition)
+        assigned = OfflineBundle.build(competition)
+        
+        assert assigned['rebuilt'] == 2
+        assert assigned['changed'] is True
+        with zipfile.ZipFile(OfflineBundle.open(competition)) as archive:
+            snapshot = json.loads(archive.read('snapshot.json'))
+        bibs = [a['race_bib'] for r in snapshot['races'] for h in r['heats'] for a in h['assignments']]
+        assert None not in bibs
+        
+        HeatAssignment.objects.filter(heat__race=race, race_bib_number__isnull=False).update(race_bib_number=None)
+        assert OfflineBundle.build(competition)['rebuilt'] == 1
+    
+    def test_download(self, client_admin, competition, race, organization, normal_user):
+        """生成済みならZIPを返し、未生成なら帳票出力画面へ戻す"""
+        from django.core.management import call_command
+        from django.urls import reverse
+        
+        url = reverse('reports:offline_bundle', args=[competition.pk])
+        response = client_admin.get(url)
+        assert response.status_code == 302
+        
+        TestStreamingCSV()._create_assignments(race, organization, normal_user, 2)
+        call_command('build_offline_bundles', competition=competition.pk, stdout=Mock())
+        response = client_admin.get(url)
+        
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'application/zip'
+        assert f'offline_{competition.event_date}_v1.zip' in response['Content-Disposition']
+        assert b''.join(response.streaming_content).startswith(b'PK')
+        assert ReportLog.objects.filter(report_type='zip_offline_bundle').count() == 1
+        index = client_admin.get(reverse('reports:index', args=[competition.pk]))
+        assert 'オフライン用データ一式（v1）' in index.content.decode()
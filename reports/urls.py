@@ -14,7 +14,12 @@ urlpatterns = [
     path('heat/<int:heat_pk>/rollcall.pdf', views.download_rollcall_pdf, name='rollcall_pdf'),
     path('race/<int:race_pk>/program.pdf', views.download_program_pdf, name='program_pdf'),
     path('competition/<int:competition_pk>/emergency.pdf', views.download_all_data_pdf, name='all_data_pdf'),
+    path('competition/<int:competition_pk>/offline.zip', views.download_offline_bundle, name='offline_bundle'),
     # 結果記録用紙
     path('heat/<int:heat_pk>/result_sheet.pdf', views.download_result_sheet_pdf, name='result_sheet_pdf'),
     path('race/<int:race_pk>/result_sheets.pdf', views.download_all_result_sheets_pdf, name='all_result_sheets_pdf'),
+    # バックグラウンド生成ジョブ
+    path('jobs/<int:job_pk>/', views.job_detail, name='job_detail'),
+    path('jobs/<int:job_pk>/status/', views.job_status, name='job_status'),
+    path('jobs/<int:job_pk>/download/', views.job_download, name='job_download'),
 ]
@@ -1,16 +1,27 @@
 """
 reports ビュー
 """
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404, render
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 
 from accounts.utils import admin_required
 from competitions.models import Competition, Race
 from heats.models import Heat
+from nitsys.streaming import StreamingFileResponse
 
+from .bundle import OfflineBundle
+from .cache import ReportCache
 from .generators import CSVGenerator, PDFGenerator, ResultSheetPDFGenerator
-from .models import ReportLog
+from .jobs import ReportJobRunner
+from .models import ReportJob, ReportLog
+
+
+def _pdf_response(pdf_file, filename):
+    """PDFのダウンロード応答（キャッシュのファイル・生成したバッファのどちらもそのまま送る）"""
+    return StreamingFileResponse(pdf_file, as_attachment=True, filename=filename, content_type='application/pdf')
 
 
 @login_required
@@ -23,17 +34,16 @@ def report_index(request, competition_pk):
     return render(request, 'reports/report_index.html', {
         'competition': competition,
         'races': races,
+        'bundle': OfflineBundle.info(competition),
     })
 
 
 @login_required
 @admin_required
 def download_startlist_csv(request, race_pk):
-    """スタートリストCSVダウンロード"""
+    """スタートリストCSVダウンロード（ストリーミング）"""
     race = get_object_or_404(Race, pk=race_pk)
     
-    csv_content = CSVGenerator.generate_startlist_csv(race)
-    
     # ログ記録
     ReportLog.objects.create(
         report_type='csv_startlist',
@@ -42,21 +52,16 @@ def download_startlist_csv(request, race_pk):
         generated_by=request.user
     )
     
-    response = HttpResponse(csv_content, content_type='text/csv; charset=utf-8-sig')
     filename = f"startlist_{race.competition.event_date}_{race.name}.csv"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    return CSVGenerator.stream_startlist_csv(race, filename)
 
 
 @login_required
 @admin_required
 def download_all_data_csv(request, competition_pk):
-    """全データCSVダウンロード"""
+    """全データCSVダウンロード（ストリーミング）"""
     competition = get_object_or_404(Competition, pk=competition_pk)
     
-    csv_content = CSVGenerator.generate_all_data_csv(competition)
-    
     # ログ記録
     ReportLog.objects.create(
         report_type='csv_startlist',
@@ -64,20 +69,17 @@ def download_all_data_csv(request, competition_pk):
         generated_by=request.user
     )
     
-    response = HttpResponse(csv_content, content_type='text/csv; charset=utf-8-sig')
     filename = f"all_data_{competition.event_date}.csv"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    return CSVGenerator.stream_all_data_csv(competition, filename)
 
 
 @login_required
 @admin_required
 def download_rollcall_pdf(request, heat_pk):
     """点呼用PDFダウンロード"""
-    heat = get_object_or_404(Heat, pk=heat_pk)
+    heat = get_object_or_404(Heat.objects.select_related('race__competition'), pk=heat_pk)
     
-    pdf_buffer = PDFGenerator.generate_rollcall_pdf(heat)
+    pdf_file, _ = ReportCache.open('pdf_rollcall', heat, PDFGenerator.generate_rollcall_pdf)
     
     # ログ記録
     ReportLog.objects.create(
@@ -87,20 +89,17 @@ def download_rollcall_pdf(request, heat_pk):
         generated_by=request.user
     )
     
-    response = HttpResponse(pdf_buffer.read(), content_type='application/pdf')
     filename = f"rollcall_{heat.race.name}_{heat.heat_number}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    return _pdf_response(pdf_file, filename)
 
 
 @login_required
 @admin_required
 def download_program_pdf(request, race_pk):
     """プログラム原稿PDFダウンロード"""
-    race = get_object_or_404(Race, pk=race_pk)
+    race = get_object_or_404(Race.objects.select_related('competition'), pk=race_pk)
     
-    pdf_buffer = PDFGenerator.generate_program_pdf(race)
+    pdf_file, _ = ReportCache.open('pdf_program', race, PDFGenerator.generate_program_pdf)
     
     # ログ記録
     ReportLog.objects.create(
@@ -110,42 +109,50 @@ def download_program_pdf(request, race_pk):
         generated_by=request.user
     )
     
-    response = HttpResponse(pdf_buffer.read(), content_type='application/pdf')
     filename = f"program_{race.competition.event_date}_{race.name}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    return _pdf_response(pdf_file, filename)
 
 
 @login_required
 @admin_required
-def download_all_data_pdf(request, competition_pk):
-    """緊急用全データPDFダウンロード"""
+def download_offline_bundle(request, competition_pk):
+    """オフライン用データ一式（ZIP）ダウンロード（夜間に生成済みのもの）"""
     competition = get_object_or_404(Competition, pk=competition_pk)
     
-    pdf_buffer = PDFGenerator.generate_all_data_pdf(competition)
+    bundle = OfflineBundle.open(competition)
+    if bundle is None:
+        messages.warning(request, 'オフライン用データ一式はまだ生成されていません（毎晩自動で生成されます）')
+        return redirect('reports:index', competition_pk=competition.pk)
     
     # ログ記録
     ReportLog.objects.create(
-        report_type='pdf_all',
+        report_type='zip_offline_bundle',
         competition=competition,
         generated_by=request.user
     )
     
-    response = HttpResponse(pdf_buffer.read(), content_type='application/pdf')
-    filename = f"emergency_backup_{competition.event_date}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return StreamingFileResponse(
+        bundle, as_attachment=True, filename=OfflineBundle.filename(competition), content_type='application/zip'
+    )
+
+
+@login_required
+@admin_required
+def download_all_data_pdf(request, competition_pk):
+    """緊急用全データPDF（バックグラウンド生成ジョブを登録して状況ページへ）"""
+    competition = get_object_or_404(Competition, pk=competition_pk)
     
-    return response
+    job = ReportJobRunner.enqueue('pdf_all', competition, user=request.user)
+    return redirect('reports:job_detail', job_pk=job.pk)
 
 
 @login_required
 @admin_required
 def download_result_sheet_pdf(request, heat_pk):
     """結果記録用紙PDFダウンロード（1組分）"""
-    heat = get_object_or_404(Heat, pk=heat_pk)
+    heat = get_object_or_404(Heat.objects.select_related('race__competition'), pk=heat_pk)
     
-    pdf_buffer = ResultSheetPDFGenerator.generate_result_sheet_pdf(heat)
+    pdf_file, _ = ReportCache.open('pdf_result_sheet', heat, ResultSheetPDFGenerator.generate_result_sheet_pdf)
     
     # ログ記録
     ReportLog.objects.create(
@@ -155,31 +162,71 @@ def download_result_sheet_pdf(request, heat_pk):
         generated_by=request.user
     )
     
-    response = HttpResponse(pdf_buffer.read(), content_type='application/pdf')
     filename = f"result_sheet_{heat.race.name}_{heat.heat_number}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    return _pdf_response(pdf_file, filename)
 
 
 @login_required
 @admin_required
 def download_all_result_sheets_pdf(request, race_pk):
-    """結果記録用紙PDF一括ダウンロード（全組）"""
+    """結果記録用紙PDF一括（全組、バックグラウンド生成ジョブを登録して状況ページへ）"""
     race = get_object_or_404(Race, pk=race_pk)
     
-    pdf_buffer = ResultSheetPDFGenerator.generate_all_result_sheets_pdf(race)
-    
-    # ログ記録
-    ReportLog.objects.create(
-        report_type='pdf_result_sheet',
-        competition=race.competition,
-        race=race,
-        generated_by=request.user
+    job = ReportJobRunner.enqueue('pdf_result_sheet', race.competition, race=race, user=request.user)
+    return redirect('reports:job_detail', job_pk=job.pk)
+
+
+def _job_status(job):
+    """ジョブの状態（JSON 応答・画面表示用）"""
+    data = {
+        'id': job.pk,
+        'report_type': job.report_type,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'error': job.error,
+        'download_url': None,
+    }
+    if job.status == ReportJob.STATUS_DONE:
+        data['download_url'] = reverse('reports:job_download', args=[job.pk])
+    return data
+
+
+@login_required
+@admin_required
+def job_detail(request, job_pk):
+    """帳票生成ジョブの状況ページ（生成中は自動更新）"""
+    job = get_object_or_404(
+        ReportJob.objects.select_related('competition', 'race'), pk=job_pk
     )
     
-    response = HttpResponse(pdf_buffer.read(), content_type='application/pdf')
-    filename = f"result_sheets_{race.competition.event_date}_{race.name}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    return render(request, 'reports/job_detail.html', {
+        'job': job,
+        'competition': job.competition,
+        'status': _job_status(job),
+    })
+
+
+@login_required
+@admin_required
+def job_status(request, job_pk):
+    """帳票生成ジョブの状態（JSON）"""
+    job = get_object_or_404(ReportJob, pk=job_pk)
+    return JsonResponse(_job_status(job))
+
+
+@login_required
+@admin_required
+def job_download(request, job_pk):
+    """生成済み帳票のダウンロード"""
+    job = get_object_or_404(ReportJob.objects.select_related('report_log'), pk=job_pk)
+    if job.status != ReportJob.STATUS_DONE or job.report_log is None:
+        raise Http404('帳票はまだ生成されていません')
+    
+    try:
+        artifact = ReportJobRunner.open_artifact(job)
+    except FileNotFoundError:
+        raise Http404('帳票ファイルが見つかりません') from None
+    
+    return _pdf_response(artifact, job.filename)
@@ -0,0 +1,228 @@
+"""
+全データPDF（緊急時バックアップ）のメモリ使用量ベンチマーク
+
+大規模な大会（既定: 80種目・5,000名）を作成し、全データPDFを次の方法で生成して
+最大RSS（VmHWM）の増加量と所要時間を比較する。
+    一時ファイル  generate_all_data_pdf_file()（ディスクに出力）
+    BytesIO       generate_all_data_pdf()（出力をメモリに保持し、保存時に getvalue() で複製）
+    一括（従来）  大会全体のフローアブルを1つのリストにして BytesIO に出力し、read() で複製
+
+解放したメモリをプロセス内で再利用して差が見えなくなるのを避けるため、方法ごとに
+子プロセスで生成し、生成前のRSSからの最大RSSの増加量を計測する（Linux の /proc を使用。
+ない環境では getrusage の最大値）。計測用のデータは子プロセスから参照できるよう
+コミットして作成し、最後に削除する。
+
+使い方:
+    python scripts/benchmark_all_data_memory.py [--athletes 5000] [--races 80]
+"""
+import os
+import sys
+
+import django
+
+# Django設定
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nitsys.settings')
+django.setup()
+
+import argparse
+import gc
+import io
+import resource
+import subprocess
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.platypus import SimpleDocTemplate
+
+from accounts.models import Athlete, Organization, User
+from competitions.models import Competition, Race
+from entries.models import Entry
+from heats.models import Heat, HeatAssignment
+from reports.generators import PDFGenerator
+from reports.rendering import RenderingContext
+
+COPY_CHUNK = 64 * 1024
+
+
+def build_competition(athletes, races):
+    """計測用の大会・種目・組編成を作成（大会・団体・ユーザーを返す）"""
+    now = timezone.now()
+    competition = Competition.objects.create(
+        name='メモリ計測大会', event_date=date.today() + timedelta(days=30),
+        venue='計測競技場', entry_start_at=now, entry_end_at=now + timedelta(days=7),
+    )
+    organization = Organization.objects.create(
+        name='ベンチマーク大学', name_kana='ベンチマークダイガク', short_name='ベンチ大',
+        representative_name='計測', representative_email='bench@example.com',
+    )
+    user = User.objects.create_user(
+        email='bench-memory@example.com', password=None, full_name='計測', organization=organization,
+    )
+    race_objects = [
+        Race.objects.create(
+            competition=competition, name=f'計測種目{i}', distance=5000, gender='M' if i % 2 == 0 else 'F',
+            display_order=i, heat_capacity=40, max_entries=None,
+        )
+        for i in range(races)
+    ]
+    athlete_objects = Athlete.objects.bulk_create([
+        Athlete(
+            organization=organization, last_name=f'計測{i}', first_name='太郎',
+            last_name_kana='ケイソク', first_name_kana='タロウ',
+            gender='M', birth_date=date(2000, 1, 1),
+        )
+        for i in range(athletes)
+    ], batch_size=1000)
+    entries = Entry.objects.bulk_create([
+        Entry(
+            athlete=athlete, race=race_objects[i % races], registered_by=user,
+            declared_time=Decimal(800 + i), status='confirmed',
+        )
+        for i, athlete in enumerate(athlete_objects)
+    ], batch_size=1000)
+
+    per_race = {}
+    for entry in entries:
+        per_race.setdefault(entry.race_id, []).append(entry)
+    heats = []
+    plan = []
+    for race in race_objects:
+        members = per_race.get(race.pk, [])
+        for number, start in enumerate(range(0, len(members), race.heat_capacity), start=1):
+            heats.append(Heat(race=race, heat_number=number))
+            plan.append(members[start:start + race.heat_capacity])
+    heats = Heat.objects.bulk_create(heats)
+    HeatAssignment.objects.bulk_create([
+        HeatAssignment(heat=heat, entry=entry, bib_number=bib)
+        for heat, members in zip(heats, plan, strict=True)
+        for bib, entry in enumerate(members, start=1)
+    ], batch_size=1000)
+    return competition, organization, user
+
+
+def peak_rss():
+    """最大RSS（KB）"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def current_rss():
+    """現在のRSS（KB）"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def drain(f):
+    """出力を少しずつ読み捨てる（FileResponse での送信に相当）"""
+    size = 0
+    while chunk := f.read(COPY_CHUNK):
+        size += len(chunk)
+    return size
+
+
+def via_temp_file(competition):
+    with PDFGenerator.generate_all_data_pdf_file(competition, workers=1) as f:
+        return drain(f)
+
+
+def via_bytesio(competition):
+    buffer = PDFGenerator.generate_all_data_pdf(competition, workers=1)
+    return len(buffer.getvalue())
+
+
+def via_single_list(competition):
+    """従来の生成方法（全フローアブルを1つのリストに保持）"""
+    races = list(competition.races.filter(is_active=True).order_by('display_order', 'pk'))
+    header = {
+        'name': competition.name,
+        'event_date': competition.event_date.strftime('%Y年%m月%d日'),
+        'generated_at': datetime.now().strftime('%Y年%m月%d日 %H:%M:%S'),
+    }
+    elements = [
+        flowable
+        for chunk in PDFGenerator._all_data_flowables(header, list(PDFGenerator._iter_all_data_races(races)))
+        for flowable in chunk
+    ]
+    buffer = io.BytesIO()
+    SimpleDocTemplate(
+        buffer, pagesize=A4, rightMargin=10*mm, leftMargin=10*mm, topMargin=15*mm, bottomMargin=15*mm,
+    ).build(elements)
+    buffer.seek(0)
+    return len(buffer.read())
+
+
+METHODS = {
+    'file': ('一時ファイル', via_temp_file),
+    'bytesio': ('BytesIO', via_bytesio),
+    'list': ('一括（従来）', via_single_list),
+}
+
+
+def measure(method, competition_pk):
+    """子プロセス：1つの方法で生成して計測結果を表示"""
+    label, func = METHODS[method]
+    competition = Competition.objects.get(pk=competition_pk)
+    RenderingContext.warm_up()
+    gc.collect()
+    before = current_rss()
+    started = time.perf_counter()
+    size = func(competition)
+    elapsed = time.perf_counter() - started
+    growth = peak_rss() - before
+    print(f'  {label:<10} 最大RSS増加 {growth / 1024:7.1f}MB  {elapsed:6.2f}秒  {size / 1024:8.0f}KB')
+
+
+def cleanup(competition, organization, user):
+    """計測用のデータを削除"""
+    with transaction.atomic():
+        competition.delete()
+        Athlete.objects.filter(organization=organization).delete()
+        user.delete()
+        organization.delete()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='全データPDFのメモリ使用量ベンチマーク')
+    parser.add_argument('--athletes', type=int, default=5000, help='選手数')
+    parser.add_argument('--races', type=int, default=80, help='種目数')
+    parser.add_argument('--measure', choices=METHODS, help=argparse.SUPPRESS)
+    parser.add_argument('--competition', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.competition)
+        return
+
+    with transaction.atomic():
+        competition, organization, user = build_competition(args.athletes, args.races)
+    try:
+        print(f'{args.athletes}名 / {args.races}種目')
+        for method in METHODS:
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--measure', method, '--competition', str(competition.pk)],
+                check=True,
+            )
+    finally:
+        cleanup(competition, organization, user)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+選手一括登録のベンチマーク
+
+2,000名分のExcelを生成し、解析（重複チェック含む）と登録にかかる時間・クエリ数を計測する。
+計測用の団体・ユーザー・選手はトランザクション内で作成し、最後にロールバックする。
+
+使い方:
+    python scripts/benchmark_athlete_import.py [--count 2000]
+"""
+import os
+import sys
+
+import django
+
+# Django設定
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nitsys.settings')
+django.setup()
+
+import argparse
+import io
+import time
+
+import pandas as pd
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from accounts.athlete_import import AthleteExcelImporter
+from accounts.models import Organization, User
+
+PREFS = ['東京', '神奈川', '埼玉', '千葉', '大阪']
+
+
+class Rollback(Exception):
+    """計測後にロールバックするための例外"""
+
+
+def build_workbook(count):
+    """ベンチマーク用のExcelを生成（末尾50行はファイル内重複）"""
+    rows = []
+    for i in range(count):
+        source = i - 50 if i >= count - 50 else i
+        rows.append({
+            '姓': f'計測{source}',
+            '名': '太郎',
+            '姓カナ': 'ケイソク',
+            '名カナ': 'タロウ',
+            '性別': 'M' if i % 2 == 0 else 'F',
+            '生年月日': f'200{i % 5}-0{i % 9 + 1}-1{i % 9}',
+            '登録陸協': PREFS[i % len(PREFS)],
+            'JAAF ID': f'BM{source:06d}',
+        })
+    output = io.BytesIO()
+    pd.DataFrame(rows).to_excel(output, index=False, engine='openpyxl')
+    return output.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='選手一括登録のベンチマーク')
+    parser.add_argument('--count', type=int, default=2000, help='選手数')
+    args = parser.parse_args()
+
+    content = build_workbook(args.count)
+    print(f'Excel生成: {args.count}名 ({len(content) // 1024}KB)')
+
+    try:
+        with transaction.atomic():
+            organization = Organization.objects.create(
+                name='ベンチマーク大学', name_kana='ベンチマークダイガク',
+                representative_name='計測', representative_email='bench@example.com',
+            )
+            user = User.objects.create_user(
+                email='bench-import@example.com', password=None,
+                full_name='計測', organization=organization,
+            )
+            importer = AthleteExcelImporter(user)
+
+            with CaptureQueriesContext(connection) as parse_queries:
+                started = time.perf_counter()
+                parsed, global_errors = importer.parse_excel(content)
+                parse_time = time.perf_counter() - started
+
+            if global_errors:
+                print('\n'.join(global_errors))
+                return
+
+            with CaptureQueriesContext(connection) as import_queries:
+                started = time.perf_counter()
+                imported, skipped = importer.import_athletes(parsed)
+                import_time = time.perf_counter() - started
+
+            warnings = sum(1 for a in parsed if a.get('warnings'))
+            print(f'解析＋重複チェック: {parse_time:.2f}秒 / {len(parse_queries)}クエリ（警告 {warnings}件）')
+            print(f'登録: {import_time:.2f}秒 / {len(import_queries)}クエリ（登録 {len(imported)}名, スキップ {len(skipped)}名）')
+            print(f'合計: {parse_time + import_time:.2f}秒')
+            raise Rollback
+    except Rollback:
+        pass
+
+
+if __name__ == '__main__':
+    main()
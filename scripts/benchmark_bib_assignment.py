@@ -0,0 +1,121 @@
+"""
+ゼッケン番号一括採番のベンチマーク
+
+NCG／一般 × 男女の種目に合計 5,000 名（既定）の組編成を作成し、
+BibNumberGenerator.assign_bib_numbers() の所要時間とクエリ数を計測する。
+計測用のデータはトランザクション内で作成し、最後にロールバックする。
+
+使い方:
+    python scripts/benchmark_bib_assignment.py [--athletes 5000] [--races 20]
+"""
+import os
+import sys
+
+import django
+
+# Django設定
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nitsys.settings')
+django.setup()
+
+import argparse
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import Athlete, Organization, User
+from competitions.models import Competition, Race
+from entries.models import Entry
+from heats.models import BibNumberGenerator, Heat, HeatAssignment
+
+
+class Rollback(Exception):
+    """計測後にロールバックするための例外"""
+
+
+def build_competition(athletes, races):
+    """計測用の大会・種目・組編成を作成"""
+    now = timezone.now()
+    competition = Competition.objects.create(
+        name='ゼッケン採番ベンチマーク', event_date=date.today() + timedelta(days=30),
+        venue='計測競技場', entry_start_at=now, entry_end_at=now + timedelta(days=7),
+    )
+    organization = Organization.objects.create(
+        name='ベンチマーク大学', name_kana='ベンチマークダイガク',
+        representative_name='計測', representative_email='bench@example.com',
+    )
+    user = User.objects.create_user(
+        email='bench-bibs@example.com', password=None, full_name='計測', organization=organization,
+    )
+
+    race_objects = []
+    for i in range(races):
+        gender = 'M' if i % 2 == 0 else 'F'
+        race_objects.append(Race.objects.create(
+            competition=competition, name=f'計測種目{i}', distance=5000, gender=gender,
+            is_ncg=i % 4 < 2, display_order=i, heat_capacity=40, max_entries=None,
+        ))
+
+    athlete_objects = Athlete.objects.bulk_create([
+        Athlete(
+            organization=organization, last_name=f'計測{i}', first_name='太郎',
+            last_name_kana='ケイソク', first_name_kana='タロウ',
+            gender='M', birth_date=date(2000, 1, 1),
+        )
+        for i in range(athletes)
+    ])
+    entries = Entry.objects.bulk_create([
+        Entry(
+            athlete=athlete, race=race_objects[i % races], registered_by=user,
+            declared_time=Decimal(800 + i), status='confirmed',
+        )
+        for i, athlete in enumerate(athlete_objects)
+    ])
+
+    per_race = {}
+    for entry in entries:
+        per_race.setdefault(entry.race_id, []).append(entry)
+    heats = []
+    plan = []
+    for race in race_objects:
+        members = per_race.get(race.pk, [])
+        for number, start in enumerate(range(0, len(members), race.heat_capacity), start=1):
+            heats.append(Heat(race=race, heat_number=number))
+            plan.append(members[start:start + race.heat_capacity])
+    heats = Heat.objects.bulk_create(heats)
+    HeatAssignment.objects.bulk_create([
+        HeatAssignment(heat=heat, entry=entry, bib_number=bib)
+        for heat, members in zip(heats, plan, strict=True)
+        for bib, entry in enumerate(members, start=1)
+    ], batch_size=1000)
+    return competition
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ゼッケン番号一括採番のベンチマーク')
+    parser.add_argument('--athletes', type=int, default=5000, help='選手数')
+    parser.add_argument('--races', type=int, default=20, help='種目数')
+    args = parser.parse_args()
+
+    try:
+        with transaction.atomic():
+            competition = build_competition(args.athletes, args.races)
+            print(f'{connection.vendor}: {args.athletes}名 / {args.races}種目')
+
+            for label in ('初回採番', '再採番（変更なし）'):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    result = BibNumberGenerator.assign_bib_numbers(competition)
+                    elapsed = time.perf_counter() - started
+                print(f'{label}: {elapsed:.3f}秒 / {len(queries)}クエリ（{len(result["assigned"])}種目）')
+            raise Rollback
+    except Rollback:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+組分けシード方式のベンチマーク
+
+申告タイム順のエントリー（データベース不要のダミー）を各方式で組に分割し、
+所要時間と「1組に同じ団体の選手が何名入るか」の最大値を表示する。
+
+使い方:
+    python scripts/benchmark_heat_seeding.py [--count 5000] [--capacity 40] [--organizations 120]
+"""
+import os
+import sys
+
+import django
+
+# Django設定
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nitsys.settings')
+django.setup()
+
+import argparse
+import random
+import time
+from collections import Counter
+from decimal import Decimal
+from types import SimpleNamespace
+
+from heats import seeding
+
+
+def build_entries(count, organizations):
+    """申告タイム順のダミーエントリー（一部の団体に選手が偏る分布）"""
+    rng = random.Random(325)
+    return [
+        SimpleNamespace(
+            pk=i,
+            declared_time=Decimal(800 + i),
+            organization_id=min(rng.randrange(organizations), rng.randrange(organizations)),
+        )
+        for i in range(count)
+    ]
+
+
+def same_organization(groups):
+    """各組で最も多い団体の人数（平均, 最大）"""
+    counts = [max(Counter(e.organization_id for e in group).values()) for group in groups if group]
+    return sum(counts) / len(counts), max(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='組分けシード方式のベンチマーク')
+    parser.add_argument('--count', type=int, default=5000, help='エントリー数')
+    parser.add_argument('--capacity', type=int, default=40, help='1組あたりの定員')
+    parser.add_argument('--organizations', type=int, default=120, help='団体数')
+    parser.add_argument('--repeat', type=int, default=5, help='計測回数（最速値を表示）')
+    args = parser.parse_args()
+
+    entries = build_entries(args.count, args.organizations)
+    print(f'エントリー {args.count}件 / 定員 {args.capacity}名 / 団体 {args.organizations}')
+
+    for strategy in seeding.STRATEGIES:
+        elapsed = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            groups = seeding.split(entries, args.capacity, strategy=strategy)
+            elapsed.append(time.perf_counter() - started)
+        sizes = [len(g) for g in groups]
+        average, worst = same_organization(groups)
+        print(
+            f'{strategy:<13} {min(elapsed) * 1000:7.2f}ms  '
+            f'{len(groups)}組（{min(sizes)}〜{max(sizes)}名）  '
+            f'1組の同一団体: 平均{average:.1f}名 / 最大{worst}名'
+        )
+
+
+if __name__ == '__main__':
+    main()
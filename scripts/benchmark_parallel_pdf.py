@@ -0,0 +1,155 @@
+"""
+大会全体の帳票の並列描画ベンチマーク
+
+40種目・2,000名（既定）の大会を作成し、全データPDFと全種目の結果記録用紙
+（generate_result_sheets_by_race()、オフライン用データ一式の生成と同じ経路）を
+直列描画とプロセスプールでの並列描画（REPORT_RENDER_WORKERS 相当）で生成して
+所要時間（実時間）を比較する。並列描画には pypdf が必要。
+プロセスプールの起動時間は最初の並列描画に含まれる。行数が parallel.MIN_ROWS 未満の
+帳票は並列指定でも直列で描画される。
+計測用のデータはトランザクション内で作成し、最後にロールバックする。
+
+並列描画の効果はCPU数に依存する。CPUが1つの環境ではプロセス間の受け渡しと
+ページの連結の分だけ並列の方が遅くなるため、ワーカー数はCPU数を超えないこと。
+導入前に本番と同じCPU数の環境で計測する。
+
+使い方:
+    python scripts/benchmark_parallel_pdf.py [--athletes 2000] [--races 40] [--workers 4]
+"""
+import os
+import sys
+
+import django
+
+# Django設定
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nitsys.settings')
+django.setup()
+
+import argparse
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import Athlete, Organization, User
+from competitions.models import Competition, Race
+from entries.models import Entry
+from heats.models import Heat, HeatAssignment
+from reports import parallel
+from reports.generators import PDFGenerator, ResultSheetPDFGenerator
+from reports.rendering import RenderingContext
+
+
+class Rollback(Exception):
+    """計測後にロールバックするための例外"""
+
+
+def build_competition(athletes, races):
+    """計測用の大会・種目・組編成を作成"""
+    now = timezone.now()
+    competition = Competition.objects.create(
+        name='並列描画ベンチマーク', event_date=date.today() + timedelta(days=30),
+        venue='計測競技場', entry_start_at=now, entry_end_at=now + timedelta(days=7),
+    )
+    organization = Organization.objects.create(
+        name='ベンチマーク大学', name_kana='ベンチマークダイガク', short_name='ベンチ大',
+        representative_name='計測', representative_email='bench@example.com',
+    )
+    user = User.objects.create_user(
+        email='bench-parallel@example.com', password=None, full_name='計測', organization=organization,
+    )
+    race_objects = [
+        Race.objects.create(
+            competition=competition, name=f'計測種目{i}', distance=5000, gender='M' if i % 2 == 0 else 'F',
+            display_order=i, heat_capacity=40, max_entries=None,
+        )
+        for i in range(races)
+    ]
+    athlete_objects = Athlete.objects.bulk_create([
+        Athlete(
+            organization=organization, last_name=f'計測{i}', first_name='太郎',
+            last_name_kana='ケイソク', first_name_kana='タロウ',
+            gender='M', birth_date=date(2000, 1, 1),
+        )
+        for i in range(athletes)
+    ])
+    entries = Entry.objects.bulk_create([
+        Entry(
+            athlete=athlete, race=race_objects[i % races], registered_by=user,
+            declared_time=Decimal(800 + i), status='confirmed',
+        )
+        for i, athlete in enumerate(athlete_objects)
+    ])
+
+    per_race = {}
+    for entry in entries:
+        per_race.setdefault(entry.race_id, []).append(entry)
+    heats = []
+    plan = []
+    for race in race_objects:
+        members = per_race.get(race.pk, [])
+        for number, start in enumerate(range(0, len(members), race.heat_capacity), start=1):
+            heats.append(Heat(race=race, heat_number=number))
+            plan.append(members[start:start + race.heat_capacity])
+    heats = Heat.objects.bulk_create(heats)
+    HeatAssignment.objects.bulk_create([
+        HeatAssignment(heat=heat, entry=entry, bib_number=bib)
+        for heat, members in zip(heats, plan, strict=True)
+        for bib, entry in enumerate(members, start=1)
+    ], batch_size=1000)
+    return competition, race_objects
+
+
+def measure(label, func):
+    """func（BytesIO または 種目のID -> バイト列 を返す）の所要時間と出力サイズを表示"""
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    if isinstance(result, dict):
+        size = sum(len(document) for document in result.values())
+    else:
+        size = len(result.getvalue())
+    print(f'  {label:<8} {elapsed:7.2f}秒  {size / 1024:8.0f}KB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='大会全体の帳票の並列描画ベンチマーク')
+    parser.add_argument('--athletes', type=int, default=2000, help='選手数')
+    parser.add_argument('--races', type=int, default=40, help='種目数')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='並列描画のワーカー数')
+    args = parser.parse_args()
+
+    if parallel.PdfWriter is None:
+        print('pypdf がインストールされていないため、直列描画のみ計測します')
+
+    try:
+        with transaction.atomic():
+            competition, races = build_competition(args.athletes, args.races)
+            RenderingContext.warm_up()
+            print(f'{args.athletes}名 / {args.races}種目 / CPU {os.cpu_count()} / ワーカー {args.workers}')
+
+            modes = [('直列', 1)]
+            if parallel.can_parallelize(args.workers, 2, parallel.MIN_ROWS):
+                modes.append(('並列', args.workers))
+
+            print('全データPDF')
+            for label, workers in modes:
+                measure(label, lambda w=workers: PDFGenerator.generate_all_data_pdf(competition, workers=w))
+
+            print('結果記録用紙（全種目）')
+            for label, workers in modes:
+                measure(label, lambda w=workers: ResultSheetPDFGenerator.generate_result_sheets_by_race(
+                    races, workers=w,
+                ))
+            raise Rollback
+    except Rollback:
+        pass
+    finally:
+        parallel.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+点呼リストPDF生成のベンチマーク（フォント・スタイルの初回構築 vs 使い回し）
+
+40名（既定）の組を作成し、PDFGenerator.generate_rollcall_pdf() の所要時間を
+・コールド: 毎回 RenderingContext をリセット（フォント登録とスタイル構築を含む）
+・ウォーム: 構築済みのフォント・スタイルを使い回す
+の2通りで計測する。計測用のデータはトランザクション内で作成し、最後にロールバックする。
+
+使い方:
+    python scripts/benchmark_pdf_rendering.py [--athletes 40] [--repeat 10]
+"""
+import os
+import sys
+
+import django
+
+# Django設定
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nitsys.settings')
+django.setup()
+
+import argparse
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import Athlete, Organization, User
+from competitions.models import Competition, Race
+from entries.models import Entry
+from heats.models import Heat, HeatAssignment
+from reports.generators import PDFGenerator
+from reports.rendering import RenderingContext
+
+
+class Rollback(Exception):
+    """計測後にロールバックするための例外"""
+
+
+def build_heat(athletes):
+    """計測用の組を作成"""
+    now = timezone.now()
+    competition = Competition.objects.create(
+        name='PDF描画ベンチマーク', event_date=date.today() + timedelta(days=30),
+        venue='計測競技場', entry_start_at=now, entry_end_at=now + timedelta(days=7),
+    )
+    organization = Organization.objects.create(
+        name='ベンチマーク大学', name_kana='ベンチマークダイガク', short_name='ベンチ大',
+        representative_name='計測', representative_email='bench@example.com',
+    )
+    user = User.objects.create_user(
+        email='bench-pdf@example.com', password=None, full_name='計測', organization=organization,
+    )
+    race = Race.objects.create(
+        competition=competition, name='男子5000m', distance=5000, gender='M',
+        heat_capacity=athletes, max_entries=None,
+    )
+    athlete_objects = Athlete.objects.bulk_create([
+        Athlete(
+            organization=organization, last_name=f'計測{i}', first_name='太郎',
+            last_name_kana='ケイソク', first_name_kana='タロウ',
+            gender='M', birth_date=date(2000, 1, 1),
+        )
+        for i in range(athletes)
+    ])
+    entries = Entry.objects.bulk_create([
+        Entry(
+            athlete=athlete, race=race, registered_by=user,
+            declared_time=Decimal(800 + i), status='confirmed',
+        )
+        for i, athlete in enumerate(athlete_objects)
+    ])
+    heat = Heat.objects.create(race=race, heat_number=1)
+    HeatAssignment.objects.bulk_create([
+        HeatAssignment(heat=heat, entry=entry, bib_number=bib)
+        for bib, entry in enumerate(entries, start=1)
+    ])
+    return heat
+
+
+def measure(heat, repeat, cold):
+    """PDF生成の所要時間（秒）のリスト"""
+    elapsed = []
+    for _ in range(repeat):
+        if cold:
+            RenderingContext.reset()
+        started = time.perf_counter()
+        PDFGenerator.generate_rollcall_pdf(heat)
+        elapsed.append(time.perf_counter() - started)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='点呼リストPDF生成のベンチマーク')
+    parser.add_argument('--athletes', type=int, default=40, help='1組の人数')
+    parser.add_argument('--repeat', type=int, default=10, help='計測回数')
+    args = parser.parse_args()
+
+    try:
+        with transaction.atomic():
+            heat = build_heat(args.athletes)
+            font_name = RenderingContext.font_name()
+            print(f'{args.athletes}名 / フォント: {font_name}（{RenderingContext.font_path() or "なし"}）')
+
+            for label, cold in (('コールド', True), ('ウォーム', False)):
+                elapsed = measure(heat, args.repeat, cold)
+                print(
+                    f'{label}: 中央値 {statistics.median(elapsed) * 1000:7.1f}ms  '
+                    f'最小 {min(elapsed) * 1000:7.1f}ms  最大 {max(elapsed) * 1000:7.1f}ms'
+                )
+            raise Rollback
+    except Rollback:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -11,9 +11,16 @@
 - 小規模テスト: 50ユーザー, 5ユーザー/秒
 - 中規模テスト: 200ユーザー, 10ユーザー/秒
 - 大規模テスト: 500ユーザー, 20ユーザー/秒
+
+条件付きGET（ETag）の効果測定のみ行う場合:
+    LOCUST_EMAIL=admin@example.com LOCUST_PASSWORD=... LOCUST_COMPETITION_ID=1 \
+        locust -f scripts/locustfile.py ConditionalPollingUser
 """
 
-from locust import HttpUser, between, task
+import os
+
+from locust import HttpUser, between, constant, task
+from locust.exception import StopUser
 
 
 class WebsiteUser(HttpUser):
@@ -98,3 +105,86 @@ class EntryFlowUser(HttpUser):
         
         # エントリーカート確認
         # self.client.get("/entries/competition/1/cart/")
+
+
+class ConditionalPollingUser(HttpUser):
+    """
+    条件付きGET（ETag / 304）の効果測定
+
+    点呼状況APIとエントリー・選手一覧APIを、If-None-Match なし（[full]）と
+    あり（[conditional]）で同じ間隔でポーリングする。
+    Locustの統計で両者の平均応答時間・平均サイズを比較でき、
+    304で転送を省略できたバイト数は request_type "SAVED" として記録される。
+
+    環境変数:
+    - LOCUST_EMAIL / LOCUST_PASSWORD: ログインユーザー（点呼APIは管理者が必要）
+    - LOCUST_COMPETITION_ID: 点呼状況を取得する大会ID（省略時は点呼APIを測定しない）
+    """
+    
+    # 点呼ダッシュボードの更新間隔に合わせる
+    wait_time = constant(5)
+    
+    def on_start(self):
+        """ログインして測定対象URLを決定"""
+        self.etags = {}
+        self.sizes = {}
+        
+        email = os.environ.get("LOCUST_EMAIL")
+        if not email:
+            # 認証情報がなければ通常の負荷テストには参加しない
+            raise StopUser()
+        
+        self.client.get("/accounts/login/")
+        self.client.post(
+            "/accounts/login/",
+            {
+                "username": email,
+                "password": os.environ.get("LOCUST_PASSWORD", ""),
+                "csrfmiddlewaretoken": self.client.cookies.get("csrftoken", ""),
+            },
+            headers={"Referer": f"{self.host}/accounts/login/"},
+        )
+        
+        self.urls = {
+            "/api/entries/": "/api/entries/",
+            "/api/athletes/": "/api/athletes/",
+        }
+        competition_id = os.environ.get("LOCUST_COMPETITION_ID")
+        if competition_id:
+            self.urls["/heats/competition/[id]/checkin/status/"] = (
+                f"/heats/competition/{competition_id}/checkin/status/"
+            )
+    
+    def _poll(self, name, url):
+        """同じURLを通常GETと条件付きGETで1回ずつ取得"""
+        with self.client.get(url, name=f"{name} [full]", catch_response=True) as response:
+            if response.status_code != 200:
+                response.failure(f"status {response.status_code}")
+        
+        headers = {}
+        if url in self.etags:
+            headers["If-None-Match"] = self.etags[url]
+        with self.client.get(
+            url, name=f"{name} [conditional]", headers=headers, catch_response=True
+        ) as response:
+            if response.status_code == 304:
+                response.success()
+                self.environment.events.request.fire(
+                    request_type="SAVED",
+                    name=name,
+                    response_time=0,
+                    response_length=self.sizes.get(url, 0),
+                    exception=None,
+                    context={},
+                )
+            elif response.status_code == 200:
+                self.etags[url] = response.headers.get("ETag")
+                self.sizes[url] = len(response.content)
+            else:
+                response.failure(f"status {response.status_code}")
+    
+    @task
+    def poll_apis(self):
+        """ダッシュボード・一覧画面のポーリング"""
+        for name, url in self.urls.items():
+            self._poll(name, url)
@@ -0,0 +1,194 @@
+"""
+エントリー受付開始直後の同時申込の負荷試験（定員超過が起きないことの確認）
+
+定員つきの種目に、複数のスレッドから同時に EntryForm でエントリーを申し込む
+（entry_create ビューと同じく、フォームの検証後に transaction.atomic() 内で保存する）。
+終了後に次を確認し、1つでも満たさなければ終了コード1で終わる。
+    ・キャンセル以外のエントリー数が定員以下
+    ・受け付けた件数が「定員」と「申込数」の小さい方と一致（取りこぼしがない）
+    ・Race.active_count が実際のエントリー数と一致
+
+PostgreSQL、またはファイルの SQLite（WAL モードに切り替えて実行）で動かす。
+計測用のデータはコミットして作成し、最後に削除する。
+
+使い方:
+    python scripts/stress_entry_capacity.py [--threads 16] [--athletes 400] [--capacity 100]
+"""
+import os
+import sys
+
+import django
+
+# Django設定
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nitsys.settings')
+django.setup()
+
+import argparse
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from django.db import OperationalError, connection, transaction
+from django.utils import timezone
+
+from accounts.models import Athlete, Organization, User
+from competitions.models import Competition, Race
+from entries.counters import EntryCounter, RaceFullError
+from entries.forms import EntryForm
+from entries.models import Entry
+
+
+def build_competition(athletes, capacity):
+    """計測用の大会・種目・選手を作成（大会・団体・ユーザー・種目を返す）"""
+    now = timezone.now()
+    competition = Competition.objects.create(
+        name='同時申込試験大会', event_date=date.today() + timedelta(days=30),
+        venue='計測競技場', entry_start_at=now - timedelta(hours=1), entry_end_at=now + timedelta(days=7),
+        is_published=True, is_entry_open=True,
+    )
+    organization = Organization.objects.create(
+        name='ベンチマーク大学', name_kana='ベンチマークダイガク', short_name='ベンチ大',
+        representative_name='計測', representative_email='bench@example.com',
+    )
+    user = User.objects.create_user(
+        email='bench-capacity@example.com', password=None, full_name='計測', organization=organization,
+    )
+    race = Race.objects.create(
+        competition=competition, name='同時申込試験種目', distance=5000, gender='M',
+        display_order=1, heat_capacity=40, max_entries=capacity,
+    )
+    Athlete.objects.bulk_create([
+        Athlete(
+            organization=organization, last_name=f'同時{i}', first_name='太郎',
+            last_name_kana='ドウジ', first_name_kana='タロウ',
+            gender='M', birth_date=date(2000, 1, 1),
+        )
+        for i in range(athletes)
+    ], batch_size=1000)
+    return competition, organization, user, race
+
+
+def submit(race_pk, user, athlete_pks, barrier, results):
+    """1スレッド分の申込（entry_create ビューと同じ手順）"""
+    outcome = Counter()
+    latencies = []
+    try:
+        barrier.wait()
+        for athlete_pk in athlete_pks:
+            started = time.perf_counter()
+            # ビューと同様にリクエストごとに種目を読み込む（定員チェックは読み込み時点の値）
+            race = Race.objects.get(pk=race_pk)
+            if race.is_full:
+                outcome['full_before_form'] += 1
+                continue
+            form = EntryForm(
+                {'athlete': athlete_pk, 'declared_time_str': '15:00.00', 'personal_best_str': '14:50.00'},
+                race=race, user=user,
+            )
+            if not form.is_valid():
+                outcome['full_on_validation'] += 1
+                continue
+            try:
+                with transaction.atomic():
+                    form.save()
+            except RaceFullError:
+                outcome['full_on_reservation'] += 1
+            except OperationalError:
+                # SQLite のロック待ちのタイムアウトなど
+                outcome['database_error'] += 1
+            else:
+                outcome['accepted'] += 1
+                latencies.append(time.perf_counter() - started)
+    finally:
+        connection.close()
+    results.append((outcome, latencies))
+
+
+def enable_wal():
+    """SQLite の場合は WAL モードに切り替える（読み取りが書き込みを待たない）"""
+    if connection.vendor != 'sqlite':
+        return connection.vendor
+    if connection.is_in_memory_db():
+        sys.exit('メモリ上の SQLite ではスレッド間でデータを共有できません。ファイルのSQLiteかPostgreSQLを使ってください。')
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        mode = cursor.fetchone()[0]
+    return f'sqlite ({mode})'
+
+
+def cleanup(competition, organization, user):
+    """計測用のデータを削除"""
+    with transaction.atomic():
+        competition.delete()
+        Athlete.objects.filter(organization=organization).delete()
+        user.delete()
+        organization.delete()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='同時申込での定員超過の負荷試験')
+    parser.add_argument('--threads', type=int, default=16, help='同時に申し込むスレッド数')
+    parser.add_argument('--athletes', type=int, default=400, help='申込数（選手数）')
+    parser.add_argument('--capacity', type=int, default=100, help='種目の定員')
+    args = parser.parse_args()
+
+    backend = enable_wal()
+    with transaction.atomic():
+        competition, organization, user, race = build_competition(args.athletes, args.capacity)
+    try:
+        athlete_pks = list(
+            Athlete.objects.filter(organization=organization).order_by('pk').values_list('pk', flat=True)
+        )
+        barrier = threading.Barrier(args.threads)
+        results = []
+        threads = [
+            threading.Thread(target=submit, args=(race.pk, user, athlete_pks[i::args.threads], barrier, results))
+            for i in range(args.threads)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        outcome = sum((result[0] for result in results), Counter())
+        latencies = sorted(latency for result in results for latency in result[1])
+        race.refresh_from_db()
+        stored = Entry.objects.filter(race=race).exclude(status='cancelled').count()
+        expected = min(args.capacity, args.athletes)
+
+        print(f'{backend} / {args.threads}スレッド / 申込 {args.athletes}件 / 定員 {args.capacity}')
+        print(f'  受付         {outcome["accepted"]:6d}件')
+        print(f'  満員（表示前） {outcome["full_before_form"]:6d}件')
+        print(f'  満員（検証時） {outcome["full_on_validation"]:6d}件')
+        print(f'  満員（確保時） {outcome["full_on_reservation"]:6d}件')
+        print(f'  DBエラー      {outcome["database_error"]:6d}件')
+        print(f'  所要時間 {elapsed:.2f}秒（{args.athletes / elapsed:.0f}件/秒）')
+        if latencies:
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            print(f'  受付1件あたり 中央値 {latencies[len(latencies) // 2] * 1000:.1f}ms / 95% {p95 * 1000:.1f}ms')
+        print(f'  エントリー数 {stored}件 / active_count {race.active_count}')
+
+        failures = []
+        if stored > args.capacity:
+            failures.append(f'定員超過: {stored}件 > 定員{args.capacity}')
+        if outcome['accepted'] != stored:
+            failures.append(f'受付件数とエントリー数が一致しません: {outcome["accepted"]} != {stored}')
+        if stored != expected and not outcome['database_error']:
+            failures.append(f'受付件数が定員に届いていません: {stored} < {expected}')
+        if EntryCounter.reconcile([race]):
+            failures.append('Race.active_count が実際のエントリー数と一致しません')
+        for failure in failures:
+            print(f'NG: {failure}')
+        if not failures:
+            print('OK: 定員超過なし')
+    finally:
+        cleanup(competition, organization, user)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
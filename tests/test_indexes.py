@@ -0,0 +1,149 @@
+"""
+インデックスのテスト - 主要なクエリが想定したインデックスを使うことを実行計画（EXPLAIN）で確認
+"""
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounts.athlete_import import AthleteExcelImporter
+from entries.excel_import import ExcelEntryImporter
+from entries.models import Entry
+from heats.checkin import CheckinAggregator
+from heats.models import Heat
+from news.models import News
+from payments.models import ParkingRequest, Payment
+
+
+def query_plan(queryset):
+    """
+    クエリセットの実行計画
+
+    PostgreSQL はテスト用の少量のデータでは順次走査を選ぶため、順次走査を抑止して
+    インデックスが使えるかどうかを確認する。
+    """
+    if connection.vendor == 'postgresql':
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
+    return queryset.explain()
+
+
+def assert_uses_index(queryset, name):
+    """実行計画に指定したインデックスが現れることを確認"""
+    plan = query_plan(queryset)
+    assert name in plan, f'インデックス {name} が使われていません:\n{plan}'
+
+
+@contextmanager
+def capture_queries(table):
+    """指定した表を参照するクエリの (SQL, パラメーター) を記録"""
+    queries = []
+
+    def record(execute, sql, params, many, context):
+        if f'"{table}"' in sql:
+            queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(record):
+        yield queries
+
+
+def sql_plan(sql, params):
+    """記録したクエリをそのままのSQL・パラメーターで EXPLAIN した実行計画"""
+    if connection.vendor == 'postgresql':
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}', params)
+                return '\n'.join(row[0] for row in cursor.fetchall())
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+
+def assert_queries_use_index(queries, name):
+    """記録したクエリのいずれかの実行計画に指定したインデックスが現れることを確認"""
+    plans = [sql_plan(sql, params) for sql, params in queries]
+    assert any(name in plan for plan in plans), (
+        f'インデックス {name} が使われていません:\n' + '\n---\n'.join(plans)
+    )
+
+
+@pytest.mark.django_db
+class TestQueryPlans:
+    """主要なクエリの実行計画"""
+
+    def test_entries_by_race_and_status(self, race):
+        """種目・状態でのエントリーの絞り込み"""
+        assert_uses_index(Entry.objects.filter(race=race, status='confirmed'), 'entry_race_status_idx')
+
+    def test_entries_by_organization_and_competition(self, competition, organization):
+        """団体・大会・状態でのエントリーの絞り込み（エントリーカート）は種目経由で同じインデックスを使う"""
+        entries = Entry.objects.filter(
+            race__competition=competition, athlete__organization=organization, status='pending',
+        )
+        assert_uses_index(entries, 'entry_race_status_idx')
+
+    def test_checkin_counts_per_heat(self, race):
+        """組ごとの点呼集計"""
+        heats = CheckinAggregator.annotate_heats(Heat.objects.filter(race=race))
+        assert_uses_index(heats, 'assignment_checkin_idx')
+
+    def test_payments_by_status(self):
+        """入金確認一覧と本日の承認件数"""
+        assert_uses_index(
+            Payment.objects.filter(status='pending').order_by('-uploaded_at'),
+            'payment_status_uploaded_idx',
+        )
+        today_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        assert_uses_index(
+            Payment.objects.filter(
+                status='approved', reviewed_at__gte=today_start, reviewed_at__lt=today_start + timedelta(days=1),
+            ),
+            'payment_status_reviewed_idx',
+        )
+
+    def test_active_news(self):
+        """公開中のお知らせ"""
+        assert_uses_index(News.get_active_news(limit=5), 'news_active_published_idx')
+
+    def test_athlete_import_matching(self, normal_user):
+        """選手の一括登録での既存選手の照合（AthleteExcelImporter が発行するクエリ）"""
+        importer = AthleteExcelImporter(normal_user)
+        parsed = [
+            {
+                'valid': True, 'row_num': i + 2, 'jaaf_id': f'J0000{i}',
+                'last_name': '鈴木', 'first_name': f'太郎{i}', 'birth_date': date(2000, 1, 1),
+            }
+            for i in range(2)
+        ]
+        with capture_queries('accounts_athlete') as queries:
+            importer.check_duplicates(parsed)
+        assert_queries_use_index(queries, 'athlete_jaaf_id_idx')
+
+    def test_entry_import_matching(self, competition, normal_user):
+        """エントリーの一括登録での選手の照合（ExcelEntryImporter が発行する JAAF ID・氏名のクエリ）"""
+        importer = ExcelEntryImporter(competition, normal_user)
+        df = pd.DataFrame({
+            '選手ID': ['J00001', ''], '姓': ['鈴木', '佐藤'], '名': ['太郎', '花子'],
+        })
+        with capture_queries('accounts_athlete') as queries:
+            importer.prepare(df)
+        assert_queries_use_index(
+            [q for q in queries if 'jaaf_id' in q[0].split('WHERE')[-1]], 'athlete_jaaf_id_idx'
+        )
+        assert_queries_use_index(
+            [q for q in queries if 'last_name' in q[0].split('WHERE')[-1]], 'athlete_name_idx'
+        )
+
+    def test_parking_requests_by_competition(self, competition):
+        """大会ごとの割当済みの駐車場申請"""
+        assert_uses_index(
+            ParkingRequest.objects.filter(competition=competition, status='assigned'),
+            'parking_competition_status_idx',
+        )